@@ -0,0 +1,3 @@
+-- 添加查询结果缓存有效期字段到database_sources表
+ALTER TABLE database_sources
+ADD COLUMN IF NOT EXISTS query_cache_ttl INTEGER;
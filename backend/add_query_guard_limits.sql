@@ -0,0 +1,4 @@
+-- 添加数据库查询代价阈值字段到users表
+ALTER TABLE users
+ADD COLUMN IF NOT EXISTS query_max_rows INTEGER,
+ADD COLUMN IF NOT EXISTS query_max_cost DOUBLE PRECISION;
@@ -1,7 +1,7 @@
 from fastapi import APIRouter
 
 from api.routes import auth, notes, datasets, llm, llm_config, conversations, processing, nlp
-from api.routes import task_dependency, task_history
+from api.routes import task_dependency, task_history, vector_search
 from api.endpoints import pdf
 
 # 创建主路由
@@ -18,4 +18,5 @@ api_router.include_router(processing.router, prefix="/processing", tags=["数据
 api_router.include_router(nlp.router, prefix="/nlp", tags=["自然语言处理"])
 api_router.include_router(task_dependency.router, prefix="/task-dependencies", tags=["任务依赖"])
 api_router.include_router(task_history.router, prefix="/task-history", tags=["任务历史"])
+api_router.include_router(vector_search.router, prefix="/vector-search", tags=["向量搜索"])
 api_router.include_router(pdf.router, prefix="/pdf", tags=["PDF处理"])
@@ -1,15 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form
-from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Form, BackgroundTasks, Request, Header
+from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 
 from core.dependencies import get_db, get_current_user
-from core.config import settings
 from models.schemas import (
     DatasetCreate, DatasetUpdate, DatasetResponse,
     DatabaseSourceCreate, FileSourceResponse, URLSourceCreate,
+    UploadSessionCreate, UploadSessionResponse,
     UserResponse
 )
 from services import dataset_service
+from core.processing.schema_cache import schema_cache
 
 router = APIRouter()
 
@@ -89,6 +90,7 @@ def delete_dataset(
 def add_database_source(
     dataset_id: int,
     source: DatabaseSourceCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
@@ -102,11 +104,109 @@ def add_database_source(
     source.dataset_id = dataset_id
     
     # 添加数据源
-    dataset_service.add_database_source(db=db, source=source)
+    db_source = dataset_service.add_database_source(db=db, source=source)
+
+    # 在后台预加载数据库元数据
+    if db_source.connection_string:
+        background_tasks.add_task(
+            schema_cache.refresh_in_background, db_source.id, db_source.connection_string
+        )
     
     # 返回更新后的数据集
     return dataset_service.get_dataset(db=db, dataset_id=dataset_id)
 
+@router.get("/{dataset_id}/database-sources/{source_id}/schema", response_model=Dict[str, Any])
+def get_database_schema(
+    dataset_id: int,
+    source_id: int,
+    search: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    refresh: bool = False,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """浏览数据库数据源的表结构"""
+    # 检查数据集是否存在且属于当前用户
+    dataset = dataset_service.get_dataset(db=db, dataset_id=dataset_id)
+    if dataset is None or dataset.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+
+    schema = dataset_service.get_database_schema(
+        db=db,
+        dataset_id=dataset_id,
+        source_id=source_id,
+        refresh=refresh,
+        search=search,
+        skip=skip,
+        limit=limit
+    )
+    if schema is None:
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    return schema
+
+@router.post("/{dataset_id}/database-sources/{source_id}/schema/refresh", response_model=Dict[str, Any])
+def refresh_database_schema(
+    dataset_id: int,
+    source_id: int,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """刷新数据库数据源的元数据缓存"""
+    # 检查数据集是否存在且属于当前用户
+    dataset = dataset_service.get_dataset(db=db, dataset_id=dataset_id)
+    if dataset is None or dataset.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+
+    schema = dataset_service.get_database_schema(
+        db=db, dataset_id=dataset_id, source_id=source_id, refresh=True
+    )
+    if schema is None:
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    return schema
+
+@router.get("/{dataset_id}/database-sources/{source_id}/schema/tables/{table_name}", response_model=Dict[str, Any])
+def get_database_table_schema(
+    dataset_id: int,
+    source_id: int,
+    table_name: str,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """获取数据库数据源中单张表的结构"""
+    # 检查数据集是否存在且属于当前用户
+    dataset = dataset_service.get_dataset(db=db, dataset_id=dataset_id)
+    if dataset is None or dataset.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+
+    table = dataset_service.get_database_table_schema(
+        db=db, dataset_id=dataset_id, source_id=source_id, table_name=table_name
+    )
+    if table is None:
+        raise HTTPException(status_code=404, detail="数据源或表不存在")
+    return table
+
+@router.delete("/{dataset_id}/database-sources/{source_id}/query-cache", response_model=Dict[str, Any])
+def invalidate_query_cache(
+    dataset_id: int,
+    source_id: int,
+    query: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """清除数据库数据源的查询结果缓存，指定query时只清除该查询"""
+    # 检查数据集是否存在且属于当前用户
+    dataset = dataset_service.get_dataset(db=db, dataset_id=dataset_id)
+    if dataset is None or dataset.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+
+    removed = dataset_service.invalidate_query_cache(
+        db=db, dataset_id=dataset_id, source_id=source_id, query=query
+    )
+    if removed is None:
+        raise HTTPException(status_code=404, detail="数据源不存在")
+    return {"removed": removed}
+
 @router.post("/{dataset_id}/file-sources", response_model=FileSourceResponse)
 async def add_file_source(
     dataset_id: int,
@@ -128,10 +228,69 @@ async def add_file_source(
         name=name,
         description=description,
         dataset_id=dataset_id,
-        file=file,
-        upload_dir=settings.UPLOAD_DIR
+        file=file
     )
 
+@router.post("/{dataset_id}/uploads", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    dataset_id: int,
+    session: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """创建可续传的上传会话，之后用PUT按Content-Range上传分块（可以乱序、并行），最后调用complete"""
+    dataset = dataset_service.get_dataset(db=db, dataset_id=dataset_id)
+    if dataset is None or dataset.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+    return dataset_service.create_upload_session(dataset_id=dataset_id, user_id=current_user.id, session=session)
+
+@router.get("/{dataset_id}/uploads/{upload_id}", response_model=UploadSessionResponse)
+def get_upload_session(
+    dataset_id: int,
+    upload_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """查询上传会话已收到和缺少的字节范围"""
+    return dataset_service.get_upload_session(dataset_id=dataset_id, user_id=current_user.id, upload_id=upload_id)
+
+@router.put("/{dataset_id}/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    dataset_id: int,
+    upload_id: str,
+    request: Request,
+    content_range: Optional[str] = Header(None),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """上传一个分块，请求体为原始字节，Content-Range为 bytes <开始>-<结束>/<总大小>"""
+    return await dataset_service.upload_chunk(
+        dataset_id=dataset_id,
+        user_id=current_user.id,
+        upload_id=upload_id,
+        content_range=content_range,
+        body=request.stream()
+    )
+
+@router.post("/{dataset_id}/uploads/{upload_id}/complete", response_model=FileSourceResponse)
+async def complete_upload_session(
+    dataset_id: int,
+    upload_id: str,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """完成上传，校验文件后创建文件类型数据源"""
+    return await dataset_service.complete_upload_session(
+        db=db, dataset_id=dataset_id, user_id=current_user.id, upload_id=upload_id
+    )
+
+@router.delete("/{dataset_id}/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_upload_session(
+    dataset_id: int,
+    upload_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """取消上传，删除已收到的数据"""
+    dataset_service.abort_upload_session(dataset_id=dataset_id, user_id=current_user.id, upload_id=upload_id)
+
 @router.post("/{dataset_id}/url-sources", response_model=DatasetResponse)
 def add_url_source(
     dataset_id: int,
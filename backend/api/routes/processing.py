@@ -13,6 +13,7 @@ from models.schemas import (
 )
 from services import processing_service
 from core.processing.scheduler import task_scheduler
+from core.processing.query_cache import query_cache
 
 router = APIRouter()
 
@@ -57,6 +58,14 @@ async def get_tasks(
     )
 
 
+@router.get("/query-cache/stats", response_model=Dict[str, Any])
+async def get_query_cache_stats(
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """获取查询结果缓存的命中统计"""
+    return query_cache.get_stats()
+
+
 @router.get("/{task_id}", response_model=ProcessingTaskResponse)
 async def get_task(
     task_id: int,
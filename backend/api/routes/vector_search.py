@@ -0,0 +1,91 @@
+"""
+向量搜索API路由
+提供数据集文件和笔记文本块的相似度搜索，以及笔记的嵌入索引
+"""
+from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Dict, Any, List, Optional
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from core.dependencies import get_db, get_current_user
+from models.schemas import UserResponse
+from services import dataset_service, note_service, vector_search_service
+
+router = APIRouter()
+
+
+class VectorSearchRequest(BaseModel):
+    """向量搜索请求"""
+    query: str
+    top_k: int = 10
+    dataset_id: Optional[int] = None
+    source_id: Optional[int] = None
+    source_type: Optional[str] = None  # file或note
+    embed_model: Optional[str] = None
+
+
+class VectorSearchResult(BaseModel):
+    """向量搜索结果"""
+    score: float
+    dataset_id: Optional[int] = None
+    source_type: str
+    source_id: int
+    user_id: Optional[int] = None
+    row: int
+    text: str
+
+
+class NoteIndexRequest(BaseModel):
+    """笔记索引请求"""
+    embed_model: Optional[str] = None
+
+
+@router.post("/search", response_model=List[VectorSearchResult])
+async def search(
+    request: VectorSearchRequest,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """搜索当前用户的文本块，可按数据集、数据源和类型过滤"""
+    if request.dataset_id is not None:
+        dataset = dataset_service.get_dataset(db=db, dataset_id=request.dataset_id)
+        if dataset is None or dataset.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="数据集不存在")
+    if request.source_type not in (None, "file", "note"):
+        raise HTTPException(status_code=400, detail="source_type只能是file或note")
+    if not 1 <= request.top_k <= 1000:
+        raise HTTPException(status_code=400, detail="top_k必须在1到1000之间")
+
+    try:
+        return await vector_search_service.search(
+            db=db,
+            query=request.query,
+            user_id=current_user.id,
+            top_k=request.top_k,
+            dataset_id=request.dataset_id,
+            source_id=request.source_id,
+            source_type=request.source_type,
+            embed_model=request.embed_model
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/notes/{note_id}", response_model=Dict[str, Any])
+async def index_note(
+    note_id: int,
+    request: Optional[NoteIndexRequest] = None,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """嵌入笔记内容并加入向量索引，笔记修改后再次调用只重新嵌入变化的部分"""
+    note = note_service.get_note(db=db, note_id=note_id)
+    if note is None or note.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="笔记不存在")
+
+    try:
+        return await vector_search_service.index_note(
+            db=db, note_id=note_id, embed_model=request.embed_model if request else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
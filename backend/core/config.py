@@ -29,12 +29,83 @@ class Settings(BaseSettings):
 
     # 文件存储配置
     UPLOAD_DIR: Path = Path("./uploads")
+    BLOB_DIR: Path = Path("./uploads/blobs")  # 按内容哈希保存上传文件的目录，内容相同的文件只保存一份
+    UPLOAD_CHUNK_BYTES: int = 4 * 1024 * 1024  # 流式保存上传文件时每次读取的字节数
+    UPLOAD_SESSION_DIR: Path = Path("./uploads/sessions")  # 可续传上传的临时目录，应与BLOB_DIR在同一文件系统
+    UPLOAD_MAX_CHUNK_BYTES: int = 64 * 1024 * 1024  # 可续传上传每个分块的最大字节数
+    UPLOAD_SESSION_TTL_SECONDS: int = 7 * 24 * 3600  # 可续传上传会话超过该时间没有更新时删除
+
+    # 外部数据源配置
+    SCHEMA_CACHE_TTL_SECONDS: int = 3600  # 元数据缓存有效期（秒）
+    ASYNC_DB_ENABLED: bool = True  # Postgres/MySQL是否使用异步驱动
+    DATABASE_QUERY_BATCH_SIZE: int = 10000  # 流式查询每批行数
+    DATABASE_PROFILE_CONCURRENCY: int = 4  # 整库分析时每个数据源的最大并发连接数
+    DATABASE_STATEMENT_TIMEOUT_SECONDS: int = 300  # 外部数据库语句超时（秒），0表示不限制
+    DATABASE_PARTIAL_RESULT_TABLES: int = 20  # 整库分析时每完成多少张表写入一次阶段性结果
+    DATABASE_PARTIAL_RESULT_SECONDS: float = 5.0  # 整库分析时距上次写入阶段性结果超过该秒数也写入一次
+
+    # 分析配置
+    ARTIFACT_DIR: Path = Path("./temp/artifacts")  # 分析产物（如相关系数矩阵）存放目录
+    CORRELATION_FULL_MATRIX_MAX_COLUMNS: int = 50  # 超过该列数时相关性分析只返回高相关列对
+    CORRELATION_BLOCK_SIZE: int = 256  # 分块计算相关系数时每块的列数
+
+    # 查询代价预检配置（可按用户覆盖）
+    QUERY_GUARD_ENABLED: bool = True
+    QUERY_GUARD_MAX_ROWS: int = 1000000  # 估计返回行数上限，超过时自动加LIMIT、抽样或拒绝
+    QUERY_GUARD_MAX_COST: float = 100000000.0  # EXPLAIN估计代价上限，超过时拒绝
+    QUERY_GUARD_LIMIT_ROWS: int = 100000  # 自动加LIMIT或抽样时保留的行数
+
+    # 执行计划配置
+    TASK_MEMORY_BUDGET_BYTES: int = 512 * 1024 * 1024  # 单个任务加载数据的内存预算
+    CSV_CHUNK_ROWS: int = 100000  # 流式处理CSV时每块的行数
+    SPILL_DIR: Path = Path("./temp/spill")  # 流式处理时溢写临时文件的目录
+    EXTERNAL_SORT_RUN_BYTES: int = 128 * 1024 * 1024  # 外部排序每个有序段占用的内存上限
+    HASH_AGGREGATE_STATE_ROWS: int = 1000000  # 分组聚合在内存中保留的部分状态行数上限，超过后按哈希分区溢写
+    JOIN_BUILD_BYTES: int = 256 * 1024 * 1024  # 哈希连接构建侧的内存上限，两侧都超过时改用排序归并连接
+
+    # CSV的Parquet影子副本配置
+    SHADOW_DIR: Path = Path("./temp/parquet_shadow")
+    SHADOW_ROW_GROUP_ROWS: int = 131072  # 每个行组的行数，越小过滤下推越精细
+    SHADOW_COMPRESSION: str = "zstd"
+
+    # 文件剖析配置
+    PROFILE_BLOCK_BYTES: int = 8 * 1024 * 1024  # 剖析文件时每次读取的字节数
+    PROFILE_STORE_DIR: Path = Path("./temp/profile_store")  # 按内容哈希保存的剖析结果目录
+    PROFILE_STORE_MAX_PROFILES: int = 10000
+    TOP_WORDS_CAPACITY: int = 10000  # 词频摘要最多保留的单词数，超出后按Space-Saving淘汰低频词
+    JSON_MAX_VALUE_CHARS: int = 1024 * 1024  # JSON结构分析时整体解码的单个值的最大字符数，更大的值逐个成员解析
+    JSON_MAX_PATHS: int = 2000  # JSON结构分析最多记录的键路径数
+    TEXT_BLOCK_CHARS: int = 4 * 1024 * 1024  # 文本处理时每块读取的字符数
+
+    # 文件格式转换配置
+    CONVERT_BATCH_ROWS: int = 65536  # 转换时每批读取的行数
+    CONVERT_ROW_GROUP_ROWS: int = 131072  # 输出Parquet时每个行组的行数，可按任务覆盖
+
+    # 查询结果缓存配置
+    QUERY_CACHE_DIR: Path = Path("./temp/query_cache")
+    QUERY_CACHE_TTL_SECONDS: int = 300  # 默认有效期（秒），可按数据源覆盖
+    QUERY_CACHE_MEMORY_BYTES: int = 256 * 1024 * 1024  # 内存缓存上限
+    QUERY_CACHE_DISK_BYTES: int = 2 * 1024 * 1024 * 1024  # 磁盘缓存上限
 
     # LLM配置
     LLM_API_KEY: Optional[str] = None
     LLM_MODEL: str = "gpt-3.5-turbo"
     DEEPSEEK_API_KEY: Optional[str] = None
 
+    # 文本嵌入配置
+    EMBED_API_BASE: str = "https://api.openai.com/v1"  # OpenAI兼容的嵌入接口地址
+    EMBED_API_KEY: Optional[str] = None  # 未设置时使用LLM_API_KEY
+    EMBED_CHUNK_TOKENS: int = 256  # 每个文本块的目标词元数
+    EMBED_OVERLAP_TOKENS: int = 32  # 相邻文本块重叠的词元数
+    EMBED_BATCH_SIZE: int = 64  # 每次请求嵌入的文本块数
+    EMBED_CONCURRENCY: int = 4  # 同时进行的嵌入请求数
+    EMBED_HASHING_DIMENSIONS: int = 256  # 本地哈希嵌入（embed_model为hashing）的维度
+    VECTOR_STORE_DIR: Path = Path("./temp/vector_store")  # 按模型保存的float32向量目录
+    EMBED_DEFAULT_MODEL: str = "hashing"  # 向量搜索未指定模型时使用的嵌入模型
+    VECTOR_INDEX_DIR: Path = Path("./temp/vector_index")  # 按模型和数据集分区保存的向量索引目录
+    VECTOR_INDEX_NPROBE: int = 16  # 搜索时探测的倒排列表数，越大越准确、越慢
+    VECTOR_INDEX_TRAIN_MIN: int = 10000  # 分区向量数达到该值后训练聚类中心，否则精确搜索
+
     # 加密配置
     ENCRYPTION_KEY: Optional[str] = None
 
@@ -102,6 +102,7 @@ class InstructionParser:
             - table_name: 要分析的表名
             - analysis_type: 分析类型，可以是descriptive(描述性统计), correlation(相关性分析), distribution(分布分析)
             - column: 如果是针对特定列的分析，指定列名
+            - scope: 如果要分析整个数据库的所有表，设置为database（此时不需要table_name，分析类型只能是descriptive或correlation）
             
             对于 database_transform (数据转换)：
             - table_name: 要转换的表名
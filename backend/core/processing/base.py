@@ -175,6 +175,19 @@ class BaseDataProcessor(DataProcessor):
                 task.progress = progress
                 db.commit()
 
+    def update_partial_result(self, task_id: int, result: Dict[str, Any], db: Session) -> None:
+        """
+        写入任务的阶段性结果，长时间运行的任务可以在完成前展示已完成的部分
+        :param task_id: 任务ID
+        :param result: 阶段性结果（每次传入新的字典）
+        :param db: 数据库会话
+        """
+        if task_id in self.running_tasks:
+            task = db.query(ProcessingTask).filter(ProcessingTask.id == task_id).first()
+            if task:
+                task.result = result
+                db.commit()
+
     def get_progress(self, task_id: int, db: Session) -> int:
         """
         获取任务进度
@@ -0,0 +1,160 @@
+"""
+分块相关性计算
+面向宽表：按列分块计算皮尔逊相关系数（按成对完整的行，与pandas一致），只保留超过阈值或前K个的列对，
+完整矩阵以float32二进制文件写入磁盘而不是放进任务结果JSON
+"""
+import heapq
+import json
+import logging
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def standardize(numeric_df: pd.DataFrame) -> np.ndarray:
+    """
+    将数值列按列的均值和标准差缩放（不改变相关系数，只是减小后面求和时的舍入误差），缺失值保留为NaN
+    :param numeric_df: 数值列数据框
+    :return: 缩放后的矩阵（行 x 列）
+    """
+    values = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(all="ignore"):
+        mean = np.nanmean(values, axis=0)
+        std = np.nanstd(values, axis=0)
+    mean[~np.isfinite(mean)] = 0.0
+    std[~np.isfinite(std) | (std == 0)] = 1.0
+    return (values - mean) / std
+
+
+def _pairwise_block(left: np.ndarray, left_mask: np.ndarray,
+                    right: np.ndarray, right_mask: np.ndarray) -> np.ndarray:
+    """
+    两块列之间按成对完整的行（两列都不为空）计算相关系数，与pandas的DataFrame.corr一致
+    :param left: 左块（缺失值已置0）
+    :param left_mask: 左块的非空标记（0/1）
+    :param right: 右块（缺失值已置0）
+    :param right_mask: 右块的非空标记（0/1）
+    :return: 相关系数块，共同非空的行少于2行或其中一列为常数时为NaN
+    """
+    n = left_mask.T @ right_mask
+    sum_x = left.T @ right_mask
+    sum_y = left_mask.T @ right
+    with np.errstate(all="ignore"):
+        cov = left.T @ right - sum_x * sum_y / n
+        var_x = (left * left).T @ right_mask - sum_x * sum_x / n
+        var_y = left_mask.T @ (right * right) - sum_y * sum_y / n
+        block = cov / np.sqrt(var_x * var_y)
+    block[(n < 2) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+    return block
+
+
+def blockwise_correlation_pairs(
+    numeric_df: pd.DataFrame,
+    threshold: float = 0.7,
+    top_k: Optional[int] = None,
+    block_size: int = 256,
+    matrix_path: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    分块计算相关系数，返回高相关列对
+    :param numeric_df: 数值列数据框
+    :param threshold: 相关系数绝对值阈值
+    :param top_k: 只保留绝对值最大的K个列对，为空时保留所有超过阈值的列对
+    :param block_size: 每块的列数
+    :param matrix_path: 完整矩阵的输出路径（.npy），为空时不写入
+    :return: 高相关列对和统计信息
+    """
+    columns = [str(column) for column in numeric_df.columns]
+    column_count = len(columns)
+    row_count = len(numeric_df)
+    z = standardize(numeric_df)
+    mask = (~np.isnan(z)).astype(np.float64)
+    z[mask == 0] = 0.0
+
+    matrix = None
+    if matrix_path is not None:
+        matrix = np.lib.format.open_memmap(
+            matrix_path, mode="w+", dtype=np.float32, shape=(column_count, column_count)
+        )
+
+    # 小顶堆保存 (|r|, i, j, r)
+    heap: List[tuple] = []
+    pairs: List[tuple] = []
+    pair_count_above_threshold = 0
+
+    for i0 in range(0, column_count, block_size):
+        i1 = min(i0 + block_size, column_count)
+        left, left_mask = z[:, i0:i1], mask[:, i0:i1]
+        for j0 in range(i0, column_count, block_size):
+            j1 = min(j0 + block_size, column_count)
+            block = _pairwise_block(left, left_mask, z[:, j0:j1], mask[:, j0:j1])
+            np.clip(block, -1.0, 1.0, out=block)
+
+            if matrix is not None:
+                matrix[i0:i1, j0:j1] = block
+                matrix[j0:j1, i0:i1] = block.T
+
+            # 只取上三角（i < j）
+            with np.errstate(invalid="ignore"):
+                rows, cols = np.nonzero(np.abs(block) >= threshold)
+            rows_global = rows + i0
+            cols_global = cols + j0
+            upper = rows_global < cols_global
+            for i, j in zip(rows_global[upper], cols_global[upper]):
+                value = float(block[i - i0, j - j0])
+                pair_count_above_threshold += 1
+                if top_k:
+                    item = (abs(value), int(i), int(j), value)
+                    if len(heap) < top_k:
+                        heapq.heappush(heap, item)
+                    elif item[0] > heap[0][0]:
+                        heapq.heapreplace(heap, item)
+                else:
+                    pairs.append((abs(value), int(i), int(j), value))
+
+    if matrix is not None:
+        matrix.flush()
+        del matrix
+
+    selected = heap if top_k else pairs
+    selected.sort(key=lambda item: item[0], reverse=True)
+
+    return {
+        "column_count": column_count,
+        "row_count": row_count,
+        "pair_count_above_threshold": pair_count_above_threshold,
+        "high_correlations": [
+            {
+                "column1": columns[i],
+                "column2": columns[j],
+                "correlation": round(value, 4)
+            }
+            for _, i, j, value in selected
+        ]
+    }
+
+
+def write_matrix_columns(matrix_path: Path, columns: List[str]) -> Path:
+    """
+    写入矩阵对应的列名
+    :param matrix_path: 矩阵文件路径
+    :param columns: 列名列表
+    :return: 列名文件路径
+    """
+    columns_path = matrix_path.with_suffix(".columns.json")
+    with open(columns_path, "w", encoding="utf-8") as f:
+        json.dump(columns, f, ensure_ascii=False)
+    return columns_path
+
+
+def new_matrix_path(artifact_dir: Path) -> Path:
+    """生成新的矩阵文件路径"""
+    artifact_dir.mkdir(parents=True, exist_ok=True)
+    return artifact_dir / f"correlation_{uuid.uuid4().hex}.npy"
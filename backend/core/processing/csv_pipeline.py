@@ -0,0 +1,802 @@
+"""
+CSV流式处理管道
+按块读取CSV，逐块应用行级操作并追加写入输出文件；
+需要全局视图的操作（排序、去重、按统计量填充空值）先把数据溢写到磁盘再回放，内存占用与文件大小无关
+"""
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from core.processing.external_sort import external_sort
+from core.processing.hash_aggregate import HashAggregator, parse_aggregations, normalize_keys
+from core.processing.file_join import FileJoin, parse_join, describe_join
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 只依赖当前行的操作，可以逐块执行
+ROW_OPERATIONS = ["filter_rows", "select_columns", "rename_columns", "convert_type", "create_column", "fill_nulls"]
+
+# 去重时按哈希分区的数量
+DEDUP_PARTITIONS = 64
+# 两个不同的哈希键组成128位行指纹，避免哈希碰撞误删
+_HASH_KEYS = ("kortex-dedup-k01", "kortex-dedup-k02")
+
+
+def _merge_dtype(current: str, new: str) -> str:
+    """合并两块数据推断出的列类型"""
+    if current == new:
+        return current
+    if current in ("int64", "float64") and new in ("int64", "float64"):
+        return "float64"
+    return "object"
+
+
+class OperationSkipped(ValueError):
+    """操作参数无效（如列不存在），跳过该操作"""
+
+
+class PipelineCancelled(Exception):
+    """任务被取消"""
+
+
+def is_row_operation(operation: Dict[str, Any]) -> bool:
+    """
+    判断操作是否可以逐块执行
+    :param operation: 操作定义
+    :return: 是否为行级操作
+    """
+    operation_type = operation.get("type")
+    if operation_type == "fill_nulls":
+        return operation.get("method", "value") == "value"
+    return operation_type in ROW_OPERATIONS
+
+
+def get_sort_keys(operation: Dict[str, Any]) -> Tuple[List[str], List[bool]]:
+    """
+    解析排序操作的排序键，支持单列（column）或多列（columns），ascending可以是布尔值或与列一一对应的列表
+    :param operation: 操作定义
+    :return: (排序列, 每列是否升序)
+    """
+    columns = operation.get("columns") or [operation.get("column")]
+    ascending = operation.get("ascending", True)
+    if isinstance(ascending, list):
+        if len(ascending) != len(columns):
+            raise OperationSkipped("ascending的数量与排序列的数量不一致")
+        return columns, [bool(value) for value in ascending]
+    return columns, [bool(ascending)] * len(columns)
+
+
+def describe_sort(columns: List[str], ascending: List[bool]) -> str:
+    """生成排序操作的结果说明"""
+    keys = ", ".join(f"{column} {'升序' if asc else '降序'}" for column, asc in zip(columns, ascending))
+    return f"已按列 {keys} 排序"
+
+
+def describe_aggregation(keys: List[str], aggregations: List[Dict[str, Any]], groups: int, spilled: bool = False) -> str:
+    """生成分组聚合的结果说明"""
+    functions = ", ".join(aggregation["alias"] for aggregation in aggregations)
+    message = f"已按 {', '.join(str(key) for key in keys)} 分组聚合为 {groups} 行: {functions}" if keys else f"已聚合: {functions}"
+    if spilled:
+        message += "（分组数较多，已溢写到磁盘分区计算）"
+    return message
+
+
+def apply_row_operation(df: pd.DataFrame, operation: Dict[str, Any]) -> Tuple[pd.DataFrame, str]:
+    """
+    应用行级操作
+    :param df: 数据框（完整数据或一个数据块）
+    :param operation: 操作定义
+    :return: (处理后的数据框, 结果说明)
+    :raises OperationSkipped: 参数无效时
+    """
+    operation_type = operation.get("type")
+
+    if operation_type == "filter_rows":
+        # 过滤行
+        column = operation.get("column")
+        condition = operation.get("condition")  # eq, ne, gt, lt, contains, etc.
+        value = operation.get("value")
+
+        if column not in df.columns:
+            raise OperationSkipped(f"列 {column} 不存在")
+
+        old_count = len(df)
+
+        if condition == "eq":
+            df = df[df[column] == value]
+        elif condition == "ne":
+            df = df[df[column] != value]
+        elif condition == "gt":
+            df = df[df[column] > value]
+        elif condition == "lt":
+            df = df[df[column] < value]
+        elif condition == "contains":
+            df = df[df[column].astype(str).str.contains(str(value), na=False)]
+        elif condition == "not_contains":
+            df = df[~df[column].astype(str).str.contains(str(value), na=False)]
+        elif condition == "is_null":
+            df = df[df[column].isnull()]
+        elif condition == "is_not_null":
+            df = df[df[column].notnull()]
+        else:
+            raise OperationSkipped(f"不支持的条件: {condition}")
+
+        return df, f"已过滤 {old_count - len(df)} 行数据"
+
+    if operation_type == "select_columns":
+        # 选择列
+        columns = operation.get("columns", [])
+
+        # 检查列是否存在
+        missing_columns = [col for col in columns if col not in df.columns]
+        if missing_columns:
+            raise OperationSkipped(f"列不存在: {', '.join(missing_columns)}")
+
+        old_columns = df.columns.tolist()
+        df = df[columns]
+        return df, f"已选择 {len(columns)} 列，移除 {len(old_columns) - len(columns)} 列"
+
+    if operation_type == "rename_columns":
+        # 重命名列
+        rename_map = operation.get("rename_map", {})
+
+        # 检查列是否存在
+        missing_columns = [col for col in rename_map.keys() if col not in df.columns]
+        if missing_columns:
+            raise OperationSkipped(f"列不存在: {', '.join(missing_columns)}")
+
+        df = df.rename(columns=rename_map)
+        return df, f"已重命名 {len(rename_map)} 列"
+
+    if operation_type == "fill_nulls":
+        # 用常量填充空值
+        column = operation.get("column")
+        value = operation.get("value")
+
+        if column not in df.columns:
+            raise OperationSkipped(f"列 {column} 不存在")
+        if value is None:
+            raise OperationSkipped("不支持的方法: value")
+
+        null_count = df[column].isnull().sum()
+        df[column] = df[column].fillna(value)
+        return df, f"已填充 {null_count} 个空值"
+
+    if operation_type == "create_column":
+        # 创建新列
+        new_column = operation.get("new_column")
+        expression = operation.get("expression")
+
+        if not expression:
+            raise OperationSkipped("未指定表达式")
+
+        # 使用eval执行表达式（注意：这在生产环境中可能存在安全风险）
+        try:
+            # 创建一个局部命名空间，包含df和常用库
+            local_dict = {"df": df, "np": np, "pd": pd}
+            # 执行表达式
+            df[new_column] = eval(expression, {"__builtins__": {}}, local_dict)
+        except Exception as e:
+            raise OperationSkipped(f"表达式执行失败: {str(e)}")
+        return df, f"已创建新列 {new_column}"
+
+    if operation_type == "convert_type":
+        # 转换数据类型
+        column = operation.get("column")
+        target_type = operation.get("target_type")  # int, float, str, datetime
+
+        if column not in df.columns:
+            raise OperationSkipped(f"列 {column} 不存在")
+
+        if target_type == "int":
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+        elif target_type == "float":
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        elif target_type == "str":
+            df[column] = df[column].astype(str)
+        elif target_type == "datetime":
+            df[column] = pd.to_datetime(df[column], errors='coerce')
+        else:
+            raise OperationSkipped(f"不支持的目标类型: {target_type}")
+
+        return df, f"已将列 {column} 转换为 {target_type} 类型"
+
+    raise OperationSkipped(f"不支持的操作类型: {operation_type}")
+
+
+class QuantileSketch:
+    """基于蓄水池抽样的近似分位数"""
+
+    def __init__(self, capacity: int = 100000, seed: int = 0):
+        self.capacity = capacity
+        self.count = 0
+        self._sample = np.empty(0, dtype=np.float64)
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values: Any) -> None:
+        """
+        加入一批数值（忽略空值）
+        :param values: 数值序列
+        """
+        values = np.asarray(pd.to_numeric(pd.Series(values), errors="coerce").dropna(), dtype=np.float64)
+        if values.size == 0:
+            return
+
+        room = self.capacity - self._sample.size
+        if room > 0:
+            self._sample = np.concatenate([self._sample, values[:room]])
+            self.count += min(room, values.size)
+            values = values[room:]
+
+        if values.size:
+            # 第i个元素以 capacity/i 的概率替换蓄水池中的随机位置
+            positions = self.count + np.arange(1, values.size + 1)
+            keep = self._rng.random(values.size) < self.capacity / positions
+            slots = self._rng.integers(0, self.capacity, size=int(keep.sum()))
+            self._sample[slots] = values[keep]
+            self.count += values.size
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        获取近似分位数
+        :param q: 分位点（0-1）
+        :return: 分位数，没有数据时返回None
+        """
+        if self._sample.size == 0:
+            return None
+        return float(np.quantile(self._sample, q))
+
+    @property
+    def exact(self) -> bool:
+        """数据量未超过蓄水池容量时结果是精确的"""
+        return self.count <= self.capacity
+
+
+class ChunkSpool:
+    """把数据块按顺序溢写到磁盘，之后可以重复回放"""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.chunk_count = 0
+        self.row_count = 0
+
+    def append(self, df: pd.DataFrame) -> None:
+        """写入一个数据块"""
+        with open(self.directory / f"{self.chunk_count:08d}.pkl", "wb") as f:
+            pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.chunk_count += 1
+        self.row_count += len(df)
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        for index in range(self.chunk_count):
+            with open(self.directory / f"{index:08d}.pkl", "rb") as f:
+                yield pickle.load(f)
+
+    def cleanup(self) -> None:
+        """删除溢写文件"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StreamingCsvPipeline:
+    """CSV流式处理管道"""
+
+    def __init__(
+        self,
+        file_path: str,
+        output_path: str,
+        operations: List[Dict[str, Any]],
+        chunk_size: int = 100000,
+        encoding: str = "utf-8",
+        spill_dir: Optional[Path] = None,
+        sort_run_bytes: int = 128 * 1024 * 1024,
+        aggregate_state_rows: int = 1000000,
+        join_sources: Optional[Dict[str, Dict[str, Any]]] = None,
+        join_build_bytes: int = 256 * 1024 * 1024,
+        shadow_path: Optional[Path] = None,
+        dtypes: Optional[Dict[str, str]] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[[float], None]] = None
+    ):
+        self.file_path = file_path
+        self.output_path = output_path
+        self.operations = operations
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.sort_run_bytes = sort_run_bytes
+        self.aggregate_state_rows = aggregate_state_rows
+        # 连接操作引用的数据源：str(source_id) -> {"file_path": 文件路径, "encoding": 编码, "estimated_bytes": 估计内存}
+        self.join_sources = join_sources or {}
+        self.join_build_bytes = join_build_bytes
+        # 源文件的Parquet影子副本，存在时按批读取副本而不解析CSV
+        self.shadow_path = Path(shadow_path) if shadow_path else None
+        # 整个文件的列类型（如之前整体读取时推断的），为空时读取前先扫描一遍推断，保证各块类型一致
+        self.dtypes = dtypes
+        self.should_cancel = should_cancel or (lambda: False)
+        self.on_progress = on_progress or (lambda fraction: None)
+
+        self.work_dir: Optional[Path] = None
+        self.original_rows = 0
+        self.original_columns: List[str] = []
+        self.operation_results: List[Dict[str, Any]] = []
+
+    def run(self) -> Dict[str, Any]:
+        """
+        执行管道
+        :return: 处理结果
+        """
+        if self.spill_dir is not None:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+        self.work_dir = Path(tempfile.mkdtemp(prefix="csv_pipeline_", dir=self.spill_dir))
+        try:
+            stream = self._read_source()
+            for index, operation in enumerate(self.operations):
+                result = {"operation": operation, "applied": False, "message": "", "rows_in": 0, "rows_out": 0}
+                self.operation_results.append(result)
+                stream = self._apply(stream, operation, result, index)
+            return self._write_output(stream)
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _read_source(self) -> Iterator[pd.DataFrame]:
+        """按块读取源文件"""
+        if self.shadow_path is not None:
+            yield from self._read_shadow()
+            return
+
+        if self.dtypes is None:
+            self.dtypes = self._infer_dtypes()
+
+        with open(self.file_path, "rb") as f:
+            total = max(Path(self.file_path).stat().st_size, 1)
+            for chunk in pd.read_csv(f, encoding=self.encoding, dtype=self.dtypes, chunksize=self.chunk_size):
+                if self.should_cancel():
+                    raise PipelineCancelled()
+                if not self.original_columns:
+                    self.original_columns = chunk.columns.tolist()
+                self.original_rows += len(chunk)
+                self.on_progress(min(f.tell() / total, 1.0))
+                yield chunk
+
+    def _infer_dtypes(self) -> Dict[str, str]:
+        """
+        按块推断整个文件的列类型，与一次读取整个文件的结果一致：
+        各块类型不同时整数与浮点合并为浮点，其他合并为object；第一块已是object的列不需要再扫描
+        :return: 列名 -> 类型
+        """
+        first = pd.read_csv(self.file_path, encoding=self.encoding, nrows=self.chunk_size)
+        dtypes = {column: str(dtype) for column, dtype in first.dtypes.items()}
+        positions = [i for i, dtype in enumerate(dtypes.values()) if dtype != "object"]
+        if not positions or len(first) < self.chunk_size:
+            return dtypes
+
+        reader = pd.read_csv(self.file_path, encoding=self.encoding, usecols=positions, chunksize=self.chunk_size)
+        for chunk in reader:
+            if self.should_cancel():
+                raise PipelineCancelled()
+            for column, dtype in chunk.dtypes.items():
+                dtypes[column] = _merge_dtype(dtypes[column], str(dtype))
+        return dtypes
+
+    def _read_shadow(self) -> Iterator[pd.DataFrame]:
+        """按批读取Parquet影子副本，列类型在各块之间保持一致"""
+        parquet_file = pq.ParquetFile(self.shadow_path)
+        total = max(parquet_file.metadata.num_rows, 1)
+        self.original_columns = parquet_file.schema_arrow.names
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_size):
+            if self.should_cancel():
+                raise PipelineCancelled()
+            chunk = batch.to_pandas()
+            self.original_rows += len(chunk)
+            self.on_progress(min(self.original_rows / total, 1.0))
+            yield chunk
+
+    def _apply(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """为数据流加上一个操作"""
+        if is_row_operation(operation):
+            return self._apply_row_operation(stream, operation, result)
+
+        operation_type = operation.get("type")
+        if operation_type == "fill_nulls":
+            return self._fill_nulls_with_statistic(stream, operation, result, index)
+        if operation_type == "drop_duplicates":
+            return self._drop_duplicates(stream, operation, result, index)
+        if operation_type == "sort":
+            return self._sort(stream, operation, result, index)
+        if operation_type in ("group_by", "aggregate"):
+            return self._aggregate(stream, operation, result, index)
+        if operation_type == "join":
+            return self._join(stream, operation, result, index)
+
+        result["message"] = f"流式模式不支持的操作类型: {operation_type}"
+        return stream
+
+    def _apply_row_operation(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any]) -> Iterator[pd.DataFrame]:
+        """逐块应用行级操作，参数无效时整个操作跳过"""
+        skipped = False
+        for chunk in stream:
+            result["rows_in"] += len(chunk)
+            if not skipped:
+                try:
+                    chunk, _ = apply_row_operation(chunk, operation)
+                    result["applied"] = True
+                except OperationSkipped as e:
+                    # 各数据块的列相同，第一块无效时后续块也无效
+                    skipped = True
+                    result["message"] = str(e)
+            result["rows_out"] += len(chunk)
+            yield chunk
+
+        if result["applied"]:
+            result["message"] = self._summarize(operation, result)
+
+    def _summarize(self, operation: Dict[str, Any], result: Dict[str, Any]) -> str:
+        """生成流式操作的结果说明"""
+        operation_type = operation.get("type")
+        if operation_type == "filter_rows":
+            return f"已过滤 {result['rows_in'] - result['rows_out']} 行数据"
+        if operation_type == "select_columns":
+            return f"已选择 {len(operation.get('columns', []))} 列"
+        if operation_type == "rename_columns":
+            return f"已重命名 {len(operation.get('rename_map', {}))} 列"
+        if operation_type == "fill_nulls":
+            return f"已用常量填充列 {operation.get('column')} 的空值"
+        if operation_type == "create_column":
+            return f"已创建新列 {operation.get('new_column')}"
+        if operation_type == "convert_type":
+            return f"已将列 {operation.get('column')} 转换为 {operation.get('target_type')} 类型"
+        return ""
+
+    def _spool(self, stream: Iterator[pd.DataFrame], name: str, on_chunk: Optional[Callable[[pd.DataFrame], None]] = None) -> ChunkSpool:
+        """把上游数据全部溢写到磁盘"""
+        spool = ChunkSpool(self.work_dir / name)
+        for chunk in stream:
+            if self.should_cancel():
+                raise PipelineCancelled()
+            if on_chunk is not None:
+                on_chunk(chunk)
+            spool.append(chunk)
+        return spool
+
+    def _replay(self, spool: ChunkSpool) -> Iterator[pd.DataFrame]:
+        """回放溢写的数据，回放完成后删除"""
+        try:
+            for chunk in spool:
+                if self.should_cancel():
+                    raise PipelineCancelled()
+                yield chunk
+        finally:
+            spool.cleanup()
+
+    def _fill_nulls_with_statistic(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """按统计量填充空值：第一遍溢写并累计统计量，第二遍回放时填充"""
+        column = operation.get("column")
+        method = operation.get("method")
+        if method not in ("mean", "median", "mode"):
+            result["message"] = f"不支持的方法: {method}"
+            return stream
+
+        state = {"sum": 0.0, "count": 0, "nulls": 0, "numeric": True, "missing": False}
+        sketch = QuantileSketch()
+        counter: Counter = Counter()
+
+        def accumulate(chunk: pd.DataFrame) -> None:
+            result["rows_in"] += len(chunk)
+            if column not in chunk.columns:
+                state["missing"] = True
+                return
+            series = chunk[column]
+            state["nulls"] += int(series.isnull().sum())
+            if method == "mode":
+                counter.update(series.dropna().value_counts().to_dict())
+            elif not pd.api.types.is_numeric_dtype(series) and series.notnull().any():
+                state["numeric"] = False
+            elif method == "mean":
+                state["sum"] += float(series.sum())
+                state["count"] += int(series.count())
+            else:
+                sketch.add(series)
+
+        spool = self._spool(stream, f"fill_{index}", accumulate)
+
+        if state["missing"]:
+            result["message"] = f"列 {column} 不存在"
+            return self._replay(spool)
+        if method in ("mean", "median") and not state["numeric"]:
+            result["message"] = f"不支持的方法: {method}"
+            return self._replay(spool)
+
+        if method == "mean":
+            fill_value = state["sum"] / state["count"] if state["count"] else None
+        elif method == "median":
+            fill_value = sketch.quantile(0.5)
+        else:
+            fill_value = counter.most_common(1)[0][0] if counter else None
+
+        result["applied"] = True
+        result["fill_value"] = fill_value
+        result["message"] = f"已填充 {state['nulls']} 个空值"
+        if method == "median" and not sketch.exact:
+            result["message"] += "（中位数为抽样近似值）"
+
+        def fill() -> Iterator[pd.DataFrame]:
+            for chunk in self._replay(spool):
+                if fill_value is not None:
+                    chunk[column] = chunk[column].fillna(fill_value)
+                result["rows_out"] += len(chunk)
+                yield chunk
+
+        return fill()
+
+    def _drop_duplicates(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """
+        去重：第一遍溢写数据，并把每行的128位指纹按哈希分区写入Parquet；
+        逐个分区找出重复行的行号，第二遍回放时过滤，保留首次出现的行并保持原有顺序
+        """
+        subset = operation.get("subset", None)
+        partition_dir = self.work_dir / f"dedup_{index}"
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        schema = pa.schema([("row_id", pa.int64()), ("h1", pa.uint64()), ("h2", pa.uint64())])
+        writers: Dict[int, pq.ParquetWriter] = {}
+        state = {"next_row_id": 0, "missing": None}
+
+        def partition(chunk: pd.DataFrame) -> None:
+            result["rows_in"] += len(chunk)
+            if subset:
+                missing = [col for col in subset if col not in chunk.columns]
+                if missing:
+                    state["missing"] = missing
+                    return
+            # 统一类型，同一行在不同数据块中推断出整数或浮点数时指纹相同
+            keys = normalize_keys(chunk[subset] if subset else chunk)
+            h1 = pd.util.hash_pandas_object(keys, index=False, hash_key=_HASH_KEYS[0]).to_numpy()
+            h2 = pd.util.hash_pandas_object(keys, index=False, hash_key=_HASH_KEYS[1]).to_numpy()
+            row_ids = np.arange(state["next_row_id"], state["next_row_id"] + len(chunk), dtype=np.int64)
+            state["next_row_id"] += len(chunk)
+
+            buckets = (h1 % DEDUP_PARTITIONS).astype(np.int64)
+            for bucket in np.unique(buckets):
+                mask = buckets == bucket
+                if bucket not in writers:
+                    writers[bucket] = pq.ParquetWriter(partition_dir / f"{bucket}.parquet", schema)
+                writers[bucket].write_table(pa.table(
+                    {"row_id": row_ids[mask], "h1": h1[mask], "h2": h2[mask]}, schema=schema
+                ))
+
+        try:
+            spool = self._spool(stream, f"dedup_rows_{index}", partition)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        if state["missing"]:
+            shutil.rmtree(partition_dir, ignore_errors=True)
+            result["message"] = f"列不存在: {', '.join(state['missing'])}"
+            return self._replay(spool)
+
+        # 逐个分区找出重复行，分区内按行号排序保证保留首次出现的行
+        duplicate_ids = []
+        for bucket in writers:
+            if self.should_cancel():
+                raise PipelineCancelled()
+            fingerprints = pq.read_table(partition_dir / f"{bucket}.parquet").to_pandas()
+            fingerprints = fingerprints.sort_values("row_id", kind="stable")
+            duplicated = fingerprints.duplicated(subset=["h1", "h2"], keep="first")
+            duplicate_ids.append(fingerprints.loc[duplicated, "row_id"].to_numpy())
+        shutil.rmtree(partition_dir, ignore_errors=True)
+
+        # 重复行号排序后写入磁盘，回放时按内存映射读取每块行号范围内的部分
+        dropped_path = self.work_dir / f"dedup_dropped_{index}.npy"
+        np.save(dropped_path, np.sort(np.concatenate(duplicate_ids)) if duplicate_ids else np.empty(0, dtype=np.int64))
+        del duplicate_ids
+        dropped = np.load(dropped_path, mmap_mode="r")
+        result["applied"] = True
+        result["message"] = f"已删除 {len(dropped)} 条重复记录"
+
+        def filter_duplicates() -> Iterator[pd.DataFrame]:
+            offset = 0
+            position = 0
+            for chunk in self._replay(spool):
+                end = offset + len(chunk)
+                stop = position + int(np.searchsorted(dropped[position:], end))
+                if stop > position:
+                    keep = np.ones(len(chunk), dtype=bool)
+                    keep[np.asarray(dropped[position:stop]) - offset] = False
+                    chunk = chunk[keep]
+                    position = stop
+                offset = end
+                result["rows_out"] += len(chunk)
+                yield chunk
+
+        return filter_duplicates()
+
+    def _sort(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """外部归并排序：按内存预算生成有序段后多路归并"""
+        try:
+            columns, ascending = get_sort_keys(operation)
+        except OperationSkipped as e:
+            result["message"] = str(e)
+            return stream
+
+        first = next(stream, None)
+        if first is None:
+            return iter([])
+
+        def restore() -> Iterator[pd.DataFrame]:
+            yield first
+            yield from stream
+
+        missing = [column for column in columns if column not in first.columns]
+        if missing:
+            result["message"] = f"列 {', '.join(str(column) for column in missing)} 不存在"
+            return restore()
+
+        def counted() -> Iterator[pd.DataFrame]:
+            for chunk in restore():
+                if self.should_cancel():
+                    raise PipelineCancelled()
+                result["rows_in"] += len(chunk)
+                yield chunk
+
+        def sorted_chunks() -> Iterator[pd.DataFrame]:
+            for chunk in external_sort(
+                counted(), columns, ascending,
+                run_dir=self.work_dir / f"sort_{index}",
+                run_bytes=self.sort_run_bytes
+            ):
+                result["rows_out"] += len(chunk)
+                yield chunk
+
+        result["applied"] = True
+        result["message"] = describe_sort(columns, ascending)
+        return sorted_chunks()
+
+    def _aggregate(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """流式哈希分组聚合：逐块合并部分聚合状态，分组过多时按哈希分区溢写"""
+        try:
+            keys, aggregations = parse_aggregations(operation)
+        except ValueError as e:
+            result["message"] = str(e)
+            return stream
+
+        first = next(stream, None)
+        if first is None:
+            return iter([])
+
+        def restore() -> Iterator[pd.DataFrame]:
+            yield first
+            yield from stream
+
+        aggregator = HashAggregator(
+            keys, aggregations,
+            spill_dir=self.work_dir / f"aggregate_{index}",
+            max_state_rows=self.aggregate_state_rows
+        )
+        try:
+            aggregator.validate(first.columns.tolist())
+        except ValueError as e:
+            result["message"] = str(e)
+            return restore()
+
+        def aggregated() -> Iterator[pd.DataFrame]:
+            for chunk in restore():
+                if self.should_cancel():
+                    aggregator.cleanup()
+                    raise PipelineCancelled()
+                result["rows_in"] += len(chunk)
+                aggregator.add(chunk)
+
+            for chunk in aggregator.results():
+                result["rows_out"] += len(chunk)
+                yield chunk
+            result["message"] = describe_aggregation(keys, aggregations, result["rows_out"], aggregator.spilled)
+
+        result["applied"] = True
+        return aggregated()
+
+    def _join(self, stream: Iterator[pd.DataFrame], operation: Dict[str, Any], result: Dict[str, Any], index: int) -> Iterator[pd.DataFrame]:
+        """与另一个文件数据源连接：右侧能放入内存时哈希连接，否则外部排序后归并连接"""
+        try:
+            spec = parse_join(operation)
+        except ValueError as e:
+            result["message"] = str(e)
+            return stream
+
+        source = self.join_sources.get(str(spec["source_id"]))
+        if source is None:
+            result["message"] = f"连接的数据源不存在或不可用: {spec['source_id']}"
+            return stream
+
+        first = next(stream, None)
+        if first is None:
+            return iter([])
+
+        def restore() -> Iterator[pd.DataFrame]:
+            yield first
+            yield from stream
+
+        joiner = FileJoin(
+            spec, source["file_path"],
+            work_dir=self.work_dir / f"join_{index}",
+            right_encoding=source.get("encoding", "utf-8"),
+            right_bytes=source.get("estimated_bytes"),
+            chunk_size=self.chunk_size,
+            build_bytes=self.join_build_bytes,
+            sort_run_bytes=self.sort_run_bytes,
+            should_cancel=self.should_cancel
+        )
+        try:
+            joiner.validate(first.columns.tolist())
+        except ValueError as e:
+            result["message"] = str(e)
+            return restore()
+
+        def joined() -> Iterator[pd.DataFrame]:
+            for chunk in joiner.join(restore()):
+                if self.should_cancel():
+                    raise PipelineCancelled()
+                yield chunk
+            if self.should_cancel():
+                raise PipelineCancelled()
+
+            stats = joiner.summary()
+            result["rows_in"] = stats["left_rows"]
+            result["rows_out"] = stats["output_rows"]
+            result["join_stats"] = stats
+            result["message"] = describe_join(spec, stats)
+
+        result["applied"] = True
+        return joined()
+
+    def _write_output(self, stream: Iterator[pd.DataFrame]) -> Dict[str, Any]:
+        """逐块追加写入临时文件，完成后替换为输出文件（源文件在此过程中仍在被读取，输出路径可以与源文件相同）"""
+        processed_rows = 0
+        processed_columns: List[str] = []
+        sample_rows: List[Dict[str, Any]] = []
+        header = True
+
+        temp_path = f"{self.output_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8", newline="") as f:
+                for chunk in stream:
+                    if self.should_cancel():
+                        raise PipelineCancelled()
+                    if header:
+                        processed_columns = chunk.columns.tolist()
+                    chunk.to_csv(f, index=False, header=header)
+                    header = False
+                    processed_rows += len(chunk)
+                    if len(sample_rows) < 10:
+                        sample_rows.extend(chunk.head(10 - len(sample_rows)).to_dict(orient="records"))
+
+                if header:
+                    # 没有任何数据时至少写入表头
+                    f.write(",".join(self.original_columns) + "\n")
+                    processed_columns = self.original_columns
+            os.replace(temp_path, self.output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return {
+            "original_rows": self.original_rows,
+            "original_columns": self.original_columns,
+            "processed_rows": processed_rows,
+            "processed_columns": processed_columns,
+            "operation_results": self.operation_results,
+            "sample_data": sample_rows
+        }
@@ -3,26 +3,71 @@
 实现数据库数据的清洗和处理
 """
 import asyncio
+import importlib.util
 import logging
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 import pandas as pd
 import numpy as np
 import sqlalchemy
-from sqlalchemy import create_engine, text, inspect
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.exc import SQLAlchemyError
-from typing import Dict, Any, List, Optional, Tuple, Union
+from typing import Dict, Any, List, Optional, Tuple, Union, AsyncIterator, Iterator, Awaitable, TYPE_CHECKING
 from sqlalchemy.orm import Session
 
+from core.config import settings
 from models.domain.dataset import ProcessingTask, DatabaseSource
+from models.domain.user import User
 from core.processing.base import BaseDataProcessor
+from core.processing.schema_cache import schema_cache
+from core.processing.query_cache import query_cache
+from core.processing.correlation import blockwise_correlation_pairs, new_matrix_path, write_matrix_columns
+from core.processing.memory_planner import memory_planner, IN_MEMORY, SQL_PUSHDOWN, SAMPLED
+from core.processing.dtype_optimizer import optimize_dtypes
+from core.processing import query_guard
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 支持异步执行的数据库类型及其异步驱动
+ASYNC_DRIVERS = {
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+    "mysql": ("mysql+aiomysql", "aiomysql"),
+    "mariadb": ("mariadb+aiomysql", "aiomysql")
+}
+
+# 查询执行期间检查取消请求的间隔（秒）
+CANCEL_POLL_SECONDS = 0.5
+# 数据库端超时未生效时，客户端额外等待的时间（秒）
+STATEMENT_TIMEOUT_GRACE_SECONDS = 5
+
+# 当前协程正在执行的任务ID，查询执行时据此读取取消标记和超时设置
+_current_task_id: ContextVar[Optional[int]] = ContextVar("current_task_id", default=None)
+
+
+def _is_async_engine(engine: Any) -> bool:
+    """是否为异步引擎（按属性判断，不需要导入sqlalchemy的异步扩展）"""
+    return hasattr(engine, "sync_engine")
+
+
+class QueryAbortedError(Exception):
+    """查询因任务取消或超时被终止"""
+
 
 class DatabaseProcessor(BaseDataProcessor):
     """数据库处理器"""
 
+    def __init__(self):
+        super().__init__()
+        self.async_engines: Dict[str, "AsyncEngine"] = {}  # 按连接字符串复用的异步引擎
+        self.source_semaphores: Dict[int, asyncio.Semaphore] = {}  # 每个数据源的并发连接限制
+
     def get_supported_task_types(self) -> List[str]:
         """获取支持的任务类型"""
         return [
@@ -39,41 +84,278 @@ class DatabaseProcessor(BaseDataProcessor):
         :return: 数据库连接引擎和错误信息（如果有）
         """
         try:
+            # Postgres/MySQL优先使用异步驱动，避免阻塞事件循环
+            async_engine = self._get_async_engine(data_source.connection_string)
+            if async_engine is not None:
+                async with async_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                return async_engine, None
+
             # 创建数据库连接
             engine = create_engine(data_source.connection_string)
             # 测试连接
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
+            await asyncio.to_thread(self._test_connection, engine)
             return engine, None
         except SQLAlchemyError as e:
             error_msg = f"数据库连接失败: {str(e)}"
             logger.error(error_msg)
             return None, error_msg
 
-    async def _get_table_names(self, engine: Any) -> List[str]:
+    def _test_connection(self, engine: Any) -> None:
         """
-        获取数据库中的所有表名
+        测试同步引擎的连接
         :param engine: 数据库连接引擎
+        """
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    def _get_async_engine(self, connection_string: str) -> Optional["AsyncEngine"]:
+        """
+        获取异步引擎，数据库类型不支持或未安装异步驱动时返回None
+        :param connection_string: 数据库连接字符串
+        :return: 异步引擎
+        """
+        if not settings.ASYNC_DB_ENABLED or not connection_string:
+            return None
+
+        if connection_string in self.async_engines:
+            return self.async_engines[connection_string]
+
+        url = make_url(connection_string)
+        driver = ASYNC_DRIVERS.get(url.get_backend_name())
+        if driver is None:
+            return None
+
+        drivername, module_name = driver
+        if importlib.util.find_spec(module_name) is None:
+            logger.warning(f"未安装异步驱动 {module_name}，回退到同步执行")
+            return None
+        try:
+            # sqlalchemy的异步扩展依赖greenlet
+            if importlib.util.find_spec("greenlet") is None:
+                raise ImportError("greenlet")
+            from sqlalchemy.ext.asyncio import create_async_engine
+        except ImportError:
+            logger.warning("未安装greenlet（sqlalchemy[asyncio]），回退到同步执行")
+            return None
+
+        engine = create_async_engine(url.set(drivername=drivername), pool_pre_ping=True)
+        self.async_engines[connection_string] = engine
+        return engine
+
+    async def _get_table_names(self, data_source: DatabaseSource) -> List[str]:
+        """
+        获取数据库中的所有表名（优先使用元数据缓存）
+        :param data_source: 数据库数据源
         :return: 表名列表
         """
-        inspector = inspect(engine)
-        return inspector.get_table_names()
+        schema = await schema_cache.aget_or_load(data_source.id, data_source.connection_string)
+        return list(schema["tables"].keys())
 
     async def _execute_query(self, engine: Any, query: str) -> Tuple[pd.DataFrame, str]:
         """
-        执行SQL查询
+        执行SQL查询，任务取消或超时时在数据库端终止语句
         :param engine: 数据库连接引擎
         :param query: SQL查询语句
         :return: 查询结果DataFrame和错误信息（如果有）
         """
+        backend: Dict[str, Any] = {}
+
+        async def run_async() -> pd.DataFrame:
+            # 异步驱动：按批次流式读取，等待网络时不阻塞其他任务
+            columns = []
+            batches = []
+            async for batch in self._stream_query(engine, query, backend=backend):
+                columns = batch.columns.tolist()
+                batches.append(batch)
+            non_empty = [batch for batch in batches if not batch.empty]
+            if non_empty:
+                return pd.concat(non_empty, ignore_index=True)
+            return pd.DataFrame(columns=columns)
+
+        def run_sync() -> pd.DataFrame:
+            # 同步驱动：在线程池中执行查询
+            with self._guarded_connection(engine, backend) as conn:
+                return pd.read_sql(text(query), conn)
+
         try:
-            # 执行查询并返回结果
-            df = pd.read_sql(query, engine)
+            if _is_async_engine(engine):
+                df = await self._run_cancellable(engine, run_async(), backend)
+            else:
+                df = await self._run_cancellable(engine, asyncio.to_thread(run_sync), backend)
             return df, None
         except SQLAlchemyError as e:
             error_msg = f"查询执行失败: {str(e)}"
             logger.error(error_msg)
             return pd.DataFrame(), error_msg
+        except QueryAbortedError as e:
+            error_msg = f"查询已终止: {str(e)}"
+            logger.warning(error_msg)
+            return pd.DataFrame(), error_msg
+
+    def _get_statement_timeout(self) -> int:
+        """
+        获取当前任务的语句超时时间（秒），任务参数statement_timeout优先，0表示不限制
+        :return: 超时时间
+        """
+        task_info = self.running_tasks.get(_current_task_id.get())
+        parameters = (task_info["task"].parameters or {}) if task_info else {}
+        timeout = parameters.get("statement_timeout")
+        if timeout is None:
+            timeout = settings.DATABASE_STATEMENT_TIMEOUT_SECONDS
+        return max(int(timeout), 0)
+
+    def _is_cancel_requested(self) -> bool:
+        """检查当前任务是否请求取消"""
+        task_info = self.running_tasks.get(_current_task_id.get())
+        return bool(task_info and task_info["cancel_requested"])
+
+    def _session_statements(self, engine: Any, timeout: int) -> Tuple[Optional[str], List[str]]:
+        """
+        获取查询连接的会话语句
+        :param engine: 数据库连接引擎
+        :param timeout: 语句超时时间（秒），0表示不限制
+        :return: (查询当前连接ID的语句, 设置超时的语句列表)
+        """
+        dialect = engine.dialect
+        if dialect.name == "postgresql":
+            # SET LOCAL只在当前事务内生效，连接归还连接池后不影响其他查询
+            return "SELECT pg_backend_pid()", [f"SET LOCAL statement_timeout = {timeout * 1000}"]
+        if dialect.name == "mariadb" or getattr(dialect, "is_mariadb", False):
+            return "SELECT CONNECTION_ID()", [f"SET SESSION max_statement_time = {timeout}"]
+        if dialect.name == "mysql":
+            return "SELECT CONNECTION_ID()", [f"SET SESSION MAX_EXECUTION_TIME = {timeout * 1000}"]
+        return None, []
+
+    @contextmanager
+    def _guarded_connection(self, engine: Any, backend: Dict[str, Any]) -> Iterator[Any]:
+        """
+        打开设置了语句超时的同步连接，并记录连接ID以便取消
+        :param engine: 同步数据库引擎
+        :param backend: 用于记录连接ID的字典
+        """
+        pid_query, statements = self._session_statements(engine, self._get_statement_timeout())
+        with engine.connect() as conn:
+            with conn.begin():
+                if pid_query:
+                    backend["pid"] = conn.execute(text(pid_query)).scalar()
+                elif engine.dialect.name == "sqlite":
+                    # SQLite没有连接ID，取消时直接中断该连接
+                    backend["sqlite_connection"] = conn.connection
+                for statement in statements:
+                    conn.execute(text(statement))
+                yield conn
+
+    @asynccontextmanager
+    async def _guarded_async_connection(self, engine: "AsyncEngine", backend: Dict[str, Any]) -> AsyncIterator[Any]:
+        """
+        打开设置了语句超时的异步连接，并记录连接ID以便取消
+        :param engine: 异步数据库引擎
+        :param backend: 用于记录连接ID的字典
+        """
+        pid_query, statements = self._session_statements(engine, self._get_statement_timeout())
+        async with engine.connect() as conn:
+            async with conn.begin():
+                if pid_query:
+                    backend["pid"] = await conn.scalar(text(pid_query))
+                for statement in statements:
+                    await conn.execute(text(statement))
+                yield conn
+
+    async def _run_cancellable(self, engine: Any, work: Awaitable[Any], backend: Dict[str, Any]) -> Any:
+        """
+        执行查询并监视任务状态，任务取消或超时时终止数据库端的语句
+        :param engine: 数据库连接引擎
+        :param work: 执行查询的协程
+        :param backend: 查询连接的ID（由查询连接写入）
+        :return: 查询结果
+        """
+        runner = asyncio.ensure_future(work)
+        loop = asyncio.get_running_loop()
+        timeout = self._get_statement_timeout()
+        # 数据库端超时优先生效，客户端超时作为兜底
+        deadline = loop.time() + timeout + STATEMENT_TIMEOUT_GRACE_SECONDS if timeout else None
+
+        while True:
+            done, _ = await asyncio.wait({runner}, timeout=CANCEL_POLL_SECONDS)
+            if done:
+                return runner.result()
+
+            if self._is_cancel_requested():
+                reason = "任务已取消"
+            elif deadline is not None and loop.time() >= deadline:
+                reason = f"查询超过 {timeout} 秒未完成"
+            else:
+                continue
+
+            await self._cancel_backend(engine, backend)
+            runner.cancel()
+            # 线程中的同步查询无法直接取消，结束后丢弃其结果
+            runner.add_done_callback(lambda future: future.cancelled() or future.exception())
+            raise QueryAbortedError(reason)
+
+    async def _cancel_backend(self, engine: Any, backend: Dict[str, Any]) -> None:
+        """
+        通过新连接终止正在执行的语句（PostgreSQL: pg_cancel_backend，MySQL: KILL QUERY，SQLite: interrupt）
+        :param engine: 数据库连接引擎
+        :param backend: 查询连接的ID
+        """
+        if "sqlite_connection" in backend:
+            backend["sqlite_connection"].interrupt()
+            return
+
+        pid = backend.get("pid")
+        if pid is None:
+            return
+
+        dialect = engine.dialect.name
+        if dialect == "postgresql":
+            statement = f"SELECT pg_cancel_backend({int(pid)})"
+        elif dialect in ("mysql", "mariadb"):
+            statement = f"KILL QUERY {int(pid)}"
+        else:
+            return
+
+        try:
+            if _is_async_engine(engine):
+                async with engine.connect() as conn:
+                    await conn.execute(text(statement))
+            else:
+                def cancel():
+                    with engine.connect() as conn:
+                        conn.execute(text(statement))
+
+                await asyncio.to_thread(cancel)
+            logger.info(f"已在数据库端终止连接 {pid} 上的语句")
+        except SQLAlchemyError as e:
+            logger.error(f"终止数据库语句失败: {str(e)}")
+
+    async def _stream_query(
+        self,
+        engine: "AsyncEngine",
+        query: str,
+        batch_size: Optional[int] = None,
+        backend: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[pd.DataFrame]:
+        """
+        使用服务端游标流式执行查询，逐批返回DataFrame
+        :param engine: 异步数据库引擎
+        :param query: SQL查询语句
+        :param batch_size: 每批行数
+        :param backend: 用于记录连接ID的字典
+        :return: DataFrame批次的异步迭代器
+        """
+        batch_size = batch_size or settings.DATABASE_QUERY_BATCH_SIZE
+        async with self._guarded_async_connection(engine, backend if backend is not None else {}) as conn:
+            result = await conn.stream(text(query))
+            columns = list(result.keys())
+            has_rows = False
+            async for rows in result.partitions(batch_size):
+                has_rows = True
+                yield pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+            if not has_rows:
+                # 没有数据时也返回列信息
+                yield pd.DataFrame(columns=columns)
 
     def validate_parameters(self, parameters: Dict[str, Any]) -> bool:
         """验证任务参数"""
@@ -108,6 +390,9 @@ class DatabaseProcessor(BaseDataProcessor):
         if not data_source:
             raise ValueError(f"数据源不存在: {task.data_source_id}")
 
+        # 记录当前任务，查询执行时据此检查取消请求和超时设置
+        _current_task_id.set(task.id)
+
         # 根据任务类型执行不同的处理逻辑
         if task.task_type == "database_clean":
             return await self._clean_database(task, data_source, db)
@@ -149,12 +434,11 @@ class DatabaseProcessor(BaseDataProcessor):
         # 更新进度
         self.update_progress(task.id, 20, db)
 
-        # 读取表数据
+        # 读取表数据（清洗结果需要完整数据，只有显式指定时才抽样）
         try:
-            query = f"SELECT * FROM {table_name}"
-            df, error = await self._execute_query(engine, query)
+            df, plan, error = await self._load_table(engine, data_source, table_name, parameters, [IN_MEMORY])
             if error:
-                return {"success": False, "error": error}
+                return {"success": False, "error": error, "execution_plan": plan}
 
             # 记录原始数据统计信息
             original_shape = df.shape
@@ -294,6 +578,7 @@ class DatabaseProcessor(BaseDataProcessor):
                 "removed_rows": original_shape[0] - cleaned_shape[0],
                 "filled_nulls": int(original_null_count - cleaned_null_count),
                 "cleaning_results": cleaning_results,
+                "execution_plan": plan,
                 "sample_data": df.head(10).to_dict(orient="records")
             }
 
@@ -311,9 +596,12 @@ class DatabaseProcessor(BaseDataProcessor):
         :return: 分析结果
         """
         parameters = task.parameters or {}
-        analysis_type = parameters.get("analysis_type")
         table_name = parameters.get("table_name")
 
+        # 整库分析模式
+        if parameters.get("scope") == "database":
+            return await self._analyze_all_tables(task, data_source, db)
+
         if not table_name:
             return {"success": False, "error": "未指定表名"}
 
@@ -328,50 +616,243 @@ class DatabaseProcessor(BaseDataProcessor):
         # 更新进度
         self.update_progress(task.id, 20, db)
 
-        # 读取表数据
         try:
-            query = f"SELECT * FROM {table_name}"
-            df, error = await self._execute_query(engine, query)
-            if error:
-                return {"success": False, "error": error}
-
-            # 更新进度
-            self.update_progress(task.id, 40, db)
-
-            # 根据分析类型执行不同的分析
-            if analysis_type == "descriptive":
-                # 描述性统计分析
-                result = await self._descriptive_analysis(df)
-            elif analysis_type == "correlation":
-                # 相关性分析
-                result = await self._correlation_analysis(df)
-            elif analysis_type == "distribution":
-                # 分布分析
-                column = parameters.get("column")
-                if not column or column not in df.columns:
-                    return {"success": False, "error": f"未指定有效的列名: {column}"}
-                result = await self._distribution_analysis(df, column)
-            else:
-                return {"success": False, "error": f"不支持的分析类型: {analysis_type}"}
+            result = await self._analyze_table(engine, data_source, table_name, parameters)
 
             # 更新进度
             self.update_progress(task.id, 100, db)
 
-            # 返回处理结果
-            return {
-                "success": True,
-                "analysis_type": analysis_type,
-                "table_name": table_name,
-                "row_count": len(df),
-                "column_count": len(df.columns),
-                "result": result
-            }
+            return result
 
         except Exception as e:
             error_msg = f"分析数据时出错: {str(e)}"
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
+    async def _analyze_table(self, engine: Any, data_source: DatabaseSource, table_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        分析单张表
+        :param engine: 数据库连接引擎
+        :param data_source: 数据库数据源
+        :param table_name: 表名
+        :param parameters: 任务参数
+        :return: 分析结果
+        """
+        analysis_type = parameters.get("analysis_type")
+
+        # 分布分析优先下推到SQL，只传输分箱结果
+        if analysis_type == "distribution":
+            return await self._analyze_distribution(engine, data_source, table_name, parameters)
+
+        # 读取表数据，超出内存预算时抽样分析
+        df, plan, error = await self._load_table(engine, data_source, table_name, parameters, [IN_MEMORY, SAMPLED])
+        if error:
+            return {"success": False, "table_name": table_name, "error": error, "execution_plan": plan}
+
+        # 压缩数据类型，降低分析时的内存占用
+        dtype_report = None
+        if parameters.get("optimize_dtypes", True):
+            df, dtype_report = await asyncio.to_thread(optimize_dtypes, df)
+
+        # 根据分析类型执行不同的分析
+        if analysis_type == "descriptive":
+            # 描述性统计分析
+            result = await self._descriptive_analysis(df)
+        elif analysis_type == "correlation":
+            # 相关性分析
+            result = await self._correlation_analysis(df, parameters)
+        else:
+            return {"success": False, "error": f"不支持的分析类型: {analysis_type}"}
+
+        # 返回处理结果
+        return {
+            "success": True,
+            "analysis_type": analysis_type,
+            "table_name": table_name,
+            "row_count": len(df),
+            "column_count": len(df.columns),
+            "execution_plan": plan,
+            "dtype_optimization": dtype_report,
+            "result": result
+        }
+
+    async def _load_table(
+        self,
+        engine: Any,
+        data_source: DatabaseSource,
+        table_name: str,
+        parameters: Dict[str, Any],
+        supported_modes: List[str]
+    ) -> Tuple[Optional[pd.DataFrame], Dict[str, Any], str]:
+        """
+        按内存预算读取整张表
+        :param engine: 数据库连接引擎
+        :param data_source: 数据库数据源
+        :param table_name: 表名
+        :param parameters: 任务参数
+        :param supported_modes: 自动选择时可用的执行模式，显式指定sampled时总是允许抽样
+        :return: (数据框, 执行计划, 错误信息)
+        """
+        table_schema = None
+        try:
+            schema = await schema_cache.aget_or_load(data_source.id, data_source.connection_string)
+            table_schema = schema["tables"].get(table_name)
+        except SQLAlchemyError as e:
+            logger.warning(f"读取元数据失败，无法估计表大小: {str(e)}")
+
+        if parameters.get("execution_mode") == SAMPLED and SAMPLED not in supported_modes:
+            supported_modes = supported_modes + [SAMPLED]
+
+        estimated_bytes = memory_planner.estimate_table(table_schema)
+        plan = memory_planner.plan(estimated_bytes, supported_modes, parameters)
+        if plan["mode"] is None:
+            return None, plan, f"表 {table_name} {plan['reason']}"
+
+        query = f"SELECT * FROM {table_name}"
+        if plan["mode"] == SAMPLED and plan["sample_fraction"] < 1.0:
+            query = self._sample_query(engine, table_name, plan, table_schema)
+
+        df, error = await self._execute_query(engine, query)
+        return df, plan, error
+
+    def _sample_query(self, engine: Any, table_name: str, plan: Dict[str, Any], table_schema: Optional[Dict[str, Any]]) -> str:
+        """
+        生成抽样查询，PostgreSQL使用TABLESAMPLE随机抽样，其他数据库按估计行数截取
+        :param engine: 数据库连接引擎
+        :param table_name: 表名
+        :param plan: 执行计划（会记录抽样方式）
+        :param table_schema: 表元数据
+        :return: SQL查询语句
+        """
+        fraction = plan["sample_fraction"]
+        if engine.dialect.name == "postgresql":
+            plan["sample_method"] = "tablesample_bernoulli"
+            return f"SELECT * FROM {table_name} TABLESAMPLE BERNOULLI ({fraction * 100:.6f})"
+
+        row_estimate = (table_schema or {}).get("row_estimate") or 0
+        limit = max(int(row_estimate * fraction), 1)
+        plan["sample_method"] = "limit"
+        plan["sample_rows"] = limit
+        return f"SELECT * FROM {table_name} LIMIT {limit}"
+
+    def _get_source_semaphore(self, source_id: int) -> asyncio.Semaphore:
+        """
+        获取数据源的并发连接限制，同一数据源上的所有任务共享
+        :param source_id: 数据源ID
+        :return: 信号量
+        """
+        if source_id not in self.source_semaphores:
+            self.source_semaphores[source_id] = asyncio.Semaphore(settings.DATABASE_PROFILE_CONCURRENCY)
+        return self.source_semaphores[source_id]
+
+    async def _analyze_all_tables(self, task: ProcessingTask, data_source: DatabaseSource, db: Session) -> Dict[str, Any]:
+        """
+        整库分析：并发分析所有表，每完成一批表或经过一段时间写入一次阶段性结果
+        :param task: 处理任务
+        :param data_source: 数据库数据源
+        :param db: 数据库会话
+        :return: 分析结果
+        """
+        parameters = task.parameters or {}
+        analysis_type = parameters.get("analysis_type")
+
+        if analysis_type not in ("descriptive", "correlation"):
+            return {"success": False, "error": f"整库分析不支持的分析类型: {analysis_type}"}
+
+        # 更新进度
+        self.update_progress(task.id, 5, db)
+
+        # 连接到数据库
+        engine, error = await self._connect_to_database(data_source)
+        if error:
+            return {"success": False, "error": error}
+
+        # 从元数据缓存获取表列表
+        try:
+            table_names = await self._get_table_names(data_source)
+        except SQLAlchemyError as e:
+            return {"success": False, "error": f"获取表列表失败: {str(e)}"}
+
+        include_tables = parameters.get("tables")
+        exclude_tables = set(parameters.get("exclude_tables") or [])
+        if include_tables:
+            table_names = [name for name in table_names if name in include_tables]
+        table_names = [name for name in table_names if name not in exclude_tables]
+
+        # 更新进度
+        self.update_progress(task.id, 10, db)
+
+        semaphore = self._get_source_semaphore(data_source.id)
+
+        # 最多DATABASE_PROFILE_CONCURRENCY张表同时加载，每张表分到任务内存预算的相应份额
+        task_budget = memory_planner.budget_bytes
+        if parameters.get("memory_budget_mb"):
+            task_budget = min(int(float(parameters["memory_budget_mb"]) * 1024 * 1024), task_budget)
+        table_parameters = {
+            **parameters,
+            "memory_budget_mb": task_budget / settings.DATABASE_PROFILE_CONCURRENCY / (1024 * 1024)
+        }
+
+        async def profile(name: str) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self._analyze_table(engine, data_source, name, table_parameters)
+                except Exception as e:
+                    return {"success": False, "table_name": name, "error": f"分析数据时出错: {str(e)}"}
+
+        tables: Dict[str, Any] = {}
+        failed_tables: List[str] = []
+        pending = [asyncio.create_task(profile(name)) for name in table_names]
+        # 每次写入阶段性结果都要序列化所有已完成的表，按批写入避免表很多时总写入量随表数平方增长
+        flushed_count = 0
+        flushed_at = time.monotonic()
+
+        try:
+            for finished in asyncio.as_completed(pending):
+                table_result = await finished
+                name = table_result.get("table_name")
+                tables[name] = table_result
+                if not table_result.get("success"):
+                    failed_tables.append(name)
+
+                # 写入阶段性结果
+                if (
+                    len(tables) - flushed_count >= settings.DATABASE_PARTIAL_RESULT_TABLES
+                    or time.monotonic() - flushed_at >= settings.DATABASE_PARTIAL_RESULT_SECONDS
+                ):
+                    self.update_partial_result(task.id, {
+                        "scope": "database",
+                        "analysis_type": analysis_type,
+                        "table_count": len(table_names),
+                        "completed_count": len(tables),
+                        "failed_tables": list(failed_tables),
+                        "tables": dict(tables)
+                    }, db)
+                    self.update_progress(task.id, 10 + int(len(tables) / len(table_names) * 89), db)
+                    flushed_count = len(tables)
+                    flushed_at = time.monotonic()
+
+                # 检查是否请求取消
+                if task.id in self.running_tasks and self.running_tasks[task.id]["cancel_requested"]:
+                    return {"status": "cancelled"}
+        finally:
+            for pending_task in pending:
+                if not pending_task.done():
+                    pending_task.cancel()
+
+        # 更新进度
+        self.update_progress(task.id, 100, db)
+
+        return {
+            "success": True,
+            "scope": "database",
+            "analysis_type": analysis_type,
+            "table_count": len(table_names),
+            "completed_count": len(tables),
+            "failed_tables": failed_tables,
+            "tables": tables
+        }
+
     async def _descriptive_analysis(self, df: pd.DataFrame) -> Dict[str, Any]:
         """
         描述性统计分析
@@ -422,17 +903,27 @@ class DatabaseProcessor(BaseDataProcessor):
 
         return result
 
-    async def _correlation_analysis(self, df: pd.DataFrame) -> Dict[str, Any]:
+    async def _correlation_analysis(self, df: pd.DataFrame, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         相关性分析
         :param df: 数据框
+        :param parameters: 任务参数
         :return: 分析结果
         """
+        parameters = parameters or {}
+
         # 只分析数值列
         numeric_df = df.select_dtypes(include=[np.number])
         if numeric_df.empty:
             return {"error": "没有数值列可以进行相关性分析"}
 
+        # 列数较多时使用分块模式，只返回高相关列对
+        mode = parameters.get("correlation_mode", "auto")
+        if mode == "auto":
+            mode = "full" if len(numeric_df.columns) <= settings.CORRELATION_FULL_MATRIX_MAX_COLUMNS else "top_pairs"
+        if mode == "top_pairs":
+            return await asyncio.to_thread(self._top_pairs_correlation, numeric_df, parameters)
+
         # 计算相关系数矩阵
         corr_matrix = numeric_df.corr().fillna(0).round(4)
 
@@ -461,6 +952,276 @@ class DatabaseProcessor(BaseDataProcessor):
             "high_correlations": high_correlations
         }
 
+    def _top_pairs_correlation(self, numeric_df: pd.DataFrame, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        分块计算相关系数，只返回超过阈值或前K个的列对，完整矩阵写入二进制文件
+        :param numeric_df: 数值列数据框
+        :param parameters: 任务参数
+        :return: 分析结果
+        """
+        threshold = float(parameters.get("correlation_threshold", 0.7))
+        top_k = parameters.get("top_k", 100)
+        sample_rows = parameters.get("sample_rows")
+
+        # 可选：抽样计算
+        sampled = bool(sample_rows) and len(numeric_df) > sample_rows
+        if sampled:
+            numeric_df = numeric_df.sample(n=sample_rows, random_state=0)
+
+        matrix_path = new_matrix_path(settings.ARTIFACT_DIR) if parameters.get("save_matrix", True) else None
+        result = blockwise_correlation_pairs(
+            numeric_df,
+            threshold=threshold,
+            top_k=top_k,
+            block_size=settings.CORRELATION_BLOCK_SIZE,
+            matrix_path=matrix_path
+        )
+
+        result.update({
+            "mode": "top_pairs",
+            "threshold": threshold,
+            "top_k": top_k,
+            "sampled": sampled
+        })
+        if matrix_path is not None:
+            columns_path = write_matrix_columns(matrix_path, [str(column) for column in numeric_df.columns])
+            result["matrix_artifact"] = {
+                "path": str(matrix_path),
+                "columns_path": str(columns_path),
+                "format": "npy",
+                "dtype": "float32",
+                "shape": [result["column_count"], result["column_count"]]
+            }
+        return result
+
+    async def _analyze_distribution(self, engine: Any, data_source: DatabaseSource, table_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        分布分析：由执行计划选择模式，支持的数据库直接用聚合SQL计算，否则在内存预算内只读取该列后用pandas计算
+        :param engine: 数据库连接引擎
+        :param data_source: 数据库数据源
+        :param table_name: 表名
+        :param parameters: 任务参数
+        :return: 分析结果
+        """
+        column = parameters.get("column")
+        if not column:
+            return {"success": False, "table_name": table_name, "error": f"未指定有效的列名: {column}"}
+
+        # 从元数据缓存获取列类型
+        table_schema = None
+        try:
+            schema = await schema_cache.aget_or_load(data_source.id, data_source.connection_string)
+            table_schema = schema["tables"].get(table_name)
+        except SQLAlchemyError as e:
+            logger.warning(f"读取元数据失败: {str(e)}")
+
+        column_schema = None
+        if table_schema is not None:
+            column_schema = next((c for c in table_schema["columns"] if c["name"] == column), None)
+            if column_schema is None:
+                return {"success": False, "table_name": table_name, "error": f"未指定有效的列名: {column}"}
+
+        # 只读取该列时的内存占用
+        column_table = {**table_schema, "columns": [column_schema], "size_bytes": None} if table_schema else None
+        estimated_bytes = memory_planner.estimate_table(column_table)
+        plan = memory_planner.plan(
+            estimated_bytes, [SQL_PUSHDOWN, IN_MEMORY] if column_schema is not None else [IN_MEMORY], parameters
+        )
+
+        result = None
+        if plan["mode"] == SQL_PUSHDOWN:
+            try:
+                result = await self._distribution_analysis_sql(engine, table_name, column, column_schema["numeric"])
+            except SQLAlchemyError as e:
+                logger.warning(f"分布分析下推失败，回退到pandas: {str(e)}")
+            except QueryAbortedError as e:
+                return {"success": False, "table_name": table_name, "error": f"查询已终止: {str(e)}"}
+            if result is None:
+                # 数据库不支持下推时重新规划，读取该列仍受内存预算限制
+                plan = memory_planner.plan(estimated_bytes, [IN_MEMORY], parameters)
+                plan["pushdown_fallback"] = True
+
+        if plan["mode"] is None:
+            return {"success": False, "table_name": table_name, "error": f"列 {column} {plan['reason']}", "execution_plan": plan}
+
+        if result is not None:
+            execution = SQL_PUSHDOWN
+            row_count = result.pop("row_count")
+        else:
+            # 回退：只读取需要的列
+            query = f"SELECT {self._quote_identifier(engine, column)} FROM {table_name}"
+            df, error = await self._execute_query(engine, query)
+            if error:
+                return {"success": False, "table_name": table_name, "error": error}
+            if column not in df.columns:
+                return {"success": False, "table_name": table_name, "error": f"未指定有效的列名: {column}"}
+            execution = "pandas"
+            row_count = len(df)
+            result = await self._distribution_analysis(df, column)
+
+        return {
+            "success": True,
+            "analysis_type": "distribution",
+            "table_name": table_name,
+            "row_count": row_count,
+            "column_count": table_schema["column_count"] if table_schema else 1,
+            "execution": execution,
+            "execution_plan": plan,
+            "result": result
+        }
+
+    async def _fetch_rows(self, engine: Any, query: str, params: Optional[Dict[str, Any]] = None) -> List[Tuple]:
+        """
+        执行SQL并返回全部结果行（适用于只返回少量聚合结果的查询）
+        :param engine: 数据库连接引擎（同步或异步）
+        :param query: SQL语句
+        :param params: 绑定参数
+        :return: 结果行列表
+        """
+        backend: Dict[str, Any] = {}
+
+        async def fetch_async() -> List[Tuple]:
+            async with self._guarded_async_connection(engine, backend) as conn:
+                result = await conn.execute(text(query), params or {})
+                return [tuple(row) for row in result.fetchall()]
+
+        def fetch() -> List[Tuple]:
+            with self._guarded_connection(engine, backend) as conn:
+                return [tuple(row) for row in conn.execute(text(query), params or {}).fetchall()]
+
+        if _is_async_engine(engine):
+            return await self._run_cancellable(engine, fetch_async(), backend)
+        return await self._run_cancellable(engine, asyncio.to_thread(fetch), backend)
+
+    def _quote_identifier(self, engine: Any, name: str) -> str:
+        """按数据库方言为标识符加引号"""
+        return engine.dialect.identifier_preparer.quote(name)
+
+    async def _distribution_analysis_sql(self, engine: Any, table_name: str, column: str, numeric: bool) -> Optional[Dict[str, Any]]:
+        """
+        用聚合SQL计算分布，只传输统计量和分箱结果
+        数值列需要percentile_cont和width_bucket（PostgreSQL），分类列使用GROUP BY（所有数据库）
+        :param engine: 数据库连接引擎
+        :param table_name: 表名
+        :param column: 列名
+        :param numeric: 是否为数值列
+        :return: 分析结果（额外包含row_count），数据库不支持时返回None
+        """
+        quoted = self._quote_identifier(engine, column)
+        dialect = engine.dialect.name
+
+        if not numeric:
+            rows = await self._fetch_rows(
+                engine,
+                f"SELECT {quoted}, COUNT(*) FROM {table_name} "
+                f"WHERE {quoted} IS NOT NULL GROUP BY {quoted} ORDER BY COUNT(*) DESC"
+            )
+            total = await self._fetch_rows(engine, f"SELECT COUNT(*) FROM {table_name}")
+            non_null = sum(int(count) for _, count in rows)
+            return {
+                "row_count": int(total[0][0]),
+                "value_counts": {str(value): int(count) for value, count in rows},
+                "value_percentages": {
+                    str(value): float(count) / non_null * 100 for value, count in rows
+                } if non_null else {}
+            }
+
+        if dialect != "postgresql":
+            return None
+
+        percentiles = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
+        quartiles = [0.25, 0.5, 0.75]
+        x = f"CAST({quoted} AS DOUBLE PRECISION)"
+
+        # 计算计数、最值、矩和分位数；矩按减去均值后的值计算，避免大数值时原点矩相减损失全部精度
+        d = f"({x} - center.mu)"
+        stats_query = (
+            f"WITH center AS (SELECT AVG({x}) AS mu FROM {table_name}) "
+            f"SELECT COUNT(*), COUNT({x}), AVG({x}), STDDEV_SAMP({x}), MIN({x}), MAX({x}), "
+            f"AVG({d}), AVG(POWER({d}, 2)), AVG(POWER({d}, 3)), AVG(POWER({d}, 4)), "
+            f"percentile_cont(ARRAY{percentiles + quartiles}::double precision[]) WITHIN GROUP (ORDER BY {x}) "
+            f"FROM {table_name} CROSS JOIN center"
+        )
+        row = (await self._fetch_rows(engine, stats_query))[0]
+        total, count, mean, std, min_val, max_val, shifted1, shifted2, shifted3, shifted4, quantiles = row
+
+        result: Dict[str, Any] = {"row_count": int(total)}
+        count = int(count)
+        if count == 0:
+            result["statistics"] = {"count": 0}
+            return result
+
+        quantiles = [float(q) for q in quantiles]
+        result["statistics"] = {
+            "count": count,
+            "mean": float(mean),
+            "std": float(std) if std is not None else float("nan"),
+            "min": float(min_val),
+            "25%": quantiles[len(percentiles)],
+            "50%": quantiles[len(percentiles) + 1],
+            "75%": quantiles[len(percentiles) + 2],
+            "max": float(max_val)
+        }
+        result["percentiles"] = {
+            f"{int(p * 100)}%": quantiles[i] for i, p in enumerate(percentiles)
+        }
+        result["skewness"], result["kurtosis"] = self._moments_to_shape(
+            count, float(shifted1), float(shifted2), float(shifted3), float(shifted4)
+        )
+
+        # 直方图：width_bucket分箱后只传输每箱计数
+        bins = 10
+        if min_val == max_val:
+            hist, bin_edges = np.histogram([float(min_val)], bins=bins, weights=[count])
+        else:
+            bucket_rows = await self._fetch_rows(
+                engine,
+                f"SELECT LEAST(width_bucket({x}, :min_val, :max_val, {bins}), {bins}) AS bucket, COUNT(*) "
+                f"FROM {table_name} WHERE {quoted} IS NOT NULL GROUP BY 1",
+                {"min_val": float(min_val), "max_val": float(max_val)}
+            )
+            hist = np.zeros(bins, dtype=np.int64)
+            for bucket, bucket_count in bucket_rows:
+                hist[int(bucket) - 1] += int(bucket_count)
+            bin_edges = np.linspace(float(min_val), float(max_val), bins + 1)
+        result["histogram"] = {
+            "counts": [int(c) for c in hist],
+            "bin_edges": [float(edge) for edge in bin_edges]
+        }
+
+        return result
+
+    def _moments_to_shape(self, n: int, mean: float, raw2: float, raw3: float, raw4: float) -> Tuple[float, float]:
+        """
+        由各阶矩计算样本偏度和峰度（与pandas的skew/kurtosis口径一致）
+        偏度和峰度与平移无关，矩可以相对任意位置计算，相对接近均值的位置计算时精度最好
+        :param n: 非空值个数
+        :param mean: 一阶矩
+        :param raw2: 二阶矩
+        :param raw3: 三阶矩
+        :param raw4: 四阶矩
+        :return: (偏度, 峰度)
+        """
+        m2 = raw2 - mean ** 2
+        m3 = raw3 - 3 * mean * raw2 + 2 * mean ** 3
+        m4 = raw4 - 4 * mean * raw3 + 6 * mean ** 2 * raw2 - 3 * mean ** 4
+
+        if n < 3:
+            skewness = float("nan")
+        elif m2 <= 0:
+            skewness = 0.0
+        else:
+            skewness = np.sqrt(n * (n - 1)) / (n - 2) * m3 / m2 ** 1.5
+
+        if n < 4:
+            kurtosis = float("nan")
+        elif m2 <= 0:
+            kurtosis = 0.0
+        else:
+            kurtosis = (n - 1) / ((n - 2) * (n - 3)) * ((n + 1) * m4 / m2 ** 2 - 3 * (n - 1))
+
+        return float(skewness), float(kurtosis)
+
     async def _distribution_analysis(self, df: pd.DataFrame, column: str) -> Dict[str, Any]:
         """
         分布分析
@@ -551,12 +1312,11 @@ class DatabaseProcessor(BaseDataProcessor):
         # 更新进度
         self.update_progress(task.id, 20, db)
 
-        # 读取表数据
+        # 读取表数据（转换结果需要完整数据，只有显式指定时才抽样）
         try:
-            query = f"SELECT * FROM {table_name}"
-            df, error = await self._execute_query(engine, query)
+            df, plan, error = await self._load_table(engine, data_source, table_name, parameters, [IN_MEMORY])
             if error:
-                return {"success": False, "error": error}
+                return {"success": False, "error": error, "execution_plan": plan}
 
             # 记录原始数据信息
             original_shape = df.shape
@@ -709,6 +1469,7 @@ class DatabaseProcessor(BaseDataProcessor):
                 "added_columns": [col for col in transformed_columns if col not in original_columns],
                 "removed_columns": [col for col in original_columns if col not in transformed_columns],
                 "transform_results": transform_results,
+                "execution_plan": plan,
                 "sample_data": df.head(10).to_dict(orient="records")
             }
 
@@ -728,21 +1489,40 @@ class DatabaseProcessor(BaseDataProcessor):
         parameters = task.parameters or {}
         query = parameters.get("query", "")
 
+        # 缓存有效期：任务参数优先，其次数据源配置，0表示不缓存
+        cache_ttl = parameters.get("cache_ttl", data_source.query_cache_ttl)
+        use_cache = parameters.get("use_cache", True) and cache_ttl != 0 and query_cache.is_cacheable(query)
+
         # 更新进度
         self.update_progress(task.id, 10, db)
 
-        # 连接到数据库
-        engine, error = await self._connect_to_database(data_source)
-        if error:
-            return {"success": False, "error": error}
+        # 优先读取缓存
+        df = query_cache.get(data_source.id, query) if use_cache else None
+        cache_hit = df is not None
+        guard = None
 
-        # 更新进度
-        self.update_progress(task.id, 30, db)
+        if not cache_hit:
+            # 连接到数据库
+            engine, error = await self._connect_to_database(data_source)
+            if error:
+                return {"success": False, "error": error}
 
-        # 执行查询
-        df, error = await self._execute_query(engine, query)
-        if error:
-            return {"success": False, "error": error}
+            # 预估查询代价，必要时自动加LIMIT、抽样或拒绝
+            guard = await self._guard_query(engine, query, task, db)
+            if guard["action"] == query_guard.REJECT:
+                return {"success": False, "error": guard["reason"], "query_guard": guard}
+
+            # 更新进度
+            self.update_progress(task.id, 30, db)
+
+            # 执行查询
+            df, error = await self._execute_query(engine, guard["query"])
+            if error:
+                return {"success": False, "error": error, "query_guard": guard}
+
+            # 写入缓存（被改写的查询结果不完整，不缓存）
+            if use_cache and guard["action"] == query_guard.ALLOW:
+                await asyncio.to_thread(query_cache.set, data_source.id, query, df, cache_ttl)
 
         # 更新进度
         self.update_progress(task.id, 70, db)
@@ -779,9 +1559,48 @@ class DatabaseProcessor(BaseDataProcessor):
                 "records": records[:100],  # 只返回前100条记录，避免数据过大
                 "has_more": len(records) > 100,
                 "total_records": len(records),
-                "statistics": stats
+                "statistics": stats,
+                "cache_hit": cache_hit,
+                "query_guard": guard
             }
         except Exception as e:
             error_msg = f"处理查询结果时出错: {str(e)}"
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
+
+    async def _guard_query(self, engine: Any, query: str, task: ProcessingTask, db: Session) -> Dict[str, Any]:
+        """
+        执行前运行EXPLAIN，按用户阈值决定如何执行查询
+        :param engine: 数据库连接引擎
+        :param query: SQL查询语句
+        :param task: 处理任务
+        :param db: 数据库会话
+        :return: 预检结果，query为实际执行的SQL
+        """
+        parameters = task.parameters or {}
+        dialect = engine.dialect.name
+        allowed = {"action": query_guard.ALLOW, "query": query, "reason": ""}
+
+        statement = query_guard.explain_statement(dialect, query) if settings.QUERY_GUARD_ENABLED else None
+        if statement is None:
+            allowed["reason"] = "未启用预检或数据库不支持代价估计"
+            return allowed
+
+        on_large_result = parameters.get("on_large_result", query_guard.LIMIT)
+        if on_large_result not in query_guard.LARGE_RESULT_ACTIONS:
+            on_large_result = query_guard.LIMIT
+
+        try:
+            rows = await self._fetch_rows(engine, statement)
+            estimate = query_guard.parse_explain(dialect, rows)
+        except QueryAbortedError as e:
+            return {"action": query_guard.REJECT, "query": query, "reason": f"查询已终止: {str(e)}"}
+        except (SQLAlchemyError, ValueError, KeyError, IndexError, TypeError) as e:
+            # EXPLAIN失败（如语法错误）时交给实际执行返回错误
+            logger.warning(f"EXPLAIN执行失败: {str(e)}")
+            allowed["reason"] = "无法获取执行计划"
+            return allowed
+
+        user = db.query(User).filter(User.id == task.user_id).first() if task.user_id else None
+        limits = query_guard.get_query_limits(user)
+        return query_guard.decide(query, dialect, estimate, limits, on_large_result)
@@ -0,0 +1,157 @@
+"""
+文档嵌入管道
+逐块读取文档文本，按词元切分为有重叠的文本块，跳过向量存储中已有的文本块（按内容哈希），
+其余文本块分批并发计算嵌入后追加到向量存储，最后保存文档的文本块清单。
+文档被编辑后重新嵌入时，只有内容变化的文本块需要计算
+"""
+import asyncio
+import logging
+import os
+from itertools import islice
+from typing import Dict, Any, List, Iterator, Iterable, Optional, Callable
+
+import pandas as pd
+
+from core.processing.embedders import Embedder, embed_in_batches
+from core.processing.text_chunker import TextChunker
+from core.processing.vector_store import VectorStore
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCancelled(Exception):
+    """嵌入被取消"""
+
+
+def read_text_blocks(
+    file_path: str,
+    encoding: str = "utf-8",
+    block_chars: int = 4 * 1024 * 1024,
+    should_cancel: Optional[Callable[[], bool]] = None,
+    on_progress: Optional[Callable[[float], None]] = None
+) -> Iterator[str]:
+    """按块读取文本文件，每块在最后一个换行符处截断，不完整的行留到下一块"""
+    total = max(os.path.getsize(file_path), 1)
+    carry = ""
+    with open(file_path, "r", encoding=encoding, errors="ignore") as source:
+        while True:
+            if should_cancel and should_cancel():
+                raise EmbeddingCancelled()
+            data = source.read(block_chars)
+            if not data:
+                break
+            data = carry + data if carry else data
+            cut = data.rfind("\n") + 1
+            if not cut:
+                carry = data
+                continue
+            carry = data[cut:]
+            if on_progress:
+                on_progress(min(source.buffer.tell() / total, 1.0))
+            yield data[:cut]
+    if carry:
+        yield carry
+
+
+def read_table_text_blocks(
+    chunks: Iterable[pd.DataFrame],
+    should_cancel: Optional[Callable[[], bool]] = None
+) -> Iterator[str]:
+    """把表格逐块转换为文本，每行一行，格式为 "列名: 值; 列名: 值"，空值省略"""
+    for df in chunks:
+        if should_cancel and should_cancel():
+            raise EmbeddingCancelled()
+        columns = [str(column) for column in df.columns]
+        lines = []
+        for values in df.itertuples(index=False, name=None):
+            fields = [f"{column}: {value}" for column, value in zip(columns, values) if not pd.isna(value)]
+            lines.append("; ".join(fields) + "\n")
+        if lines:
+            yield "".join(lines)
+
+
+class DocumentEmbeddingPipeline:
+    """文档嵌入管道"""
+
+    def __init__(
+        self,
+        document_id: str,
+        blocks: Iterable[str],
+        embedder: Embedder,
+        store: VectorStore,
+        chunker: Optional[TextChunker] = None,
+        batch_size: int = 64,
+        concurrency: int = 4,
+        group_chunks: int = 1024,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ):
+        """
+        :param document_id: 文档标识（例如数据源ID），用于保存文本块清单
+        :param blocks: 文档文本，见 TextChunker.chunks
+        :param embedder: 嵌入模型
+        :param store: 向量存储，应与嵌入模型对应
+        :param chunker: 文本切分器
+        :param batch_size: 每次请求嵌入的文本块数
+        :param concurrency: 同时进行的嵌入请求数
+        :param group_chunks: 每组切分的文本块数，逐组查重、嵌入和写入，内存占用与文档大小无关
+        """
+        self.document_id = document_id
+        self.blocks = blocks
+        self.embedder = embedder
+        self.store = store
+        self.chunker = chunker or TextChunker()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.group_chunks = group_chunks
+        self.should_cancel = should_cancel or (lambda: False)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行嵌入
+        :return: 文本块数、新嵌入数、复用数和与上次嵌入相比的变化
+        """
+        previous = self.store.get_document(self.document_id) or {}
+        previous_hashes = {chunk["hash"] for chunk in previous.get("chunks", [])}
+
+        chunks = self.chunker.chunks(self.blocks)
+        manifest: List[Dict[str, Any]] = []
+        embedded = 0
+        reused = 0
+        total_tokens = 0
+
+        while True:
+            group = await asyncio.to_thread(lambda: list(islice(chunks, self.group_chunks)))
+            if not group:
+                break
+            if self.should_cancel():
+                raise EmbeddingCancelled()
+
+            texts = {chunk["hash"]: chunk["text"] for chunk in group}
+            missing = self.store.missing([chunk["hash"] for chunk in group])
+            if missing:
+                vectors = await embed_in_batches(
+                    self.embedder, [texts[h] for h in missing], self.batch_size, self.concurrency
+                )
+                await asyncio.to_thread(self.store.add, missing, vectors, [texts[h] for h in missing])
+            embedded += len(missing)
+            reused += len(group) - len(missing)
+
+            for chunk in group:
+                total_tokens += chunk["tokens"]
+                manifest.append({key: chunk[key] for key in ("hash", "start", "end", "tokens")})
+
+        current_hashes = {chunk["hash"] for chunk in manifest}
+        self.store.set_document(self.document_id, manifest, model=self.embedder.model)
+
+        return {
+            "embed_model": self.embedder.model,
+            "dimensions": self.store.dimensions,
+            "chunk_count": len(manifest),
+            "token_count": total_tokens,
+            "embedded_chunks": embedded,
+            "reused_chunks": reused,
+            "unchanged_chunks": len(current_hashes & previous_hashes),
+            "removed_chunks": len(previous_hashes - current_hashes)
+        }
@@ -0,0 +1,120 @@
+"""
+数据类型优化
+加载数据后压缩DataFrame的内存占用：数值列降位、低基数字符串列转为category、
+其余字符串列使用Arrow字符串类型、日期字符串一次性解析为datetime
+"""
+import importlib.util
+import logging
+import re
+from typing import Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 唯一值占比低于该值的字符串列转为category
+DEFAULT_CATEGORY_RATIO = 0.5
+
+# 判断日期列时检查的样本数
+_DATE_SAMPLE_SIZE = 20
+_DATE_PATTERN = re.compile(
+    r"^\d{4}[-/]\d{1,2}[-/]\d{1,2}"
+    r"([ T]\d{1,2}:\d{2}(:\d{2}(\.\d+)?)?)?"
+    r"(Z|[+-]\d{2}:?\d{2})?$"
+)
+
+# pyarrow可用时使用Arrow字符串类型
+_ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+
+def optimize_dtypes(
+    df: pd.DataFrame,
+    category_ratio: float = DEFAULT_CATEGORY_RATIO,
+    parse_dates: bool = True
+) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    优化DataFrame各列的数据类型
+    :param df: 数据框
+    :param category_ratio: 唯一值占比低于该值的字符串列转为category
+    :param parse_dates: 是否把日期字符串列解析为datetime
+    :return: (优化后的数据框, 优化报告)
+    """
+    memory_before = int(df.memory_usage(deep=True).sum())
+    converted = {}
+
+    optimized = {}
+    for column in df.columns:
+        series = df[column]
+        new_series = _optimize_series(series, category_ratio, parse_dates)
+        if new_series.dtype != series.dtype:
+            converted[str(column)] = {"from": str(series.dtype), "to": str(new_series.dtype)}
+        optimized[column] = new_series
+
+    result = pd.DataFrame(optimized, index=df.index) if len(df.columns) else df
+    memory_after = int(result.memory_usage(deep=True).sum())
+
+    report = {
+        "memory_before": memory_before,
+        "memory_after": memory_after,
+        "memory_saved": memory_before - memory_after,
+        "reduction_ratio": round(memory_before / memory_after, 2) if memory_after else None,
+        "converted_columns": converted
+    }
+    logger.info(f"数据类型优化: {memory_before} -> {memory_after} 字节，转换 {len(converted)} 列")
+    return result, report
+
+
+def _optimize_series(series: pd.Series, category_ratio: float, parse_dates: bool) -> pd.Series:
+    """优化单列的数据类型"""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+
+    if pd.api.types.is_integer_dtype(series):
+        # 只降为有符号整数，避免无符号类型相减时回绕
+        return pd.to_numeric(series, downcast="integer")
+
+    if pd.api.types.is_float_dtype(series):
+        # 只在不损失精度时降为float32
+        if series.dtype == np.float64:
+            narrowed = series.astype(np.float32)
+            if ((narrowed.astype(np.float64) == series) | series.isna()).all():
+                return narrowed
+        return series
+
+    if series.dtype == object:
+        non_null = series.dropna()
+        if non_null.empty or not non_null.map(lambda value: isinstance(value, str)).all():
+            return series
+
+        if parse_dates:
+            parsed = _parse_dates(series, non_null)
+            if parsed is not None:
+                return parsed
+
+        if non_null.nunique() / len(series) < category_ratio:
+            return series.astype("category")
+
+        if _ARROW_AVAILABLE:
+            return series.astype("string[pyarrow]")
+
+    return series
+
+
+def _parse_dates(series: pd.Series, non_null: pd.Series) -> Any:
+    """样本都像日期时解析整列，解析后空值增加则放弃"""
+    sample = non_null.head(_DATE_SAMPLE_SIZE)
+    if not sample.map(lambda value: bool(_DATE_PATTERN.match(value.strip()))).all():
+        return None
+
+    try:
+        parsed = pd.to_datetime(series, errors="coerce")
+    except (ValueError, TypeError) as e:
+        logger.debug(f"日期解析失败: {str(e)}")
+        return None
+
+    if parsed.isna().sum() > series.isna().sum():
+        return None
+    return parsed
@@ -0,0 +1,148 @@
+"""
+文本嵌入
+embed_model为hashing（或hashing-<维度>）时使用本地的确定性哈希嵌入，不需要网络，适合离线环境和测试；
+其他模型名通过OpenAI兼容的/embeddings接口计算。文本按批发送，同时进行的请求数有上限
+"""
+import asyncio
+import logging
+import zlib
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from core.config import settings
+from core.processing.text_chunker import tokenize
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Embedder(ABC):
+    """嵌入模型接口"""
+
+    model: str = ""
+    # 接口返回前可能不知道维度
+    dimensions: Optional[int] = None
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        计算一批文本的嵌入
+        :param texts: 文本列表
+        :return: 形状为 (len(texts), 维度) 的float32数组
+        """
+        pass
+
+
+class HashingEmbedder(Embedder):
+    """按词元和相邻词元对做特征哈希的本地嵌入，相同的文本在任何进程中得到相同的向量"""
+
+    def __init__(self, dimensions: int = 256):
+        if dimensions < 1:
+            raise ValueError("dimensions必须大于0")
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+    def embed_sync(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = [token.lower() for token in tokenize(text)]
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in features),
+                                 dtype=np.uint32, count=len(features))
+            # 低位决定维度，最高位决定符号，减少哈希冲突带来的偏差
+            signs = np.where(hashes >> 31, -1.0, 1.0)
+            vectors[row] = np.bincount(hashes % self.dimensions, weights=signs, minlength=self.dimensions)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class OpenAICompatibleEmbedder(Embedder):
+    """通过OpenAI兼容的/embeddings接口计算嵌入"""
+
+    def __init__(self, model: str, api_base: str, api_key: Optional[str], timeout_seconds: float = 60.0,
+                 max_retries: int = 3):
+        """
+        :param model: 模型名
+        :param api_base: 接口地址，例如 https://api.openai.com/v1
+        :param api_key: API密钥
+        :param timeout_seconds: 单次请求超时（秒）
+        :param max_retries: 限流或服务端错误时的最大重试次数
+        """
+        if not api_key:
+            raise ValueError("未配置嵌入接口的API密钥（EMBED_API_KEY或LLM_API_KEY）")
+        self.model = model
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.dimensions = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        import aiohttp
+
+        payload = {"model": self.model, "input": texts}
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for attempt in range(self.max_retries + 1):
+                async with session.post(f"{self.api_base}/embeddings", json=payload, headers=headers) as response:
+                    if response.status == 429 or response.status >= 500:
+                        if attempt < self.max_retries:
+                            await asyncio.sleep(2 ** attempt)
+                            continue
+                    if response.status != 200:
+                        raise RuntimeError(f"嵌入接口返回错误 {response.status}: {(await response.text())[:500]}")
+                    data = await response.json()
+                    break
+
+        items = sorted(data["data"], key=lambda item: item["index"])
+        vectors = np.asarray([item["embedding"] for item in items], dtype=np.float32)
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"嵌入接口返回了 {len(vectors)} 个向量，请求了 {len(texts)} 个")
+        self.dimensions = vectors.shape[1]
+        return vectors
+
+
+def create_embedder(embed_model: Optional[str] = None) -> Embedder:
+    """
+    按模型名创建嵌入模型
+    :param embed_model: hashing、hashing-<维度>，或嵌入接口的模型名，为空时使用EMBED_DEFAULT_MODEL
+    """
+    embed_model = embed_model or settings.EMBED_DEFAULT_MODEL
+    if embed_model == "hashing":
+        return HashingEmbedder(settings.EMBED_HASHING_DIMENSIONS)
+    if embed_model.startswith("hashing-"):
+        return HashingEmbedder(int(embed_model[len("hashing-"):]))
+    return OpenAICompatibleEmbedder(
+        model=embed_model,
+        api_base=settings.EMBED_API_BASE,
+        api_key=settings.EMBED_API_KEY or settings.LLM_API_KEY
+    )
+
+
+async def embed_in_batches(embedder: Embedder, texts: List[str], batch_size: int = 64,
+                           concurrency: int = 4) -> np.ndarray:
+    """
+    分批计算嵌入，同时进行的请求数不超过concurrency
+    :return: 按texts顺序排列的float32数组
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+    async def run(batch: List[str]) -> np.ndarray:
+        async with semaphore:
+            return await embedder.embed(batch)
+
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), max(batch_size, 1))]
+    results = await asyncio.gather(*(run(batch) for batch in batches))
+    if not results:
+        return np.zeros((0, embedder.dimensions or 0), dtype=np.float32)
+    return np.concatenate(results, axis=0)
@@ -0,0 +1,195 @@
+"""
+外部归并排序
+数据按内存预算分批排序后写成Parquet有序段（run），再用有界缓冲区多路归并输出，
+可以对超过内存大小的数据排序；相等的键保持输入顺序（稳定排序）
+"""
+import logging
+import shutil
+from pathlib import Path
+from typing import List, Iterator, Optional, Tuple
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 归并时用于保持稳定性的辅助列
+_RUN_COLUMN = "__sort_run"
+_POSITION_COLUMN = "__sort_position"
+# 归并时每个有序段每次至少读取的行数
+_MIN_MERGE_BATCH_ROWS = 64
+# 有序段Parquet文件的行组行数
+_RUN_ROW_GROUP_ROWS = 8192
+
+
+def _sort_frame(df: pd.DataFrame, by: List[str], ascending: List[bool]) -> pd.DataFrame:
+    """按排序键排序，辅助列作为最后的比较键保证稳定"""
+    return df.sort_values(
+        by=by + [_RUN_COLUMN, _POSITION_COLUMN],
+        ascending=ascending + [True, True],
+        kind="mergesort",
+        na_position="last"
+    )
+
+
+def external_sort(
+    chunks: Iterator[pd.DataFrame],
+    by: List[str],
+    ascending: List[bool],
+    run_dir: Path,
+    run_bytes: int = 128 * 1024 * 1024,
+    merge_batch_rows: Optional[int] = None
+) -> Iterator[pd.DataFrame]:
+    """
+    外部排序
+    :param chunks: 输入数据块
+    :param by: 排序列
+    :param ascending: 每个排序列是否升序
+    :param run_dir: 有序段的临时目录
+    :param run_bytes: 每个有序段在内存中的最大字节数，归并时所有有序段的缓冲区合计也不超过该值
+    :param merge_batch_rows: 归并时每个有序段每次读取的行数，为空时按run_bytes和有序段数计算
+    :return: 有序的数据块
+    """
+    run_dir = Path(run_dir)
+    run_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        runs: List[Path] = []
+        buffer: List[pd.DataFrame] = []
+        buffer_bytes = 0
+        total_bytes = 0
+        position = 0
+
+        # 第一阶段：按内存预算生成有序段
+        for chunk in chunks:
+            chunk = chunk.reset_index(drop=True)
+            chunk[_POSITION_COLUMN] = range(position, position + len(chunk))
+            position += len(chunk)
+            buffer.append(chunk)
+            chunk_bytes = int(chunk.memory_usage(deep=True).sum())
+            buffer_bytes += chunk_bytes
+            total_bytes += chunk_bytes
+            if buffer_bytes >= run_bytes:
+                runs.append(_write_run(buffer, by, ascending, run_dir, len(runs)))
+                buffer, buffer_bytes = [], 0
+
+        # 数据可以一次放入内存时不需要归并
+        if not runs:
+            if buffer:
+                df = pd.concat(buffer, ignore_index=True)
+                df[_RUN_COLUMN] = 0
+                yield _sort_frame(df, by, ascending).drop(columns=[_RUN_COLUMN, _POSITION_COLUMN]).reset_index(drop=True)
+            return
+
+        if buffer:
+            runs.append(_write_run(buffer, by, ascending, run_dir, len(runs)))
+        buffer = []
+
+        # 所有有序段的读取缓冲区合计不超过一个有序段的内存预算
+        row_bytes = max(total_bytes / max(position, 1), 1.0)
+        batch_rows = merge_batch_rows or max(_MIN_MERGE_BATCH_ROWS, int(run_bytes / len(runs) / row_bytes))
+        logger.info(f"外部排序: 生成 {len(runs)} 个有序段，共 {position} 行，归并时每段每次读取 {batch_rows} 行")
+        yield from _merge_runs(runs, by, ascending, batch_rows)
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def _write_run(buffer: List[pd.DataFrame], by: List[str], ascending: List[bool], run_dir: Path, run_index: int) -> Path:
+    """排序并写出一个有序段"""
+    df = pd.concat(buffer, ignore_index=True)
+    df[_RUN_COLUMN] = run_index
+    df = _sort_frame(df, by, ascending)
+    path = run_dir / f"run_{run_index:05d}.parquet"
+    # 行组较小，归并时按批读取不需要解码整个大行组
+    df.to_parquet(path, engine="pyarrow", index=False, row_group_size=_RUN_ROW_GROUP_ROWS)
+    return path
+
+
+class _SortKey:
+    """一行的排序键，比较规则与_sort_frame一致：按各列升降序比较，空值排在最后，最后按有序段和位置比较"""
+
+    __slots__ = ("values", "ascending")
+
+    def __init__(self, values: Tuple, ascending: List[bool]):
+        self.values = values
+        self.ascending = ascending
+
+    def __lt__(self, other: "_SortKey") -> bool:
+        for a, b, asc in zip(self.values, other.values, self.ascending):
+            a_null, b_null = pd.isna(a), pd.isna(b)
+            if a_null or b_null:
+                if a_null and b_null:
+                    continue
+                return b_null
+            if a == b:
+                continue
+            return a < b if asc else a > b
+        return False
+
+
+class _RunCursor:
+    """有序段的读取缓冲区：当前批次和读取位置"""
+
+    def __init__(self, path: Path, columns: List[str], ascending: List[bool], batch_rows: int):
+        self.columns = columns
+        self.ascending = ascending
+        self._batches = pq.ParquetFile(path).iter_batches(batch_size=batch_rows)
+        self.frame: Optional[pd.DataFrame] = None
+        self.start = 0
+        self._keys: List[list] = []
+
+    def refill(self) -> bool:
+        """当前批次读完后读取下一批，没有数据时返回False"""
+        while self.frame is None or self.start >= len(self.frame):
+            batch = next(self._batches, None)
+            if batch is None:
+                self.frame = None
+                return False
+            self.frame = batch.to_pandas()
+            self.start = 0
+            self._keys = [self.frame[column].tolist() for column in self.columns]
+        return True
+
+    def key(self, row: int) -> _SortKey:
+        return _SortKey(tuple(values[row] for values in self._keys), self.ascending)
+
+    def count_not_after(self, bound: _SortKey) -> int:
+        """当前批次剩余部分中排序键不大于bound的行数（二分查找）"""
+        low, high = self.start, len(self.frame)
+        while low < high:
+            middle = (low + high) // 2
+            if bound < self.key(middle):
+                high = middle
+            else:
+                low = middle + 1
+        return low - self.start
+
+    def take(self, rows: int) -> pd.DataFrame:
+        taken = self.frame.iloc[self.start:self.start + rows]
+        self.start += rows
+        return taken
+
+
+def _merge_runs(runs: List[Path], by: List[str], ascending: List[bool], batch_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    多路归并：每个有序段只在内存中保留一个批次。
+    每轮以“仍有未读数据的有序段中当前批次最后一行”的最小值为边界，从各段缓冲区取出不大于边界的前缀合并排序后输出，
+    边界所在的段整批输出后读取下一批；每行只参与一次排序
+    """
+    columns = by + [_RUN_COLUMN, _POSITION_COLUMN]
+    key_ascending = ascending + [True, True]
+    cursors = [_RunCursor(path, columns, key_ascending, batch_rows) for path in runs]
+    active = [cursor for cursor in cursors if cursor.refill()]
+
+    while active:
+        bound = min(cursor.key(len(cursor.frame) - 1) for cursor in active)
+        parts = []
+        for cursor in active:
+            if not bound < cursor.key(cursor.start):
+                parts.append(cursor.take(cursor.count_not_after(bound)))
+
+        merged = parts[0] if len(parts) == 1 else _sort_frame(pd.concat(parts, ignore_index=True), by, ascending)
+        yield merged.drop(columns=[_RUN_COLUMN, _POSITION_COLUMN]).reset_index(drop=True)
+
+        active = [cursor for cursor in active if cursor.refill()]
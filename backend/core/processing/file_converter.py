@@ -0,0 +1,531 @@
+"""
+文件格式转换
+在CSV、JSONL、JSON数组、Parquet和XLSX之间转换，读取端逐批产生Arrow记录批（RecordBatch），
+写入端逐批写出，内存占用只与批大小有关；按记录读取的格式（JSONL、JSON数组、XLSX）先扫描一遍推断统一的列类型
+"""
+import datetime
+import decimal
+import gzip
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Callable
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONVERT_FORMATS = ["csv", "jsonl", "json", "parquet", "xlsx"]
+
+# 格式别名
+_FORMAT_ALIASES = {"ndjson": "jsonl", "xls": "xlsx", "excel": "xlsx", "pq": "parquet"}
+
+PARQUET_COMPRESSIONS = ["none", "snappy", "gzip", "brotli", "zstd", "lz4"]
+TEXT_COMPRESSIONS = ["none", "gzip"]
+
+# XLSX每个工作表的最大行数（含表头）
+_XLSX_MAX_ROWS = 1048576
+# 读取JSON数组时每次读取的字符数
+_JSON_READ_CHARS = 1024 * 1024
+# CSV解析错误信息中的列序号
+_CSV_ERROR_COLUMN_PATTERN = re.compile(r"CSV column #(\d+)")
+
+
+class ConversionCancelled(Exception):
+    """转换被取消"""
+
+
+def normalize_format(name: Optional[str]) -> str:
+    """
+    规范化格式名
+    :param name: 格式名或文件扩展名
+    :return: 格式
+    :raises ValueError: 不支持的格式
+    """
+    fmt = (name or "").lower().lstrip(".")
+    fmt = _FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in CONVERT_FORMATS:
+        raise ValueError(f"不支持的格式: {name}")
+    return fmt
+
+
+def _merge_types(current: pa.DataType, new: pa.DataType) -> pa.DataType:
+    """合并两批数据推断出的列类型：整数与浮点合并为浮点，其他不一致的类型退化为字符串"""
+    if current == new or pa.types.is_null(new):
+        return current
+    if pa.types.is_null(current):
+        return new
+    if pa.types.is_integer(current) and pa.types.is_integer(new):
+        return pa.int64()
+    numeric = (pa.types.is_integer, pa.types.is_floating)
+    if any(check(current) for check in numeric) and any(check(new) for check in numeric):
+        return pa.float64()
+    return pa.string()
+
+
+def _infer_type(values: List[Any]) -> pa.DataType:
+    """推断一列值的类型，混合类型时为字符串"""
+    try:
+        return pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        return pa.string()
+
+
+def _to_text(value: Any) -> Optional[str]:
+    """把任意值转换为字符串，嵌套结构使用JSON"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=_json_default)
+    return str(value)
+
+
+def _json_default(value: Any) -> Any:
+    """JSON序列化无法直接处理的值"""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return str(value)
+
+
+def _clean_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """NaN不是合法的JSON，输出为null"""
+    return {key: None if isinstance(value, float) and value != value else value for key, value in record.items()}
+
+
+class RecordBatcher:
+    """把字典记录流转换为统一类型的记录批：第一遍推断列类型，第二遍转换"""
+
+    def __init__(self, open_records: Callable[[], Iterator[Dict[str, Any]]], batch_rows: int):
+        """
+        :param open_records: 每次调用返回一个新的记录迭代器
+        :param batch_rows: 每批的行数
+        """
+        self.open_records = open_records
+        self.batch_rows = batch_rows
+
+    def _batches(self) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for record in self.open_records():
+            batch.append(record)
+            if len(batch) >= self.batch_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def infer_schema(self) -> pa.Schema:
+        """扫描全部记录推断统一的列类型，列按首次出现的顺序排列"""
+        types: Dict[str, pa.DataType] = {}
+        for batch in self._batches():
+            names = list(dict.fromkeys(key for record in batch for key in record))
+            for name in names:
+                inferred = _infer_type([record.get(name) for record in batch])
+                types[name] = _merge_types(types[name], inferred) if name in types else inferred
+        # 全部为空的列按字符串输出
+        return pa.schema([(name, pa.string() if pa.types.is_null(t) else t) for name, t in types.items()])
+
+    def __iter__(self) -> Iterator[pa.RecordBatch]:
+        schema = self.infer_schema()
+        for batch in self._batches():
+            arrays = []
+            for field in schema:
+                values = [record.get(field.name) for record in batch]
+                if pa.types.is_string(field.type):
+                    values = [_to_text(value) for value in values]
+                arrays.append(pa.array(values, type=field.type))
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class FileConverter:
+    """流式文件格式转换"""
+
+    def __init__(
+        self,
+        source_path: str,
+        source_format: str,
+        target_path: str,
+        target_format: str,
+        compression: Optional[str] = None,
+        row_group_rows: int = 131072,
+        batch_rows: int = 65536,
+        block_bytes: int = 16 * 1024 * 1024,
+        encoding: str = "utf-8",
+        sheet: Optional[str] = None,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[[float], None]] = None
+    ):
+        """
+        :param source_path: 源文件路径
+        :param source_format: 源格式
+        :param target_path: 输出文件路径
+        :param target_format: 目标格式
+        :param compression: 压缩算法，Parquet默认zstd，文本格式支持gzip，XLSX不支持
+        :param row_group_rows: Parquet每个行组的行数
+        :param batch_rows: 每批读取的行数
+        :param block_bytes: 解析CSV时每块的字节数（列类型按第一块推断）
+        :param encoding: CSV源文件编码
+        :param sheet: XLSX源文件的工作表名，默认第一个
+        :raises ValueError: 格式或压缩算法不支持时
+        """
+        self.source_path = source_path
+        self.source_format = normalize_format(source_format)
+        self.target_path = Path(target_path)
+        self.target_format = normalize_format(target_format)
+        self.row_group_rows = row_group_rows
+        self.batch_rows = batch_rows
+        self.block_bytes = block_bytes
+        self.encoding = encoding
+        self.sheet = sheet
+        self.should_cancel = should_cancel or (lambda: False)
+        self.on_progress = on_progress or (lambda fraction: None)
+
+        if self.target_format == "parquet":
+            self.compression = (compression or "zstd").lower()
+            if self.compression not in PARQUET_COMPRESSIONS:
+                raise ValueError(f"Parquet不支持的压缩算法: {compression}")
+        elif self.target_format == "xlsx":
+            if compression not in (None, "none"):
+                raise ValueError("XLSX不支持额外压缩")
+            self.compression = "none"
+        else:
+            self.compression = (compression or "none").lower()
+            if self.compression not in TEXT_COMPRESSIONS:
+                raise ValueError(f"{self.target_format}不支持的压缩算法: {compression}")
+
+        self.rows = 0
+        self.batches = 0
+        self._csv_schema: Optional[pa.Schema] = None
+        self._csv_types: Optional[Dict[str, pa.DataType]] = None
+        self._source_size = max(os.path.getsize(source_path), 1)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        执行转换，先写临时文件，完成后替换为输出文件
+        :return: 转换统计
+        :raises ConversionCancelled: 任务被取消时
+        """
+        self.target_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.target_path.with_name(self.target_path.name + ".tmp")
+        try:
+            while True:
+                try:
+                    columns = self._write(self._counted(self._read()), temp_path)
+                    break
+                except pa.ArrowInvalid as e:
+                    # CSV的列类型按第一块推断，后面的值无法转换时放宽列类型后重新读取
+                    if self.source_format != "csv" or not self._widen_csv_types(str(e)):
+                        raise
+                    self.rows = self.batches = 0
+            os.replace(temp_path, self.target_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        return {
+            "source_format": self.source_format,
+            "target_format": self.target_format,
+            "compression": self.compression,
+            "rows": self.rows,
+            "batches": self.batches,
+            "columns": columns,
+            "source_size": self._source_size,
+            "converted_size": os.path.getsize(self.target_path)
+        }
+
+    def _widen_csv_types(self, error: str) -> bool:
+        """
+        放宽CSV的列类型：第一次把整数列改为浮点数，之后把无法转换的列（无法确定时所有非字符串列）改为字符串
+        :param error: 解析错误信息
+        :return: 是否放宽了列类型，没有可放宽的列时返回False
+        """
+        if self._csv_types is None:
+            self._csv_types = {
+                field.name: pa.float64() if pa.types.is_integer(field.type) else field.type
+                for field in self._csv_schema
+            }
+            return True
+
+        match = _CSV_ERROR_COLUMN_PATTERN.search(error)
+        if match and int(match.group(1)) < len(self._csv_schema):
+            names = [self._csv_schema.field(int(match.group(1))).name]
+        else:
+            names = list(self._csv_types)
+        names = [name for name in names if not pa.types.is_string(self._csv_types[name])]
+        for name in names:
+            self._csv_types[name] = pa.string()
+        return bool(names)
+
+    def _counted(self, batches: Iterator[pa.RecordBatch]) -> Iterator[pa.RecordBatch]:
+        for batch in batches:
+            if self.should_cancel():
+                raise ConversionCancelled()
+            self.rows += batch.num_rows
+            self.batches += 1
+            yield batch
+
+    # 读取端
+
+    def _read(self) -> Iterator[pa.RecordBatch]:
+        if self.source_format == "csv":
+            return self._read_csv()
+        if self.source_format == "parquet":
+            return self._read_parquet()
+        if self.source_format == "jsonl":
+            return iter(RecordBatcher(self._jsonl_records, self.batch_rows))
+        if self.source_format == "json":
+            return iter(RecordBatcher(self._json_array_records, self.batch_rows))
+        return iter(RecordBatcher(self._xlsx_records, self.batch_rows))
+
+    def _read_csv(self) -> Iterator[pa.RecordBatch]:
+        """按块解析CSV，空字符串视为空值"""
+        with open(self.source_path, "rb") as f:
+            reader = pa_csv.open_csv(
+                f,
+                read_options=pa_csv.ReadOptions(encoding=self.encoding, block_size=self.block_bytes),
+                convert_options=pa_csv.ConvertOptions(column_types=self._csv_types or {}, strings_can_be_null=True)
+            )
+            self._csv_schema = reader.schema
+            for batch in reader:
+                self.on_progress(min(f.tell() / self._source_size, 1.0))
+                yield batch
+
+    def _read_parquet(self) -> Iterator[pa.RecordBatch]:
+        parquet_file = pq.ParquetFile(self.source_path)
+        total = max(parquet_file.metadata.num_rows, 1)
+        read = 0
+        for batch in parquet_file.iter_batches(batch_size=self.batch_rows):
+            read += batch.num_rows
+            self.on_progress(min(read / total, 1.0))
+            yield batch
+
+    def _jsonl_records(self) -> Iterator[Dict[str, Any]]:
+        with open(self.source_path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"第 {line_number} 行不是JSON对象")
+                self._report_text_progress(f)
+                yield record
+
+    def _json_array_records(self) -> Iterator[Dict[str, Any]]:
+        """逐个解析顶层JSON数组的元素，不把整个文件读入内存"""
+        decoder = json.JSONDecoder()
+        with open(self.source_path, "r", encoding="utf-8") as f:
+            buffer = f.read(_JSON_READ_CHARS).lstrip()
+            if not buffer.startswith("["):
+                raise ValueError("JSON文件的顶层不是数组")
+            buffer = buffer[1:]
+            eof = False
+            while True:
+                buffer = buffer.lstrip().lstrip(",").lstrip()
+                while not buffer and not eof:
+                    chunk = f.read(_JSON_READ_CHARS)
+                    eof = not chunk
+                    buffer = chunk.lstrip().lstrip(",").lstrip()
+                if buffer.startswith("]"):
+                    return
+                if not buffer:
+                    raise ValueError("JSON数组没有结束")
+                try:
+                    record, end = decoder.raw_decode(buffer)
+                    # 数字等标量恰好在缓冲区末尾时可能被截断
+                    truncated = end == len(buffer) and not eof
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    truncated = True
+                if truncated:
+                    # 元素可能被读取边界截断，继续读取后重试
+                    chunk = f.read(_JSON_READ_CHARS)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+                if not isinstance(record, dict):
+                    record = {"value": record}
+                buffer = buffer[end:]
+                self._report_text_progress(f)
+                yield record
+
+    def _report_text_progress(self, f) -> None:
+        try:
+            self.on_progress(min(f.buffer.tell() / self._source_size, 1.0))
+        except (AttributeError, OSError):
+            pass
+
+    def _xlsx_records(self) -> Iterator[Dict[str, Any]]:
+        """以只读模式逐行读取工作表，第一行为表头"""
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(self.source_path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[self.sheet] if self.sheet else workbook.worksheets[0]
+            rows = worksheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            names = []
+            for index, name in enumerate(header):
+                name = str(name) if name is not None else f"column_{index + 1}"
+                while name in names:
+                    name = f"{name}_{index + 1}"
+                names.append(name)
+
+            total = max(worksheet.max_row or 0, 1)
+            for row_number, row in enumerate(rows, 2):
+                if row is None or all(value is None for value in row):
+                    continue
+                if row_number % self.batch_rows == 0:
+                    self.on_progress(min(row_number / total, 1.0))
+                yield dict(zip(names, row))
+        finally:
+            workbook.close()
+
+    # 写入端
+
+    def _write(self, batches: Iterator[pa.RecordBatch], path: Path) -> List[str]:
+        if self.target_format == "parquet":
+            return self._write_parquet(batches, path)
+        if self.target_format == "xlsx":
+            return self._write_xlsx(batches, path)
+        opener = gzip.open if self.compression == "gzip" else open
+        with opener(path, "wb") as f:
+            if self.target_format == "csv":
+                return self._write_csv(batches, f)
+            if self.target_format == "jsonl":
+                return self._write_jsonl(batches, f)
+            return self._write_json_array(batches, f)
+
+    def _write_parquet(self, batches: Iterator[pa.RecordBatch], path: Path) -> List[str]:
+        """按行组缓冲写入Parquet，并写入列统计"""
+        writer = None
+        buffer: List[pa.RecordBatch] = []
+        buffered = 0
+        schema = None
+        try:
+            for batch in batches:
+                if writer is None:
+                    schema = batch.schema
+                    writer = pq.ParquetWriter(path, schema, compression=self.compression, write_statistics=True)
+                buffer.append(batch)
+                buffered += batch.num_rows
+                if buffered >= self.row_group_rows:
+                    # 只写出整数个行组，余下的行留到下一次，保证行组大小一致
+                    table = pa.Table.from_batches(buffer, schema=schema)
+                    full = buffered - buffered % self.row_group_rows
+                    writer.write_table(table.slice(0, full), row_group_size=self.row_group_rows)
+                    buffer = table.slice(full).to_batches()
+                    buffered -= full
+            if writer is None:
+                # 没有数据时写入空文件
+                pq.write_table(pa.table({}), path, compression=self.compression)
+                return []
+            if buffer:
+                writer.write_table(pa.Table.from_batches(buffer, schema=schema), row_group_size=self.row_group_rows)
+            return schema.names
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _write_csv(self, batches: Iterator[pa.RecordBatch], f) -> List[str]:
+        """Arrow CSV写入器，嵌套列输出为JSON字符串"""
+        writer = None
+        columns: List[str] = []
+        try:
+            for batch in batches:
+                batch = self._flatten_nested(batch)
+                if writer is None:
+                    columns = batch.schema.names
+                    writer = pa_csv.CSVWriter(f, batch.schema)
+                writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return columns
+
+    def _write_jsonl(self, batches: Iterator[pa.RecordBatch], f) -> List[str]:
+        columns: List[str] = []
+        for batch in batches:
+            columns = columns or batch.schema.names
+            lines = [
+                json.dumps(_clean_record(record), ensure_ascii=False, default=_json_default)
+                for record in batch.to_pylist()
+            ]
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        return columns
+
+    def _write_json_array(self, batches: Iterator[pa.RecordBatch], f) -> List[str]:
+        columns: List[str] = []
+        first = True
+        f.write(b"[")
+        for batch in batches:
+            columns = columns or batch.schema.names
+            for record in batch.to_pylist():
+                f.write((b"\n" if first else b",\n") + json.dumps(
+                    _clean_record(record), ensure_ascii=False, default=_json_default
+                ).encode("utf-8"))
+                first = False
+        f.write(b"\n]\n" if not first else b"]\n")
+        return columns
+
+    def _write_xlsx(self, batches: Iterator[pa.RecordBatch], path: Path) -> List[str]:
+        """只写模式逐行写入XLSX，超过单个工作表的行数上限时写入新的工作表"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        worksheet = None
+        sheet_rows = 0
+        columns: List[str] = []
+        for batch in batches:
+            if not columns:
+                columns = batch.schema.names
+            for record in batch.to_pylist():
+                if worksheet is None or sheet_rows >= _XLSX_MAX_ROWS:
+                    worksheet = workbook.create_sheet(f"Sheet{len(workbook.worksheets) + 1}")
+                    worksheet.append(columns)
+                    sheet_rows = 1
+                worksheet.append([self._xlsx_value(record[column]) for column in columns])
+                sheet_rows += 1
+        if worksheet is None:
+            workbook.create_sheet("Sheet1").append(columns)
+        workbook.save(path)
+        return columns
+
+    @staticmethod
+    def _xlsx_value(value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=_json_default)
+        if isinstance(value, datetime.datetime) and value.tzinfo is not None:
+            # XLSX不支持时区
+            return value.replace(tzinfo=None)
+        if isinstance(value, float) and value != value:
+            return None
+        return value
+
+    @staticmethod
+    def _flatten_nested(batch: pa.RecordBatch) -> pa.RecordBatch:
+        """把列表、结构体等嵌套列转换为JSON字符串"""
+        nested = [
+            index for index, field in enumerate(batch.schema)
+            if pa.types.is_nested(field.type) or pa.types.is_dictionary(field.type)
+        ]
+        if not nested:
+            return batch
+        arrays = list(batch.columns)
+        fields = list(batch.schema)
+        for index in nested:
+            arrays[index] = pa.array([_to_text(value) for value in arrays[index].to_pylist()], type=pa.string())
+            fields[index] = pa.field(fields[index].name, pa.string())
+        return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields))
@@ -0,0 +1,541 @@
+"""
+文件数据源连接
+把当前数据流与另一个CSV文件数据源按键列连接，支持内连接（inner）、左连接（left）和反连接（anti）；
+较小的一侧能放入内存时用哈希连接（构建侧的键只分解一次，另一侧逐块探测），否则两侧先外部排序再归并连接
+"""
+import heapq
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterator, Callable
+
+import numpy as np
+import pandas as pd
+
+from core.processing.external_sort import external_sort
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOIN_TYPES = ["inner", "left", "anti"]
+JOIN_STRATEGIES = ["auto", "hash", "sort_merge"]
+
+HASH = "hash"
+SORT_MERGE = "sort_merge"
+
+# 反连接时标记是否匹配的辅助列
+_MATCH_COLUMN = "__join_match"
+# 倾斜统计中保留的最热键数量
+_TOP_KEYS = 5
+
+
+def parse_join(operation: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    解析连接操作
+    :param operation: 操作定义，source_id为另一个文件数据源的ID；
+                      on为两侧同名的键列，或用left_on/right_on分别指定；how为inner、left或anti；
+                      strategy为auto、hash或sort_merge；suffix为右侧重名列的后缀
+    :return: 连接定义
+    :raises ValueError: 参数无效时
+    """
+    source_id = operation.get("source_id")
+    if source_id is None:
+        raise ValueError("未指定要连接的数据源")
+
+    on = operation.get("on")
+    left_on = operation.get("left_on") or on
+    right_on = operation.get("right_on") or on
+    if isinstance(left_on, str):
+        left_on = [left_on]
+    if isinstance(right_on, str):
+        right_on = [right_on]
+    if not left_on or not right_on:
+        raise ValueError("未指定连接键")
+    if len(left_on) != len(right_on):
+        raise ValueError("left_on与right_on的列数不一致")
+
+    how = operation.get("how", "inner")
+    if how not in JOIN_TYPES:
+        raise ValueError(f"不支持的连接类型: {how}")
+    strategy = operation.get("strategy", "auto")
+    if strategy not in JOIN_STRATEGIES:
+        raise ValueError(f"不支持的连接策略: {strategy}")
+
+    return {
+        "source_id": source_id,
+        "left_on": list(left_on),
+        "right_on": list(right_on),
+        "how": how,
+        "strategy": strategy,
+        "suffix": operation.get("suffix", "_right")
+    }
+
+
+def describe_join(spec: Dict[str, Any], stats: Dict[str, Any]) -> str:
+    """生成连接操作的结果说明"""
+    strategy = "哈希连接" if stats["strategy"] == HASH else "排序归并连接"
+    keys = ", ".join(str(key) for key in spec["left_on"])
+    return (
+        f"已与数据源 {spec['source_id']} 按 {keys} 进行{spec['how']}连接（{strategy}），"
+        f"左侧 {stats['left_rows']} 行，右侧 {stats['right_rows']} 行，输出 {stats['output_rows']} 行"
+    )
+
+
+class KeySkewTracker:
+    """统计连接键的分布倾斜：不同键数、每个键的最大行数和最热的键"""
+
+    def __init__(self, top_keys: int = _TOP_KEYS):
+        self.top_keys = top_keys
+        self.distinct_keys = 0
+        self.rows = 0
+        self.max_rows = 0
+        self._heap: List[Tuple[int, int, Any]] = []
+        self._sequence = 0
+        # 有序输入时上一块末尾尚未结束的键
+        self._open_key: Optional[Tuple] = None
+        self._open_rows = 0
+
+    def _push(self, key: Any, rows: int) -> None:
+        self.distinct_keys += 1
+        self.rows += rows
+        self.max_rows = max(self.max_rows, rows)
+        self._sequence += 1
+        entry = (rows, -self._sequence, key)
+        if len(self._heap) < self.top_keys:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def add_counts(self, counts: pd.Series) -> None:
+        """
+        加入每个键的行数
+        :param counts: 以键为索引的行数
+        """
+        for key, rows in counts.items():
+            self._push(key, int(rows))
+
+    def add_sorted(self, keys: pd.DataFrame) -> None:
+        """
+        加入按键排序的一块数据，相同的键可能跨块
+        :param keys: 键列
+        """
+        if keys.empty:
+            return
+        counts = keys.groupby(list(keys.columns), sort=False).size()
+        items = [(key if isinstance(key, tuple) else (key,), int(rows)) for key, rows in counts.items()]
+        if self._open_key is not None:
+            if items[0][0] == self._open_key:
+                items[0] = (self._open_key, items[0][1] + self._open_rows)
+            else:
+                self._push(self._format(self._open_key), self._open_rows)
+        for key, rows in items[:-1]:
+            self._push(self._format(key), rows)
+        self._open_key, self._open_rows = items[-1]
+
+    def finish(self) -> None:
+        """结束有序输入"""
+        if self._open_key is not None:
+            self._push(self._format(self._open_key), self._open_rows)
+            self._open_key = None
+
+    @staticmethod
+    def _format(key: Tuple) -> Any:
+        return key[0] if len(key) == 1 else key
+
+    def summary(self) -> Dict[str, Any]:
+        """倾斜统计结果"""
+        mean_rows = self.rows / self.distinct_keys if self.distinct_keys else 0.0
+        top = sorted(self._heap, reverse=True)
+        return {
+            "distinct_keys": self.distinct_keys,
+            "max_rows_per_key": self.max_rows,
+            "mean_rows_per_key": round(mean_rows, 3),
+            "skew_ratio": round(self.max_rows / mean_rows, 3) if mean_rows else 0.0,
+            "top_keys": [
+                {"key": list(key) if isinstance(key, tuple) else key, "rows": rows}
+                for rows, _, key in top
+            ]
+        }
+
+
+class FileJoin:
+    """与另一个CSV文件的连接"""
+
+    def __init__(
+        self,
+        spec: Dict[str, Any],
+        right_path: str,
+        work_dir: Path,
+        right_encoding: str = "utf-8",
+        right_bytes: Optional[int] = None,
+        chunk_size: int = 100000,
+        build_bytes: int = 256 * 1024 * 1024,
+        sort_run_bytes: int = 128 * 1024 * 1024,
+        should_cancel: Optional[Callable[[], bool]] = None
+    ):
+        """
+        :param spec: 连接定义（parse_join的结果）
+        :param right_path: 右侧CSV文件路径
+        :param work_dir: 溢写目录
+        :param right_encoding: 右侧文件编码
+        :param right_bytes: 右侧数据加载到内存后的估计大小，未指定时使用文件大小
+        :param chunk_size: 读取右侧文件时每块的行数
+        :param build_bytes: 哈希连接构建侧允许占用的内存
+        :param sort_run_bytes: 排序归并连接时每个有序段占用的内存上限
+        """
+        self.spec = spec
+        self.left_on = spec["left_on"]
+        self.right_on = spec["right_on"]
+        self.how = spec["how"]
+        self.suffix = spec["suffix"]
+        self.right_path = right_path
+        self.work_dir = Path(work_dir)
+        self.right_encoding = right_encoding
+        self.right_bytes = right_bytes if right_bytes is not None else os.path.getsize(right_path)
+        self.chunk_size = chunk_size
+        self.build_bytes = build_bytes
+        self.sort_run_bytes = sort_run_bytes
+        self.should_cancel = should_cancel or (lambda: False)
+
+        self.right_columns: List[str] = pd.read_csv(right_path, encoding=right_encoding, nrows=0).columns.tolist()
+        self._numeric_keys: List[bool] = []
+        self._right_empty: Optional[pd.DataFrame] = None
+        self.skew = KeySkewTracker()
+        self.stats: Dict[str, Any] = {
+            "strategy": None,
+            "build_side": None,
+            "left_rows": 0,
+            "right_rows": 0,
+            "matched_left_rows": 0,
+            "output_rows": 0
+        }
+
+    def validate(self, left_columns: List[str]) -> None:
+        """
+        检查两侧的键列是否存在
+        :param left_columns: 左侧数据的列名
+        :raises ValueError: 列不存在时
+        """
+        missing = [column for column in self.left_on if column not in left_columns]
+        if missing:
+            raise ValueError(f"列不存在: {', '.join(str(column) for column in missing)}")
+        missing = [column for column in self.right_on if column not in self.right_columns]
+        if missing:
+            raise ValueError(f"连接数据源中列不存在: {', '.join(str(column) for column in missing)}")
+
+    def choose_strategy(self, left_bytes: Optional[int] = None) -> Tuple[str, str]:
+        """
+        选择连接策略和构建侧：右侧能放入内存时以右侧为构建侧做哈希连接；
+        内连接时左侧已知能放入内存也可以以左侧为构建侧；否则排序归并
+        :param left_bytes: 左侧数据占用的内存，未知（流式输入）时为None
+        :return: (策略, 构建侧)
+        """
+        strategy = self.spec["strategy"]
+        if strategy == SORT_MERGE:
+            return SORT_MERGE, None
+        if strategy == HASH or self.right_bytes <= self.build_bytes:
+            return HASH, "right"
+        if self.how == "inner" and left_bytes is not None and left_bytes <= self.build_bytes:
+            return HASH, "left"
+        return SORT_MERGE, None
+
+    def join(self, left_chunks: Iterator[pd.DataFrame], left_bytes: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        执行连接
+        :param left_chunks: 左侧数据块，第一块用于确定键的类型
+        :param left_bytes: 左侧数据占用的内存，左侧完整在内存中时传入
+        :return: 连接结果的数据块
+        """
+        first = next(left_chunks, None)
+        if first is None:
+            return
+
+        def restore() -> Iterator[pd.DataFrame]:
+            yield first
+            yield from left_chunks
+
+        right_first = pd.read_csv(self.right_path, encoding=self.right_encoding, nrows=self.chunk_size)
+        # 两侧都是数值的键按数值比较，否则按字符串比较
+        self._numeric_keys = [
+            pd.api.types.is_numeric_dtype(first[left]) and pd.api.types.is_numeric_dtype(right_first[right])
+            for left, right in zip(self.left_on, self.right_on)
+        ]
+        self._right_empty = self._normalize(right_first.iloc[:0].copy(), self.right_on)
+
+        strategy, build_side = self.choose_strategy(left_bytes)
+        self.stats["strategy"] = strategy
+        self.stats["build_side"] = build_side
+        logger.info(f"连接数据源 {self.spec['source_id']}: 策略 {strategy}，构建侧 {build_side}")
+
+        if strategy == HASH and build_side == "right":
+            chunks = self._hash_join(restore())
+        elif strategy == HASH:
+            chunks = self._hash_join_build_left(restore())
+        else:
+            chunks = self._sort_merge_join(restore())
+
+        for chunk in chunks:
+            self.stats["output_rows"] += len(chunk)
+            yield chunk
+
+    def summary(self) -> Dict[str, Any]:
+        """行数和倾斜统计"""
+        stats = dict(self.stats)
+        stats["unmatched_left_rows"] = stats["left_rows"] - stats["matched_left_rows"]
+        stats["key_skew"] = self.skew.summary()
+        return stats
+
+    def _read_right(self) -> Iterator[pd.DataFrame]:
+        """按块读取右侧文件，去掉键为空的行（空键不与任何行匹配）"""
+        for chunk in pd.read_csv(self.right_path, encoding=self.right_encoding, chunksize=self.chunk_size):
+            if self.should_cancel():
+                return
+            self.stats["right_rows"] += len(chunk)
+            chunk = self._normalize(chunk, self.right_on)
+            yield chunk.dropna(subset=self.right_on)
+
+    def _count_left(self, chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for chunk in chunks:
+            self.stats["left_rows"] += len(chunk)
+            yield self._normalize(chunk, self.left_on)
+
+    def _normalize(self, df: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+        """统一两侧键列的类型，空值保持为空"""
+        df = df.copy(deep=False)
+        for key, numeric in zip(keys, self._numeric_keys):
+            series = df[key]
+            if numeric:
+                df[key] = pd.to_numeric(series, errors="coerce")
+            else:
+                df[key] = series.astype(str).where(series.notnull())
+        return df
+
+    def _probe(self, left: pd.DataFrame, index: "_JoinIndex") -> pd.DataFrame:
+        """用一块左侧数据探测构建侧的键索引，保持左侧的顺序，与pandas merge的结果一致"""
+        codes = index.lookup(left, self.left_on)
+        matched = codes >= 0
+        self.stats["matched_left_rows"] += int(matched.sum())
+
+        left = left.reset_index(drop=True)
+        if self.how == "anti":
+            return left[~matched]
+
+        counts = np.zeros(len(codes), dtype=np.int64)
+        counts[matched] = index.counts[codes[matched]]
+        repeats = np.maximum(counts, 1) if self.how == "left" else counts
+        left_rows = np.repeat(np.arange(len(left)), repeats)
+        right_rows = index.rows(codes, repeats)
+
+        # 两侧同名的键列只保留左侧的一列，其余重名列给右侧加后缀
+        right_columns = [
+            column for column in index.right.columns
+            if not any(column == r and column == l for l, r in zip(self.left_on, self.right_on))
+        ]
+        right = index.right[right_columns]
+        right = right.reindex(right_rows) if (right_rows < 0).any() else right.iloc[right_rows]
+        right = right.rename(columns={
+            column: f"{column}{self.suffix}" for column in right_columns if column in left.columns
+        })
+        return pd.concat([left.iloc[left_rows].reset_index(drop=True), right.reset_index(drop=True)], axis=1)
+
+    def _hash_join(self, left_chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """以右侧为构建侧的哈希连接：构建侧的键只分解一次，左侧逐块探测，保持左侧的顺序"""
+        frames = list(self._read_right())
+        build = pd.concat(frames, ignore_index=True) if frames else self._right_empty
+        self.skew.add_counts(build.groupby(self.right_on, sort=False).size())
+        index = _JoinIndex(build, self.right_on)
+        del frames, build
+
+        for chunk in self._count_left(left_chunks):
+            if self.should_cancel():
+                return
+            yield self._probe(chunk, index)
+
+    def _hash_join_build_left(self, left_chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """内连接时以左侧为构建侧，右侧逐块探测"""
+        frames = list(self._count_left(left_chunks))
+        build = pd.concat(frames, ignore_index=True).dropna(subset=self.left_on).reset_index(drop=True)
+        build[_MATCH_COLUMN] = np.arange(len(build))
+        matched = np.zeros(len(build), dtype=bool)
+
+        for chunk in self._read_right():
+            if self.should_cancel():
+                return
+            self.skew.add_counts(chunk.groupby(self.right_on, sort=False).size())
+            joined = build.merge(chunk, how="inner", left_on=self.left_on, right_on=self.right_on, suffixes=("", self.suffix))
+            matched[joined[_MATCH_COLUMN].to_numpy()] = True
+            yield joined.drop(columns=[_MATCH_COLUMN])
+
+        self.stats["matched_left_rows"] = int(matched.sum())
+
+    def _sort_merge_join(self, left_chunks: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """两侧按键外部排序后归并连接，左侧键为空的行单独溢写并在最后输出"""
+        null_dir = self.work_dir / "left_nulls"
+        null_dir.mkdir(parents=True, exist_ok=True)
+        null_files: List[Path] = []
+
+        def left_keyed() -> Iterator[pd.DataFrame]:
+            for chunk in self._count_left(left_chunks):
+                if self.should_cancel():
+                    return
+                nulls = chunk[self.left_on].isnull().any(axis=1)
+                if nulls.any() and self.how != "inner":
+                    path = null_dir / f"{len(null_files):08d}.pkl"
+                    with open(path, "wb") as f:
+                        pickle.dump(chunk[nulls], f, protocol=pickle.HIGHEST_PROTOCOL)
+                    null_files.append(path)
+                yield chunk[~nulls]
+
+        def right_tracked() -> Iterator[pd.DataFrame]:
+            for chunk in external_sort(
+                self._read_right(), self.right_on, [True] * len(self.right_on),
+                run_dir=self.work_dir / "right_runs", run_bytes=self.sort_run_bytes
+            ):
+                self.skew.add_sorted(chunk[self.right_on])
+                yield chunk
+            self.skew.finish()
+
+        try:
+            left_sorted = external_sort(
+                left_keyed(), self.left_on, [True] * len(self.left_on),
+                run_dir=self.work_dir / "left_runs", run_bytes=self.sort_run_bytes
+            )
+            yield from self._merge(left_sorted, right_tracked())
+
+            for path in null_files:
+                with open(path, "rb") as f:
+                    nulls = pickle.load(f)
+                yield self._probe(nulls, _JoinIndex(self._right_empty, self.right_on))
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _merge(self, left_sorted: Iterator[pd.DataFrame], right_sorted: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """
+        归并两个有序数据流：每轮取两侧缓冲区末尾键的较小值作为边界，
+        小于边界的键在两侧都已读完整，可以连接输出；相同的键跨越多块时继续读取
+        """
+        left_buffer = None
+        right_buffer = self._right_empty
+        left_done = right_done = False
+
+        def last_key(df: pd.DataFrame, keys: List[str]) -> Tuple:
+            return tuple(df[keys].iloc[-1].tolist())
+
+        while True:
+            if self.should_cancel():
+                return
+            if not left_done and (left_buffer is None or left_buffer.empty):
+                batch = next(left_sorted, None)
+                if batch is None:
+                    left_done = True
+                else:
+                    left_buffer = batch if left_buffer is None else pd.concat([left_buffer, batch], ignore_index=True)
+            if not right_done and right_buffer.empty:
+                batch = next(right_sorted, None)
+                if batch is None:
+                    right_done = True
+                else:
+                    right_buffer = batch
+
+            if left_buffer is None or left_buffer.empty:
+                if left_done:
+                    # 右侧剩余的行不会出现在结果中，读完以完成统计
+                    for _ in right_sorted:
+                        pass
+                    return
+                continue
+
+            if right_done:
+                # 右侧已全部读入缓冲区，左侧剩余数据直接探测
+                index = _JoinIndex(right_buffer, self.right_on)
+                yield self._probe(left_buffer, index)
+                for batch in left_sorted:
+                    yield self._probe(batch, index)
+                return
+            if right_buffer.empty:
+                continue
+
+            bounds = [last_key(right_buffer, self.right_on)]
+            if not left_done:
+                bounds.append(last_key(left_buffer, self.left_on))
+            bound = min(bounds)
+
+            left_mask = _keys_before(left_buffer, self.left_on, bound)
+            right_mask = _keys_before(right_buffer, self.right_on, bound)
+            if left_mask.any():
+                yield self._probe(left_buffer[left_mask], _JoinIndex(right_buffer[right_mask], self.right_on))
+            left_buffer = left_buffer[~left_mask]
+            right_buffer = right_buffer[~right_mask]
+
+            if not left_mask.any() and not right_mask.any():
+                # 两侧缓冲区中都只剩边界键，读取末尾为边界键的一侧
+                if not left_done and last_key(left_buffer, self.left_on) == bound:
+                    batch = next(left_sorted, None)
+                    if batch is None:
+                        left_done = True
+                    else:
+                        left_buffer = pd.concat([left_buffer, batch], ignore_index=True)
+                if last_key(right_buffer, self.right_on) == bound:
+                    batch = next(right_sorted, None)
+                    if batch is None:
+                        right_done = True
+                    else:
+                        right_buffer = pd.concat([right_buffer, batch], ignore_index=True)
+
+
+class _JoinIndex:
+    """构建侧的键索引：键分解为整数编码，构建侧的行按编码分组，探测时只需查找左侧键的编码"""
+
+    def __init__(self, right: pd.DataFrame, keys: List[str]):
+        """
+        :param right: 构建侧数据（键不为空）
+        :param keys: 构建侧的键列
+        """
+        self.right = right.reset_index(drop=True)
+        codes, self.uniques = _key_index(self.right, keys).factorize()
+        order = np.argsort(codes, kind="stable")
+        self.order = order[codes[order] >= 0]
+        self.counts = np.bincount(codes[codes >= 0], minlength=len(self.uniques))
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def lookup(self, left: pd.DataFrame, keys: List[str]) -> np.ndarray:
+        """左侧每行的键编码，没有匹配的键（包括空值）为-1"""
+        if not len(self.uniques):
+            return np.full(len(left), -1, dtype=np.int64)
+        return self.uniques.get_indexer(_key_index(left, keys))
+
+    def rows(self, codes: np.ndarray, repeats: np.ndarray) -> np.ndarray:
+        """
+        展开每个左侧行匹配的构建侧行号（按构建侧原有顺序），左连接中没有匹配的行为-1
+        :param codes: 左侧每行的键编码
+        :param repeats: 左侧每行输出的行数
+        """
+        starts = np.full(len(codes), -1, dtype=np.int64)
+        starts[codes >= 0] = self.starts[codes[codes >= 0]]
+        starts = np.repeat(starts, repeats)
+        offsets = np.arange(len(starts)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        matched = starts >= 0
+        rows = np.full(len(starts), -1, dtype=np.int64)
+        rows[matched] = self.order[starts[matched] + offsets[matched]]
+        return rows
+
+
+def _key_index(df: pd.DataFrame, keys: List[str]) -> pd.Index:
+    """键列组成的索引，多列时为MultiIndex"""
+    if len(keys) == 1:
+        return pd.Index(df[keys[0]])
+    return pd.MultiIndex.from_frame(df[keys])
+
+
+def _keys_before(df: pd.DataFrame, keys: List[str], bound: Tuple) -> np.ndarray:
+    """按字典序判断每行的键是否小于边界"""
+    before = np.zeros(len(df), dtype=bool)
+    equal = np.ones(len(df), dtype=bool)
+    for key, value in zip(keys, bound):
+        column = df[key].to_numpy()
+        before |= equal & (column < value)
+        equal &= column == value
+    return before
@@ -3,25 +3,56 @@
 实现文件数据的嵌入和处理
 """
 import asyncio
+import hashlib
+import json
 import os
 import logging
 import pandas as pd
 import numpy as np
-import json
 import csv
 import re
 import shutil
+import uuid
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple, Union
 from sqlalchemy.orm import Session
 
 from models.domain.dataset import ProcessingTask, FileSource
 from core.processing.base import BaseDataProcessor
+from core.processing.memory_planner import memory_planner, IN_MEMORY, SAMPLED, CHUNKED
+from core.processing.dtype_optimizer import optimize_dtypes
+from core.processing.hash_aggregate import HashAggregator, parse_aggregations
+from core.processing.file_join import FileJoin, parse_join, describe_join
+from core.processing.parquet_shadow import parquet_shadow, pushdown_filters, required_columns
+from core.processing.file_converter import FileConverter, ConversionCancelled, normalize_format
+from core.processing.file_profiler import FileProfiler
+from core.processing.json_structure import JsonStructureAnalyzer
+from core.processing.profile_store import profile_store
+from core.processing.text_pipeline import StreamingTextPipeline, TextPipelineCancelled
+from core.processing.text_chunker import TextChunker
+from core.processing.embedders import create_embedder
+from core.processing.vector_store import vector_stores
+from core.processing.vector_index import vector_indexes, dataset_partition
+from core.processing.document_embedding import (
+    DocumentEmbeddingPipeline, EmbeddingCancelled, read_text_blocks, read_table_text_blocks
+)
+from core.processing.csv_pipeline import (
+    StreamingCsvPipeline, PipelineCancelled, OperationSkipped, is_row_operation, apply_row_operation,
+    get_sort_keys, describe_sort, describe_aggregation
+)
+from core.config import settings
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 按文本统计行数和字符的文件类型
+TEXT_FILE_TYPES = ["txt", "md", "csv", "json", "jsonl", "py", "js", "html", "css"]
+# 按流式JSON结构分析处理的文件类型（单个JSON值或JSON Lines）
+JSON_FILE_TYPES = ["json", "jsonl", "ndjson"]
+# 再次读取同一内容时可以直接指定、与pandas推断结果一致的列类型
+REUSABLE_CSV_DTYPES = ["int64", "float64", "bool", "object"]
+
 
 class FileProcessor(BaseDataProcessor):
     """文件处理器"""
@@ -111,28 +142,98 @@ class FileProcessor(BaseDataProcessor):
         raise ValueError(f"不支持的任务类型: {task.task_type}")
 
     async def _embed_file(self, task: ProcessingTask, data_source: FileSource, db: Session) -> Dict[str, Any]:
-        """嵌入文件数据"""
+        """
+        嵌入文件数据：按词元切分为有重叠的文本块，只为向量存储中没有的文本块计算嵌入
+        :param task: 处理任务
+        :param data_source: 文件数据源
+        :param db: 数据库会话
+        :return: 嵌入结果
+        """
         parameters = task.parameters or {}
         embed_model = parameters.get("embed_model")
+        file_path = data_source.file_path
+        file_type = data_source.file_type.lower() if data_source.file_type else ""
+        task_info = self.running_tasks.get(task.id)
 
-        # 模拟处理过程
-        for i in range(10):
-            # 检查是否请求取消
-            if task.id in self.running_tasks and self.running_tasks[task.id]["cancel_requested"]:
-                return {"status": "cancelled"}
+        def should_cancel() -> bool:
+            return bool(task_info and task_info["cancel_requested"])
 
-            # 模拟处理时间
-            await asyncio.sleep(0.5)
+        def on_progress(fraction: float) -> None:
+            # 在工作线程中只更新内存中的进度，不使用数据库会话
+            if task_info is not None:
+                task_info["progress"] = 10 + int(fraction * 85)
 
-            # 更新进度
-            progress = int((i + 1) / 10 * 100)
-            self.update_progress(task.id, progress, db)
+        try:
+            embedder = create_embedder(embed_model)
+            chunker = TextChunker(
+                chunk_tokens=parameters.get("chunk_tokens", settings.EMBED_CHUNK_TOKENS),
+                overlap_tokens=parameters.get("overlap_tokens", settings.EMBED_OVERLAP_TOKENS)
+            )
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        # 表格按行转换为文本，其他文本文件直接读取
+        if file_type == "csv":
+            encoding = self._detect_encoding(file_path, parameters.get("encoding"))
+            total = max(os.path.getsize(file_path), 1)
+
+            def csv_chunks():
+                with open(file_path, "rb") as raw:
+                    reader = pd.read_csv(raw, encoding=encoding, chunksize=settings.CSV_CHUNK_ROWS)
+                    for df in reader:
+                        yield df
+                        on_progress(min(raw.tell() / total, 1.0))
+
+            blocks = read_table_text_blocks(csv_chunks(), should_cancel=should_cancel)
+        elif file_type in ["xlsx", "xls"]:
+            blocks = read_table_text_blocks([pd.read_excel(file_path)], should_cancel=should_cancel)
+        elif file_type in TEXT_FILE_TYPES or file_type == "ndjson":
+            blocks = read_text_blocks(
+                file_path,
+                encoding=self._detect_encoding(file_path, parameters.get("encoding")),
+                block_chars=settings.TEXT_BLOCK_CHARS,
+                should_cancel=should_cancel,
+                on_progress=on_progress
+            )
+        else:
+            return {"success": False, "error": f"不支持嵌入的文件类型: {file_type}"}
+
+        self.update_progress(task.id, 10, db)
+
+        pipeline = DocumentEmbeddingPipeline(
+            document_id=str(data_source.id),
+            blocks=blocks,
+            embedder=embedder,
+            store=vector_stores.get(embedder.model),
+            chunker=chunker,
+            batch_size=parameters.get("batch_size", settings.EMBED_BATCH_SIZE),
+            concurrency=settings.EMBED_CONCURRENCY,
+            should_cancel=should_cancel
+        )
+        try:
+            result = await pipeline.run()
+            # 更新数据集分区的向量索引，只插入新增的文本块、删除不再存在的
+            dataset = data_source.dataset
+            result["index"] = await asyncio.to_thread(
+                vector_indexes.get(embedder.model).index_document,
+                dataset_partition(data_source.dataset_id), str(data_source.id), "file", data_source.id,
+                dataset.user_id if dataset else None
+            )
+        except EmbeddingCancelled:
+            return {"status": "cancelled"}
+        except Exception as e:
+            error_msg = f"嵌入文件时出错: {str(e)}"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
+
+        self.update_progress(task.id, 100, db)
 
-        # 返回处理结果
         return {
-            "embed_model": embed_model,
-            "vector_count": 1000,  # 模拟数据
-            "dimensions": 768,
+            "success": True,
+            **result,
+            "vector_count": result["chunk_count"],
+            "chunk_tokens": chunker.chunk_tokens,
+            "overlap_tokens": chunker.overlap_tokens,
             "file_type": data_source.file_type
         }
 
@@ -162,29 +263,90 @@ class FileProcessor(BaseDataProcessor):
         }
 
     async def _convert_file(self, task: ProcessingTask, data_source: FileSource, db: Session) -> Dict[str, Any]:
-        """转换文件格式"""
+        """
+        转换文件格式，读取端和写入端逐批流式处理，结果注册为同一数据集下的新文件数据源
+        :param task: 处理任务
+        :param data_source: 文件数据源
+        :param db: 数据库会话
+        :return: 转换结果
+        """
         parameters = task.parameters or {}
-        target_format = parameters.get("target_format")
+        task_info = self.running_tasks.get(task.id)
 
-        # 模拟处理过程
-        for i in range(3):
-            # 检查是否请求取消
-            if task.id in self.running_tasks and self.running_tasks[task.id]["cancel_requested"]:
-                return {"status": "cancelled"}
+        try:
+            source_format = normalize_format(data_source.file_type)
+            target_format = normalize_format(parameters.get("target_format"))
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        compression = parameters.get("compression")
+        extension = "json" if target_format == "json" else target_format
+        if target_format != "parquet" and (compression or "none").lower() == "gzip":
+            extension += ".gz"
+        output_path = settings.UPLOAD_DIR / f"{uuid.uuid4()}.{extension}"
+
+        # CSV源文件有Parquet影子副本时直接读取副本，省去CSV解析
+        source_path = data_source.file_path
+        shadow_path = parquet_shadow.get(source_path) if source_format == "csv" else None
+        if shadow_path is not None:
+            source_path, source_format = str(shadow_path), "parquet"
+
+        def should_cancel() -> bool:
+            return bool(task_info and task_info["cancel_requested"])
+
+        def on_progress(fraction: float) -> None:
+            # 在工作线程中只更新内存中的进度，不使用数据库会话
+            if task_info is not None:
+                task_info["progress"] = 10 + int(fraction * 80)
 
-            # 模拟处理时间
-            await asyncio.sleep(0.5)
+        try:
+            converter = FileConverter(
+                source_path, source_format, str(output_path), target_format,
+                compression=compression,
+                row_group_rows=int(parameters.get("row_group_size") or settings.CONVERT_ROW_GROUP_ROWS),
+                batch_rows=int(parameters.get("batch_rows") or settings.CONVERT_BATCH_ROWS),
+                encoding=self._detect_encoding(source_path, parameters.get("encoding")) if source_format == "csv" else "utf-8",
+                sheet=parameters.get("sheet"),
+                should_cancel=should_cancel,
+                on_progress=on_progress
+            )
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
 
-            # 更新进度
-            progress = int((i + 1) / 3 * 100)
-            self.update_progress(task.id, progress, db)
+        self.update_progress(task.id, 10, db)
+        try:
+            result = await asyncio.to_thread(converter.run)
+        except ConversionCancelled:
+            return {"status": "cancelled"}
+        except Exception as e:
+            error_msg = f"转换文件时出错: {str(e)}"
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
 
-        # 返回处理结果
-        return {
-            "source_format": data_source.file_type,
-            "target_format": target_format,
-            "converted_size": data_source.file_size * 0.8 if data_source.file_size else 1000  # 模拟数据
-        }
+        # 注册为新的文件数据源
+        output_source = FileSource(
+            name=parameters.get("output_name") or f"{data_source.name} ({target_format})",
+            description=f"由数据源 {data_source.id} 转换为 {target_format}",
+            dataset_id=data_source.dataset_id,
+            file_path=str(output_path),
+            file_type=target_format,
+            file_size=result["converted_size"]
+        )
+        db.add(output_source)
+        db.commit()
+        db.refresh(output_source)
+        if target_format == "csv" and result["compression"] == "none":
+            parquet_shadow.schedule(str(output_path))
+
+        self.update_progress(task.id, 100, db)
+        result.update({
+            "success": True,
+            "source_format": normalize_format(data_source.file_type),
+            "read_from_shadow": shadow_path is not None,
+            "output_path": str(output_path),
+            "output_source_id": output_source.id
+        })
+        return result
 
     async def _analyze_file(self, task: ProcessingTask, data_source: FileSource, db: Session) -> Dict[str, Any]:
         """
@@ -218,6 +380,28 @@ class FileProcessor(BaseDataProcessor):
             # 更新进度
             self.update_progress(task.id, 30, db)
 
+            # 相同内容用相同参数分析过时直接返回之前的结果；
+            # 基本分析本身就要计算哈希，只按大小和修改时间查找，其他分析按内容哈希查找（重新上传的相同文件也能命中）
+            if analysis_type not in ["basic", "content", "structure"]:
+                return {"success": False, "error": f"不支持的分析类型: {analysis_type}"}
+            cache_key = self._analysis_cache_key(analysis_type, file_type, parameters)
+            if analysis_type == "basic":
+                profile = profile_store.lookup(file_path) or {}
+            else:
+                profile = await asyncio.to_thread(profile_store.find, file_path)
+            if cache_key in profile:
+                analysis_result = profile[cache_key]
+                if analysis_type == "basic":
+                    analysis_result["permissions"] = oct(os.stat(file_path).st_mode)[-3:]
+                self.update_progress(task.id, 100, db)
+                return {
+                    "success": True,
+                    "analysis_type": analysis_type,
+                    "file_info": file_info,
+                    "analysis_result": analysis_result,
+                    "cached": True
+                }
+
             # 根据文件类型和分析类型执行不同的分析
             analysis_result = {}
 
@@ -231,10 +415,13 @@ class FileProcessor(BaseDataProcessor):
 
             elif analysis_type == "structure":
                 # 结构分析：CSV/JSON结构等
-                analysis_result = await self._structure_file_analysis(file_path, file_type)
+                analysis_result = await self._structure_file_analysis(file_path, file_type, parameters)
 
-            else:
-                return {"success": False, "error": f"不支持的分析类型: {analysis_type}"}
+            # 只保存基于全部数据、没有出错的结果
+            if self._is_complete_analysis(analysis_result):
+                await asyncio.to_thread(
+                    profile_store.update, file_path, {cache_key: analysis_result}, analysis_result.get("md5_hash")
+                )
 
             # 更新进度
             self.update_progress(task.id, 100, db)
@@ -252,6 +439,22 @@ class FileProcessor(BaseDataProcessor):
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
+    @staticmethod
+    def _analysis_cache_key(analysis_type: str, file_type: str, parameters: Dict[str, Any]) -> str:
+        """剖析结果中保存分析结果的字段名，包含影响结果的文件类型和任务参数"""
+        options = {key: value for key, value in parameters.items() if key != "analysis_type"}
+        digest = hashlib.md5(json.dumps(options, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:12]
+        return f"analysis:{analysis_type}:{file_type}:{digest}"
+
+    @staticmethod
+    def _is_complete_analysis(analysis_result: Dict[str, Any]) -> bool:
+        """分析结果是否可以保存：没有出错，也不是基于抽样数据"""
+        if "error" in analysis_result:
+            return False
+        if (analysis_result.get("execution_plan") or {}).get("mode") == SAMPLED:
+            return False
+        return not (analysis_result.get("structure_analysis") or {}).get("sampled")
+
     def _format_file_size(self, size_bytes: int) -> str:
         """
         格式化文件大小为人类可读格式
@@ -278,30 +481,14 @@ class FileProcessor(BaseDataProcessor):
 
         # 文件统计信息
         try:
-            # 计算行数（对于文本文件）
-            if file_type in ["txt", "md", "csv", "json", "py", "js", "html", "css"]:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    lines = f.readlines()
-                    result["line_count"] = len(lines)
-                    result["empty_line_count"] = sum(1 for line in lines if line.strip() == "")
-                    result["non_empty_line_count"] = result["line_count"] - result["empty_line_count"]
-
-                    # 计算平均行长度
-                    if result["non_empty_line_count"] > 0:
-                        total_chars = sum(len(line.strip()) for line in lines if line.strip() != "")
-                        result["avg_line_length"] = total_chars / result["non_empty_line_count"]
-                    else:
-                        result["avg_line_length"] = 0
-
-            # 文件哈希值（用于唯一标识）
-            import hashlib
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.md5()
-                chunk = f.read(8192)
-                while chunk:
-                    file_hash.update(chunk)
-                    chunk = f.read(8192)
-                result["md5_hash"] = file_hash.hexdigest()
+            # 一次遍历计算行数（对于文本文件）和文件哈希值（用于唯一标识）
+            text = file_type in TEXT_FILE_TYPES
+            profiler = FileProfiler(block_bytes=settings.PROFILE_BLOCK_BYTES, text=text)
+            profile = await asyncio.to_thread(profiler.profile, file_path)
+            if text:
+                for key in ("line_count", "empty_line_count", "non_empty_line_count", "avg_line_length"):
+                    result[key] = profile[key]
+            result["md5_hash"] = profile["md5_hash"]
 
             # 文件权限
             result["permissions"] = oct(os.stat(file_path).st_mode)[-3:]
@@ -321,36 +508,18 @@ class FileProcessor(BaseDataProcessor):
         result = {}
 
         try:
-            # 文本文件内容分析
-            if file_type in ["txt", "md", "csv", "json", "py", "js", "html", "css"]:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-
-                    # 字符统计
-                    result["char_count"] = len(content)
-                    result["letter_count"] = sum(c.isalpha() for c in content)
-                    result["digit_count"] = sum(c.isdigit() for c in content)
-                    result["whitespace_count"] = sum(c.isspace() for c in content)
-                    result["punctuation_count"] = sum(c in ".,;:!?-\"'()[]{}" for c in content)
-
-                    # 单词统计
-                    words = re.findall(r'\b\w+\b', content.lower())
-                    result["word_count"] = len(words)
-
-                    # 词频统计（前10个）
-                    from collections import Counter
-                    word_freq = Counter(words)
-                    result["top_words"] = [
-                        {"word": word, "count": count}
-                        for word, count in word_freq.most_common(10)
-                    ]
-
-                    # 检测编码
-                    import chardet
-                    with open(file_path, 'rb') as binary_file:
-                        raw_data = binary_file.read(10000)  # 只读取前10000字节进行检测
-                        encoding_result = chardet.detect(raw_data)
-                        result["detected_encoding"] = encoding_result
+            # 文本文件内容分析：字符统计、单词统计、词频和编码检测在一次遍历中完成
+            if file_type in TEXT_FILE_TYPES:
+                profiler = FileProfiler(
+                    block_bytes=settings.PROFILE_BLOCK_BYTES, words=True, top_words=10,
+                    word_capacity=settings.TOP_WORDS_CAPACITY
+                )
+                profile = await asyncio.to_thread(profiler.profile, file_path)
+                for key in (
+                    "char_count", "letter_count", "digit_count", "whitespace_count", "punctuation_count",
+                    "word_count", "top_words", "top_words_max_error", "detected_encoding"
+                ):
+                    result[key] = profile[key]
 
             # CSV文件特定分析
             elif file_type == "csv":
@@ -361,28 +530,264 @@ class FileProcessor(BaseDataProcessor):
                 result["null_counts"] = {col: int(df[col].isnull().sum()) for col in df.columns}
                 result["sample_rows"] = df.head(5).to_dict(orient="records")
 
-            # JSON文件特定分析
-            elif file_type == "json":
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    json_data = json.load(f)
-
-                    if isinstance(json_data, list):
-                        result["structure"] = "array"
-                        result["array_length"] = len(json_data)
-                        if json_data and isinstance(json_data[0], dict):
-                            result["sample_keys"] = list(json_data[0].keys())
-                    elif isinstance(json_data, dict):
-                        result["structure"] = "object"
-                        result["top_level_keys"] = list(json_data.keys())
-                    else:
-                        result["structure"] = "primitive"
-                        result["value_type"] = type(json_data).__name__
+            # JSON文件特定分析（流式解析，不把整个文件读入内存）
+            if file_type in JSON_FILE_TYPES:
+                analyzer = JsonStructureAnalyzer(
+                    max_value_chars=settings.JSON_MAX_VALUE_CHARS, max_paths=settings.JSON_MAX_PATHS
+                )
+                summary = await asyncio.to_thread(analyzer.analyze, file_path)
+                root = summary["schema"][0]
+                result["format"] = summary["format"]
+                if summary["format"] == "jsonl":
+                    result["structure"] = "records"
+                    result["record_count"] = summary["record_count"]
+                    result["sample_keys"] = root.get("keys", [])
+                elif summary["root_type"] == "array":
+                    result["structure"] = "array"
+                    result["array_length"] = summary["root_array_length"]
+                    items = next((entry for entry in summary["schema"] if entry["path"] == "$[]"), {})
+                    result["sample_keys"] = items.get("keys", [])
+                elif summary["root_type"] == "object":
+                    result["structure"] = "object"
+                    result["top_level_keys"] = root.get("keys", [])
+                else:
+                    result["structure"] = "primitive"
+                    result["value_type"] = summary["root_type"]
 
         except Exception as e:
             result["error"] = f"内容分析时出错: {str(e)}"
 
         return result
 
+    def _read_csv_sample(self, file_path: str, fraction: float, **kwargs) -> pd.DataFrame:
+        """
+        按比例随机抽样读取CSV，被跳过的行不会进入内存
+        :param file_path: 文件路径
+        :param fraction: 抽样比例，不小于1时读取全部
+        :return: 数据框
+        """
+        if fraction >= 1.0:
+            return pd.read_csv(file_path, **kwargs)
+        rng = np.random.default_rng()
+        return pd.read_csv(file_path, skiprows=lambda i: i > 0 and rng.random() >= fraction, **kwargs)
+
+    def _get_output_path(self, data_source: FileSource, parameters: Dict[str, Any], extension: str) -> str:
+        """
+        获取处理结果的输出路径并确保目录存在
+        上传的文件按内容共享存储，未指定输出路径时按数据源ID在上传目录下生成，不写在源文件旁边
+        :param data_source: 文件数据源
+        :param parameters: 任务参数
+        :param extension: 默认输出文件的扩展名（例如 .csv）
+        :return: 输出路径
+        :raises ValueError: 指定的输出路径位于共享的文件存储目录中时
+        """
+        output_path = parameters.get("output_path")
+        if output_path:
+            resolved = Path(output_path).resolve()
+            blob_dir = Path(settings.BLOB_DIR).resolve()
+            if resolved == blob_dir or blob_dir in resolved.parents:
+                raise ValueError("输出路径不能位于共享的文件存储目录中")
+        else:
+            output_path = str(settings.UPLOAD_DIR / "processed" / f"{data_source.id}_processed{extension}")
+
+        # 确保输出目录存在
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        return output_path
+
+    def _detect_encoding(self, file_path: str, encoding: Optional[str] = None) -> str:
+        """
+        检测文件编码：指定编码优先，文件开头能按UTF-8解码时使用UTF-8，否则用chardet检测
+        :param file_path: 文件路径
+        :param encoding: 指定的编码
+        :return: 编码
+        """
+        if encoding:
+            return encoding
+        # 文件没有变化时使用之前检测的结果
+        profile = profile_store.lookup(file_path)
+        if profile and profile.get("encoding"):
+            return profile["encoding"]
+
+        with open(file_path, 'rb') as f:
+            head = f.read(1024 * 1024)
+        try:
+            # 末尾可能截断了多字节字符
+            head.decode("utf-8")
+            detected = "utf-8"
+        except UnicodeDecodeError as e:
+            if e.start >= len(head) - 3:
+                detected = "utf-8"
+            else:
+                import chardet
+                detected = chardet.detect(head[:10000])['encoding'] or "utf-8"
+        profile_store.schedule_update(file_path, {"encoding": detected})
+        return detected
+
+    def _known_csv_dtypes(self, file_path: str, encoding: str) -> Optional[Dict[str, str]]:
+        """
+        之前用相同编码读取同一内容时推断出的列类型
+        :param file_path: 文件路径
+        :param encoding: 本次读取使用的编码
+        :return: 列名 -> 类型，没有记录或包含不能直接指定的类型时返回None
+        """
+        profile = profile_store.lookup(file_path)
+        if not profile or profile.get("csv_encoding") != encoding or not profile.get("csv_dtypes"):
+            return None
+        dtypes = profile["csv_dtypes"]
+        if any(dtype not in REUSABLE_CSV_DTYPES for dtype in dtypes.values()):
+            return None
+        return dtypes
+
+    def _resolve_join_sources(self, operations: List[Dict[str, Any]], data_source: FileSource, db: Session) -> Dict[str, Dict[str, Any]]:
+        """
+        查找连接操作引用的CSV文件数据源，只允许连接同一用户的数据源
+        :param operations: 操作列表
+        :param data_source: 当前文件数据源
+        :param db: 数据库会话
+        :return: str(source_id) -> {"file_path": 文件路径, "encoding": 编码, "estimated_bytes": 估计内存}，不可用的数据源不包含在内
+        """
+        owner_id = data_source.dataset.user_id if data_source.dataset else None
+        sources = {}
+        for operation in operations:
+            source_id = operation.get("source_id") if operation.get("type") == "join" else None
+            if source_id is None or str(source_id) in sources:
+                continue
+            join_source = db.query(FileSource).filter(FileSource.id == source_id).first()
+            if not join_source or (join_source.file_type or "").lower() != "csv":
+                continue
+            if (join_source.dataset.user_id if join_source.dataset else None) != owner_id:
+                continue
+            if not os.path.exists(join_source.file_path):
+                continue
+            sources[str(source_id)] = {
+                "file_path": join_source.file_path,
+                "encoding": self._detect_encoding(join_source.file_path),
+                "estimated_bytes": memory_planner.estimate_file(join_source.file_path, "csv", join_source.file_size)
+            }
+        return sources
+
+    def _read_csv_shadow(
+        self,
+        file_path: str,
+        operations: List[Dict[str, Any]]
+    ) -> Optional[Tuple[pd.DataFrame, Tuple[int, int], List[str], Dict[int, Dict[str, Any]]]]:
+        """
+        从Parquet影子副本读取CSV处理需要的数据
+        :param file_path: 源文件路径
+        :param operations: 操作列表
+        :return: (数据框, 原始形状, 原始列, 已下推的过滤操作结果)，没有副本或读取失败时返回None
+        """
+        schema = parquet_shadow.schema(file_path)
+        statistics = parquet_shadow.statistics(file_path) if schema is not None else None
+        if statistics is None:
+            return None
+
+        original_columns = schema.names
+        original_shape = (statistics["row_count"], len(original_columns))
+        filters, pushed = pushdown_filters(operations, schema)
+        columns = required_columns(operations, original_columns)
+        try:
+            df = parquet_shadow.read(file_path, columns=columns, filters=filters)
+        except Exception as e:
+            logger.warning(f"读取Parquet副本失败，改为读取CSV: {str(e)}")
+            return None
+        if df is None:
+            return None
+
+        pushed_results = {}
+        for i in range(pushed):
+            pushed_results[i] = {"operation": operations[i], "applied": True, "pushed_down": True, "message": "已下推到Parquet读取"}
+        if pushed:
+            pushed_results[pushed - 1]["message"] = f"已过滤 {original_shape[0] - len(df)} 行数据" + (
+                f"（{pushed} 个过滤条件合并下推到Parquet读取）" if pushed > 1 else "（已下推到Parquet读取）"
+            )
+        return df, original_shape, original_columns, pushed_results
+
+    async def _process_csv_streaming(
+        self,
+        task: ProcessingTask,
+        file_path: str,
+        output_path: str,
+        parameters: Dict[str, Any],
+        plan: Dict[str, Any],
+        join_sources: Dict[str, Dict[str, Any]],
+        db: Session
+    ) -> Dict[str, Any]:
+        """
+        按块流式处理CSV文件，内存占用与文件大小无关
+        :param task: 处理任务
+        :param file_path: 文件路径
+        :param output_path: 输出路径
+        :param parameters: 任务参数
+        :param plan: 执行计划
+        :param join_sources: 连接操作引用的数据源
+        :param db: 数据库会话
+        :return: 处理结果
+        """
+        task_info = self.running_tasks.get(task.id)
+
+        def should_cancel() -> bool:
+            return bool(task_info and task_info["cancel_requested"])
+
+        def on_progress(fraction: float) -> None:
+            # 在工作线程中只更新内存中的进度，不使用数据库会话
+            if task_info is not None:
+                task_info["progress"] = 30 + int(fraction * 60)
+
+        # 没有影子副本时按整个文件的列类型读取各块，文件没有变化时使用之前推断的列类型
+        encoding = self._detect_encoding(file_path, parameters.get("encoding"))
+        shadow_path = parquet_shadow.get(file_path)
+        known_dtypes = self._known_csv_dtypes(file_path, encoding) if shadow_path is None else None
+
+        pipeline = StreamingCsvPipeline(
+            file_path=file_path,
+            output_path=output_path,
+            operations=parameters.get("operations", []),
+            chunk_size=int(parameters.get("chunk_size") or settings.CSV_CHUNK_ROWS),
+            encoding=encoding,
+            spill_dir=settings.SPILL_DIR,
+            sort_run_bytes=settings.EXTERNAL_SORT_RUN_BYTES,
+            aggregate_state_rows=settings.HASH_AGGREGATE_STATE_ROWS,
+            join_sources=join_sources,
+            join_build_bytes=settings.JOIN_BUILD_BYTES,
+            shadow_path=shadow_path,
+            dtypes=known_dtypes,
+            should_cancel=should_cancel,
+            on_progress=on_progress
+        )
+
+        self.update_progress(task.id, 30, db)
+        try:
+            result = await asyncio.to_thread(pipeline.run)
+        except PipelineCancelled:
+            return {"status": "cancelled"}
+        self.update_progress(task.id, 100, db)
+
+        if shadow_path is None and known_dtypes is None and pipeline.dtypes is not None:
+            profile_store.schedule_update(file_path, {
+                "csv_encoding": encoding,
+                "delimiter": ",",
+                "columns": result["original_columns"],
+                "csv_dtypes": pipeline.dtypes,
+                "row_count": result["original_rows"]
+            })
+
+        original_columns = result["original_columns"]
+        processed_columns = result["processed_columns"]
+        return {
+            "success": True,
+            "original_rows": result["original_rows"],
+            "original_columns": original_columns,
+            "processed_rows": result["processed_rows"],
+            "processed_columns": processed_columns,
+            "added_columns": [col for col in processed_columns if col not in original_columns],
+            "removed_columns": [col for col in original_columns if col not in processed_columns],
+            "operation_results": result["operation_results"],
+            "output_path": output_path,
+            "execution_plan": plan,
+            "sample_data": result["sample_data"]
+        }
+
     async def _process_csv(self, task: ProcessingTask, data_source: FileSource, db: Session) -> Dict[str, Any]:
         """
         处理CSV文件
@@ -403,26 +808,58 @@ class FileProcessor(BaseDataProcessor):
             # 检查文件类型
             if data_source.file_type.lower() != "csv":
                 return {"success": False, "error": "文件类型不是CSV"}
-
-            # 读取CSV文件
-            try:
-                # 尝试自动检测编码
-                encoding = parameters.get("encoding", "utf-8")
-                df = pd.read_csv(file_path, encoding=encoding)
-            except UnicodeDecodeError:
-                # 如果UTF-8解码失败，尝试其他编码
+            output_path = self._get_output_path(data_source, parameters, ".csv")
+
+            # 超出内存预算时按块流式处理
+            plan = memory_planner.plan(
+                memory_planner.estimate_file(file_path, "csv", data_source.file_size),
+                [IN_MEMORY, CHUNKED],
+                parameters
+            )
+            if plan["mode"] is None:
+                return {"success": False, "error": f"无法处理CSV文件: {plan['reason']}", "execution_plan": plan}
+            join_sources = self._resolve_join_sources(operations, data_source, db)
+            if plan["mode"] == CHUNKED:
+                return await self._process_csv_streaming(task, file_path, output_path, parameters, plan, join_sources, db)
+
+            # 有Parquet影子副本时只读取需要的列，开头的过滤条件下推到行组
+            shadow = await asyncio.to_thread(self._read_csv_shadow, file_path, operations)
+            pushed_results: Dict[int, Dict[str, Any]] = {}
+            if shadow is not None:
+                df, original_shape, original_columns, pushed_results = shadow
+            else:
+                # 读取CSV文件，文件没有变化时使用之前推断的列类型，跳过类型推断
                 try:
-                    import chardet
-                    with open(file_path, 'rb') as f:
-                        result = chardet.detect(f.read(10000))
-                    encoding = result['encoding']
-                    df = pd.read_csv(file_path, encoding=encoding)
-                except Exception as e:
-                    return {"success": False, "error": f"无法读取CSV文件: {str(e)}"}
-
-            # 记录原始数据信息
-            original_shape = df.shape
-            original_columns = df.columns.tolist()
+                    encoding = self._detect_encoding(file_path, parameters.get("encoding"))
+                    known_dtypes = self._known_csv_dtypes(file_path, encoding)
+                    df = pd.read_csv(file_path, encoding=encoding, dtype=known_dtypes)
+                    if known_dtypes is None:
+                        profile_store.schedule_update(file_path, {
+                            "csv_encoding": encoding,
+                            "delimiter": ",",
+                            "columns": df.columns.tolist(),
+                            "csv_dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
+                            "row_count": len(df)
+                        })
+                except UnicodeDecodeError:
+                    # 如果UTF-8解码失败，尝试其他编码
+                    try:
+                        import chardet
+                        with open(file_path, 'rb') as f:
+                            result = chardet.detect(f.read(10000))
+                        encoding = result['encoding']
+                        df = pd.read_csv(file_path, encoding=encoding)
+                    except Exception as e:
+                        return {"success": False, "error": f"无法读取CSV文件: {str(e)}"}
+
+                # 记录原始数据信息
+                original_shape = df.shape
+                original_columns = df.columns.tolist()
+
+            # 按需压缩数据类型（category列填充新值等操作需要注意类型）
+            dtype_report = None
+            if parameters.get("optimize_dtypes", False):
+                df, dtype_report = await asyncio.to_thread(optimize_dtypes, df)
 
             # 更新进度
             self.update_progress(task.id, 30, db)
@@ -436,6 +873,11 @@ class FileProcessor(BaseDataProcessor):
                 if task.id in self.running_tasks and self.running_tasks[task.id]["cancel_requested"]:
                     return {"status": "cancelled"}
 
+                if i in pushed_results:
+                    # 已在读取影子副本时过滤
+                    operation_results.append(pushed_results[i])
+                    continue
+
                 # 获取操作信息
                 operation_type = operation.get("type")
 
@@ -443,92 +885,100 @@ class FileProcessor(BaseDataProcessor):
                 result = {"operation": operation, "applied": False, "message": ""}
 
                 try:
-                    if operation_type == "filter_rows":
-                        # 过滤行
-                        column = operation.get("column")
-                        condition = operation.get("condition")  # eq, ne, gt, lt, contains, etc.
-                        value = operation.get("value")
-
-                        if column not in df.columns:
-                            result["message"] = f"列 {column} 不存在"
-                            continue
-
-                        old_count = len(df)
-
-                        if condition == "eq":
-                            df = df[df[column] == value]
-                        elif condition == "ne":
-                            df = df[df[column] != value]
-                        elif condition == "gt":
-                            df = df[df[column] > value]
-                        elif condition == "lt":
-                            df = df[df[column] < value]
-                        elif condition == "contains":
-                            df = df[df[column].astype(str).str.contains(str(value), na=False)]
-                        elif condition == "not_contains":
-                            df = df[~df[column].astype(str).str.contains(str(value), na=False)]
-                        elif condition == "is_null":
-                            df = df[df[column].isnull()]
-                        elif condition == "is_not_null":
-                            df = df[df[column].notnull()]
-                        else:
-                            result["message"] = f"不支持的条件: {condition}"
+                    if is_row_operation(operation):
+                        # 行级操作，与流式模式共用实现
+                        try:
+                            df, result["message"] = apply_row_operation(df, operation)
+                        except OperationSkipped as e:
+                            result["message"] = str(e)
                             continue
 
-                        new_count = len(df)
                         result["applied"] = True
-                        result["message"] = f"已过滤 {old_count - new_count} 行数据"
 
-                    elif operation_type == "select_columns":
-                        # 选择列
-                        columns = operation.get("columns", [])
+                    elif operation_type == "sort":
+                        # 排序（支持多列，每列可以指定升序或降序）
+                        try:
+                            columns, ascending = get_sort_keys(operation)
+                        except OperationSkipped as e:
+                            result["message"] = str(e)
+                            continue
 
-                        # 检查列是否存在
                         missing_columns = [col for col in columns if col not in df.columns]
                         if missing_columns:
-                            result["message"] = f"列不存在: {', '.join(missing_columns)}"
+                            result["message"] = f"列 {', '.join(str(col) for col in missing_columns)} 不存在"
                             continue
 
-                        old_columns = df.columns.tolist()
-                        df = df[columns]
+                        df = df.sort_values(by=columns, ascending=ascending, kind="mergesort")
 
                         result["applied"] = True
-                        result["message"] = f"已选择 {len(columns)} 列，移除 {len(old_columns) - len(columns)} 列"
+                        result["message"] = describe_sort(columns, ascending)
 
-                    elif operation_type == "rename_columns":
-                        # 重命名列
-                        rename_map = operation.get("rename_map", {})
+                    elif operation_type in ("group_by", "aggregate"):
+                        # 分组聚合，与流式模式共用哈希聚合实现，结果替换当前数据
+                        try:
+                            keys, aggregations = parse_aggregations(operation)
+                        except ValueError as e:
+                            result["message"] = str(e)
+                            continue
 
-                        # 检查列是否存在
-                        missing_columns = [col for col in rename_map.keys() if col not in df.columns]
-                        if missing_columns:
-                            result["message"] = f"列不存在: {', '.join(missing_columns)}"
+                        aggregator = HashAggregator(
+                            keys, aggregations,
+                            spill_dir=settings.SPILL_DIR / f"aggregate_{task.id}_{i}",
+                            max_state_rows=settings.HASH_AGGREGATE_STATE_ROWS
+                        )
+                        try:
+                            aggregator.validate(df.columns.tolist())
+                        except ValueError as e:
+                            result["message"] = str(e)
                             continue
 
-                        df = df.rename(columns=rename_map)
+                        aggregator.add(df)
+                        df = pd.concat(list(aggregator.results()), ignore_index=True)
 
                         result["applied"] = True
-                        result["message"] = f"已重命名 {len(rename_map)} 列"
+                        result["message"] = describe_aggregation(keys, aggregations, len(df), aggregator.spilled)
 
-                    elif operation_type == "sort":
-                        # 排序
-                        column = operation.get("column")
-                        ascending = operation.get("ascending", True)
+                    elif operation_type == "join":
+                        # 与另一个文件数据源连接，当前数据已在内存中，内连接时也可以作为哈希连接的构建侧
+                        try:
+                            spec = parse_join(operation)
+                        except ValueError as e:
+                            result["message"] = str(e)
+                            continue
 
-                        if column not in df.columns:
-                            result["message"] = f"列 {column} 不存在"
+                        source = join_sources.get(str(spec["source_id"]))
+                        if source is None:
+                            result["message"] = f"连接的数据源不存在或不可用: {spec['source_id']}"
                             continue
 
-                        df = df.sort_values(by=column, ascending=ascending)
+                        joiner = FileJoin(
+                            spec, source["file_path"],
+                            work_dir=settings.SPILL_DIR / f"join_{task.id}_{i}",
+                            right_encoding=source["encoding"],
+                            right_bytes=source["estimated_bytes"],
+                            chunk_size=settings.CSV_CHUNK_ROWS,
+                            build_bytes=settings.JOIN_BUILD_BYTES,
+                            sort_run_bytes=settings.EXTERNAL_SORT_RUN_BYTES
+                        )
+                        try:
+                            joiner.validate(df.columns.tolist())
+                        except ValueError as e:
+                            result["message"] = str(e)
+                            continue
 
+                        left_bytes = int(df.memory_usage(deep=True).sum())
+                        chunks = await asyncio.to_thread(lambda: list(joiner.join(iter([df]), left_bytes=left_bytes)))
+                        df = pd.concat(chunks, ignore_index=True) if chunks else df.iloc[:0]
+
+                        stats = joiner.summary()
                         result["applied"] = True
-                        result["message"] = f"已按列 {column} {'升序' if ascending else '降序'} 排序"
+                        result["join_stats"] = stats
+                        result["message"] = describe_join(spec, stats)
 
                     elif operation_type == "fill_nulls":
-                        # 填充空值
+                        # 按统计量填充空值（用常量填充属于行级操作）
                         column = operation.get("column")
-                        method = operation.get("method", "value")  # value, mean, median, mode
-                        value = operation.get("value")
+                        method = operation.get("method")  # mean, median, mode
 
                         if column not in df.columns:
                             result["message"] = f"列 {column} 不存在"
@@ -536,9 +986,7 @@ class FileProcessor(BaseDataProcessor):
 
                         null_count = df[column].isnull().sum()
 
-                        if method == "value" and value is not None:
-                            df[column] = df[column].fillna(value)
-                        elif method == "mean" and pd.api.types.is_numeric_dtype(df[column]):
+                        if method == "mean" and pd.api.types.is_numeric_dtype(df[column]):
                             df[column] = df[column].fillna(df[column].mean())
                         elif method == "median" and pd.api.types.is_numeric_dtype(df[column]):
                             df[column] = df[column].fillna(df[column].median())
@@ -551,27 +999,6 @@ class FileProcessor(BaseDataProcessor):
                         result["applied"] = True
                         result["message"] = f"已填充 {null_count} 个空值"
 
-                    elif operation_type == "create_column":
-                        # 创建新列
-                        new_column = operation.get("new_column")
-                        expression = operation.get("expression")
-
-                        if not expression:
-                            result["message"] = "未指定表达式"
-                            continue
-
-                        # 使用eval执行表达式（注意：这在生产环境中可能存在安全风险）
-                        try:
-                            # 创建一个局部命名空间，包含df和常用库
-                            local_dict = {"df": df, "np": np, "pd": pd}
-                            # 执行表达式
-                            df[new_column] = eval(expression, {"__builtins__": {}}, local_dict)
-                            result["applied"] = True
-                            result["message"] = f"已创建新列 {new_column}"
-                        except Exception as e:
-                            result["message"] = f"表达式执行失败: {str(e)}"
-                            continue
-
                     elif operation_type == "drop_duplicates":
                         # 删除重复行
                         subset = operation.get("subset", None)  # 可以指定基于哪些列去重
@@ -583,30 +1010,6 @@ class FileProcessor(BaseDataProcessor):
                         result["applied"] = True
                         result["message"] = f"已删除 {old_count - new_count} 条重复记录"
 
-                    elif operation_type == "convert_type":
-                        # 转换数据类型
-                        column = operation.get("column")
-                        target_type = operation.get("target_type")  # int, float, str, datetime
-
-                        if column not in df.columns:
-                            result["message"] = f"列 {column} 不存在"
-                            continue
-
-                        if target_type == "int":
-                            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
-                        elif target_type == "float":
-                            df[column] = pd.to_numeric(df[column], errors='coerce')
-                        elif target_type == "str":
-                            df[column] = df[column].astype(str)
-                        elif target_type == "datetime":
-                            df[column] = pd.to_datetime(df[column], errors='coerce')
-                        else:
-                            result["message"] = f"不支持的目标类型: {target_type}"
-                            continue
-
-                        result["applied"] = True
-                        result["message"] = f"已将列 {column} 转换为 {target_type} 类型"
-
                     else:
                         result["message"] = f"不支持的操作类型: {operation_type}"
 
@@ -619,18 +1022,6 @@ class FileProcessor(BaseDataProcessor):
                 progress = 30 + int((i + 1) / total_steps * 60)
                 self.update_progress(task.id, progress, db)
 
-            # 保存处理后的CSV文件
-            output_path = parameters.get("output_path")
-            if not output_path:
-                # 如果未指定输出路径，则在原文件旁边创建一个新文件
-                file_dir = os.path.dirname(file_path)
-                file_name = os.path.basename(file_path)
-                file_name_without_ext = os.path.splitext(file_name)[0]
-                output_path = os.path.join(file_dir, f"{file_name_without_ext}_processed.csv")
-
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
             # 保存处理后的CSV文件
             df.to_csv(output_path, index=False, encoding='utf-8')
 
@@ -652,6 +1043,8 @@ class FileProcessor(BaseDataProcessor):
                 "removed_columns": [col for col in original_columns if col not in processed_columns],
                 "operation_results": operation_results,
                 "output_path": output_path,
+                "execution_plan": plan,
+                "dtype_optimization": dtype_report,
                 "sample_data": df.head(10).to_dict(orient="records")
             }
 
@@ -682,203 +1075,42 @@ class FileProcessor(BaseDataProcessor):
             if file_type not in ["txt", "md", "json", "html", "css", "js", "py"]:
                 return {"success": False, "error": f"不支持的文件类型: {file_type}"}
 
-            # 读取文本文件
+            # 输出路径
+            output_path = self._get_output_path(data_source, parameters, os.path.splitext(file_path)[1])
+
+            # 操作编译为逐块执行的管道，一次读取、一次写出
+            task_info = self.running_tasks.get(task.id)
+
+            def should_cancel() -> bool:
+                return bool(task_info and task_info["cancel_requested"])
+
+            def on_progress(fraction: float) -> None:
+                # 在工作线程中只更新内存中的进度，不使用数据库会话
+                if task_info is not None:
+                    task_info["progress"] = 30 + int(fraction * 60)
+
             try:
-                # 尝试自动检测编码
-                encoding = parameters.get("encoding", "utf-8")
-                with open(file_path, 'r', encoding=encoding, errors='ignore') as f:
-                    content = f.read()
+                # 未指定编码时自动检测（文件没有变化时使用之前检测的结果）
+                encoding = self._detect_encoding(file_path, parameters.get("encoding"))
+                pipeline = StreamingTextPipeline(
+                    file_path=file_path,
+                    output_path=output_path,
+                    operations=operations,
+                    encoding=encoding,
+                    block_chars=settings.TEXT_BLOCK_CHARS,
+                    should_cancel=should_cancel,
+                    on_progress=on_progress
+                )
             except Exception as e:
                 return {"success": False, "error": f"无法读取文本文件: {str(e)}"}
 
-            # 记录原始内容信息
-            original_lines = content.splitlines()
-            original_line_count = len(original_lines)
-            original_char_count = len(content)
-
             # 更新进度
             self.update_progress(task.id, 30, db)
 
-            # 应用操作
-            operation_results = []
-            total_steps = len(operations)
-
-            for i, operation in enumerate(operations):
-                # 检查是否请求取消
-                if task.id in self.running_tasks and self.running_tasks[task.id]["cancel_requested"]:
-                    return {"status": "cancelled"}
-
-                # 获取操作信息
-                operation_type = operation.get("type")
-
-                # 应用操作
-                result = {"operation": operation, "applied": False, "message": ""}
-
-                try:
-                    if operation_type == "replace_text":
-                        # 替换文本
-                        old_text = operation.get("old_text", "")
-                        new_text = operation.get("new_text", "")
-
-                        if not old_text:
-                            result["message"] = "未指定要替换的文本"
-                            continue
-
-                        old_count = content.count(old_text)
-                        content = content.replace(old_text, new_text)
-
-                        result["applied"] = True
-                        result["message"] = f"已替换 {old_count} 处文本"
-
-                    elif operation_type == "regex_replace":
-                        # 正则表达式替换
-                        pattern = operation.get("pattern", "")
-                        replacement = operation.get("replacement", "")
-
-                        if not pattern:
-                            result["message"] = "未指定正则表达式模式"
-                            continue
-
-                        try:
-                            old_content = content
-                            content = re.sub(pattern, replacement, content)
-
-                            # 计算替换次数
-                            matches = re.findall(pattern, old_content)
-                            match_count = len(matches)
-
-                            result["applied"] = True
-                            result["message"] = f"已替换 {match_count} 处匹配项"
-                        except re.error as e:
-                            result["message"] = f"正则表达式错误: {str(e)}"
-                            continue
-
-                    elif operation_type == "insert_text":
-                        # 插入文本
-                        position = operation.get("position", "start")  # start, end, line
-                        line_number = operation.get("line_number", 1)
-                        text = operation.get("text", "")
-
-                        if not text:
-                            result["message"] = "未指定要插入的文本"
-                            continue
-
-                        if position == "start":
-                            content = text + content
-                        elif position == "end":
-                            content = content + text
-                        elif position == "line":
-                            lines = content.splitlines()
-                            if 1 <= line_number <= len(lines) + 1:
-                                lines.insert(line_number - 1, text)
-                                content = "\n".join(lines)
-                            else:
-                                result["message"] = f"行号 {line_number} 超出范围"
-                                continue
-                        else:
-                            result["message"] = f"不支持的位置: {position}"
-                            continue
-
-                        result["applied"] = True
-                        result["message"] = f"已在 {position} 位置插入文本"
-
-                    elif operation_type == "remove_lines":
-                        # 删除行
-                        start_line = operation.get("start_line", 1)
-                        end_line = operation.get("end_line", start_line)
-
-                        lines = content.splitlines()
-
-                        if 1 <= start_line <= len(lines) and 1 <= end_line <= len(lines) and start_line <= end_line:
-                            del lines[start_line - 1:end_line]
-                            content = "\n".join(lines)
-
-                            result["applied"] = True
-                            result["message"] = f"已删除第 {start_line} 到第 {end_line} 行"
-                        else:
-                            result["message"] = f"行号范围 {start_line}-{end_line} 超出范围"
-                            continue
-
-                    elif operation_type == "filter_lines":
-                        # 过滤行
-                        pattern = operation.get("pattern", "")
-                        keep_matching = operation.get("keep_matching", True)
-
-                        if not pattern:
-                            result["message"] = "未指定过滤模式"
-                            continue
-
-                        try:
-                            lines = content.splitlines()
-                            if keep_matching:
-                                # 保留匹配的行
-                                filtered_lines = [line for line in lines if re.search(pattern, line)]
-                            else:
-                                # 移除匹配的行
-                                filtered_lines = [line for line in lines if not re.search(pattern, line)]
-
-                            content = "\n".join(filtered_lines)
-
-                            result["applied"] = True
-                            result["message"] = f"已{'保留' if keep_matching else '移除'} {len(lines) - len(filtered_lines)} 行"
-                        except re.error as e:
-                            result["message"] = f"正则表达式错误: {str(e)}"
-                            continue
-
-                    elif operation_type == "convert_case":
-                        # 转换大小写
-                        case_type = operation.get("case_type", "lower")  # lower, upper, title, sentence
-
-                        if case_type == "lower":
-                            content = content.lower()
-                        elif case_type == "upper":
-                            content = content.upper()
-                        elif case_type == "title":
-                            content = content.title()
-                        elif case_type == "sentence":
-                            # 句子大小写：每个句子的第一个字母大写
-                            sentences = re.split(r'(?<=[.!?])\s+', content)
-                            content = " ".join(s.capitalize() for s in sentences)
-                        else:
-                            result["message"] = f"不支持的大小写类型: {case_type}"
-                            continue
-
-                        result["applied"] = True
-                        result["message"] = f"已转换为 {case_type} 大小写"
-
-                    else:
-                        result["message"] = f"不支持的操作类型: {operation_type}"
-
-                except Exception as e:
-                    result["message"] = f"应用操作时出错: {str(e)}"
-
-                operation_results.append(result)
-
-                # 更新进度
-                progress = 30 + int((i + 1) / total_steps * 60)
-                self.update_progress(task.id, progress, db)
-
-            # 保存处理后的文本文件
-            output_path = parameters.get("output_path")
-            if not output_path:
-                # 如果未指定输出路径，则在原文件旁边创建一个新文件
-                file_dir = os.path.dirname(file_path)
-                file_name = os.path.basename(file_path)
-                file_name_without_ext = os.path.splitext(file_name)[0]
-                file_ext = os.path.splitext(file_name)[1]
-                output_path = os.path.join(file_dir, f"{file_name_without_ext}_processed{file_ext}")
-
-            # 确保输出目录存在
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-            # 保存处理后的文本文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-
-            # 计算处理后的内容信息
-            processed_lines = content.splitlines()
-            processed_line_count = len(processed_lines)
-            processed_char_count = len(content)
+            try:
+                result = await asyncio.to_thread(pipeline.run)
+            except TextPipelineCancelled:
+                return {"status": "cancelled"}
 
             # 更新进度
             self.update_progress(task.id, 100, db)
@@ -886,15 +1118,15 @@ class FileProcessor(BaseDataProcessor):
             # 返回处理结果
             return {
                 "success": True,
-                "original_line_count": original_line_count,
-                "original_char_count": original_char_count,
-                "processed_line_count": processed_line_count,
-                "processed_char_count": processed_char_count,
-                "line_count_diff": processed_line_count - original_line_count,
-                "char_count_diff": processed_char_count - original_char_count,
-                "operation_results": operation_results,
+                "original_line_count": result["original_line_count"],
+                "original_char_count": result["original_char_count"],
+                "processed_line_count": result["processed_line_count"],
+                "processed_char_count": result["processed_char_count"],
+                "line_count_diff": result["processed_line_count"] - result["original_line_count"],
+                "char_count_diff": result["processed_char_count"] - result["original_char_count"],
+                "operation_results": result["operation_results"],
                 "output_path": output_path,
-                "sample_content": content[:1000] if len(content) > 1000 else content  # 只返回前1000个字符
+                "sample_content": result["sample_content"]  # 只返回前1000个字符
             }
 
         except Exception as e:
@@ -902,11 +1134,12 @@ class FileProcessor(BaseDataProcessor):
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
 
-    async def _structure_file_analysis(self, file_path: str, file_type: str) -> Dict[str, Any]:
+    async def _structure_file_analysis(self, file_path: str, file_type: str, parameters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         文件结构分析
         :param file_path: 文件路径
         :param file_type: 文件类型
+        :param parameters: 任务参数
         :return: 分析结果
         """
         result = {}
@@ -914,17 +1147,37 @@ class FileProcessor(BaseDataProcessor):
         try:
             # CSV文件结构分析
             if file_type == "csv":
-                # 读取CSV文件
-                df = pd.read_csv(file_path)
+                # 读取CSV文件，超出内存预算时随机抽样
+                plan = memory_planner.plan(
+                    memory_planner.estimate_file(file_path, file_type),
+                    [IN_MEMORY, SAMPLED],
+                    parameters
+                )
+                result["execution_plan"] = plan
+                if plan["mode"] is None:
+                    result["error"] = plan["reason"]
+                    return result
+                # 有Parquet影子副本时不再解析CSV，并从副本元数据获取全表的列统计
+                df = await asyncio.to_thread(
+                    parquet_shadow.read, file_path, sample_fraction=plan.get("sample_fraction", 1.0)
+                )
+                if df is None:
+                    df = self._read_csv_sample(file_path, plan.get("sample_fraction", 1.0))
+                else:
+                    result["column_statistics"] = parquet_shadow.statistics(file_path)
 
                 # 基本信息
                 result["row_count"] = len(df)
                 result["column_count"] = len(df.columns)
                 result["columns"] = df.columns.tolist()
 
-                # 数据类型分析
+                # 数据类型分析（报告CSV推断出的类型）
                 result["data_types"] = {col: str(df[col].dtype) for col in df.columns}
 
+                # 压缩数据类型，降低后续统计的内存占用
+                if (parameters or {}).get("optimize_dtypes", True):
+                    df, result["dtype_optimization"] = await asyncio.to_thread(optimize_dtypes, df)
+
                 # 缺失值分析
                 result["null_counts"] = {col: int(df[col].isnull().sum()) for col in df.columns}
                 result["null_percentages"] = {
@@ -963,39 +1216,14 @@ class FileProcessor(BaseDataProcessor):
                             "top_values": {str(k): int(v) for k, v in value_counts.items()}
                         }
 
-            # JSON文件结构分析
-            elif file_type == "json":
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    json_data = json.load(f)
-
-                    # 递归分析JSON结构
-                    def analyze_json_structure(data, max_depth=3, current_depth=0):
-                        if current_depth >= max_depth:
-                            return {"type": type(data).__name__, "truncated": True}
-
-                        if isinstance(data, dict):
-                            return {
-                                "type": "object",
-                                "keys_count": len(data),
-                                "keys": list(data.keys()),
-                                "sample_values": {
-                                    k: analyze_json_structure(v, max_depth, current_depth + 1)
-                                    for k, v in list(data.items())[:5]  # 只分析前5个键值对
-                                }
-                            }
-                        elif isinstance(data, list):
-                            return {
-                                "type": "array",
-                                "length": len(data),
-                                "sample_items": [
-                                    analyze_json_structure(item, max_depth, current_depth + 1)
-                                    for item in data[:5]  # 只分析前5个元素
-                                ] if data else []
-                            }
-                        else:
-                            return {"type": type(data).__name__, "value": str(data)[:100]}
-
-                    result["structure_analysis"] = analyze_json_structure(json_data)
+            # JSON文件结构分析：流式推断键路径、类型、可空性和数组长度，内存占用与文件大小无关
+            elif file_type in JSON_FILE_TYPES:
+                analyzer = JsonStructureAnalyzer(
+                    max_value_chars=settings.JSON_MAX_VALUE_CHARS,
+                    max_paths=settings.JSON_MAX_PATHS,
+                    sample_fraction=float((parameters or {}).get("sample_fraction", 1.0))
+                )
+                result["structure_analysis"] = await asyncio.to_thread(analyzer.analyze, file_path)
 
             # 文本文件结构分析
             elif file_type in ["txt", "md"]:
@@ -0,0 +1,173 @@
+"""
+单遍文件剖析
+按大块读取文件，一次遍历同时计算行统计、MD5、字节分类计数、编码检测和词频（有界内存的高频词摘要）；
+行统计和字节分类用numpy在字节上向量化计算，不逐字符执行Python循环
+"""
+import hashlib
+import logging
+from typing import Dict, Any, List
+
+import numpy as np
+
+from core.processing.heavy_hitters import HeavyHitters
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# str.isspace()为真、str.strip()会去掉的ASCII空白字符
+_SPACE_CLASS = [9, 10, 11, 12, 13, 28, 29, 30, 31, 32]
+_WHITESPACE_BYTES = np.zeros(256, dtype=bool)
+_WHITESPACE_BYTES[_SPACE_CLASS] = True
+_PUNCTUATION_CLASS = list(b".,;:!?-\"'()[]{}")
+
+# 逐轮跳过行首尾空白的最大轮数，超过后按字节串处理剩余的行
+_MAX_TRIM_STEPS = 64
+
+# 编码检测使用的文件开头字节数
+_ENCODING_SAMPLE_BYTES = 10000
+
+
+class FileProfiler:
+    """单遍文件剖析"""
+
+    def __init__(
+        self,
+        block_bytes: int = 8 * 1024 * 1024,
+        text: bool = True,
+        words: bool = False,
+        top_words: int = 10,
+        word_capacity: int = 10000
+    ):
+        """
+        :param block_bytes: 每次读取的字节数
+        :param text: 是否按文本统计行、字符类别和编码
+        :param words: 是否统计词频（按UTF-8解码后的小写单词）
+        :param top_words: 报告的高频词数量
+        :param word_capacity: 词频摘要最多保留的单词数
+        """
+        self.block_bytes = block_bytes
+        self.text = text
+        self.words = words
+        self.top_words = top_words
+        self.word_capacity = word_capacity
+
+    def profile(self, file_path: str) -> Dict[str, Any]:
+        """
+        剖析文件
+        :param file_path: 文件路径
+        :return: 剖析结果
+        """
+        md5 = hashlib.md5()
+        histogram = np.zeros(256, dtype=np.int64)
+        lines = {"count": 0, "empty": 0, "chars": 0}
+        word_counts = HeavyHitters(self.word_capacity)
+        head = b""
+        # 尚未遇到换行符的数据，超长的行跨越多块时只在遇到换行符后拼接一次
+        pending: List[bytes] = []
+        size = 0
+
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                block = f.read(self.block_bytes)
+                if not block:
+                    break
+                size += len(block)
+                md5.update(block)
+                if not self.text:
+                    continue
+
+                if len(head) < _ENCODING_SAMPLE_BYTES:
+                    head += block[:_ENCODING_SAMPLE_BYTES - len(head)]
+                histogram += np.bincount(np.frombuffer(block, dtype=np.uint8), minlength=256)
+
+                # 只处理完整的行，最后一个不完整的行留到下一块，多字节字符也不会被截断
+                cut = block.rfind(b"\n") + 1
+                if not cut:
+                    pending.append(block)
+                    continue
+                data = b"".join(pending) + block[:cut] if pending else block[:cut]
+                pending = [block[cut:]] if cut < len(block) else []
+                self._count_lines(data, lines)
+                if self.words:
+                    word_counts.add_text(data.decode("utf-8", errors="ignore"))
+
+        if self.text and pending:
+            # 文件末尾没有换行符的最后一行
+            data = b"".join(pending)
+            self._count_lines(data + b"\n", lines)
+            if self.words:
+                word_counts.add_text(data.decode("utf-8", errors="ignore"))
+
+        result: Dict[str, Any] = {"size": size, "md5_hash": md5.hexdigest()}
+        if not self.text:
+            return result
+
+        non_empty = lines["count"] - lines["empty"]
+        result.update({
+            "line_count": lines["count"],
+            "empty_line_count": lines["empty"],
+            "non_empty_line_count": non_empty,
+            "avg_line_length": lines["chars"] / non_empty if non_empty else 0,
+            "char_count": int(histogram.sum() - histogram[0x80:0xC0].sum()),
+            # 非ASCII字符（多字节UTF-8序列的首字节）按字母计数，中文等文字的isalpha()为真
+            "letter_count": int(histogram[ord("A"):ord("Z") + 1].sum() + histogram[ord("a"):ord("z") + 1].sum()
+                                + histogram[0xC0:].sum()),
+            "digit_count": int(histogram[ord("0"):ord("9") + 1].sum()),
+            "whitespace_count": int(histogram[_SPACE_CLASS].sum()),
+            "punctuation_count": int(histogram[_PUNCTUATION_CLASS].sum()),
+            "detected_encoding": _detect_encoding(head)
+        })
+        if self.words:
+            result["word_count"] = word_counts.total
+            result["top_words"] = word_counts.top_words(self.top_words)
+            result["top_words_max_error"] = word_counts.max_error
+        return result
+
+    @staticmethod
+    def _count_lines(data: bytes, lines: Dict[str, int]) -> None:
+        """
+        统计一段以换行符结尾的数据中的行数、空行数和去掉首尾空白后的字符数
+        :param data: 以换行符结尾的数据
+        :param lines: 累计结果
+        """
+        arr = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(arr == 10)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+
+        # 从两端向内跳过空白，每轮只处理仍以空白开头或结尾的行（通常只有缩进和\r）
+        whitespace = _WHITESPACE_BYTES[arr]
+        for bound, step in ((starts, 1), (ends, -1)):
+            edge = bound if step == 1 else bound - 1
+            pending = np.flatnonzero((starts < ends) & whitespace[np.minimum(edge, len(arr) - 1)])
+            for _ in range(_MAX_TRIM_STEPS):
+                if not len(pending):
+                    break
+                bound[pending] += step
+                edge = bound[pending] if step == 1 else bound[pending] - 1
+                alive = starts[pending] < ends[pending]
+                pending = pending[alive & whitespace[np.minimum(edge, len(arr) - 1)]]
+            else:
+                # 极长的首尾空白直接按字节串处理
+                for index in pending:
+                    stripped = data[starts[index]:ends[index]].strip()
+                    offset = data.find(stripped, starts[index]) if stripped else ends[index]
+                    starts[index], ends[index] = offset, offset + len(stripped)
+
+        spans = ends - starts
+        has_text = spans > 0
+        chars = int(spans.sum())
+        if not data.isascii():
+            # 减去行内的UTF-8延续字节（10xxxxxx），按字符计数
+            continuation = np.concatenate(([0], np.cumsum((arr & 0xC0) == 0x80, dtype=np.int64)))
+            chars -= int((continuation[ends] - continuation[starts]).sum())
+
+        lines["count"] += len(ends)
+        lines["empty"] += int(len(ends) - has_text.sum())
+        lines["chars"] += chars
+
+
+def _detect_encoding(head: bytes) -> Dict[str, Any]:
+    """用文件开头的字节检测编码"""
+    import chardet
+    return chardet.detect(head)
@@ -0,0 +1,348 @@
+"""
+流式哈希分组聚合
+逐块计算可合并的部分聚合状态（和、计数、最值、去重值、分位数样本），
+分组数过多时按分组键的哈希把部分状态溢写到磁盘分区，最后逐个分区合并输出
+"""
+import logging
+import pickle
+import shutil
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Iterator
+
+import numpy as np
+import pandas as pd
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+AGGREGATE_FUNCTIONS = ["sum", "count", "mean", "min", "max", "count_distinct", "quantile"]
+
+# 没有分组键时使用的常量分组列
+_ALL_KEY = "__all"
+# 计数列（count(*)）
+_ROWS_COLUMN = "__rows"
+# 分位数样本的随机优先级列
+_PRIORITY_COLUMN = "__priority"
+
+
+def parse_aggregations(operation: Dict[str, Any]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    解析分组聚合操作
+    :param operation: 操作定义，group_by使用by指定分组列，aggregate对全部数据聚合；
+                      aggregations为 [{"column": 列名, "function": 聚合函数, "q": 分位点, "alias": 输出列名}]
+    :return: (分组列, 聚合定义列表)
+    :raises ValueError: 参数无效时
+    """
+    keys = (operation.get("by") or []) if operation.get("type") == "group_by" else []
+    if isinstance(keys, str):
+        keys = [keys]
+    if operation.get("type") == "group_by" and not keys:
+        raise ValueError("未指定分组列")
+
+    aggregations = []
+    for spec in operation.get("aggregations") or []:
+        function = spec.get("function")
+        column = spec.get("column")
+        if function not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f"不支持的聚合函数: {function}")
+        if column is None and function != "count":
+            raise ValueError(f"聚合函数 {function} 需要指定列")
+
+        q = float(spec.get("q", 0.5)) if function == "quantile" else None
+        if q is not None and not 0 <= q <= 1:
+            raise ValueError(f"分位点必须在0到1之间: {q}")
+
+        if spec.get("alias"):
+            alias = spec["alias"]
+        elif column is None:
+            alias = "count"
+        elif function == "quantile":
+            alias = f"{column}_p{round(q * 100):g}"
+        else:
+            alias = f"{column}_{function}"
+        aggregations.append({"column": column, "function": function, "q": q, "alias": alias})
+
+    if not aggregations:
+        raise ValueError("未指定聚合函数")
+    return keys, aggregations
+
+
+def normalize_keys(keys: pd.DataFrame) -> pd.DataFrame:
+    """
+    统一键列的类型后再计算哈希：数值统一为float64，保证不同数据块中推断出的整数和浮点数哈希相同；
+    None和NaN统一为空字符串，保证空值的哈希相同
+    :param keys: 键列
+    :return: 统一类型后的键列
+    """
+    return pd.DataFrame({
+        key: keys[key].astype(np.float64) if pd.api.types.is_numeric_dtype(keys[key])
+        else keys[key].astype(str).where(keys[key].notnull(), "")
+        for key in keys.columns
+    })
+
+
+class HashAggregator:
+    """流式哈希分组聚合"""
+
+    def __init__(
+        self,
+        keys: List[str],
+        aggregations: List[Dict[str, Any]],
+        spill_dir: Path,
+        max_state_rows: int = 1000000,
+        partitions: int = 32,
+        sample_size: int = 10000,
+        seed: int = 0
+    ):
+        """
+        :param keys: 分组列
+        :param aggregations: 聚合定义
+        :param spill_dir: 溢写目录
+        :param max_state_rows: 内存中部分状态的最大行数，超过后溢写到磁盘分区
+        :param partitions: 溢写分区数
+        :param sample_size: 每个分组用于计算近似分位数的样本数
+        """
+        self.keys = keys or [_ALL_KEY]
+        self.grouped = bool(keys)
+        self.aggregations = aggregations
+        self.spill_dir = Path(spill_dir)
+        self.max_state_rows = max_state_rows
+        self.partitions = partitions
+        self.sample_size = sample_size
+        self._rng = np.random.default_rng(seed)
+
+        # 需要的部分状态
+        self.numeric_columns = sorted({a["column"] for a in aggregations if a["function"] in ("sum", "mean", "quantile")})
+        self.count_columns = sorted({a["column"] for a in aggregations if a["function"] in ("count", "sum", "mean") and a["column"]})
+        self.minmax_columns = sorted({a["column"] for a in aggregations if a["function"] in ("min", "max")})
+        self.distinct_columns = sorted({a["column"] for a in aggregations if a["function"] == "count_distinct"})
+        self.sample_columns = sorted({a["column"] for a in aggregations if a["function"] == "quantile"})
+
+        self.state: Dict[str, List[pd.DataFrame]] = {}
+        self.state_rows = 0
+        self.spilled = False
+        self.input_rows = 0
+
+    def _columns_needed(self) -> List[str]:
+        columns = {a["column"] for a in self.aggregations if a["column"]}
+        return [key for key in self.keys if key != _ALL_KEY] + sorted(columns)
+
+    def validate(self, columns: List[str]) -> None:
+        """
+        检查列是否存在
+        :param columns: 数据的列名
+        :raises ValueError: 列不存在时
+        """
+        missing = [column for column in self._columns_needed() if column not in columns]
+        if missing:
+            raise ValueError(f"列不存在: {', '.join(str(column) for column in missing)}")
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        """
+        加入一个数据块
+        :param chunk: 数据块
+        """
+        self.input_rows += len(chunk)
+        if not self.grouped:
+            chunk = chunk.assign(**{_ALL_KEY: 0})
+
+        partial = self._partial(chunk)
+        if self.spilled:
+            self._spill(partial)
+            return
+
+        for kind, frame in partial.items():
+            self.state.setdefault(kind, []).append(frame)
+
+        self.state_rows += sum(len(frame) for frame in partial.values())
+        if self.state_rows > self.max_state_rows:
+            # 先合并一次，仍然超过上限时溢写到磁盘
+            merged = {kind: self._merge(kind, frames) for kind, frames in self.state.items()}
+            self.state = {kind: [frame] for kind, frame in merged.items()}
+            self.state_rows = sum(len(frame) for frame in merged.values())
+            if self.state_rows > self.max_state_rows:
+                logger.info(f"分组聚合状态超过 {self.max_state_rows} 行，溢写到磁盘")
+                self.spilled = True
+                self._spill(merged)
+                self.state = {}
+                self.state_rows = 0
+
+    def results(self) -> Iterator[pd.DataFrame]:
+        """
+        输出聚合结果（未溢写时按分组键排序，溢写时按分区输出）
+        :return: 结果数据块
+        """
+        try:
+            if not self.spilled:
+                merged = {kind: self._merge(kind, frames) for kind, frames in self.state.items()}
+                self.state = {}
+                result = self._finalize(merged)
+                if self.grouped and len(result):
+                    result = result.sort_values(self.keys, kind="mergesort", na_position="last")
+                yield result.reset_index(drop=True)
+                return
+
+            for partition in range(self.partitions):
+                state = {}
+                for kind in ("base", "distinct", "sample"):
+                    frames = list(self._read_partition(partition, kind))
+                    if frames:
+                        state[kind] = self._merge(kind, frames)
+                if state:
+                    yield self._finalize(state).reset_index(drop=True)
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        """删除溢写文件"""
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def _partial(self, chunk: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """计算数据块的部分聚合状态"""
+        keys = chunk[self.keys]
+        base = pd.DataFrame({key: keys[key] for key in self.keys})
+        base[_ROWS_COLUMN] = 1
+
+        values = {}
+        for column in self.numeric_columns:
+            values[column] = pd.to_numeric(chunk[column], errors="coerce")
+        for column in self.numeric_columns:
+            base[f"sum:{column}"] = values[column]
+        for column in self.count_columns:
+            base[f"count:{column}"] = chunk[column].notnull().astype(np.int64)
+        for column in self.minmax_columns:
+            base[f"min:{column}"] = chunk[column]
+            base[f"max:{column}"] = chunk[column]
+
+        grouped = base.groupby(self.keys, dropna=False, sort=False)
+        aggregations = {_ROWS_COLUMN: "sum"}
+        for column in base.columns:
+            if column.startswith(("sum:", "count:")):
+                aggregations[column] = "sum"
+            elif column.startswith("min:"):
+                aggregations[column] = "min"
+            elif column.startswith("max:"):
+                aggregations[column] = "max"
+        partial = {"base": grouped.agg(aggregations).reset_index()}
+
+        if self.distinct_columns:
+            frames = []
+            for column in self.distinct_columns:
+                pairs = pd.DataFrame({key: keys[key] for key in self.keys})
+                pairs["column"] = column
+                pairs["value"] = chunk[column]
+                frames.append(pairs.dropna(subset=["value"]).drop_duplicates())
+            partial["distinct"] = pd.concat(frames, ignore_index=True)
+
+        if self.sample_columns:
+            frames = []
+            for column in self.sample_columns:
+                sample = pd.DataFrame({key: keys[key] for key in self.keys})
+                sample["column"] = column
+                sample["value"] = values[column]
+                sample = sample.dropna(subset=["value"])
+                sample[_PRIORITY_COLUMN] = self._rng.random(len(sample))
+                frames.append(sample)
+            partial["sample"] = self._merge("sample", frames)
+
+        return partial
+
+    def _merge(self, kind: str, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """合并同类部分状态"""
+        frames = [frame for frame in frames if len(frame)]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+
+        if kind == "base":
+            aggregations = {}
+            for column in df.columns:
+                if column == _ROWS_COLUMN or column.startswith(("sum:", "count:")):
+                    aggregations[column] = "sum"
+                elif column.startswith("min:"):
+                    aggregations[column] = "min"
+                elif column.startswith("max:"):
+                    aggregations[column] = "max"
+            return df.groupby(self.keys, dropna=False, sort=False).agg(aggregations).reset_index()
+
+        if kind == "distinct":
+            return df.drop_duplicates()
+
+        # 分位数样本：每个分组保留随机优先级最小的sample_size个值（无放回的均匀抽样，可合并）
+        df = df.sort_values(_PRIORITY_COLUMN, kind="mergesort")
+        return df.groupby(self.keys + ["column"], dropna=False, sort=False).head(self.sample_size)
+
+    def _finalize(self, state: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        """由合并后的部分状态计算最终结果"""
+        base = state.get("base", pd.DataFrame())
+        if base.empty:
+            return pd.DataFrame(columns=[key for key in self.keys if self.grouped] + [a["alias"] for a in self.aggregations])
+
+        result = base[self.keys].copy()
+
+        for aggregation in self.aggregations:
+            column = aggregation["column"]
+            function = aggregation["function"]
+            alias = aggregation["alias"]
+
+            if function == "count":
+                result[alias] = base[f"count:{column}"] if column else base[_ROWS_COLUMN]
+            elif function == "sum":
+                result[alias] = base[f"sum:{column}"]
+            elif function == "mean":
+                counts = base[f"count:{column}"].replace(0, np.nan)
+                result[alias] = base[f"sum:{column}"] / counts
+            elif function == "min":
+                result[alias] = base[f"min:{column}"]
+            elif function == "max":
+                result[alias] = base[f"max:{column}"]
+            elif function == "count_distinct":
+                distinct = state.get("distinct", pd.DataFrame(columns=self.keys + ["column", "value"]))
+                distinct = distinct[distinct["column"] == column]
+                counts = distinct.groupby(self.keys, dropna=False).size().rename("value").reset_index()
+                result[alias] = np.nan_to_num(self._align(base, counts).astype(np.float64)).astype(np.int64)
+            elif function == "quantile":
+                sample = state.get("sample", pd.DataFrame(columns=self.keys + ["column", "value"]))
+                sample = sample[sample["column"] == column]
+                quantiles = sample.groupby(self.keys, dropna=False)["value"].quantile(aggregation["q"]).reset_index()
+                result[alias] = self._align(base, quantiles)
+
+        if not self.grouped:
+            result = result.drop(columns=[_ALL_KEY])
+        return result
+
+    def _align(self, base: pd.DataFrame, values: pd.DataFrame) -> np.ndarray:
+        """按分组键把各分组的值对齐到base的行顺序（merge会把空值键视为相同的键）"""
+        merged = base[self.keys].merge(values, on=self.keys, how="left", sort=False)
+        return merged["value"].to_numpy()
+
+    def _spill(self, partial: Dict[str, pd.DataFrame]) -> None:
+        """按分组键哈希把部分状态追加写入磁盘分区"""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        for kind, frame in partial.items():
+            if frame.empty:
+                continue
+            buckets = self._bucket(frame[self.keys])
+            for partition in np.unique(buckets):
+                with open(self.spill_dir / f"{kind}_{partition}.pkl", "ab") as f:
+                    pickle.dump(frame[buckets == partition], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _bucket(self, keys: pd.DataFrame) -> np.ndarray:
+        """
+        计算分组键所属分区，键列先统一类型，保证不同数据块中的相同分组落在同一分区
+        """
+        hashes = pd.util.hash_pandas_object(normalize_keys(keys), index=False).to_numpy()
+        return (hashes % self.partitions).astype(np.int64)
+
+    def _read_partition(self, partition: int, kind: str) -> Iterator[pd.DataFrame]:
+        """读取磁盘分区中的部分状态"""
+        path = self.spill_dir / f"{kind}_{partition}.pkl"
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
@@ -0,0 +1,120 @@
+"""
+有界内存的高频项统计
+使用可合并的Space-Saving摘要：每批数据先在批内精确计数，再合并到最多保留capacity个条目的摘要中；
+条目超出上限时淘汰计数最小的条目，被淘汰条目的最大计数作为之后新条目的误差下限。
+每个条目的真实次数落在 [count - error, count] 之间，不在摘要中的项的真实次数不超过max_error
+"""
+import re
+from collections import Counter
+from typing import Dict, Any, List, Iterable, Iterator, Mapping
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"\b\w+\b")
+
+
+class HeavyHitters:
+    """有界内存的高频项统计"""
+
+    def __init__(self, capacity: int = 10000):
+        """
+        :param capacity: 摘要最多保留的条目数，决定内存上限和误差
+        """
+        if capacity < 1:
+            raise ValueError("capacity必须大于0")
+        self.capacity = capacity
+        # 项 -> 估计次数（插入顺序即首次出现顺序，同次数的项按首次出现排序）
+        self._counts: Dict[str, int] = {}
+        # 项 -> 估计误差，只记录误差大于0的项
+        self._errors: Dict[str, int] = {}
+        # 被淘汰条目的最大估计次数
+        self.max_error = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, items: Iterable[str]) -> None:
+        """添加一批项"""
+        self.update(Counter(items))
+
+    def add_text(self, text: str) -> Dict[str, int]:
+        """
+        按单词（小写）添加一段文本
+        :return: 本段的单词数和单词总长度
+        """
+        words = WORD_PATTERN.findall(text.lower())
+        self.add(words)
+        return {"words": len(words), "length": sum(map(len, words))}
+
+    def update(self, counts: Mapping[str, int]) -> None:
+        """
+        合并一批已计数的项
+        :param counts: 项 -> 次数
+        """
+        entries = self._counts
+        floor = self.max_error
+        for item, count in counts.items():
+            if item in entries:
+                entries[item] += count
+            else:
+                # 新条目此前可能已被淘汰过，真实次数最多比本批多floor
+                entries[item] = floor + count
+                if floor:
+                    self._errors[item] = floor
+            self.total += count
+        if len(entries) > self.capacity:
+            self._prune()
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        """
+        估计次数最高的n项
+        :return: [{"item": 项, "count": 估计次数, "error": 估计误差}]
+        """
+        ranked = sorted(self._counts.items(), key=lambda entry: entry[1], reverse=True)[:n]
+        return [
+            {"item": item, "count": count, "error": self._errors.get(item, 0)}
+            for item, count in ranked
+        ]
+
+    def top_words(self, n: int) -> List[Dict[str, Any]]:
+        """按单词报告估计次数最高的n项"""
+        return [
+            {"word": entry["item"], "count": entry["count"], "error": entry["error"]}
+            for entry in self.top(n)
+        ]
+
+    def _prune(self) -> None:
+        """只保留估计次数最大的capacity个条目，同次数时保留先出现的"""
+        values = np.fromiter(self._counts.values(), dtype=np.int64, count=len(self._counts))
+        threshold = int(np.partition(values, len(values) - self.capacity)[len(values) - self.capacity])
+        ties = self.capacity - int((values > threshold).sum())
+
+        kept: Dict[str, int] = {}
+        evicted = 0
+        for item, count in self._counts.items():
+            if count > threshold or (count == threshold and ties > 0):
+                if count == threshold:
+                    ties -= 1
+                kept[item] = count
+            else:
+                evicted = max(evicted, count)
+                self._errors.pop(item, None)
+        self._counts = kept
+        self.max_error = max(self.max_error, evicted)
+
+
+def iter_text_blocks(text: str, block_chars: int = 1024 * 1024) -> Iterator[str]:
+    """
+    按空白处把长文本切成块，单词不会被切断
+    :param text: 文本
+    :param block_chars: 每块的大致字符数
+    """
+    start = 0
+    while start < len(text):
+        end = start + block_chars
+        if end < len(text):
+            cut = max(text.rfind(" ", start, end), text.rfind("\n", start, end))
+            end = cut + 1 if cut > start else end
+        yield text[start:end]
+        start = end
@@ -0,0 +1,324 @@
+"""
+流式JSON结构分析
+按块读取文件，大小有限的值直接用C实现的json解码器解析后遍历，
+超出上限的对象和数组逐个键、逐个元素向下解析，因此内存占用只取决于单个值的大小上限，与文件大小无关。
+支持单个JSON值和JSON Lines（多个顶层值），推断每个键路径的类型、可空性、是否可缺省和数组长度
+"""
+import json
+import logging
+import random
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROOT_PATH = "$"
+
+# 每次从文件读取的字符数
+_READ_CHARS = 1024 * 1024
+_WHITESPACE = " \t\r\n"
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# 每个路径保留的示例值数量和长度
+_MAX_EXAMPLES = 3
+_EXAMPLE_CHARS = 100
+
+
+class JsonStructureAnalyzer:
+    """流式JSON结构分析"""
+
+    def __init__(
+        self,
+        max_value_chars: int = 1024 * 1024,
+        max_paths: int = 2000,
+        max_depth: int = 20,
+        sample_fraction: float = 1.0,
+        array_head: int = 1000,
+        seed: Optional[int] = None
+    ):
+        """
+        :param max_value_chars: 整体解码的单个值的最大字符数，更大的对象和数组逐个成员解析
+        :param max_paths: 最多记录的键路径数，超出后新路径只计数不记录
+        :param max_depth: 最大分析深度，更深的值只记录类型
+        :param sample_fraction: 数组元素（以及JSON Lines的记录）的抽样比例
+        :param array_head: 每个数组前多少个元素总是参与分析
+        :param seed: 抽样随机种子
+        """
+        if not 0 < sample_fraction <= 1:
+            raise ValueError("sample_fraction必须在(0, 1]之间")
+        self.max_value_chars = max_value_chars
+        self.max_paths = max_paths
+        self.max_depth = max_depth
+        self.sample_fraction = sample_fraction
+        self.array_head = array_head
+        self._rng = random.Random(seed)
+        self._decoder = json.JSONDecoder()
+        self._reset()
+
+    def _reset(self) -> None:
+        # 按首次出现顺序排列的统计节点，第一个是根
+        self._nodes: List[Dict[str, Any]] = []
+        self._dropped_paths = 0
+        self._sampled = False
+        self._file = None
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def analyze(self, file_path: str, encoding: str = "utf-8") -> Dict[str, Any]:
+        """
+        分析JSON或JSON Lines文件的结构
+        :param file_path: 文件路径
+        :param encoding: 文件编码
+        :return: 结构摘要
+        """
+        self._reset()
+        records = 0
+        with open(file_path, "r", encoding=encoding, errors="replace") as f:
+            self._file = f
+            root = self._new_node(ROOT_PATH, None)
+            while self._peek() is not None:
+                # 多个顶层值（JSON Lines）按数组元素同样抽样
+                self._parse_value(root, 0, self._should_analyze(records))
+                records += 1
+        self._file = None
+        if not records:
+            raise ValueError("文件中没有JSON值")
+        return self._summary(records)
+
+    # 读取
+
+    def _fill(self, chars: int = _READ_CHARS) -> bool:
+        """读取更多数据，返回是否读到了数据"""
+        if self._eof:
+            return False
+        chunk = self._file.read(chars)
+        if not chunk:
+            self._eof = True
+            return False
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        self._buffer += chunk
+        return True
+
+    def _peek(self) -> Optional[str]:
+        """跳过空白，返回下一个字符（不消费），文件结束时返回None"""
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if char is None or char not in chars:
+            raise ValueError(f"JSON格式错误：期望 {' 或 '.join(chars)}，实际为 {char!r}")
+        self._pos += 1
+        return char
+
+    def _decode(self) -> Tuple[Any, bool]:
+        """
+        尝试整体解码下一个值
+        :return: (值, 是否成功)，值超过max_value_chars时不成功，调用方改为逐个成员解析
+        """
+        if self._peek() is None:
+            raise ValueError("JSON格式错误：数据意外结束")
+        while True:
+            first = self._buffer[self._pos]
+            available = len(self._buffer) - self._pos
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # 只有数字恰好在缓冲区末尾时可能被截断
+                if end < len(self._buffer) or self._eof or first not in "-0123456789":
+                    self._pos = end
+                    return value, True
+            except json.JSONDecodeError:
+                # 数字和字面量很短，字符串不超过上限，解析失败说明格式错误而不是被读取边界截断
+                if self._eof or (first not in '"{[' and available > 64) or \
+                        (first == '"' and available >= self.max_value_chars):
+                    raise
+            if available >= self.max_value_chars and first in "{[":
+                return None, False
+            # 按已有数据量倍增读取，避免大值被反复从头解码
+            self._fill(max(available, _READ_CHARS))
+
+    # 解析
+
+    def _parse_value(self, node: Optional[Dict[str, Any]], depth: int, analyze: bool) -> None:
+        """
+        解析下一个值
+        :param node: 值所在路径的统计节点，路径数超出上限时为None
+        :param depth: 深度
+        :param analyze: 是否统计（未被抽中的数组元素只解析不统计）
+        """
+        analyze = analyze and node is not None
+        value, decoded = self._decode()
+        if decoded:
+            if analyze:
+                self._observe(value, node, depth)
+            return
+
+        # 值太大，逐个成员解析
+        descend = analyze and depth < self.max_depth
+        if self._expect("{[") == "{":
+            if analyze:
+                _count_type(node, "object")
+            if self._peek() == "}":
+                self._pos += 1
+                return
+            while True:
+                if self._peek() != '"':
+                    raise ValueError("JSON格式错误：对象的键必须是字符串")
+                key, _ = self._decode()
+                self._expect(":")
+                self._parse_value(self._child(node, key) if descend else None, depth + 1, descend)
+                if self._expect(",}") == "}":
+                    return
+        else:
+            if analyze:
+                _count_type(node, "array")
+            items = self._items(node) if descend else None
+            length = 0
+            if self._peek() == "]":
+                self._pos += 1
+            else:
+                while True:
+                    self._parse_value(items, depth + 1, descend and self._should_analyze(length))
+                    length += 1
+                    if self._expect(",]") == "]":
+                        break
+            if analyze:
+                _observe_length(node, length)
+
+    def _should_analyze(self, index: int) -> bool:
+        if index < self.array_head or self.sample_fraction >= 1:
+            return True
+        self._sampled = True
+        return self._rng.random() < self.sample_fraction
+
+    # 统计
+
+    def _new_node(self, path: str, parent: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if len(self._nodes) >= self.max_paths:
+            self._dropped_paths += 1
+            return None
+        node = {
+            "path": path, "parent": parent, "types": {}, "children": {}, "items": None, "examples": []
+        }
+        self._nodes.append(node)
+        return node
+
+    def _child(self, node: Dict[str, Any], key: str) -> Optional[Dict[str, Any]]:
+        """对象成员的统计节点"""
+        child = node["children"].get(key)
+        if child is None:
+            child = self._new_node(_child_path(node["path"], key), node)
+            if child is not None:
+                node["children"][key] = child
+        return child
+
+    def _items(self, node: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """数组元素的统计节点"""
+        if node["items"] is None:
+            node["items"] = self._new_node(node["path"] + "[]", None)
+        return node["items"]
+
+    def _observe(self, value: Any, node: Dict[str, Any], depth: int) -> None:
+        """遍历已解码的值"""
+        type_name = _TYPE_NAMES[type(value)]
+        types = node["types"]
+        types[type_name] = types.get(type_name, 0) + 1
+        if depth >= self.max_depth:
+            return
+
+        if type_name == "object":
+            children = node["children"]
+            for key, child_value in value.items():
+                child = children.get(key) or self._child(node, key)
+                if child is not None:
+                    self._observe(child_value, child, depth + 1)
+        elif type_name == "array":
+            _observe_length(node, len(value))
+            items = self._items(node)
+            if items is None:
+                return
+            for index, item in enumerate(value):
+                if self._should_analyze(index):
+                    self._observe(item, items, depth + 1)
+        elif type_name != "null" and len(node["examples"]) < _MAX_EXAMPLES:
+            example = (value if type_name == "string" else json.dumps(value))[:_EXAMPLE_CHARS]
+            if example not in node["examples"]:
+                node["examples"].append(example)
+
+    def _summary(self, records: int) -> Dict[str, Any]:
+        schema = []
+        for node in self._nodes:
+            count = sum(node["types"].values())
+            entry: Dict[str, Any] = {
+                "path": node["path"],
+                "types": node["types"],
+                "count": count,
+                "nullable": "null" in node["types"]
+            }
+            if node["parent"] is not None:
+                # 只在部分父对象中出现的键
+                entry["optional"] = count < node["parent"]["types"].get("object", 0)
+            if node["children"]:
+                entry["keys"] = list(node["children"])
+            if "min_length" in node:
+                entry["array_length"] = {
+                    "min": node["min_length"],
+                    "max": node["max_length"],
+                    "avg": node["total_length"] / node["arrays"]
+                }
+            if node["examples"]:
+                entry["examples"] = node["examples"]
+            schema.append(entry)
+
+        root = self._nodes[0]
+        root_type = max(root["types"], key=root["types"].get) if root["types"] else None
+        result = {
+            "format": "jsonl" if records > 1 else "json",
+            "record_count": records,
+            "root_type": root_type,
+            "path_count": len(schema),
+            "schema": schema,
+            "sampled": self._sampled
+        }
+        if records == 1 and root_type == "array":
+            result["root_array_length"] = root["max_length"]
+        if self._dropped_paths:
+            result["dropped_path_observations"] = self._dropped_paths
+        return result
+
+
+_TYPE_NAMES = {
+    dict: "object", list: "array", str: "string", int: "integer", float: "number", bool: "boolean",
+    type(None): "null"
+}
+
+
+def _child_path(path: str, key: str) -> str:
+    if _IDENTIFIER.match(key):
+        return f"{path}.{key}"
+    return f"{path}[{json.dumps(key, ensure_ascii=False)}]"
+
+
+def _count_type(node: Dict[str, Any], type_name: str) -> None:
+    node["types"][type_name] = node["types"].get(type_name, 0) + 1
+
+
+def _observe_length(node: Dict[str, Any], length: int) -> None:
+    if "min_length" not in node:
+        node.update({"min_length": length, "max_length": length, "total_length": 0, "arrays": 0})
+    node["min_length"] = min(node["min_length"], length)
+    node["max_length"] = max(node["max_length"], length)
+    node["total_length"] += length
+    node["arrays"] += 1
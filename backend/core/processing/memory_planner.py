@@ -0,0 +1,170 @@
+"""
+内存预算与执行模式规划
+在加载数据前估计输入在pandas中占用的内存，与任务内存预算比较后选择执行模式：
+内存执行（in_memory）、分块流式（chunked）、SQL下推（sql_pushdown）或抽样（sampled）
+"""
+import logging
+import os
+from typing import Dict, Any, List, Optional
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 执行模式
+IN_MEMORY = "in_memory"
+CHUNKED = "chunked"
+SQL_PUSHDOWN = "sql_pushdown"
+SAMPLED = "sampled"
+
+EXECUTION_MODES = [IN_MEMORY, CHUNKED, SQL_PUSHDOWN, SAMPLED]
+
+# 超出预算时的优先顺序：结果精确的模式优先，抽样最后
+_FALLBACK_ORDER = [CHUNKED, SAMPLED]
+
+# 文件加载到DataFrame后相对文件大小的膨胀系数（字符串列会变成Python对象）
+FILE_MEMORY_FACTORS = {
+    "csv": 3.0,
+    "tsv": 3.0,
+    "txt": 3.0,
+    "json": 4.0,
+    "jsonl": 4.0,
+    "xls": 8.0,
+    "xlsx": 8.0,
+    "parquet": 5.0
+}
+DEFAULT_FILE_MEMORY_FACTOR = 3.0
+
+# 数据库列在DataFrame中每个值的估计字节数
+_NUMERIC_CELL_BYTES = 8
+_OBJECT_CELL_BYTES = 64
+
+# 抽样时预留的余量
+_SAMPLE_SAFETY = 0.8
+
+
+class MemoryPlanner:
+    """内存预算规划器"""
+
+    def __init__(self, budget_bytes: int = 512 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+
+    def estimate_table(self, table_schema: Optional[Dict[str, Any]]) -> Optional[int]:
+        """
+        根据元数据缓存中的行数估计和列类型估计表加载后的内存占用
+        :param table_schema: 表元数据（来自schema_cache）
+        :return: 估计字节数，无法估计时返回None
+        """
+        if not table_schema or not table_schema.get("row_estimate"):
+            return None
+
+        row_count = table_schema["row_estimate"]
+        columns = table_schema.get("columns") or []
+        row_width = sum(
+            _NUMERIC_CELL_BYTES if column.get("numeric") else _OBJECT_CELL_BYTES
+            for column in columns
+        )
+
+        # 目录统计中的平均行宽包含了长文本，取两者中较大的值
+        size_bytes = table_schema.get("size_bytes")
+        if size_bytes:
+            row_width = max(row_width, size_bytes / row_count)
+
+        return int(row_count * row_width)
+
+    def estimate_file(self, file_path: str, file_type: Optional[str] = None, file_size: Optional[int] = None) -> int:
+        """
+        根据文件大小和类型估计加载后的内存占用
+        :param file_path: 文件路径
+        :param file_type: 文件类型
+        :param file_size: 文件大小，为空时读取文件系统
+        :return: 估计字节数
+        """
+        if file_size is None:
+            file_size = os.path.getsize(file_path)
+        factor = FILE_MEMORY_FACTORS.get((file_type or "").lower(), DEFAULT_FILE_MEMORY_FACTOR)
+        return int(file_size * factor)
+
+    def plan(
+        self,
+        estimated_bytes: Optional[int],
+        supported_modes: List[str],
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        选择执行模式
+        :param estimated_bytes: 估计的内存占用，为空表示无法估计
+        :param supported_modes: 当前任务支持的执行模式
+        :param parameters: 任务参数，支持execution_mode（强制模式）和memory_budget_mb（调低预算，不能超过配置的预算）
+        :return: 执行计划，mode为None表示没有可用的模式
+        """
+        parameters = parameters or {}
+        budget = self.budget_bytes
+        if parameters.get("memory_budget_mb"):
+            budget = min(int(float(parameters["memory_budget_mb"]) * 1024 * 1024), self.budget_bytes)
+
+        plan = {
+            "mode": None,
+            "estimated_bytes": estimated_bytes,
+            "budget_bytes": budget,
+            "reason": ""
+        }
+
+        requested = parameters.get("execution_mode")
+        if requested:
+            if requested not in supported_modes:
+                plan["reason"] = f"不支持的执行模式: {requested}，可选: {', '.join(supported_modes)}"
+                return plan
+            if requested == IN_MEMORY and estimated_bytes is not None and estimated_bytes > budget:
+                plan["reason"] = (
+                    f"指定了内存执行，但估计需要 {estimated_bytes // (1024 * 1024)} MB，"
+                    f"超出内存预算 {budget // (1024 * 1024)} MB"
+                )
+                return plan
+            plan["mode"] = requested
+            plan["reason"] = "按任务参数指定"
+        elif SQL_PUSHDOWN in supported_modes:
+            # 下推时只传输聚合结果，数据不进入内存，支持时总是优先
+            plan["mode"] = SQL_PUSHDOWN
+            plan["reason"] = "数据库支持下推计算"
+        elif estimated_bytes is None:
+            plan["mode"] = IN_MEMORY if IN_MEMORY in supported_modes else supported_modes[0]
+            plan["reason"] = "无法估计数据大小"
+        elif estimated_bytes <= budget and IN_MEMORY in supported_modes:
+            plan["mode"] = IN_MEMORY
+            plan["reason"] = "估计大小在内存预算内"
+        else:
+            for mode in _FALLBACK_ORDER:
+                if mode in supported_modes:
+                    plan["mode"] = mode
+                    plan["reason"] = "估计大小超出内存预算"
+                    break
+            else:
+                plan["reason"] = (
+                    f"估计需要 {estimated_bytes // (1024 * 1024)} MB，"
+                    f"超出内存预算 {budget // (1024 * 1024)} MB"
+                )
+                return plan
+
+        if plan["mode"] == SAMPLED:
+            plan["sample_fraction"] = self.sample_fraction(estimated_bytes, budget)
+
+        logger.info(f"执行计划: {plan}")
+        return plan
+
+    def sample_fraction(self, estimated_bytes: Optional[int], budget_bytes: int) -> float:
+        """
+        计算能放入预算的抽样比例
+        :param estimated_bytes: 估计的内存占用
+        :param budget_bytes: 内存预算
+        :return: 抽样比例（0, 1]
+        """
+        if not estimated_bytes:
+            return 1.0
+        return max(min(budget_bytes * _SAMPLE_SAFETY / estimated_bytes, 1.0), 1e-6)
+
+
+# 全局规划器实例
+memory_planner = MemoryPlanner(budget_bytes=settings.TASK_MEMORY_BUDGET_BYTES)
@@ -0,0 +1,351 @@
+"""
+Parquet影子副本
+上传的CSV文件在后台转换为带类型、分行组（row group）并写入列统计信息的Parquet副本，
+处理器读取时只读需要的列并把过滤条件下推到行组，避免每次重新解析CSV文本
+"""
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 副本元数据中记录的源文件状态，源文件变化后副本失效
+_SOURCE_SIZE_KEY = b"kortex.source_size"
+_SOURCE_MTIME_KEY = b"kortex.source_mtime_ns"
+
+# 可以下推到Parquet读取的过滤条件
+_PUSHDOWN_CONDITIONS = ["eq", "ne", "gt", "lt", "is_null", "is_not_null"]
+
+# 读取列时需要整张表的操作（列名会变化或依赖任意列）
+_ALL_COLUMN_OPERATIONS = ["rename_columns", "create_column", "join"]
+
+
+class ParquetShadowStore:
+    """CSV文件的Parquet影子副本"""
+
+    def __init__(
+        self,
+        shadow_dir: Path,
+        row_group_rows: int = 131072,
+        compression: str = "zstd",
+        block_bytes: int = 16 * 1024 * 1024,
+        max_workers: int = 2
+    ):
+        """
+        :param shadow_dir: 副本目录
+        :param row_group_rows: 每个行组的行数
+        :param compression: 压缩算法
+        :param block_bytes: 解析CSV时每块的字节数（类型按第一块推断）
+        :param max_workers: 后台转换的线程数
+        """
+        self.shadow_dir = Path(shadow_dir)
+        self.row_group_rows = row_group_rows
+        self.compression = compression
+        self.block_bytes = block_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="parquet_shadow")
+        self._building: set = set()
+        self._lock = threading.Lock()
+
+    def shadow_path(self, file_path: str) -> Path:
+        """副本路径，按源文件的绝对路径命名"""
+        digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return self.shadow_dir / f"{digest}.parquet"
+
+    def get(self, file_path: str) -> Optional[Path]:
+        """
+        获取有效的副本
+        :param file_path: 源文件路径
+        :return: 副本路径，不存在或源文件已变化时返回None
+        """
+        path = self.shadow_path(file_path)
+        if not path.exists():
+            return None
+        try:
+            metadata = pq.read_schema(path).metadata or {}
+            stat = os.stat(file_path)
+        except (OSError, pa.ArrowException):
+            return None
+        if metadata.get(_SOURCE_SIZE_KEY) != str(stat.st_size).encode() \
+                or metadata.get(_SOURCE_MTIME_KEY) != str(stat.st_mtime_ns).encode():
+            return None
+        return path
+
+    def schedule(self, file_path: str, encoding: str = "utf-8") -> bool:
+        """
+        在后台线程中生成副本，同一文件正在转换时不重复提交
+        :param file_path: 源文件路径
+        :param encoding: 文件编码
+        :return: 是否提交了转换
+        """
+        with self._lock:
+            if file_path in self._building:
+                return False
+            self._building.add(file_path)
+        self._executor.submit(self._build_in_background, file_path, encoding)
+        return True
+
+    def _build_in_background(self, file_path: str, encoding: str) -> None:
+        try:
+            self.build(file_path, encoding)
+        except Exception as e:
+            logger.warning(f"生成Parquet副本失败 {file_path}: {str(e)}")
+        finally:
+            with self._lock:
+                self._building.discard(file_path)
+
+    def build(self, file_path: str, encoding: str = "utf-8") -> Optional[Path]:
+        """
+        把CSV转换为Parquet副本，先写临时文件再替换，读取方不会看到写了一半的副本
+        :param file_path: 源文件路径
+        :param encoding: 文件编码
+        :return: 副本路径，类型推断与后续数据不一致而无法转换时返回None
+        """
+        self.shadow_dir.mkdir(parents=True, exist_ok=True)
+        path = self.shadow_path(file_path)
+        stat = os.stat(file_path)
+        metadata = {_SOURCE_SIZE_KEY: str(stat.st_size).encode(), _SOURCE_MTIME_KEY: str(stat.st_mtime_ns).encode()}
+
+        column_types = self._infer_types(file_path, encoding)
+        # 第一块推断为整数的列在后面出现小数时，改为浮点数重试一次
+        promoted = {name: pa.float64() if pa.types.is_integer(t) else t for name, t in column_types.items()}
+        attempts = [column_types] if promoted == column_types else [column_types, promoted]
+
+        temp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+        try:
+            for types in attempts:
+                try:
+                    rows = self._write(file_path, encoding, types, metadata, temp_path)
+                except pa.ArrowInvalid as e:
+                    logger.info(f"Parquet副本类型推断不一致，重试: {str(e)}")
+                    continue
+                os.replace(temp_path, path)
+                logger.info(f"已生成Parquet副本 {file_path} -> {path}，共 {rows} 行")
+                return path
+            return None
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+    def _csv_options(self, encoding: str, column_types: Optional[Dict[str, pa.DataType]] = None):
+        read_options = pa_csv.ReadOptions(encoding=encoding, block_size=self.block_bytes)
+        # 与pandas一致：空字符串视为空值
+        convert_options = pa_csv.ConvertOptions(column_types=column_types or {}, strings_can_be_null=True)
+        return read_options, convert_options
+
+    def _infer_types(self, file_path: str, encoding: str) -> Dict[str, pa.DataType]:
+        """按第一块推断列类型；日期时间列保持为字符串，与pandas读取CSV的结果一致"""
+        read_options, convert_options = self._csv_options(encoding)
+        reader = pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options)
+        try:
+            types = {}
+            for field in reader.schema:
+                temporal = pa.types.is_temporal(field.type)
+                types[field.name] = pa.string() if temporal or pa.types.is_null(field.type) else field.type
+            return types
+        finally:
+            reader.close()
+
+    def _write(
+        self,
+        file_path: str,
+        encoding: str,
+        column_types: Dict[str, pa.DataType],
+        metadata: Dict[bytes, bytes],
+        temp_path: Path
+    ) -> int:
+        """流式解析CSV并按行组写入Parquet"""
+        read_options, convert_options = self._csv_options(encoding, column_types)
+        reader = pa_csv.open_csv(file_path, read_options=read_options, convert_options=convert_options)
+        schema = reader.schema.with_metadata(metadata)
+        rows = 0
+        buffer: List[pa.RecordBatch] = []
+        buffered = 0
+        with pq.ParquetWriter(temp_path, schema, compression=self.compression, write_statistics=True) as writer:
+            for batch in reader:
+                buffer.append(batch)
+                buffered += batch.num_rows
+                if buffered >= self.row_group_rows:
+                    table = pa.Table.from_batches(buffer, schema=reader.schema)
+                    full = buffered - buffered % self.row_group_rows
+                    writer.write_table(table.slice(0, full), row_group_size=self.row_group_rows)
+                    buffer = table.slice(full).to_batches()
+                    buffered -= full
+                    rows += full
+            if buffered:
+                writer.write_table(pa.Table.from_batches(buffer, schema=reader.schema), row_group_size=self.row_group_rows)
+                rows += buffered
+        return rows
+
+    def read(
+        self,
+        file_path: str,
+        columns: Optional[List[str]] = None,
+        filters: Optional[pc.Expression] = None,
+        sample_fraction: float = 1.0,
+        seed: Optional[int] = None
+    ) -> Optional[pd.DataFrame]:
+        """
+        从副本读取数据
+        :param file_path: 源文件路径
+        :param columns: 只读取这些列
+        :param filters: 下推的过滤条件，按行组统计信息跳过不满足条件的行组
+        :param sample_fraction: 随机抽样比例，小于1时逐批抽样
+        :return: 数据框，没有有效副本时返回None
+        """
+        path = self.get(file_path)
+        if path is None:
+            return None
+        if sample_fraction >= 1.0:
+            return pq.read_table(path, columns=columns, filters=filters).to_pandas()
+
+        rng = np.random.default_rng(seed)
+        parquet_file = pq.ParquetFile(path)
+        batches = [
+            batch.filter(pa.array(rng.random(batch.num_rows) < sample_fraction))
+            for batch in parquet_file.iter_batches(batch_size=self.row_group_rows, columns=columns)
+        ]
+        if not batches:
+            return pq.read_table(path, columns=columns).to_pandas()
+        table = pa.Table.from_batches(batches)
+        if filters is not None:
+            table = table.filter(filters)
+        return table.to_pandas()
+
+    def schema(self, file_path: str) -> Optional[pa.Schema]:
+        """副本的列类型，没有有效副本时返回None"""
+        path = self.get(file_path)
+        return pq.read_schema(path) if path else None
+
+    def statistics(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        从副本元数据汇总每列的空值数和最值，不读取数据
+        :param file_path: 源文件路径
+        :return: 统计信息，没有有效副本时返回None
+        """
+        path = self.get(file_path)
+        if path is None:
+            return None
+        parquet_file = pq.ParquetFile(path)
+        metadata = parquet_file.metadata
+        columns = {}
+        for index, field in enumerate(parquet_file.schema_arrow):
+            null_count, minimum, maximum = 0, None, None
+            for group in range(metadata.num_row_groups):
+                stats = metadata.row_group(group).column(index).statistics
+                if stats is None:
+                    null_count = None
+                    break
+                if null_count is not None:
+                    null_count += stats.null_count
+                if stats.has_min_max:
+                    minimum = stats.min if minimum is None else min(minimum, stats.min)
+                    maximum = stats.max if maximum is None else max(maximum, stats.max)
+            columns[field.name] = {"type": str(field.type), "null_count": null_count, "min": minimum, "max": maximum}
+        return {"row_count": metadata.num_rows, "row_groups": metadata.num_row_groups, "columns": columns}
+
+    def invalidate(self, file_path: str) -> None:
+        """删除副本"""
+        try:
+            os.remove(self.shadow_path(file_path))
+        except OSError:
+            pass
+
+
+def pushdown_filters(operations: List[Dict[str, Any]], schema: pa.Schema) -> Tuple[Optional[pc.Expression], int]:
+    """
+    把开头连续的filter_rows操作转换为Parquet过滤表达式，
+    只下推列存在、比较值与列类型一致的条件，语义与pandas过滤一致（ne保留空值）
+    :param operations: 操作列表
+    :param schema: 副本的列类型
+    :return: (过滤表达式, 下推的操作数量)
+    """
+    expression = None
+    count = 0
+    for operation in operations:
+        if operation.get("type") != "filter_rows":
+            break
+        column = operation.get("column")
+        condition = operation.get("condition")
+        value = operation.get("value")
+        if condition not in _PUSHDOWN_CONDITIONS or column not in schema.names:
+            break
+
+        field = pc.field(column)
+        column_type = schema.field(column).type
+        if condition == "is_null":
+            predicate = field.is_null()
+        elif condition == "is_not_null":
+            predicate = field.is_valid()
+        else:
+            numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if not ((numeric and (pa.types.is_integer(column_type) or pa.types.is_floating(column_type)))
+                    or (isinstance(value, str) and pa.types.is_string(column_type))):
+                break
+            if condition == "eq":
+                predicate = field == value
+            elif condition == "ne":
+                predicate = (field != value) | field.is_null()
+            elif condition == "gt":
+                predicate = field > value
+            else:
+                predicate = field < value
+
+        expression = predicate if expression is None else expression & predicate
+        count += 1
+    return expression, count
+
+
+def required_columns(operations: List[Dict[str, Any]], available: List[str]) -> Optional[List[str]]:
+    """
+    计算操作需要读取的列：在select_columns或分组聚合之前只引用了确定的列时可以裁剪，
+    否则（重命名、新建列、连接等）需要全部列
+    :param operations: 操作列表
+    :param available: 副本的全部列
+    :return: 需要读取的列（保持文件中的顺序），需要全部列时返回None
+    """
+    needed = set()
+    for operation in operations:
+        operation_type = operation.get("type")
+        if operation_type in _ALL_COLUMN_OPERATIONS:
+            return None
+        if operation_type == "drop_duplicates" and not operation.get("subset"):
+            return None
+
+        for key in ("column", "columns", "subset", "by"):
+            value = operation.get(key)
+            if isinstance(value, str):
+                needed.add(value)
+            elif isinstance(value, list):
+                needed.update(value)
+        needed.update(spec.get("column") for spec in operation.get("aggregations") or [] if spec.get("column"))
+
+        if operation_type in ("select_columns", "group_by", "aggregate"):
+            # 之后的操作只能看到这些列
+            return [column for column in available if column in needed]
+        if operation_type not in ("filter_rows", "sort", "fill_nulls", "convert_type", "drop_duplicates"):
+            return None
+    return None
+
+
+# 全局Parquet副本实例
+parquet_shadow = ParquetShadowStore(
+    shadow_dir=settings.SHADOW_DIR,
+    row_group_rows=settings.SHADOW_ROW_GROUP_ROWS,
+    compression=settings.SHADOW_COMPRESSION
+)
@@ -0,0 +1,189 @@
+"""
+文件剖析结果存储
+按文件内容的MD5保存检测到的编码、分隔符、列类型、行数和分析结果，
+文件路径的大小和修改时间没有变化时直接命中，变化后重新计算哈希，内容相同（例如重新上传）时仍可复用
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def file_md5(file_path: str, block_bytes: int = 8 * 1024 * 1024) -> str:
+    """按块计算文件的MD5"""
+    md5 = hashlib.md5()
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            block = f.read(block_bytes)
+            if not block:
+                break
+            md5.update(block)
+    return md5.hexdigest()
+
+
+class FileProfileStore:
+    """按内容哈希保存的文件剖析结果"""
+
+    def __init__(self, store_dir: Path, max_profiles: int = 10000, block_bytes: int = 8 * 1024 * 1024):
+        """
+        :param store_dir: 存储目录
+        :param max_profiles: 最多保存的剖析结果数，超出后删除最久未更新的
+        :param block_bytes: 计算哈希时每次读取的字节数
+        """
+        self.store_dir = Path(store_dir)
+        self.max_profiles = max_profiles
+        self.block_bytes = block_bytes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profile_store")
+        self._lock = threading.Lock()
+
+    def _path_entry_file(self, file_path: str) -> Path:
+        digest = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return self.store_dir / "paths" / f"{digest}.json"
+
+    def _profile_file(self, content_hash: str) -> Path:
+        return self.store_dir / "profiles" / f"{content_hash}.json"
+
+    def lookup(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        只按文件大小和修改时间查找剖析结果，不读取文件内容
+        :param file_path: 文件路径
+        :return: 剖析结果，文件变化或没有记录时返回None
+        """
+        content_hash = self._known_hash(file_path)
+        return self._read(self._profile_file(content_hash)) if content_hash else None
+
+    def find(self, file_path: str) -> Dict[str, Any]:
+        """
+        查找剖析结果，文件大小或修改时间变化时重新计算哈希，按内容查找
+        :param file_path: 文件路径
+        :return: 剖析结果，没有记录时为空字典
+        """
+        content_hash = self.content_hash(file_path)
+        return self._read(self._profile_file(content_hash)) or {}
+
+    def content_hash(self, file_path: str) -> str:
+        """文件内容的MD5，大小和修改时间没有变化时使用记录的值"""
+        content_hash = self._known_hash(file_path)
+        if content_hash:
+            return content_hash
+        stat = os.stat(file_path)
+        content_hash = file_md5(file_path, self.block_bytes)
+        self._link(file_path, stat, content_hash)
+        return content_hash
+
+    def update(self, file_path: str, values: Dict[str, Any], content_hash: Optional[str] = None) -> None:
+        """
+        合并剖析结果
+        :param file_path: 文件路径
+        :param values: 要保存的字段
+        :param content_hash: 已知的内容MD5（例如剖析时顺带计算的），省略时按需计算
+        """
+        stat = os.stat(file_path)
+        if content_hash:
+            self._link(file_path, stat, content_hash)
+        else:
+            content_hash = self.content_hash(file_path)
+        # 计算期间文件被修改时不保存
+        if self._known_hash(file_path) != content_hash:
+            return
+
+        profile_file = self._profile_file(content_hash)
+        with self._lock:
+            profile = self._read(profile_file)
+            created = profile is None
+            profile = profile or {"content_hash": content_hash, "size": stat.st_size}
+            profile.update(values)
+            profile["updated_at"] = time.time()
+            self._write(profile_file, profile)
+        if created:
+            self._prune()
+
+    def schedule_update(self, file_path: str, values: Dict[str, Any]) -> None:
+        """在后台线程中合并剖析结果（需要计算哈希时不阻塞调用方）"""
+        self._executor.submit(self._update_in_background, file_path, values)
+
+    def _update_in_background(self, file_path: str, values: Dict[str, Any]) -> None:
+        try:
+            self.update(file_path, values)
+        except Exception as e:
+            logger.warning(f"保存文件剖析结果失败 {file_path}: {str(e)}")
+
+    def invalidate(self, file_path: str) -> None:
+        """删除文件路径的记录（按内容保存的剖析结果保留，供相同内容的文件复用）"""
+        try:
+            self._path_entry_file(file_path).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _known_hash(self, file_path: str) -> Optional[str]:
+        """路径记录的内容哈希，文件大小或修改时间变化时返回None"""
+        entry = self._read(self._path_entry_file(file_path))
+        if not entry:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if entry.get("size") != stat.st_size or entry.get("mtime_ns") != stat.st_mtime_ns:
+            return None
+        return entry.get("content_hash")
+
+    def _link(self, file_path: str, stat: os.stat_result, content_hash: str) -> None:
+        """记录路径对应的内容哈希，stat为计算哈希前的文件状态，计算期间文件变化时不记录"""
+        current = os.stat(file_path)
+        if (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            return
+        self._write(self._path_entry_file(file_path), {
+            "path": os.path.abspath(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "content_hash": content_hash
+        })
+
+    @staticmethod
+    def _read(path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: Path, data: Dict[str, Any]) -> None:
+        """先写临时文件再替换，读取方不会看到写了一半的文件"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(temp_path, path)
+
+    def _prune(self) -> None:
+        """剖析结果数超出上限时删除最久未更新的十分之一"""
+        profiles = list((self.store_dir / "profiles").glob("*.json"))
+        if len(profiles) <= self.max_profiles:
+            return
+        profiles.sort(key=lambda path: path.stat().st_mtime)
+        for path in profiles[:len(profiles) - self.max_profiles + self.max_profiles // 10]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+profile_store = FileProfileStore(
+    store_dir=settings.PROFILE_STORE_DIR,
+    max_profiles=settings.PROFILE_STORE_MAX_PROFILES,
+    block_bytes=settings.PROFILE_BLOCK_BYTES
+)
@@ -0,0 +1,300 @@
+"""
+查询结果缓存
+按数据源ID和规范化SQL缓存database_query的结果，
+结果以zstd压缩的Parquet格式保存在内存和磁盘两级LRU缓存中
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import pandas as pd
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 字符串字面量、带引号的标识符，以及连续的空白和注释
+_SQL_TOKEN_PATTERN = re.compile(
+    r"('(?:[^']|'')*')|(\"(?:[^\"]|\"\")*\")|((?:\s|--[^\n]*|/\*.*?\*/)+)",
+    re.DOTALL
+)
+
+# 只缓存只读查询
+_CACHEABLE_PATTERN = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+# 会修改数据或加锁的关键字，WITH子句中可以包含DML（如 WITH d AS (DELETE ... RETURNING *) SELECT ...）
+_WRITE_PATTERN = re.compile(
+    r"\b(insert|update|delete|merge|truncate|create|drop|alter|grant|revoke|into|lock)\b|;",
+    re.IGNORECASE
+)
+
+
+def normalize_query(query: str) -> str:
+    """
+    规范化SQL：去掉注释、合并空白、去掉结尾分号，字符串字面量保持不变
+    :param query: SQL查询语句
+    :return: 规范化后的SQL
+    """
+    def replace(match):
+        if match.group(1) or match.group(2):
+            return match.group(0)
+        return " "
+
+    normalized = _SQL_TOKEN_PATTERN.sub(replace, query or "").strip()
+    return normalized.rstrip(";").strip()
+
+
+class QueryCache:
+    """查询结果缓存（内存 + 磁盘两级LRU）"""
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        default_ttl: int = 300,
+        memory_budget: int = 256 * 1024 * 1024,
+        disk_budget: int = 2 * 1024 * 1024 * 1024
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.default_ttl = default_ttl
+        self.memory_budget = memory_budget
+        self.disk_budget = disk_budget
+
+        self._entries: Dict[str, Dict[str, Any]] = {}  # 缓存键 -> 元数据
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0
+        }
+
+        # 磁盘索引只保存在内存中，启动时清理上次遗留的缓存文件
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for path in self.cache_dir.glob("*.parquet"):
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def is_cacheable(self, query: str) -> bool:
+        """判断查询是否可以缓存：以SELECT或WITH开头，且字符串字面量和带引号的标识符之外没有写入关键字或多条语句"""
+        normalized = normalize_query(query)
+        if not _CACHEABLE_PATTERN.match(normalized):
+            return False
+        code = _SQL_TOKEN_PATTERN.sub(lambda match: " ", normalized)
+        return not _WRITE_PATTERN.search(code)
+
+    def make_key(self, source_id: int, query: str) -> str:
+        """根据数据源ID和规范化SQL生成缓存键"""
+        raw = f"{source_id}:{normalize_query(query)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, source_id: int, query: str) -> Optional[pd.DataFrame]:
+        """
+        读取缓存的查询结果
+        :param source_id: 数据源ID
+        :param query: SQL查询语句
+        :return: 查询结果，未命中时返回None
+        """
+        key = self.make_key(source_id, query)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+
+            if entry["expires_at"] <= time.time():
+                self._remove(key)
+                self._counters["misses"] += 1
+                return None
+
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+            else:
+                blob = self._read_disk(key)
+                if blob is None:
+                    self._remove(key)
+                    self._counters["misses"] += 1
+                    return None
+                self._counters["disk_hits"] += 1
+                self._store_memory(key, blob)
+
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            entry["hit_count"] += 1
+            self._counters["hits"] += 1
+
+        return pd.read_parquet(io.BytesIO(blob))
+
+    def set(self, source_id: int, query: str, df: pd.DataFrame, ttl_seconds: Optional[int] = None) -> bool:
+        """
+        写入查询结果
+        :param source_id: 数据源ID
+        :param query: SQL查询语句
+        :param df: 查询结果
+        :param ttl_seconds: 有效期（秒），为空时使用默认值
+        :return: 是否写入成功
+        """
+        try:
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, engine="pyarrow", compression="zstd", index=False)
+            blob = buffer.getvalue()
+        except Exception as e:
+            # 混合类型的列等无法序列化为Parquet时不缓存
+            logger.warning(f"查询结果无法缓存: {str(e)}")
+            return False
+
+        size = len(blob)
+        if size > self.memory_budget and size > self.disk_budget:
+            return False
+
+        key = self.make_key(source_id, query)
+        ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl
+
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = {
+                "source_id": source_id,
+                "size": size,
+                "row_count": len(df),
+                "created_at": time.time(),
+                "expires_at": time.time() + ttl,
+                "hit_count": 0
+            }
+            self._store_memory(key, blob)
+            self._store_disk(key, blob)
+            if key not in self._memory and key not in self._disk:
+                del self._entries[key]
+                return False
+            self._counters["stores"] += 1
+
+        return True
+
+    def invalidate(self, source_id: Optional[int] = None, query: Optional[str] = None) -> int:
+        """
+        使缓存失效
+        :param source_id: 数据源ID，为空时清空全部缓存
+        :param query: SQL查询语句，为空时清除该数据源的所有缓存
+        :return: 清除的条目数
+        """
+        with self._lock:
+            if source_id is not None and query:
+                keys = [self.make_key(source_id, query)]
+            elif source_id is not None:
+                keys = [key for key, entry in self._entries.items() if entry["source_id"] == source_id]
+            else:
+                keys = list(self._entries.keys())
+
+            removed = 0
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+                    removed += 1
+
+            self._counters["invalidations"] += removed
+            return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_budget": self.memory_budget,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_budget": self.disk_budget
+            }
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.parquet"
+
+    def _store_memory(self, key: str, blob: bytes) -> None:
+        """写入内存层，超出预算时淘汰最久未使用的条目"""
+        if len(blob) > self.memory_budget:
+            return
+        self._memory[key] = blob
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self.memory_budget:
+            old_key, old_blob = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old_blob)
+            if old_key not in self._disk:
+                self._entries.pop(old_key, None)
+                self._counters["evictions"] += 1
+
+    def _store_disk(self, key: str, blob: bytes) -> None:
+        """写入磁盘层，超出预算时淘汰最久未使用的条目"""
+        if len(blob) > self.disk_budget:
+            return
+        try:
+            with open(self._path(key), "wb") as f:
+                f.write(blob)
+        except OSError as e:
+            logger.warning(f"写入查询缓存文件失败: {str(e)}")
+            return
+        self._disk[key] = len(blob)
+        self._disk_bytes += len(blob)
+        while self._disk_bytes > self.disk_budget:
+            old_key, old_size = self._disk.popitem(last=False)
+            self._disk_bytes -= old_size
+            self._unlink(old_key)
+            if old_key not in self._memory:
+                self._entries.pop(old_key, None)
+                self._counters["evictions"] += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if key not in self._disk:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _remove(self, key: str) -> None:
+        """从内存和磁盘中删除条目"""
+        self._entries.pop(key, None)
+        blob = self._memory.pop(key, None)
+        if blob is not None:
+            self._memory_bytes -= len(blob)
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+            self._unlink(key)
+
+    def _unlink(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+# 全局查询结果缓存实例
+query_cache = QueryCache(
+    cache_dir=settings.QUERY_CACHE_DIR,
+    default_ttl=settings.QUERY_CACHE_TTL_SECONDS,
+    memory_budget=settings.QUERY_CACHE_MEMORY_BYTES,
+    disk_budget=settings.QUERY_CACHE_DISK_BYTES
+)
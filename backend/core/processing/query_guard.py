@@ -0,0 +1,191 @@
+"""
+查询代价预检
+执行用户提交的SQL前先运行EXPLAIN，提取估计行数和代价，
+按阈值决定直接执行、自动加LIMIT、抽样或拒绝
+"""
+import json
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from core.config import settings
+from core.processing.query_cache import normalize_query, query_cache
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 预检结果
+ALLOW = "allow"
+LIMIT = "limit"
+SAMPLE = "sample"
+REJECT = "reject"
+
+# 估计行数超过阈值时的处理方式
+LARGE_RESULT_ACTIONS = [LIMIT, SAMPLE, REJECT]
+
+# 嵌套循环的输出行数接近两侧行数乘积时视为笛卡尔积
+_CROSS_JOIN_MIN_ROWS = 10000
+_CROSS_JOIN_RATIO = 0.9
+
+
+def explain_statement(dialect: str, query: str) -> Optional[str]:
+    """
+    生成EXPLAIN语句
+    :param dialect: 数据库方言
+    :param query: SQL查询语句
+    :return: EXPLAIN语句，数据库不支持代价估计时返回None
+    """
+    query = normalize_query(query)
+    if dialect == "postgresql":
+        return f"EXPLAIN (FORMAT JSON) {query}"
+    if dialect in ("mysql", "mariadb"):
+        return f"EXPLAIN FORMAT=JSON {query}"
+    return None
+
+
+def parse_explain(dialect: str, rows: List[Tuple]) -> Dict[str, Any]:
+    """
+    解析EXPLAIN结果
+    :param dialect: 数据库方言
+    :param rows: EXPLAIN返回的结果行
+    :return: 估计行数、估计代价和是否存在笛卡尔积
+    """
+    raw = rows[0][0] if rows and rows[0] else None
+    data = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+
+    if dialect == "postgresql":
+        plan = data[0]["Plan"]
+        return {
+            "estimated_rows": int(plan.get("Plan Rows", 0)),
+            "estimated_cost": float(plan.get("Total Cost", 0.0)),
+            "cross_join": _postgres_has_cross_join(plan)
+        }
+
+    query_block = data.get("query_block", {})
+    tables = list(_mysql_tables(query_block))
+    estimated_rows = 0
+    for table in tables:
+        estimated_rows = max(estimated_rows, int(float(table.get("rows_produced_per_join", 0) or 0)))
+    return {
+        "estimated_rows": estimated_rows,
+        "estimated_cost": float(query_block.get("cost_info", {}).get("query_cost", 0.0) or 0.0),
+        "cross_join": _mysql_has_cross_join(tables)
+    }
+
+
+def _postgres_has_cross_join(plan: Dict[str, Any]) -> bool:
+    """没有连接条件的嵌套循环：输出行数接近两侧行数的乘积"""
+    children = plan.get("Plans", [])
+    if plan.get("Node Type") == "Nested Loop" and len(children) == 2 and "Join Filter" not in plan:
+        product = children[0].get("Plan Rows", 0) * children[1].get("Plan Rows", 0)
+        if product >= _CROSS_JOIN_MIN_ROWS and plan.get("Plan Rows", 0) >= product * _CROSS_JOIN_RATIO:
+            return True
+    return any(_postgres_has_cross_join(child) for child in children)
+
+
+def _mysql_tables(node: Any):
+    """遍历MySQL执行计划中的所有表"""
+    if isinstance(node, dict):
+        if "table" in node:
+            yield node["table"]
+        for key, value in node.items():
+            if key != "table":
+                yield from _mysql_tables(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _mysql_tables(item)
+
+
+def _mysql_has_cross_join(tables: List[Dict[str, Any]]) -> bool:
+    """除第一张表外，存在全表扫描且没有任何条件的表"""
+    for table in tables[1:]:
+        if (
+            table.get("access_type") == "ALL"
+            and "attached_condition" not in table
+            and float(table.get("rows_produced_per_join", 0) or 0) >= _CROSS_JOIN_MIN_ROWS
+        ):
+            return True
+    return False
+
+
+def get_query_limits(user: Any = None) -> Dict[str, Any]:
+    """
+    获取用户的查询阈值，未设置时使用全局配置
+    :param user: 用户
+    :return: 阈值
+    """
+    max_rows = getattr(user, "query_max_rows", None)
+    max_cost = getattr(user, "query_max_cost", None)
+    return {
+        "max_rows": max_rows if max_rows is not None else settings.QUERY_GUARD_MAX_ROWS,
+        "max_cost": max_cost if max_cost is not None else settings.QUERY_GUARD_MAX_COST,
+        "limit_rows": settings.QUERY_GUARD_LIMIT_ROWS
+    }
+
+
+def decide(
+    query: str,
+    dialect: str,
+    estimate: Dict[str, Any],
+    limits: Dict[str, Any],
+    on_large_result: str = LIMIT
+) -> Dict[str, Any]:
+    """
+    根据估计值决定如何执行查询
+    :param query: SQL查询语句
+    :param dialect: 数据库方言
+    :param estimate: EXPLAIN估计值
+    :param limits: 阈值
+    :param on_large_result: 估计行数超过阈值时的处理方式（limit/sample/reject）
+    :return: 预检结果，query为实际执行的SQL
+    """
+    decision = {
+        "action": ALLOW,
+        "query": query,
+        "reason": "",
+        **estimate,
+        **limits
+    }
+    rows = estimate["estimated_rows"]
+    cost = estimate["estimated_cost"]
+
+    if estimate["cross_join"] and rows > limits["max_rows"]:
+        decision["action"] = REJECT
+        decision["reason"] = (
+            f"查询疑似包含缺少连接条件的笛卡尔积，估计返回 {rows} 行，"
+            f"超过上限 {limits['max_rows']} 行，请检查JOIN条件"
+        )
+        return decision
+
+    if cost > limits["max_cost"]:
+        decision["action"] = REJECT
+        decision["reason"] = (
+            f"查询估计代价 {cost:.0f} 超过上限 {limits['max_cost']:.0f}，"
+            f"请增加过滤条件或联系管理员调整阈值"
+        )
+        return decision
+
+    if rows <= limits["max_rows"]:
+        return decision
+
+    # 只有只读查询可以改写
+    if on_large_result == REJECT or not query_cache.is_cacheable(query):
+        decision["action"] = REJECT
+        decision["reason"] = f"查询估计返回 {rows} 行，超过上限 {limits['max_rows']} 行"
+        return decision
+
+    inner = normalize_query(query)
+    if on_large_result == SAMPLE:
+        fraction = min(limits["limit_rows"] / rows, 1.0)
+        random_function = "RAND()" if dialect in ("mysql", "mariadb") else "random()"
+        decision["action"] = SAMPLE
+        decision["sample_fraction"] = fraction
+        decision["query"] = f"SELECT * FROM ({inner}) AS guarded_query WHERE {random_function} < {fraction:.8f}"
+        decision["reason"] = f"查询估计返回 {rows} 行，已随机抽样约 {limits['limit_rows']} 行"
+    else:
+        decision["action"] = LIMIT
+        decision["query"] = f"SELECT * FROM ({inner}) AS guarded_query LIMIT {limits['limit_rows']}"
+        decision["reason"] = f"查询估计返回 {rows} 行，已自动限制为前 {limits['limit_rows']} 行"
+
+    logger.info(f"查询预检: {decision['action']}, {decision['reason']}")
+    return decision
@@ -0,0 +1,222 @@
+"""
+数据库元数据缓存
+缓存外部数据源的表、列、类型、行数估计和索引信息，避免重复反射数据库结构
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import create_engine, inspect, text, types
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SchemaCache:
+    """数据库元数据缓存，按数据源ID保存反射结果"""
+
+    def __init__(self, ttl_seconds: int = 3600):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._source_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _get_source_lock(self, source_id: int) -> threading.Lock:
+        """获取数据源级别的锁，保证同一数据源同时只反射一次"""
+        with self._lock:
+            if source_id not in self._source_locks:
+                self._source_locks[source_id] = threading.Lock()
+            return self._source_locks[source_id]
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        """检查缓存条目是否仍在有效期内"""
+        return time.time() - entry["loaded_at"] < self.ttl_seconds
+
+    def get(self, source_id: int) -> Optional[Dict[str, Any]]:
+        """
+        获取缓存的元数据（不触发加载）
+        :param source_id: 数据源ID
+        :return: 元数据，如果不存在或已过期则返回None
+        """
+        entry = self._entries.get(source_id)
+        if entry and self._is_fresh(entry):
+            return entry
+        return None
+
+    def get_or_load(self, source_id: int, connection_string: str, force: bool = False) -> Dict[str, Any]:
+        """
+        获取元数据，缓存缺失或过期时重新反射
+        :param source_id: 数据源ID
+        :param connection_string: 数据库连接字符串
+        :param force: 是否强制刷新
+        :return: 元数据
+        """
+        if not force:
+            entry = self.get(source_id)
+            if entry:
+                return entry
+
+        with self._get_source_lock(source_id):
+            # 等待锁期间可能已被其他线程加载
+            if not force:
+                entry = self.get(source_id)
+                if entry:
+                    return entry
+            return self.refresh(source_id, connection_string)
+
+    def refresh(self, source_id: int, connection_string: str) -> Dict[str, Any]:
+        """
+        重新反射数据库结构并写入缓存
+        :param source_id: 数据源ID
+        :param connection_string: 数据库连接字符串
+        :return: 元数据
+        """
+        started = time.time()
+        tables = self._reflect(connection_string)
+        entry = {
+            "source_id": source_id,
+            "tables": tables,
+            "table_count": len(tables),
+            "loaded_at": time.time(),
+            "load_seconds": round(time.time() - started, 3)
+        }
+        self._entries[source_id] = entry
+        logger.info(f"已缓存数据源 {source_id} 的元数据: {len(tables)} 张表, 耗时 {entry['load_seconds']} 秒")
+        return entry
+
+    def refresh_in_background(self, source_id: int, connection_string: str) -> None:
+        """
+        后台刷新元数据，出错时只记录日志
+        :param source_id: 数据源ID
+        :param connection_string: 数据库连接字符串
+        """
+        try:
+            self.get_or_load(source_id, connection_string, force=True)
+        except Exception as e:
+            logger.error(f"后台加载数据源 {source_id} 元数据失败: {str(e)}")
+
+    def invalidate(self, source_id: int) -> None:
+        """
+        使数据源的缓存失效
+        :param source_id: 数据源ID
+        """
+        self._entries.pop(source_id, None)
+
+    def get_table_names(self, source_id: int, connection_string: str) -> List[str]:
+        """
+        获取表名列表
+        :param source_id: 数据源ID
+        :param connection_string: 数据库连接字符串
+        :return: 表名列表
+        """
+        return list(self.get_or_load(source_id, connection_string)["tables"].keys())
+
+    def get_table(self, source_id: int, connection_string: str, table_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单张表的元数据
+        :param source_id: 数据源ID
+        :param connection_string: 数据库连接字符串
+        :param table_name: 表名
+        :return: 表元数据，表不存在时返回None
+        """
+        return self.get_or_load(source_id, connection_string)["tables"].get(table_name)
+
+    async def aget_or_load(self, source_id: int, connection_string: str, force: bool = False) -> Dict[str, Any]:
+        """在线程池中获取元数据，避免反射阻塞事件循环"""
+        return await asyncio.to_thread(self.get_or_load, source_id, connection_string, force)
+
+    def _reflect(self, connection_string: str) -> Dict[str, Dict[str, Any]]:
+        """
+        反射数据库结构
+        :param connection_string: 数据库连接字符串
+        :return: 表名到表元数据的映射
+        """
+        engine = create_engine(connection_string)
+        try:
+            inspector = inspect(engine)
+            table_stats = self._get_table_stats(engine)
+
+            tables = {}
+            for table_name in inspector.get_table_names():
+                columns = [
+                    {
+                        "name": column["name"],
+                        "type": str(column["type"]),
+                        "numeric": isinstance(column["type"], (types.Integer, types.Numeric, types.Float)),
+                        "nullable": bool(column.get("nullable", True)),
+                        "default": str(column["default"]) if column.get("default") is not None else None
+                    }
+                    for column in inspector.get_columns(table_name)
+                ]
+
+                primary_key = inspector.get_pk_constraint(table_name) or {}
+                indexes = [
+                    {
+                        "name": index.get("name"),
+                        "columns": index.get("column_names", []),
+                        "unique": bool(index.get("unique", False))
+                    }
+                    for index in inspector.get_indexes(table_name)
+                ]
+
+                stats = table_stats.get(table_name, {})
+                tables[table_name] = {
+                    "name": table_name,
+                    "columns": columns,
+                    "column_count": len(columns),
+                    "primary_key": primary_key.get("constrained_columns", []),
+                    "indexes": indexes,
+                    "row_estimate": stats.get("row_estimate"),
+                    "size_bytes": stats.get("size_bytes")
+                }
+
+            return tables
+        finally:
+            engine.dispose()
+
+    def _get_table_stats(self, engine: Any) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        从系统目录读取行数估计和表大小，不扫描数据
+        :param engine: 数据库连接引擎
+        :return: 表名到统计信息的映射
+        """
+        dialect = engine.dialect.name
+        if dialect == "postgresql":
+            query = (
+                "SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid) "
+                "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relkind IN ('r', 'p') AND n.nspname = current_schema()"
+            )
+        elif dialect in ("mysql", "mariadb"):
+            query = (
+                "SELECT table_name, table_rows, data_length + index_length "
+                "FROM information_schema.tables WHERE table_schema = DATABASE()"
+            )
+        else:
+            return {}
+
+        try:
+            with engine.connect() as conn:
+                rows = conn.execute(text(query)).fetchall()
+        except SQLAlchemyError as e:
+            logger.warning(f"读取表统计信息失败: {str(e)}")
+            return {}
+
+        stats = {}
+        for name, row_estimate, size_bytes in rows:
+            stats[name] = {
+                # PostgreSQL未ANALYZE的表reltuples为-1
+                "row_estimate": int(row_estimate) if row_estimate is not None and row_estimate >= 0 else None,
+                "size_bytes": int(size_bytes) if size_bytes is not None else None
+            }
+        return stats
+
+
+# 全局元数据缓存实例
+schema_cache = SchemaCache(ttl_seconds=settings.SCHEMA_CACHE_TTL_SECONDS)
@@ -0,0 +1,101 @@
+"""
+按词元切分文本块
+逐块读取文本并切分词元（单词、单个汉字和标点），按句末或行末切分为有重叠的文本块；
+切分点由附近的内容决定（内容定义分块），文档中间被编辑后，编辑位置之后的切分点很快与之前一致，
+因此重新嵌入时只有被修改的文本块需要重新计算
+"""
+import hashlib
+import logging
+import re
+import zlib
+from typing import Dict, Any, List, Iterator, Iterable, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 词元：字母数字串（不含汉字等）、单个汉字/假名/谚文、其他单个非空白字符
+_CJK = "\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af"
+TOKEN_PATTERN = re.compile(rf"[^\W_{_CJK}]+(?:['’][^\W_{_CJK}]+)*|[{_CJK}]|\S")
+_SENTENCE_ENDS = frozenset(".!?;。！？；…")
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为词元"""
+    return TOKEN_PATTERN.findall(text)
+
+
+def chunk_hash(text: str) -> str:
+    """文本块的内容哈希"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class TextChunker:
+    """按词元切分有重叠的文本块"""
+
+    def __init__(self, chunk_tokens: int = 256, overlap_tokens: int = 32, boundary_divisor: int = 4):
+        """
+        :param chunk_tokens: 目标词元数，达到后在下一个句末或行末切分，达到1.5倍时强制切分
+        :param overlap_tokens: 相邻文本块重叠的词元数
+        :param boundary_divisor: 达到最小长度（目标的一半）后，句末或行末按内容哈希以1/boundary_divisor的概率切分
+        """
+        if chunk_tokens < 2:
+            raise ValueError("chunk_tokens必须大于1")
+        if not 0 <= overlap_tokens < chunk_tokens // 2:
+            raise ValueError("overlap_tokens必须小于chunk_tokens的一半")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.boundary_divisor = max(boundary_divisor, 1)
+        self.min_tokens = max(chunk_tokens // 2, overlap_tokens + 1)
+        self.max_tokens = chunk_tokens + chunk_tokens // 2
+
+    def chunks(self, blocks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        """
+        切分文本
+        :param blocks: 依次读取的文本段，每段在换行符处结束（最后一段除外），单词不会跨段
+        :return: 文本块 {"text", "hash", "start", "end", "tokens"}，start/end为字符偏移
+        """
+        buffer = ""
+        buffer_offset = 0
+        # 当前文本块的词元 (开始偏移, 结束偏移, 词元是否为句末或行末)
+        current: List[Tuple[int, int, bool]] = []
+        # current开头从上一个文本块重叠过来、已经输出过的词元数
+        carried = 0
+        offset = 0
+        min_tokens, max_tokens = self.min_tokens, self.max_tokens
+
+        for block in blocks:
+            # 只保留当前文本块开始之后的文本
+            keep_from = current[0][0] if current else offset
+            buffer = buffer[keep_from - buffer_offset:] + block
+            buffer_offset = keep_from
+            block_length = len(block)
+            for match in TOKEN_PATTERN.finditer(block):
+                start, end = match.span()
+                candidate = (end >= block_length or block[end] == "\n"
+                             or block[start:end] in _SENTENCE_ENDS)
+                current.append((start + offset, end + offset, candidate))
+                count = len(current)
+                if count >= max_tokens or (candidate and count >= min_tokens and self._is_boundary(current, buffer, buffer_offset)):
+                    yield self._emit(current, buffer, buffer_offset)
+                    current = current[count - self.overlap_tokens:] if self.overlap_tokens else []
+                    carried = len(current)
+            offset += block_length
+
+        if len(current) > carried:
+            yield self._emit(current, buffer, buffer_offset)
+
+    def _is_boundary(self, current: List[Tuple[int, int, bool]], buffer: str, buffer_offset: int) -> bool:
+        """已达到最小长度的句末或行末是否切分"""
+        if len(current) >= self.chunk_tokens:
+            return True
+        # 由切分点前的两个词元决定，与文本块从哪里开始无关
+        start = current[-2][0] - buffer_offset
+        end = current[-1][1] - buffer_offset
+        return zlib.crc32(buffer[start:end].encode("utf-8")) % self.boundary_divisor == 0
+
+    @staticmethod
+    def _emit(current: List[Tuple[int, int, bool]], buffer: str, buffer_offset: int) -> Dict[str, Any]:
+        start, end = current[0][0], current[-1][1]
+        text = buffer[start - buffer_offset:end - buffer_offset]
+        return {"text": text, "hash": chunk_hash(text), "start": start, "end": end, "tokens": len(current)}
@@ -0,0 +1,454 @@
+"""
+文本流式处理管道
+把文本操作编译为依次执行的阶段，按由完整的行组成的块读取文件，每块依次经过所有阶段后立即写出，
+正则表达式只编译一次，内存占用与文件大小无关；
+只有需要整个文本的操作（跨行替换、按句子转换大小写）才把到达该阶段的文本收集到内存
+"""
+import logging
+import os
+import re
+import uuid
+from typing import Dict, Any, List, Optional, Callable
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TEXT_OPERATIONS = ["replace_text", "regex_replace", "insert_text", "remove_lines", "filter_lines", "convert_case"]
+
+# 句子大小写：按句末标点后的空白切分
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+class TextPipelineCancelled(Exception):
+    """处理被取消"""
+
+
+class TextBlock:
+    """由完整的行组成的一段文本，按需在字符串和行列表（不含换行符）之间转换"""
+
+    __slots__ = ("_text", "_lines", "_terminated")
+
+    def __init__(self, text: str):
+        self._text: Optional[str] = text
+        self._lines: Optional[List[str]] = None
+        self._terminated = False
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "\n".join(self._lines) + ("\n" if self._terminated and self._lines else "")
+        return self._text
+
+    @text.setter
+    def text(self, value: str) -> None:
+        self._text = value
+        self._lines = None
+
+    @property
+    def lines(self) -> List[str]:
+        if self._lines is None:
+            lines = self._text.split("\n") if self._text else []
+            # 以换行符结尾时最后一个元素是空串
+            self._terminated = bool(lines) and lines[-1] == ""
+            if self._terminated:
+                lines.pop()
+            self._lines = lines
+        return self._lines
+
+    @lines.setter
+    def lines(self, value: List[str]) -> None:
+        """设置处理后的行，调用方先读取过lines，结尾是否有换行符保持不变"""
+        self._lines = value
+        self._text = None
+
+
+class _Stage:
+    """管道阶段：逐块处理，结束时可以输出剩余文本"""
+
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+
+    def process(self, block: TextBlock) -> Optional[TextBlock]:
+        return block
+
+    def finish(self) -> Optional[str]:
+        return None
+
+
+class _ReplaceText(_Stage):
+    def __init__(self, result: Dict[str, Any], old_text: str, new_text: str):
+        super().__init__(result)
+        self.old_text = old_text
+        self.new_text = new_text
+        self.count = 0
+
+    def process(self, block: TextBlock) -> TextBlock:
+        text = block.text
+        count = text.count(self.old_text)
+        if count:
+            self.count += count
+            block.text = text.replace(self.old_text, self.new_text)
+        return block
+
+    def finish(self) -> None:
+        self.result["applied"] = True
+        self.result["message"] = f"已替换 {self.count} 处文本"
+
+
+class _RegexReplace(_Stage):
+    def __init__(self, result: Dict[str, Any], pattern: re.Pattern, replacement: str):
+        super().__init__(result)
+        self.pattern = pattern
+        self.replacement = replacement
+        self.count = 0
+
+    def process(self, block: TextBlock) -> TextBlock:
+        subn = self.pattern.subn
+        replaced = [subn(self.replacement, line) for line in block.lines]
+        self.count += sum(count for _, count in replaced)
+        block.lines = [line for line, _ in replaced]
+        return block
+
+    def finish(self) -> None:
+        self.result["applied"] = True
+        self.result["message"] = f"已替换 {self.count} 处匹配项"
+
+
+class _FilterLines(_Stage):
+    def __init__(self, result: Dict[str, Any], pattern: re.Pattern, keep_matching: bool):
+        super().__init__(result)
+        self.pattern = pattern
+        self.keep_matching = keep_matching
+        self.removed = 0
+
+    def process(self, block: TextBlock) -> TextBlock:
+        lines = block.lines
+        search = self.pattern.search
+        if self.keep_matching:
+            kept = [line for line in lines if search(line)]
+        else:
+            kept = [line for line in lines if not search(line)]
+        self.removed += len(lines) - len(kept)
+        block.lines = kept
+        return block
+
+    def finish(self) -> None:
+        self.result["applied"] = True
+        self.result["message"] = f"已{'保留' if self.keep_matching else '移除'} {self.removed} 行"
+
+
+class _RemoveLines(_Stage):
+    def __init__(self, result: Dict[str, Any], start_line: int, end_line: int):
+        super().__init__(result)
+        self.start_line = start_line
+        self.end_line = end_line
+        self.seen = 0
+
+    def process(self, block: TextBlock) -> TextBlock:
+        lines = block.lines
+        # 本块的行号为 seen+1 .. seen+len(lines)
+        first = max(self.start_line - 1 - self.seen, 0)
+        last = min(self.end_line - self.seen, len(lines))
+        self.seen += len(lines)
+        if first < last:
+            block.lines = lines[:first] + lines[last:]
+        return block
+
+    def finish(self) -> None:
+        if self.seen < self.start_line:
+            self.result["message"] = f"行号范围 {self.start_line}-{self.end_line} 超出范围"
+            return
+        self.result["applied"] = True
+        self.result["message"] = f"已删除第 {self.start_line} 到第 {min(self.end_line, self.seen)} 行"
+
+
+class _InsertText(_Stage):
+    def __init__(self, result: Dict[str, Any], position: str, text: str, line_number: int):
+        super().__init__(result)
+        self.position = position
+        self.text = text
+        self.line_number = line_number
+        self.seen = 0
+        self.inserted = False
+
+    def process(self, block: TextBlock) -> TextBlock:
+        if self.inserted or self.position == "end":
+            return block
+        if self.position == "start":
+            block.text = self.text + block.text
+            self.inserted = True
+            return block
+
+        lines = block.lines
+        index = self.line_number - 1 - self.seen
+        self.seen += len(lines)
+        # 插入位置可以是本块最后一行之后，即下一块的第一行之前
+        if 0 <= index <= len(lines):
+            block.lines = lines[:index] + [self.text] + lines[index:]
+            self.inserted = True
+        return block
+
+    def finish(self) -> Optional[str]:
+        tail = None
+        if self.position == "end" or (self.position == "start" and not self.inserted):
+            tail = self.text
+        elif not self.inserted and self.line_number == self.seen + 1:
+            # 空文件中插入第1行
+            tail = self.text
+        elif not self.inserted:
+            self.result["message"] = f"行号 {self.line_number} 超出范围"
+            return None
+        self.result["applied"] = True
+        self.result["message"] = f"已在 {self.position} 位置插入文本"
+        return tail
+
+
+class _ConvertCase(_Stage):
+    def __init__(self, result: Dict[str, Any], case_type: str):
+        super().__init__(result)
+        self.case_type = case_type
+        self.convert = {"lower": str.lower, "upper": str.upper, "title": str.title}[case_type]
+
+    def process(self, block: TextBlock) -> TextBlock:
+        block.text = self.convert(block.text)
+        return block
+
+    def finish(self) -> None:
+        self.result["applied"] = True
+        self.result["message"] = f"已转换为 {self.case_type} 大小写"
+
+
+class _WholeText(_Stage):
+    """需要整个文本的操作：收集到达本阶段的全部文本，结束时一次处理后输出"""
+
+    def __init__(self, result: Dict[str, Any], transform: Callable[[str], str], message: Callable[[str], str]):
+        super().__init__(result)
+        self.transform = transform
+        self.message = message
+        self.parts: List[str] = []
+
+    def process(self, block: TextBlock) -> None:
+        self.parts.append(block.text)
+        return None
+
+    def finish(self) -> str:
+        content = "".join(self.parts)
+        self.parts = []
+        self.result["applied"] = True
+        self.result["message"] = self.message(content)
+        return self.transform(content)
+
+
+def compile_text_operation(operation: Dict[str, Any], result: Dict[str, Any]) -> Optional[_Stage]:
+    """
+    把文本操作编译为管道阶段
+    :param operation: 操作定义
+    :param result: 操作结果，参数无效时写入原因
+    :return: 阶段，参数无效时返回None
+    """
+    operation_type = operation.get("type")
+
+    if operation_type == "replace_text":
+        old_text = operation.get("old_text", "")
+        new_text = operation.get("new_text", "")
+        if not old_text:
+            result["message"] = "未指定要替换的文本"
+            return None
+        if "\n" in old_text:
+            # 跨行替换
+            return _WholeText(
+                result, lambda content: content.replace(old_text, new_text),
+                lambda content: f"已替换 {content.count(old_text)} 处文本"
+            )
+        return _ReplaceText(result, old_text, new_text)
+
+    if operation_type in ("regex_replace", "filter_lines"):
+        pattern = operation.get("pattern", "")
+        if not pattern:
+            result["message"] = "未指定正则表达式模式" if operation_type == "regex_replace" else "未指定过滤模式"
+            return None
+        try:
+            compiled = re.compile(pattern)
+        except re.error as e:
+            result["message"] = f"正则表达式错误: {str(e)}"
+            return None
+        if operation_type == "filter_lines":
+            return _FilterLines(result, compiled, operation.get("keep_matching", True))
+        replacement = operation.get("replacement", "")
+        if "\n" in pattern or "\\n" in pattern:
+            # 模式中包含换行符时按整个文本匹配
+            return _WholeText(
+                result, lambda content: compiled.sub(replacement, content),
+                lambda content: f"已替换 {len(compiled.findall(content))} 处匹配项"
+            )
+        # 其他模式逐行匹配，^和$匹配行首和行尾
+        return _RegexReplace(result, compiled, replacement)
+
+    if operation_type == "insert_text":
+        position = operation.get("position", "start")
+        text = operation.get("text", "")
+        if not text:
+            result["message"] = "未指定要插入的文本"
+            return None
+        if position not in ("start", "end", "line"):
+            result["message"] = f"不支持的位置: {position}"
+            return None
+        return _InsertText(result, position, text, int(operation.get("line_number", 1)))
+
+    if operation_type == "remove_lines":
+        start_line = int(operation.get("start_line", 1))
+        end_line = int(operation.get("end_line", start_line))
+        if start_line < 1 or end_line < start_line:
+            result["message"] = f"行号范围 {start_line}-{end_line} 超出范围"
+            return None
+        return _RemoveLines(result, start_line, end_line)
+
+    if operation_type == "convert_case":
+        case_type = operation.get("case_type", "lower")
+        if case_type == "sentence":
+            # 句子大小写：每个句子的第一个字母大写
+            return _WholeText(
+                result,
+                lambda content: " ".join(s.capitalize() for s in _SENTENCE_PATTERN.split(content)),
+                lambda content: "已转换为 sentence 大小写"
+            )
+        if case_type not in ("lower", "upper", "title"):
+            result["message"] = f"不支持的大小写类型: {case_type}"
+            return None
+        return _ConvertCase(result, case_type)
+
+    result["message"] = f"不支持的操作类型: {operation_type}"
+    return None
+
+
+class StreamingTextPipeline:
+    """文本流式处理管道"""
+
+    def __init__(
+        self,
+        file_path: str,
+        output_path: str,
+        operations: List[Dict[str, Any]],
+        encoding: str = "utf-8",
+        block_chars: int = 4 * 1024 * 1024,
+        sample_chars: int = 1000,
+        should_cancel: Optional[Callable[[], bool]] = None,
+        on_progress: Optional[Callable[[float], None]] = None
+    ):
+        """
+        :param file_path: 源文件路径
+        :param output_path: 输出文件路径
+        :param operations: 操作列表
+        :param encoding: 源文件编码
+        :param block_chars: 每次读取的字符数（块在最后一个换行符处截断）
+        :param sample_chars: 返回的输出开头字符数
+        """
+        self.file_path = file_path
+        self.output_path = output_path
+        self.operations = operations
+        self.encoding = encoding
+        self.block_chars = block_chars
+        self.sample_chars = sample_chars
+        self.should_cancel = should_cancel or (lambda: False)
+        self.on_progress = on_progress or (lambda fraction: None)
+
+        self.operation_results: List[Dict[str, Any]] = []
+        self.stages: List[_Stage] = []
+        for operation in operations:
+            result = {"operation": operation, "applied": False, "message": ""}
+            self.operation_results.append(result)
+            stage = compile_text_operation(operation, result)
+            if stage is not None:
+                self.stages.append(stage)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        执行管道，先写临时文件，完成后替换为输出文件（输出路径可以与源文件相同）
+        :return: 处理结果
+        """
+        original = _TextCounter()
+        processed = _TextCounter()
+        sample: List[str] = []
+        sample_length = 0
+
+        temp_path = f"{self.output_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(self.file_path, "r", encoding=self.encoding, errors="ignore") as source, \
+                    open(temp_path, "w", encoding="utf-8") as output:
+                def emit(text: str, start: int) -> None:
+                    nonlocal sample_length
+                    block: Optional[TextBlock] = TextBlock(text)
+                    for stage in self.stages[start:]:
+                        block = stage.process(block)
+                        if block is None:
+                            return
+                    text = block.text
+                    if not text:
+                        return
+                    output.write(text)
+                    processed.add(text)
+                    if sample_length < self.sample_chars:
+                        sample.append(text[:self.sample_chars - sample_length])
+                        sample_length += len(sample[-1])
+
+                for text in self._read_blocks(source):
+                    original.add(text)
+                    emit(text, 0)
+                # 各阶段结束时输出的剩余文本继续经过后面的阶段
+                for index, stage in enumerate(self.stages):
+                    tail = stage.finish()
+                    if tail:
+                        emit(tail, index + 1)
+            os.replace(temp_path, self.output_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return {
+            "original_line_count": original.lines,
+            "original_char_count": original.chars,
+            "processed_line_count": processed.lines,
+            "processed_char_count": processed.chars,
+            "operation_results": self.operation_results,
+            "sample_content": "".join(sample)
+        }
+
+    def _read_blocks(self, source):
+        """按块读取，每块在最后一个换行符处截断，不完整的行留到下一块"""
+        total = max(os.path.getsize(self.file_path), 1)
+        carry = ""
+        while True:
+            if self.should_cancel():
+                raise TextPipelineCancelled()
+            data = source.read(self.block_chars)
+            if not data:
+                break
+            data = carry + data if carry else data
+            cut = data.rfind("\n") + 1
+            if not cut:
+                carry = data
+                continue
+            carry = data[cut:]
+            self.on_progress(min(source.buffer.tell() / total, 1.0))
+            yield data[:cut]
+        if carry:
+            yield carry
+
+
+class _TextCounter:
+    """统计分段写出的文本的行数（与splitlines一致，结尾没有换行符的最后一行也计入）和字符数"""
+
+    def __init__(self):
+        self.chars = 0
+        self._newlines = 0
+        self._last = "\n"
+
+    def add(self, text: str) -> None:
+        self.chars += len(text)
+        self._newlines += text.count("\n")
+        self._last = text[-1]
+
+    @property
+    def lines(self) -> int:
+        return self._newlines + (0 if self._last == "\n" else 1)
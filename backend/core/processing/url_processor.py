@@ -18,6 +18,8 @@ import numpy as np
 
 from models.domain.dataset import ProcessingTask, URLSource
 from core.processing.base import BaseDataProcessor
+from core.processing.heavy_hitters import HeavyHitters, iter_text_blocks
+from core.config import settings
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -1128,23 +1130,24 @@ class URLProcessor(BaseDataProcessor):
             # 提取文本内容
             text = soup.get_text(separator=' ', strip=True)
 
-            # 分词
-            words = re.findall(r'\b\w+\b', text.lower())
-
-            # 词频统计
-            from collections import Counter
-            word_freq = Counter(words)
+            # 分块分词并统计词频，高频词摘要的内存不随词汇量增长
+            word_freq = HeavyHitters(settings.TOP_WORDS_CAPACITY)
+            word_count = 0
+            word_length = 0
+            for block in iter_text_blocks(text):
+                stats = word_freq.add_text(block)
+                word_count += stats["words"]
+                word_length += stats["length"]
 
             # 计算可读性
             sentences = re.split(r'[.!?]+', text)
             sentence_count = len([s for s in sentences if s.strip()])
-            word_count = len(words)
 
             # 计算平均句子长度
             avg_sentence_length = word_count / sentence_count if sentence_count > 0 else 0
 
             # 计算平均单词长度
-            avg_word_length = sum(len(word) for word in words) / word_count if word_count > 0 else 0
+            avg_word_length = word_length / word_count if word_count > 0 else 0
 
             # 返回结果
             return {
@@ -1157,10 +1160,10 @@ class URLProcessor(BaseDataProcessor):
                     "avg_word_length": avg_word_length
                 },
                 "top_words": [
-                    {"word": word, "count": count}
-                    for word, count in word_freq.most_common(20)
-                    if len(word) > 3  # 忽略短词
+                    entry for entry in word_freq.top_words(20)
+                    if len(entry["word"]) > 3  # 忽略短词
                 ],
+                "top_words_max_error": word_freq.max_error,
                 "content_sections": self._extract_content_sections(soup)
             }
 
@@ -0,0 +1,503 @@
+"""
+向量索引
+IVF-Flat近似最近邻索引，每个嵌入模型一个索引，每个数据集一个分区（未关联数据集的笔记在所属用户的notes分区）：
+- 基础段：向量按所属聚类中心（倒排列表）排序后连续保存，以内存映射方式打开，搜索时只计算最近的nprobe个列表
+- 增量段：新插入的向量先放在增量段中暴力搜索，超过基础段的一定比例后合并进基础段
+- 删除只做标记，合并时清除；向量数增长到训练时的4倍后重新训练聚类中心
+向量数少于VECTOR_INDEX_TRAIN_MIN时不分列表，直接精确搜索。相似度为余弦相似度（向量插入时归一化）
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from core.config import settings
+from core.processing.vector_store import VectorStore, vector_stores
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 每个向量的元数据字段（与向量按行对应）
+META_FIELDS = {"row": np.int64, "source_id": np.int64, "user_id": np.int64, "source_type": np.int8}
+SOURCE_TYPES = {"file": 0, "note": 1}
+_SOURCE_TYPE_NAMES = {code: name for name, code in SOURCE_TYPES.items()}
+
+
+def _empty_meta() -> Dict[str, np.ndarray]:
+    return {field: np.zeros(0, dtype=dtype) for field, dtype in META_FIELDS.items()}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def _load_vectors(path: Path) -> np.ndarray:
+    """以内存映射方式打开向量文件（空数组不能映射）"""
+    vectors = np.load(path, mmap_mode="r")
+    return vectors if len(vectors) else np.asarray(vectors)
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray, batch_rows: int = 8192) -> np.ndarray:
+    """每个向量最近（内积最大）的聚类中心"""
+    result = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_rows):
+        result[start:start + batch_rows] = np.argmax(vectors[start:start + batch_rows] @ centroids.T, axis=1)
+    return result
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """
+    球面k-means训练聚类中心，只使用最多64*nlist个抽样向量
+    :param vectors: 归一化的向量
+    :param nlist: 聚类中心数
+    :return: 形状为 (nlist, 维度) 的归一化聚类中心
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), nlist * 64)
+    sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))])
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums
+        # 空的聚类重新取随机向量
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+class _Segment:
+    """一段向量及其元数据，lists为倒排列表在向量中的起止偏移（长度nlist+1），没有聚类中心时只有一个列表"""
+
+    def __init__(self, vectors: np.ndarray, meta: Dict[str, np.ndarray], dead: Optional[np.ndarray] = None,
+                 centroids: Optional[np.ndarray] = None, lists: Optional[np.ndarray] = None):
+        self.vectors = vectors
+        self.meta = meta
+        self.dead = dead if dead is not None else np.zeros(len(vectors), dtype=bool)
+        self.centroids = centroids
+        self.lists = lists if lists is not None else np.array([0, len(vectors)], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def live_count(self) -> int:
+        return len(self.vectors) - int(self.dead.sum())
+
+    def search(self, query: np.ndarray, top_k: int, nprobe: int,
+               filters: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        搜索本段，满足过滤条件的结果不足top_k时扩大探测的列表数
+        :return: (相似度, 段内位置)
+        """
+        if not len(self.vectors):
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        if self.centroids is None:
+            order = np.zeros(1, dtype=np.int64)
+        else:
+            order = np.argsort(-(self.centroids @ query))
+            nprobe = min(max(nprobe, 1), len(order))
+
+        probed = 0
+        scores_parts, position_parts = [], []
+        found = 0
+        while True:
+            target = len(order) if self.centroids is None else nprobe
+            for l in order[probed:target]:
+                start, end = int(self.lists[l]), int(self.lists[l + 1])
+                if start == end:
+                    continue
+                positions = np.arange(start, end)
+                mask = ~self.dead[start:end]
+                for field, value in filters.items():
+                    mask &= self.meta[field][start:end] == value
+                if not mask.any():
+                    continue
+                positions = positions[mask]
+                scores = np.asarray(self.vectors[start:end])[mask] @ query
+                scores_parts.append(scores)
+                position_parts.append(positions)
+                found += len(positions)
+            probed = target
+            if found >= top_k or probed >= len(order):
+                break
+            nprobe = probed * 4
+
+        if not scores_parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        scores = np.concatenate(scores_parts)
+        positions = np.concatenate(position_parts)
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+            scores, positions = scores[best], positions[best]
+        return scores, positions
+
+
+class IndexPartition:
+    """索引的一个分区，保存在单独的目录中"""
+
+    def __init__(self, partition_dir: Path, train_min: int = 10000, merge_ratio: float = 0.05,
+                 merge_min: int = 2048):
+        """
+        :param partition_dir: 分区目录
+        :param train_min: 向量数达到该值后训练聚类中心，否则精确搜索
+        :param merge_ratio: 增量段超过基础段的该比例（且不少于merge_min）时合并
+        """
+        self.partition_dir = Path(partition_dir)
+        self.train_min = train_min
+        self.merge_ratio = merge_ratio
+        self.merge_min = merge_min
+        self.dimensions: Optional[int] = None
+        self.trained_count = 0
+        self.base_version: Optional[str] = None
+        # (基础段, 增量段)，整体替换，搜索时不需要加锁
+        self._state = (_Segment(np.zeros((0, 0), dtype=np.float32), _empty_meta()),
+                       _Segment(np.zeros((0, 0), dtype=np.float32), _empty_meta()))
+        # 写入（插入、删除和合并）串行执行
+        self._lock = threading.RLock()
+        self._load()
+
+    @property
+    def base(self) -> _Segment:
+        return self._state[0]
+
+    @property
+    def pending(self) -> _Segment:
+        return self._state[1]
+
+    def __len__(self) -> int:
+        return self.base.live_count() + self.pending.live_count()
+
+    def _load(self) -> None:
+        manifest_path = self.partition_dir / "manifest.json"
+        if not manifest_path.exists():
+            return
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.dimensions = manifest["dimensions"]
+        self.trained_count = manifest["trained_count"]
+        self.base_version = manifest["base_version"]
+
+        if self.base_version:
+            base_dir = self.partition_dir / f"base-{self.base_version}"
+            vectors = _load_vectors(base_dir / "vectors.npy")
+            with np.load(base_dir / "meta.npz") as data:
+                meta = {field: data[field] for field in META_FIELDS}
+                lists = data["lists"]
+                centroids = data["centroids"] if "centroids" in data.files else None
+            self._state = (_Segment(vectors, meta, centroids=centroids, lists=lists), self.pending)
+
+        delta_path = self.partition_dir / f"delta-{self.base_version}.npz"
+        if delta_path.exists():
+            with np.load(delta_path) as data:
+                self.base.dead = data["base_dead"]
+                self._state = (self.base, _Segment(data["vectors"], {field: data[field] for field in META_FIELDS},
+                                                   dead=data["dead"]))
+
+    def entries(self, source_type: int, source_id: int) -> Dict[int, List[Tuple[_Segment, int]]]:
+        """数据源现有的向量 {向量存储行号: [(段, 段内位置)]}"""
+        result: Dict[int, List[Tuple[_Segment, int]]] = {}
+        for segment in (self.base, self.pending):
+            if not len(segment):
+                continue
+            mask = (segment.meta["source_id"] == source_id) & (segment.meta["source_type"] == source_type) & ~segment.dead
+            for position in np.flatnonzero(mask):
+                result.setdefault(int(segment.meta["row"][position]), []).append((segment, int(position)))
+        return result
+
+    def update_source(self, source_type: int, source_id: int, user_id: int, rows: List[int],
+                      vectors: np.ndarray) -> Dict[str, int]:
+        """
+        用数据源当前的向量替换之前的：只删除不再存在的、插入新增的
+        :param rows: 向量在向量存储中的行号
+        :param vectors: 与rows对应的向量
+        :return: 插入和删除的向量数
+        """
+        with self._lock:
+            existing = self.entries(source_type, source_id)
+            wanted = {}
+            for i, row in enumerate(rows):
+                wanted.setdefault(int(row), i)
+
+            removed = 0
+            for row, locations in existing.items():
+                if row not in wanted:
+                    for segment, position in locations:
+                        segment.dead[position] = True
+                        removed += 1
+            new_rows = [row for row in wanted if row not in existing]
+            if new_rows:
+                indices = [wanted[row] for row in new_rows]
+                meta = {
+                    "row": np.asarray(new_rows, dtype=np.int64),
+                    "source_id": np.full(len(new_rows), source_id, dtype=np.int64),
+                    "user_id": np.full(len(new_rows), user_id, dtype=np.int64),
+                    "source_type": np.full(len(new_rows), source_type, dtype=np.int8)
+                }
+                self._append(_normalize(np.asarray(vectors)[indices]), meta)
+
+            if new_rows or removed:
+                self._maybe_merge()
+                self._save_delta()
+            return {"inserted": len(new_rows), "deleted": removed}
+
+    def delete_source(self, source_type: int, source_id: int) -> int:
+        """删除数据源的所有向量，返回删除数"""
+        with self._lock:
+            removed = 0
+            for locations in self.entries(source_type, source_id).values():
+                for segment, position in locations:
+                    segment.dead[position] = True
+                    removed += 1
+            if removed:
+                self._save_delta()
+            return removed
+
+    def _append(self, vectors: np.ndarray, meta: Dict[str, np.ndarray]) -> None:
+        if self.dimensions is None:
+            self.dimensions = vectors.shape[1]
+        if vectors.shape[1] != self.dimensions:
+            raise ValueError(f"向量维度 {vectors.shape[1]} 与索引的维度 {self.dimensions} 不一致")
+        pending = self.pending
+        self._state = (self.base, _Segment(
+            np.concatenate([pending.vectors.reshape(-1, self.dimensions), vectors]),
+            {field: np.concatenate([pending.meta[field], meta[field]]) for field in META_FIELDS},
+            dead=np.concatenate([pending.dead, np.zeros(len(vectors), dtype=bool)])
+        ))
+
+    def _maybe_merge(self) -> None:
+        threshold = max(self.merge_min, int(len(self.base) * self.merge_ratio))
+        if len(self.pending) >= threshold or (len(self.base) and self.base.dead.mean() > 0.2):
+            self.merge()
+
+    def merge(self) -> None:
+        """把增量段合并进基础段，清除删除标记，必要时重新训练聚类中心"""
+        with self._lock:
+            parts = [segment for segment in (self.base, self.pending) if len(segment)]
+            vectors = np.concatenate([np.asarray(s.vectors)[~s.dead] for s in parts]) if parts else \
+                np.zeros((0, self.dimensions or 0), dtype=np.float32)
+            meta = {field: np.concatenate([s.meta[field][~s.dead] for s in parts]) if parts
+                    else np.zeros(0, dtype=dtype) for field, dtype in META_FIELDS.items()}
+
+            centroids = self.base.centroids
+            if len(vectors) >= self.train_min and (centroids is None or len(vectors) > 4 * self.trained_count):
+                nlist = int(min(max(np.sqrt(len(vectors)), 1), 65536))
+                centroids = train_centroids(vectors, nlist)
+                self.trained_count = len(vectors)
+            elif len(vectors) < self.train_min:
+                centroids = None
+                self.trained_count = 0
+
+            if centroids is not None:
+                assign = _nearest(vectors, centroids)
+                order = np.argsort(assign, kind="stable")
+                vectors = vectors[order]
+                meta = {field: values[order] for field, values in meta.items()}
+                lists = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+            else:
+                lists = np.array([0, len(vectors)], dtype=np.int64)
+
+            old_version = self.base_version
+            self.base_version = uuid.uuid4().hex[:12]
+            base_dir = self.partition_dir / f"base-{self.base_version}"
+            base_dir.mkdir(parents=True, exist_ok=True)
+            np.save(base_dir / "vectors.npy", vectors)
+            extra = {"centroids": centroids} if centroids is not None else {}
+            np.savez(base_dir / "meta.npz", lists=lists, **meta, **extra)
+
+            self._state = (
+                _Segment(_load_vectors(base_dir / "vectors.npy"), meta, centroids=centroids, lists=lists),
+                _Segment(np.zeros((0, self.dimensions or 0), dtype=np.float32), _empty_meta())
+            )
+            self._save_delta()
+            if old_version:
+                shutil.rmtree(self.partition_dir / f"base-{old_version}", ignore_errors=True)
+                try:
+                    (self.partition_dir / f"delta-{old_version}.npz").unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _save_delta(self) -> None:
+        """保存增量段和删除标记，最后替换清单"""
+        self.partition_dir.mkdir(parents=True, exist_ok=True)
+        delta_path = self.partition_dir / f"delta-{self.base_version}.npz"
+        temp_path = self.partition_dir / f"delta.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(temp_path, base_dead=self.base.dead, vectors=self.pending.vectors,
+                 dead=self.pending.dead, **self.pending.meta)
+        os.replace(temp_path, delta_path)
+        manifest = {"dimensions": self.dimensions, "trained_count": self.trained_count,
+                    "base_version": self.base_version}
+        temp_manifest = self.partition_dir / f"manifest.{uuid.uuid4().hex}.tmp"
+        with open(temp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(temp_manifest, self.partition_dir / "manifest.json")
+
+    def search(self, query: np.ndarray, top_k: int, nprobe: int,
+               filters: Dict[str, Any]) -> List[Tuple[float, Dict[str, int]]]:
+        """返回 [(相似度, 元数据)]，按相似度从高到低"""
+        results = []
+        for segment in self._state:
+            scores, positions = segment.search(query, top_k, nprobe, filters)
+            for score, position in zip(scores.tolist(), positions.tolist()):
+                results.append((score, {field: int(segment.meta[field][position]) for field in META_FIELDS}))
+        results.sort(key=lambda item: -item[0])
+        return results[:top_k]
+
+
+class VectorIndex:
+    """一个嵌入模型的向量索引，按分区（数据集）保存"""
+
+    def __init__(self, index_dir: Path, store: VectorStore, nprobe: int = 16, train_min: int = 10000):
+        """
+        :param index_dir: 索引目录
+        :param store: 同一模型的向量存储，用于读取向量和文本块内容
+        :param nprobe: 默认探测的倒排列表数
+        :param train_min: 分区向量数达到该值后使用倒排列表
+        """
+        self.index_dir = Path(index_dir)
+        self.store = store
+        self.nprobe = nprobe
+        self.train_min = train_min
+        self._partitions: Dict[str, IndexPartition] = {}
+        self._lock = threading.Lock()
+
+    def partition(self, name: str) -> IndexPartition:
+        with self._lock:
+            if name not in self._partitions:
+                safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+                self._partitions[name] = IndexPartition(self.index_dir / safe_name, train_min=self.train_min)
+            return self._partitions[name]
+
+    def partition_names(self) -> List[str]:
+        names = set(self._partitions)
+        if self.index_dir.exists():
+            names.update(path.name for path in self.index_dir.iterdir() if (path / "manifest.json").exists())
+        return sorted(names)
+
+    def index_document(self, partition: str, document_id: str, source_type: str, source_id: int,
+                       user_id: Optional[int]) -> Dict[str, int]:
+        """
+        按向量存储中文档的文本块清单更新索引，只插入新增的文本块、删除不再存在的
+        :param partition: 分区名，例如 dataset-1
+        :param document_id: 向量存储中的文档标识
+        :param source_type: file或note
+        :param source_id: 数据源或笔记ID
+        :param user_id: 所属用户ID
+        """
+        document = self.store.get_document(document_id) or {"chunks": []}
+        rows = [self.store.row(chunk["hash"]) for chunk in document["chunks"]]
+        rows = sorted({row for row in rows if row is not None})
+        vectors = np.asarray(self.store.vectors()[rows]) if rows else np.zeros((0, self.store.dimensions or 0))
+        return self.partition(partition).update_source(
+            SOURCE_TYPES[source_type], source_id, -1 if user_id is None else user_id, rows, vectors
+        )
+
+    def delete_source(self, source_type: str, source_id: int, partition: Optional[str] = None) -> int:
+        """从指定分区（省略时所有分区）删除数据源的向量"""
+        names = [partition] if partition else self.partition_names()
+        return sum(self.partition(name).delete_source(SOURCE_TYPES[source_type], source_id) for name in names)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 10, partitions: Optional[List[str]] = None,
+               source_id: Optional[int] = None, user_id: Optional[int] = None,
+               source_type: Optional[str] = None, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        搜索最相似的文本块
+        :param query_vector: 查询向量
+        :param top_k: 返回结果数
+        :param partitions: 搜索的分区，省略时搜索所有分区
+        :param source_id: 只返回该数据源的结果
+        :param user_id: 只返回该用户的结果
+        :param source_type: 只返回file或note的结果
+        :return: [{"score", "partition", "source_type", "source_id", "user_id", "row", "text"}]
+        """
+        query = _normalize(query_vector)[0]
+        filters: Dict[str, Any] = {}
+        if source_id is not None:
+            filters["source_id"] = source_id
+        if user_id is not None:
+            filters["user_id"] = user_id
+        if source_type is not None:
+            filters["source_type"] = SOURCE_TYPES[source_type]
+
+        results = []
+        for name in partitions if partitions is not None else self.partition_names():
+            partition = self.partition(name)
+            if partition.dimensions is not None and partition.dimensions != len(query):
+                raise ValueError(f"查询向量维度 {len(query)} 与索引的维度 {partition.dimensions} 不一致")
+            for score, meta in partition.search(query, top_k, nprobe or self.nprobe, filters):
+                results.append((score, name, meta))
+        results.sort(key=lambda item: -item[0])
+        results = results[:top_k]
+
+        texts = self.store.texts([meta["row"] for _, _, meta in results])
+        return [
+            {
+                "score": score,
+                "partition": name,
+                "source_type": _SOURCE_TYPE_NAMES[meta["source_type"]],
+                "source_id": meta["source_id"],
+                "user_id": None if meta["user_id"] < 0 else meta["user_id"],
+                "row": meta["row"],
+                "text": text
+            }
+            for (score, name, meta), text in zip(results, texts)
+        ]
+
+
+class VectorIndexRegistry:
+    """按嵌入模型名打开的向量索引"""
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = Path(root_dir)
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> VectorIndex:
+        with self._lock:
+            if model not in self._indexes:
+                name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+                self._indexes[model] = VectorIndex(
+                    self.root_dir / name, vector_stores.get(model),
+                    nprobe=settings.VECTOR_INDEX_NPROBE, train_min=settings.VECTOR_INDEX_TRAIN_MIN
+                )
+            return self._indexes[model]
+
+    def delete_source(self, source_type: str, source_id: int, partition: Optional[str] = None) -> int:
+        """从所有模型的索引中删除数据源的向量"""
+        models = set(self._indexes)
+        for meta_path in vector_stores.root_dir.glob("*/meta.json"):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    models.add(json.load(f)["model"])
+            except (OSError, ValueError, KeyError):
+                continue
+        return sum(self.get(model).delete_source(source_type, source_id, partition) for model in models)
+
+
+def dataset_partition(dataset_id: int) -> str:
+    """数据集对应的分区名"""
+    return f"dataset-{dataset_id}"
+
+
+def notes_partition(user_id: int) -> str:
+    """用户未关联数据集的笔记所在的分区名"""
+    return f"notes-{user_id}"
+
+
+vector_indexes = VectorIndexRegistry(settings.VECTOR_INDEX_DIR)
@@ -0,0 +1,212 @@
+"""
+向量存储
+每个嵌入模型一个目录，向量按行追加到float32文件，文本块按内容哈希去重（相同内容只嵌入一次）：
+- vectors.f32       行优先的float32向量
+- hashes.bin        每行文本块内容哈希（SHA-1，20字节）
+- texts.bin         文本块内容（UTF-8），text_offsets.bin保存每行的结束偏移（int64）
+- meta.json         模型、维度和已提交的行数，最后写入，进程中断时多写的部分在下次打开时截掉
+- documents/*.json  每个文档的文本块清单（内容哈希和字符偏移），重新嵌入时用于比较变化
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_HASH_BYTES = 20
+
+
+class VectorStore:
+    """单个嵌入模型的向量存储"""
+
+    def __init__(self, store_dir: Path, model: str):
+        """
+        :param store_dir: 存储目录
+        :param model: 嵌入模型名，维度在第一次写入时确定
+        """
+        self.store_dir = Path(store_dir)
+        self.model = model
+        self.dimensions: Optional[int] = None
+        self.count = 0
+        self._rows: Dict[bytes, int] = {}
+        self._text_offsets: List[int] = []
+        self._lock = threading.RLock()
+        self._load()
+
+    def _file(self, name: str) -> Path:
+        return self.store_dir / name
+
+    def _load(self) -> None:
+        meta = _read_json(self._file("meta.json")) or {}
+        self.dimensions = meta.get("dimensions")
+        self.count = meta.get("count", 0)
+        if not self.count:
+            return
+
+        hashes = self._file("hashes.bin").read_bytes()[:self.count * _HASH_BYTES]
+        self._rows = {hashes[i * _HASH_BYTES:(i + 1) * _HASH_BYTES]: i for i in range(self.count)}
+        self._text_offsets = np.fromfile(self._file("text_offsets.bin"), dtype=np.int64,
+                                         count=self.count).tolist()
+        # 截掉上次未提交的部分
+        self._truncate("vectors.f32", self.count * self.dimensions * 4)
+        self._truncate("hashes.bin", self.count * _HASH_BYTES)
+        self._truncate("text_offsets.bin", self.count * 8)
+        self._truncate("texts.bin", self._text_offsets[-1])
+
+    def _truncate(self, name: str, size: int) -> None:
+        path = self._file(name)
+        if path.stat().st_size > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def row(self, content_hash: str) -> Optional[int]:
+        """内容哈希对应的行号，没有时返回None"""
+        return self._rows.get(bytes.fromhex(content_hash))
+
+    def missing(self, content_hashes: List[str]) -> List[str]:
+        """返回尚未嵌入的内容哈希（去重，保持顺序）"""
+        result = []
+        seen = set()
+        for content_hash in content_hashes:
+            if content_hash not in seen and self.row(content_hash) is None:
+                result.append(content_hash)
+            seen.add(content_hash)
+        return result
+
+    def add(self, content_hashes: List[str], vectors: np.ndarray, texts: List[str]) -> None:
+        """
+        追加向量，已存在的内容哈希跳过
+        :param content_hashes: 文本块内容哈希
+        :param vectors: 形状为 (n, 维度) 的向量
+        :param texts: 文本块内容
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if len(vectors) != len(content_hashes) or len(texts) != len(content_hashes):
+            raise ValueError("内容哈希、向量和文本的数量不一致")
+        with self._lock:
+            if self.dimensions is None and len(vectors):
+                self.dimensions = int(vectors.shape[1])
+            if len(vectors) and vectors.shape[1] != self.dimensions:
+                raise ValueError(f"向量维度 {vectors.shape[1]} 与存储的维度 {self.dimensions} 不一致")
+
+            keys = []
+            keep = []
+            seen = set()
+            for i, content_hash in enumerate(content_hashes):
+                key = bytes.fromhex(content_hash)
+                if key not in self._rows and key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+                    keep.append(i)
+            if not keep:
+                return
+
+            encoded = [texts[i].encode("utf-8") for i in keep]
+            end = self._text_offsets[-1] if self._text_offsets else 0
+            offsets = np.cumsum([len(text) for text in encoded], dtype=np.int64) + end
+
+            self.store_dir.mkdir(parents=True, exist_ok=True)
+            with open(self._file("vectors.f32"), "ab") as f:
+                f.write(vectors[keep].tobytes())
+            with open(self._file("hashes.bin"), "ab") as f:
+                f.write(b"".join(keys))
+            with open(self._file("texts.bin"), "ab") as f:
+                f.write(b"".join(encoded))
+            with open(self._file("text_offsets.bin"), "ab") as f:
+                f.write(offsets.tobytes())
+
+            for key in keys:
+                self._rows[key] = self.count
+                self.count += 1
+            self._text_offsets.extend(offsets.tolist())
+            _write_json(self._file("meta.json"),
+                        {"model": self.model, "dimensions": self.dimensions, "count": self.count})
+
+    def vectors(self) -> np.ndarray:
+        """所有向量（只读内存映射），形状为 (行数, 维度)"""
+        if not self.count:
+            return np.zeros((0, self.dimensions or 0), dtype=np.float32)
+        return np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r",
+                         shape=(self.count, self.dimensions))
+
+    def texts(self, rows: List[int]) -> List[str]:
+        """按行号读取文本块内容"""
+        result = []
+        if not rows:
+            return result
+        with open(self._file("texts.bin"), "rb") as f:
+            for row in rows:
+                start = self._text_offsets[row - 1] if row > 0 else 0
+                f.seek(start)
+                result.append(f.read(self._text_offsets[row] - start).decode("utf-8"))
+        return result
+
+    def _document_file(self, document_id: str) -> Path:
+        digest = hashlib.sha1(document_id.encode("utf-8")).hexdigest()
+        return self._file("documents") / f"{digest}.json"
+
+    def get_document(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """文档的文本块清单 {"document_id", "chunks": [{"hash", "start", "end", "tokens"}], ...}"""
+        return _read_json(self._document_file(document_id))
+
+    def set_document(self, document_id: str, chunks: List[Dict[str, Any]], **extra: Any) -> None:
+        """保存文档的文本块清单"""
+        _write_json(self._document_file(document_id), {"document_id": document_id, "chunks": chunks, **extra})
+
+    def delete_document(self, document_id: str) -> None:
+        """删除文档的文本块清单（向量保留，供内容相同的文本块复用）"""
+        try:
+            self._document_file(document_id).unlink()
+        except FileNotFoundError:
+            pass
+
+
+class VectorStoreRegistry:
+    """按嵌入模型名打开的向量存储"""
+
+    def __init__(self, root_dir: Path):
+        self.root_dir = Path(root_dir)
+        self._stores: Dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str) -> VectorStore:
+        with self._lock:
+            if model not in self._stores:
+                name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+                self._stores[model] = VectorStore(self.root_dir / name, model)
+            return self._stores[model]
+
+
+def _read_json(path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    """先写临时文件再替换"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(temp_path, path)
+
+
+vector_stores = VectorStoreRegistry(settings.VECTOR_STORE_DIR)
@@ -50,6 +50,7 @@ class DatabaseSource(DataSource):
     id = Column(ForeignKey("data_sources.id"), primary_key=True)
     connection_string = Column(String, nullable=True)  # 可以加密存储
     database_type = Column(String)  # mysql, postgresql, etc.
+    query_cache_ttl = Column(Integer, nullable=True)  # 查询结果缓存有效期（秒），为空使用默认值，0表示不缓存
 
     __mapper_args__ = {
         "polymorphic_identity": "database"
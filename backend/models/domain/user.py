@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey
+from sqlalchemy import Column, String, Boolean, Integer, Float, ForeignKey
 from sqlalchemy.orm import relationship
 
 from models.domain.base import BaseModel, TimestampMixin
@@ -13,6 +13,8 @@ class User(BaseModel, TimestampMixin):
     full_name = Column(String)
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
+    query_max_rows = Column(Integer, nullable=True)  # 数据库查询估计行数上限，为空时使用全局配置
+    query_max_cost = Column(Float, nullable=True)  # 数据库查询估计代价上限，为空时使用全局配置
 
     # 关系
     domain_notes = relationship("Note", back_populates="user")
@@ -6,6 +6,7 @@ from models.schemas.dataset import (
     DataSourceBase, DataSourceCreate, DataSourceUpdate, DataSourceResponse,
     DatabaseSourceCreate, DatabaseSourceUpdate, DatabaseSourceResponse,
     FileSourceCreate, FileSourceUpdate, FileSourceResponse,
+    UploadSessionCreate, UploadSessionResponse,
     URLSourceCreate, URLSourceUpdate, URLSourceResponse,
     ProcessingTaskBase, ProcessingTaskCreate, ProcessingTaskUpdate, ProcessingTaskResponse,
     ScheduleInfo, DependencyInfo, TaskDependencyBase, TaskDependencyCreate, TaskDependencyResponse,
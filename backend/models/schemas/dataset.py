@@ -49,14 +49,17 @@ class DataSourceResponse(DataSourceBase):
 class DatabaseSourceCreate(DataSourceCreate):
     connection_string: Optional[str] = None
     database_type: str
+    query_cache_ttl: Optional[int] = None
 
 class DatabaseSourceUpdate(DataSourceUpdate):
     connection_string: Optional[str] = None
     database_type: Optional[str] = None
+    query_cache_ttl: Optional[int] = None
 
 class DatabaseSourceResponse(DataSourceResponse):
     connection_string: Optional[str] = None
     database_type: str
+    query_cache_ttl: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -80,6 +83,25 @@ class FileSourceResponse(DataSourceResponse):
     class Config:
         from_attributes = True
 
+# 可续传的分块上传模式
+class UploadSessionCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+    filename: str
+    size: int
+    sha256: Optional[str] = None  # 提供时完成上传前校验
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    dataset_id: int
+    filename: str
+    size: int
+    received_bytes: int
+    received_ranges: List[List[int]]  # 已收到的字节范围 [开始, 结束)
+    missing_ranges: List[List[int]]
+    complete: bool
+    max_chunk_bytes: int
+
 # URL源模式
 class URLSourceCreate(DataSourceCreate):
     url: str
@@ -14,11 +14,15 @@ class UserUpdate(UserBase):
     password: Optional[str] = None
     is_active: Optional[bool] = None
     is_admin: Optional[bool] = None
+    query_max_rows: Optional[int] = Field(None, ge=0)
+    query_max_cost: Optional[float] = Field(None, ge=0)
 
 class UserResponse(UserBase):
     id: int
     is_active: bool
     is_admin: bool = False
+    query_max_rows: Optional[int] = None
+    query_max_cost: Optional[float] = None
     created_at: datetime
 
     class Config:
@@ -86,6 +86,8 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> UserRespo
         full_name=db_user.full_name,
         is_active=db_user.is_active,
         is_admin=db_user.is_admin,
+        query_max_rows=db_user.query_max_rows,
+        query_max_cost=db_user.query_max_cost,
         created_at=db_user.created_at
     )
 
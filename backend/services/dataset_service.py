@@ -1,18 +1,28 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Optional, Union, Dict, Any, AsyncIterator
 from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
 from fastapi import UploadFile, HTTPException
+import asyncio
 import os
 from pathlib import Path
-import uuid
+from datetime import datetime
 
 from models.domain.dataset import Dataset, DataSource, DatabaseSource, FileSource, URLSource
 from models.domain.note import Note, note_dataset
 from models.schemas.dataset import (
     DatasetCreate, DatasetUpdate, DatasetResponse, DatasetBrief,
     DatabaseSourceCreate, FileSourceCreate, URLSourceCreate,
-    DatabaseSourceResponse, FileSourceResponse, URLSourceResponse
+    DatabaseSourceResponse, FileSourceResponse, URLSourceResponse,
+    UploadSessionCreate, UploadSessionResponse
 )
+from core.processing.schema_cache import schema_cache
+from core.processing.query_cache import query_cache
+from core.processing.parquet_shadow import parquet_shadow
+from core.processing.profile_store import profile_store
+from services.vector_search_service import delete_source_vectors
+from storage.blob_store import blob_store, StoredBlob
+from storage.upload_sessions import upload_sessions, UploadSessionError
 
 def create_dataset(db: Session, dataset: DatasetCreate) -> DatasetResponse:
     """创建新数据集"""
@@ -141,7 +151,8 @@ def add_database_source(db: Session, source: DatabaseSourceCreate) -> DatabaseSo
         description=source.description,
         dataset_id=source.dataset_id,
         connection_string=source.connection_string,
-        database_type=source.database_type
+        database_type=source.database_type,
+        query_cache_ttl=source.query_cache_ttl
     )
     db.add(db_source)
     db.commit()
@@ -160,7 +171,8 @@ def add_database_source(db: Session, source: DatabaseSourceCreate) -> DatabaseSo
         created_at=db_source.created_at,
         updated_at=db_source.updated_at,
         connection_string=db_source.connection_string,
-        database_type=db_source.database_type
+        database_type=db_source.database_type,
+        query_cache_ttl=db_source.query_cache_ttl
     )
 
 async def add_file_source(
@@ -168,8 +180,7 @@ async def add_file_source(
     name: str,
     description: Optional[str],
     dataset_id: int,
-    file: UploadFile,
-    upload_dir: Path
+    file: UploadFile
 ) -> FileSourceResponse:
     """添加文件类型数据源"""
     # 检查数据集是否存在
@@ -177,19 +188,21 @@ async def add_file_source(
     if not dataset:
         raise HTTPException(status_code=404, detail="数据集不存在")
 
-    # 保存上传的文件
+    # 流式保存上传的文件，同时计算SHA-256，内容相同的文件共用一份
     file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ""
-    file_path = upload_dir / f"{uuid.uuid4()}{file_extension}"
-    
-    # 确保上传目录存在
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    blob = await blob_store.save_stream(file, extension=file_extension)
+    return _create_file_source(db, name, description, dataset_id, blob, file_extension)
 
-    # 获取文件大小
-    file_size = os.path.getsize(file_path)
+def _create_file_source(
+    db: Session,
+    name: str,
+    description: Optional[str],
+    dataset_id: int,
+    blob: StoredBlob,
+    file_extension: str
+) -> FileSourceResponse:
+    """为已保存的文件创建文件类型数据源"""
+    file_path = blob.path
 
     # 确定文件类型
     file_type = file_extension.lstrip(".") if file_extension else "unknown"
@@ -201,12 +214,16 @@ async def add_file_source(
         dataset_id=dataset_id,
         file_path=str(file_path),
         file_type=file_type,
-        file_size=file_size
+        file_size=blob.size
     )
     db.add(db_source)
     db.commit()
     db.refresh(db_source)
 
+    # 后台生成Parquet影子副本，之后的分析和处理不再重复解析CSV（内容相同的文件已有副本时直接复用）
+    if file_type == "csv" and parquet_shadow.get(str(file_path)) is None:
+        parquet_shadow.schedule(str(file_path))
+
     # 转换为响应模型
     return FileSourceResponse(
         id=db_source.id,
@@ -224,6 +241,80 @@ async def add_file_source(
         file_size=db_source.file_size
     )
 
+def create_upload_session(
+    dataset_id: int,
+    user_id: int,
+    session: UploadSessionCreate
+) -> UploadSessionResponse:
+    """创建可续传的上传会话"""
+    try:
+        created = upload_sessions.create(
+            size=session.size,
+            filename=session.filename,
+            expected_sha256=session.sha256,
+            dataset_id=dataset_id,
+            user_id=user_id,
+            name=session.name,
+            description=session.description
+        )
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return UploadSessionResponse(dataset_id=dataset_id, **upload_sessions.status(created))
+
+def _get_upload_session(dataset_id: int, user_id: int, upload_id: str) -> Dict[str, Any]:
+    """读取属于该数据集和用户的上传会话"""
+    try:
+        session = upload_sessions.get(upload_id)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if session.get("dataset_id") != dataset_id or session.get("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="上传会话不存在")
+    return session
+
+def get_upload_session(dataset_id: int, user_id: int, upload_id: str) -> UploadSessionResponse:
+    """查询上传会话已收到的范围"""
+    session = _get_upload_session(dataset_id, user_id, upload_id)
+    return UploadSessionResponse(dataset_id=dataset_id, **upload_sessions.status(session))
+
+async def upload_chunk(
+    dataset_id: int,
+    user_id: int,
+    upload_id: str,
+    content_range: Optional[str],
+    body: AsyncIterator[bytes]
+) -> UploadSessionResponse:
+    """写入上传会话的一个分块"""
+    _get_upload_session(dataset_id, user_id, upload_id)
+    try:
+        status = await upload_sessions.write_chunk(upload_id, content_range, body)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return UploadSessionResponse(dataset_id=dataset_id, **status)
+
+async def complete_upload_session(
+    db: Session,
+    dataset_id: int,
+    user_id: int,
+    upload_id: str
+) -> FileSourceResponse:
+    """完成上传：校验后把文件移入存储，创建文件类型数据源"""
+    _get_upload_session(dataset_id, user_id, upload_id)
+    dataset = db.query(Dataset).filter(Dataset.id == dataset_id).first()
+    if not dataset:
+        raise HTTPException(status_code=404, detail="数据集不存在")
+    try:
+        session, blob = await asyncio.to_thread(upload_sessions.complete, upload_id)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+    file_extension = os.path.splitext(session["filename"])[1].lower()
+    return _create_file_source(db, session["name"], session.get("description"), dataset_id, blob, file_extension)
+
+def abort_upload_session(dataset_id: int, user_id: int, upload_id: str) -> None:
+    """取消上传，删除已收到的数据"""
+    _get_upload_session(dataset_id, user_id, upload_id)
+    upload_sessions.abort(upload_id)
+
 def add_url_source(db: Session, source: URLSourceCreate) -> URLSourceResponse:
     """添加URL类型数据源"""
     # 检查数据集是否存在
@@ -274,10 +365,101 @@ def delete_data_source(db: Session, source_id: int) -> bool:
     if not source:
         return False
 
+    file_path = source.file_path if isinstance(source, FileSource) else None
+    dataset_id = source.dataset_id
     db.delete(source)
     db.commit()
+
+    # 清理数据库元数据缓存和查询结果缓存
+    schema_cache.invalidate(source_id)
+    query_cache.invalidate(source_id)
+    if file_path:
+        # 内容相同的上传共用同一个文件，仍被其他数据源引用时保留副本和剖析结果
+        if not db.query(FileSource).filter(FileSource.file_path == file_path).first():
+            parquet_shadow.invalidate(file_path)
+            profile_store.invalidate(file_path)
+        delete_source_vectors("file", source_id, dataset_id)
     return True
 
+def get_database_schema(
+    db: Session,
+    dataset_id: int,
+    source_id: int,
+    refresh: bool = False,
+    search: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100
+) -> Optional[Dict[str, Any]]:
+    """获取数据库数据源的表结构概览（来自元数据缓存）"""
+    source = _get_database_source(db, dataset_id, source_id)
+    if not source:
+        return None
+
+    schema = _load_schema(source, refresh)
+
+    # 按表名过滤并分页
+    tables = list(schema["tables"].values())
+    if search:
+        tables = [table for table in tables if search.lower() in table["name"].lower()]
+    tables.sort(key=lambda table: table["name"])
+
+    return {
+        "source_id": source.id,
+        "table_count": schema["table_count"],
+        "matched_count": len(tables),
+        "loaded_at": datetime.fromtimestamp(schema["loaded_at"]),
+        "load_seconds": schema["load_seconds"],
+        "tables": [
+            {
+                "name": table["name"],
+                "column_count": table["column_count"],
+                "row_estimate": table["row_estimate"],
+                "size_bytes": table["size_bytes"]
+            }
+            for table in tables[skip:skip + limit]
+        ]
+    }
+
+def get_database_table_schema(
+    db: Session,
+    dataset_id: int,
+    source_id: int,
+    table_name: str
+) -> Optional[Dict[str, Any]]:
+    """获取数据库数据源中单张表的列、类型和索引信息"""
+    source = _get_database_source(db, dataset_id, source_id)
+    if not source:
+        return None
+
+    return _load_schema(source)["tables"].get(table_name)
+
+def invalidate_query_cache(
+    db: Session,
+    dataset_id: int,
+    source_id: int,
+    query: Optional[str] = None
+) -> Optional[int]:
+    """清除数据库数据源的查询结果缓存，返回清除的条目数"""
+    source = _get_database_source(db, dataset_id, source_id)
+    if not source:
+        return None
+
+    return query_cache.invalidate(source.id, query)
+
+def _get_database_source(db: Session, dataset_id: int, source_id: int) -> Optional[DatabaseSource]:
+    """获取属于指定数据集的数据库数据源"""
+    return db.query(DatabaseSource).filter(
+        DatabaseSource.id == source_id,
+        DatabaseSource.dataset_id == dataset_id
+    ).first()
+
+def _load_schema(source: DatabaseSource, refresh: bool = False) -> Dict[str, Any]:
+    """从元数据缓存加载表结构"""
+    try:
+        return schema_cache.get_or_load(source.id, source.connection_string, force=refresh)
+    except SQLAlchemyError as e:
+        raise HTTPException(status_code=400, detail=f"获取数据库元数据失败: {str(e)}")
+
 def associate_note_with_dataset(db: Session, note_id: int, dataset_id: int) -> bool:
     """关联笔记与数据集"""
     note = db.query(Note).filter(Note.id == note_id).first()
@@ -332,7 +514,8 @@ def _convert_data_source_to_response(source: DataSource) -> Union[DatabaseSource
             created_at=db_source.created_at,
             updated_at=db_source.updated_at,
             connection_string=db_source.connection_string,
-            database_type=db_source.database_type
+            database_type=db_source.database_type,
+            query_cache_ttl=db_source.query_cache_ttl
         )
     elif source.type == "file":
         file_source = source
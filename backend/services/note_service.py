@@ -6,6 +6,7 @@ from models.domain.note import Note, note_dataset
 from models.domain.dataset import Dataset
 from models.schemas.note import NoteCreate, NoteUpdate, NoteResponse, DatabaseBrief
 from models.schemas.dataset import DatasetBrief
+from services.vector_search_service import delete_source_vectors
 
 def create_note(db: Session, note: NoteCreate) -> NoteResponse:
     """创建新笔记"""
@@ -152,3 +153,5 @@ def delete_note(db: Session, note_id: int) -> None:
     if db_note:
         db.delete(db_note)
         db.commit()
+        # 删除向量索引中的笔记文本块
+        delete_source_vectors("note", note_id)
@@ -0,0 +1,110 @@
+"""
+向量搜索服务
+用向量索引搜索数据集文件和笔记的文本块，以及把笔记内容嵌入并加入索引
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.processing.document_embedding import DocumentEmbeddingPipeline
+from core.processing.embedders import create_embedder
+from core.processing.text_chunker import TextChunker
+from core.processing.vector_index import vector_indexes, dataset_partition, notes_partition
+from core.processing.vector_store import vector_stores
+from models.domain.dataset import Dataset
+from models.domain.note import Note
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def user_partitions(db: Session, user_id: int) -> List[str]:
+    """用户可以搜索的分区：用户的各数据集分区和用户的笔记分区"""
+    dataset_ids = [row.id for row in db.query(Dataset.id).filter(Dataset.user_id == user_id)]
+    return [dataset_partition(dataset_id) for dataset_id in dataset_ids] + [notes_partition(user_id)]
+
+
+async def search(
+    db: Session,
+    query: str,
+    user_id: int,
+    top_k: int = 10,
+    dataset_id: Optional[int] = None,
+    source_id: Optional[int] = None,
+    source_type: Optional[str] = None,
+    embed_model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    搜索与查询文本最相似的文本块，只搜索该用户的分区
+    :param db: 数据库会话
+    :param query: 查询文本
+    :param user_id: 只返回该用户的结果
+    :param top_k: 返回结果数
+    :param dataset_id: 只搜索该数据集的分区（调用方需确认数据集属于该用户）
+    :param source_id: 只返回该数据源（或笔记）的结果
+    :param source_type: file或note
+    :param embed_model: 嵌入模型，需与建立索引时一致
+    :return: 搜索结果
+    """
+    embedder = create_embedder(embed_model)
+    query_vector = (await embedder.embed([query]))[0]
+    index = vector_indexes.get(embedder.model)
+    partitions = [dataset_partition(dataset_id)] if dataset_id is not None else user_partitions(db, user_id)
+    results = index.search(
+        query_vector, top_k=top_k, partitions=partitions,
+        source_id=source_id, user_id=user_id, source_type=source_type
+    )
+    for result in results:
+        partition = result.pop("partition")
+        result["dataset_id"] = int(partition.split("-", 1)[1]) if partition.startswith("dataset-") else None
+    return results
+
+
+async def index_note(db: Session, note_id: int, embed_model: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    嵌入笔记内容并加入向量索引：关联了数据集的加入各数据集的分区，否则加入用户的notes分区，
+    只有内容变化的文本块需要重新嵌入
+    :return: 嵌入和索引结果，笔记不存在时返回None
+    """
+    note = db.query(Note).filter(Note.id == note_id).first()
+    if not note:
+        return None
+
+    embedder = create_embedder(embed_model)
+    document_id = f"note-{note.id}"
+    text = "\n".join(part for part in (note.title, note.content) if part)
+    pipeline = DocumentEmbeddingPipeline(
+        document_id=document_id,
+        blocks=[text],
+        embedder=embedder,
+        store=vector_stores.get(embedder.model),
+        chunker=TextChunker(settings.EMBED_CHUNK_TOKENS, settings.EMBED_OVERLAP_TOKENS),
+        batch_size=settings.EMBED_BATCH_SIZE,
+        concurrency=settings.EMBED_CONCURRENCY
+    )
+    result = await pipeline.run()
+
+    index = vector_indexes.get(embedder.model)
+    partitions = [dataset_partition(dataset.id) for dataset in note.datasets] or [notes_partition(note.user_id)]
+    # 不再关联的数据集分区中删除
+    existing = set(index.partition_names())
+    for name in user_partitions(db, note.user_id):
+        if name not in partitions and name in existing:
+            index.delete_source("note", note.id, partition=name)
+    result["index"] = {
+        name: index.index_document(name, document_id, "note", note.id, note.user_id)
+        for name in partitions
+    }
+    return result
+
+
+def delete_source_vectors(source_type: str, source_id: int, dataset_id: Optional[int] = None) -> None:
+    """从所有模型的向量索引中删除数据源或笔记的向量"""
+    partition = dataset_partition(dataset_id) if dataset_id is not None else None
+    try:
+        vector_indexes.delete_source(source_type, source_id, partition=partition)
+    except Exception as e:
+        logger.warning(f"删除向量索引中的{source_type} {source_id}失败: {str(e)}")
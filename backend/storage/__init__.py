@@ -0,0 +1 @@
+# 存储层初始化文件
@@ -0,0 +1,131 @@
+"""
+按内容寻址的文件存储
+上传的文件按块写入临时文件，同时计算SHA-256（写入和哈希在工作线程中进行，与读取下一块重叠），
+完成后以 <sha256前2位>/<sha256><扩展名> 保存；内容相同的文件只保存一份
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Protocol
+
+from core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncReadable(Protocol):
+    """可以按块异步读取的对象（例如fastapi的UploadFile）"""
+
+    async def read(self, size: int = -1) -> bytes:
+        ...
+
+
+@dataclass
+class StoredBlob:
+    """保存结果"""
+    path: Path
+    sha256: str
+    size: int
+    # 存储中已有相同内容时为True，此次上传的数据被丢弃
+    deduplicated: bool
+
+
+class BlobStore:
+    """按内容寻址的文件存储"""
+
+    def __init__(self, root_dir: Path, chunk_bytes: int = 4 * 1024 * 1024):
+        """
+        :param root_dir: 存储目录
+        :param chunk_bytes: 每次读取的字节数
+        """
+        self.root_dir = Path(root_dir)
+        self.chunk_bytes = chunk_bytes
+
+    def blob_path(self, sha256: str, extension: str = "") -> Path:
+        """内容哈希对应的文件路径"""
+        return self.root_dir / sha256[:2] / f"{sha256}{extension.lower()}"
+
+    def temp_path(self) -> Path:
+        """新的临时文件路径（与存储在同一文件系统中，完成后可以直接改名）"""
+        temp_dir = self.root_dir / "tmp"
+        temp_dir.mkdir(parents=True, exist_ok=True)
+        return temp_dir / f"{uuid.uuid4().hex}.part"
+
+    async def save_stream(self, source: AsyncReadable, extension: str = "",
+                          expected_sha256: Optional[str] = None) -> StoredBlob:
+        """
+        流式保存上传的数据
+        :param source: 数据来源
+        :param extension: 文件扩展名（例如 .csv），内容和扩展名都相同时才复用
+        :param expected_sha256: 期望的SHA-256，不一致时抛出ValueError
+        :return: 保存结果
+        """
+        temp_path = self.temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, "wb") as output:
+                def consume(chunk: bytes) -> None:
+                    # hashlib和文件写入都会释放GIL
+                    digest.update(chunk)
+                    output.write(chunk)
+
+                pending: Optional[asyncio.Future] = None
+                try:
+                    while True:
+                        chunk = await source.read(self.chunk_bytes)
+                        if pending is not None:
+                            await pending
+                            pending = None
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        pending = asyncio.ensure_future(asyncio.to_thread(consume, chunk))
+                finally:
+                    # 读取出错时等待正在进行的写入结束后再关闭文件
+                    if pending is not None:
+                        await asyncio.gather(pending, return_exceptions=True)
+            return self._commit(temp_path, digest.hexdigest(), size, extension, expected_sha256)
+        except BaseException:
+            _remove(temp_path)
+            raise
+
+    def commit_file(self, temp_path: Path, sha256: str, extension: str = "") -> StoredBlob:
+        """把已计算哈希的临时文件移入存储（临时文件应来自temp_path）"""
+        return self._commit(Path(temp_path), sha256, os.path.getsize(temp_path), extension, None)
+
+    def _commit(self, temp_path: Path, sha256: str, size: int, extension: str,
+                expected_sha256: Optional[str]) -> StoredBlob:
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            _remove(temp_path)
+            raise ValueError(f"文件内容校验失败：期望SHA-256为 {expected_sha256}，实际为 {sha256}")
+
+        path = self.blob_path(sha256, extension)
+        if path.exists():
+            _remove(temp_path)
+            return StoredBlob(path=path, sha256=sha256, size=size, deduplicated=True)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 同时上传相同内容时后完成的覆盖先完成的，内容一致
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            # 临时文件在其他文件系统上
+            shutil.move(str(temp_path), str(path))
+        return StoredBlob(path=path, sha256=sha256, size=size, deduplicated=False)
+
+
+def _remove(path: Path) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+blob_store = BlobStore(settings.BLOB_DIR, chunk_bytes=settings.UPLOAD_CHUNK_BYTES)
@@ -0,0 +1,311 @@
+"""
+可续传的分块上传
+创建会话后，客户端可以按任意顺序、并行上传带字节范围的分块，分块直接写入预先分配大小的临时文件的对应位置（不需要再拼接）；
+随时可以查询已收到的范围，断线后只补传缺少的部分。
+从文件开头连续收到的数据在上传过程中就计入SHA-256（刚写入的数据仍在页缓存中），
+完成时只需计算剩余部分，每个字节最多读取一次，然后把临时文件直接移入按内容寻址的存储
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+
+from core.config import settings
+from storage.blob_store import BlobStore, StoredBlob, blob_store
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+_UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadSessionError(Exception):
+    """上传会话错误，status_code为对应的HTTP状态码"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_content_range(header: Optional[str]) -> Tuple[int, int, Optional[int]]:
+    """
+    解析 Content-Range: bytes <开始>-<结束>/<总大小>
+    :return: (开始, 结束（不含）, 总大小)
+    """
+    match = _CONTENT_RANGE_PATTERN.match((header or "").strip())
+    if not match:
+        raise UploadSessionError("缺少或无效的Content-Range，格式为 bytes <开始>-<结束>/<总大小>")
+    start, end = int(match.group(1)), int(match.group(2)) + 1
+    if end <= start:
+        raise UploadSessionError("Content-Range的结束位置必须不小于开始位置")
+    total = None if match.group(3) == "*" else int(match.group(3))
+    return start, end, total
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """把 [start, end) 合并进有序、不重叠的范围列表"""
+    result = []
+    for s, e in ranges:
+        if e < start or s > end:
+            result.append([s, e])
+        else:
+            start, end = min(s, start), max(e, end)
+    result.append([start, end])
+    result.sort()
+    return result
+
+
+def missing_ranges(ranges: List[List[int]], size: int) -> List[List[int]]:
+    """[0, size) 中尚未收到的范围"""
+    result = []
+    position = 0
+    for s, e in ranges:
+        if s > position:
+            result.append([position, s])
+        position = max(position, e)
+    if position < size:
+        result.append([position, size])
+    return result
+
+
+def _pwrite_all(fd: int, data: bytes, position: int) -> None:
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, position)
+        view = view[written:]
+        position += written
+
+
+class _SessionState:
+    """会话在内存中的状态：SHA-256计算到的位置，进程重启后从头重新计算"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.digest = hashlib.sha256()
+        self.hashed = 0
+
+
+class UploadSessionManager:
+    """可续传上传会话"""
+
+    def __init__(self, session_dir: Path, store: BlobStore, max_chunk_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: int = 7 * 24 * 3600, read_bytes: int = 8 * 1024 * 1024):
+        """
+        :param session_dir: 会话目录，应与存储在同一文件系统
+        :param store: 完成后保存文件的存储
+        :param max_chunk_bytes: 每个分块的最大字节数
+        :param ttl_seconds: 会话超过该时间没有更新时删除
+        :param read_bytes: 计算哈希时每次读取的字节数
+        """
+        self.session_dir = Path(session_dir)
+        self.store = store
+        self.max_chunk_bytes = max_chunk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.read_bytes = read_bytes
+        self._states: Dict[str, _SessionState] = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, upload_id: str) -> Path:
+        if not _UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise UploadSessionError("上传会话不存在", 404)
+        return self.session_dir / upload_id
+
+    def _state(self, upload_id: str) -> _SessionState:
+        with self._lock:
+            if upload_id not in self._states:
+                self._states[upload_id] = _SessionState()
+            return self._states[upload_id]
+
+    def create(self, size: int, filename: str, expected_sha256: Optional[str] = None,
+               **attributes: Any) -> Dict[str, Any]:
+        """
+        创建上传会话，预先分配临时文件
+        :param size: 文件总字节数
+        :param filename: 原始文件名（用于确定扩展名）
+        :param expected_sha256: 期望的SHA-256，完成时校验
+        :param attributes: 其他需要保存的字段（例如数据集ID、用户ID、名称）
+        :return: 会话
+        """
+        if size < 0:
+            raise UploadSessionError("文件大小不能为负数")
+        if expected_sha256 and not re.match(r"^[0-9a-fA-F]{64}$", expected_sha256):
+            raise UploadSessionError("sha256必须是64位十六进制字符串")
+        self.cleanup_expired()
+
+        upload_id = uuid.uuid4().hex
+        session_path = self._dir(upload_id)
+        session_path.mkdir(parents=True)
+        # 稀疏文件，分块写入各自的位置
+        with open(session_path / "data.part", "wb") as f:
+            f.truncate(size)
+        session = {
+            **attributes,
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "sha256": expected_sha256.lower() if expected_sha256 else None,
+            "ranges": [],
+            "created_at": time.time(),
+            "updated_at": time.time()
+        }
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Dict[str, Any]:
+        """读取会话，不存在时抛出UploadSessionError（404）"""
+        try:
+            with open(self._dir(upload_id) / "session.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadSessionError("上传会话不存在", 404)
+
+    def status(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """会话的接收情况"""
+        ranges = session["ranges"]
+        missing = missing_ranges(ranges, session["size"])
+        return {
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "size": session["size"],
+            "received_bytes": sum(e - s for s, e in ranges),
+            "received_ranges": ranges,
+            "missing_ranges": missing,
+            "complete": not missing,
+            "max_chunk_bytes": self.max_chunk_bytes
+        }
+
+    async def write_chunk(self, upload_id: str, content_range: Optional[str],
+                          body: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """
+        写入一个分块，可以与其他分块并行
+        :param upload_id: 会话ID
+        :param content_range: Content-Range请求头
+        :param body: 分块内容（按到达的片段迭代，不需要整体放在内存中）
+        :return: 写入后的接收情况
+        """
+        session = self.get(upload_id)
+        start, end, total = parse_content_range(content_range)
+        if total is not None and total != session["size"]:
+            raise UploadSessionError(f"Content-Range的总大小 {total} 与会话的文件大小 {session['size']} 不一致")
+        if end > session["size"]:
+            raise UploadSessionError("分块超出文件大小", 416)
+        if end - start > self.max_chunk_bytes:
+            raise UploadSessionError(f"分块不能超过 {self.max_chunk_bytes} 字节", 413)
+
+        fd = os.open(self._dir(upload_id) / "data.part", os.O_WRONLY)
+        position = start
+        try:
+            async for piece in body:
+                if position + len(piece) > end:
+                    raise UploadSessionError("分块内容超出Content-Range声明的长度")
+                await asyncio.to_thread(_pwrite_all, fd, piece, position)
+                position += len(piece)
+        finally:
+            os.close(fd)
+            if start < position < end:
+                # 连接中断或内容不完整时记录实际收到的部分，客户端查询后只补传缺少的
+                await asyncio.to_thread(self._record, upload_id, start, position)
+        if position != end:
+            raise UploadSessionError(f"分块内容不完整：收到 {position - start} 字节，应为 {end - start} 字节")
+
+        session = await asyncio.to_thread(self._record, upload_id, start, end)
+        return self.status(session)
+
+    def _record(self, upload_id: str, start: int, end: int) -> Dict[str, Any]:
+        """记录收到的范围，并把从文件开头连续收到的数据计入哈希；重传已计入哈希的范围时从头重新计算"""
+        state = self._state(upload_id)
+        with state.lock:
+            if start < state.hashed:
+                # 已计入哈希的数据被覆盖，在写入完成后重置，之后按文件中的新内容重新计算
+                state.digest = hashlib.sha256()
+                state.hashed = 0
+            session = self.get(upload_id)
+            session["ranges"] = merge_range(session["ranges"], start, end)
+            session["updated_at"] = time.time()
+            self._save(session)
+            self._advance_hash(upload_id, state, session["ranges"])
+            return session
+
+    def _advance_hash(self, upload_id: str, state: _SessionState, ranges: List[List[int]]) -> None:
+        contiguous = ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+        if contiguous <= state.hashed:
+            return
+        with open(self._dir(upload_id) / "data.part", "rb", buffering=0) as f:
+            f.seek(state.hashed)
+            while state.hashed < contiguous:
+                data = f.read(min(self.read_bytes, contiguous - state.hashed))
+                if not data:
+                    break
+                state.digest.update(data)
+                state.hashed += len(data)
+
+    def complete(self, upload_id: str) -> Tuple[Dict[str, Any], StoredBlob]:
+        """
+        完成上传：检查所有范围都已收到，校验SHA-256，把文件移入存储并删除会话
+        :return: (会话, 保存结果)
+        """
+        state = self._state(upload_id)
+        with state.lock:
+            session = self.get(upload_id)
+            missing = missing_ranges(session["ranges"], session["size"])
+            if missing:
+                raise UploadSessionError(f"还有 {len(missing)} 个范围没有收到", 409)
+            self._advance_hash(upload_id, state, [[0, session["size"]]])
+            sha256 = state.digest.hexdigest()
+            if session["sha256"] and session["sha256"] != sha256:
+                raise UploadSessionError(f"文件内容校验失败：期望SHA-256为 {session['sha256']}，实际为 {sha256}", 422)
+
+            extension = os.path.splitext(session["filename"])[1].lower()
+            blob = self.store.commit_file(self._dir(upload_id) / "data.part", sha256, extension)
+            self.abort(upload_id)
+            return session, blob
+
+    def abort(self, upload_id: str) -> None:
+        """删除会话和已收到的数据"""
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
+        with self._lock:
+            self._states.pop(upload_id, None)
+
+    def cleanup_expired(self) -> int:
+        """删除超过有效期没有更新的会话，返回删除数"""
+        if not self.session_dir.exists():
+            return 0
+        removed = 0
+        deadline = time.time() - self.ttl_seconds
+        for path in self.session_dir.iterdir():
+            if not _UPLOAD_ID_PATTERN.match(path.name):
+                continue
+            try:
+                updated_at = (path / "session.json").stat().st_mtime
+            except OSError:
+                continue
+            if updated_at < deadline:
+                self.abort(path.name)
+                removed += 1
+        return removed
+
+    def _save(self, session: Dict[str, Any]) -> None:
+        """先写临时文件再替换"""
+        session_path = self._dir(session["upload_id"])
+        temp_path = session_path / f"session.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(temp_path, session_path / "session.json")
+
+
+upload_sessions = UploadSessionManager(
+    session_dir=settings.UPLOAD_SESSION_DIR,
+    store=blob_store,
+    max_chunk_bytes=settings.UPLOAD_MAX_CHUNK_BYTES,
+    ttl_seconds=settings.UPLOAD_SESSION_TTL_SECONDS
+)
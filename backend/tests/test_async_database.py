@@ -0,0 +1,59 @@
+import asyncio
+import importlib.util
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import core.processing.database_processor as database_processor
+from core.processing.database_processor import DatabaseProcessor
+
+
+def _create_database(path):
+    """创建测试用SQLite数据库"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, amount REAL)")
+    conn.executemany("INSERT INTO orders (amount) VALUES (?)", [(i * 1.5,) for i in range(100)])
+    conn.commit()
+    conn.close()
+
+
+def test_async_engine_query(tmp_path, monkeypatch):
+    """测试有异步驱动时通过异步引擎连接和查询"""
+    pytest.importorskip("aiosqlite")
+    monkeypatch.setitem(database_processor.ASYNC_DRIVERS, "sqlite", ("sqlite+aiosqlite", "aiosqlite"))
+    db_path = tmp_path / "source.db"
+    _create_database(db_path)
+
+    processor = DatabaseProcessor()
+    data_source = SimpleNamespace(id=1, connection_string=f"sqlite:///{db_path}")
+
+    async def main():
+        engine, error = await processor._connect_to_database(data_source)
+        assert error is None
+        assert database_processor._is_async_engine(engine)
+        try:
+            return await processor._execute_query(engine, "SELECT COUNT(*) AS n, SUM(amount) AS total FROM orders")
+        finally:
+            await engine.dispose()
+
+    df, error = asyncio.run(main())
+    assert error is None
+    assert df.to_dict(orient="records") == [{"n": 100, "total": 7425.0}]
+
+
+def test_falls_back_to_sync_engine_without_greenlet(tmp_path, monkeypatch):
+    """测试未安装greenlet时回退到同步引擎"""
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *args: None if name == "greenlet" else find_spec(name, *args))
+    monkeypatch.setitem(database_processor.ASYNC_DRIVERS, "sqlite", ("sqlite+aiosqlite", "sqlite3"))
+    db_path = tmp_path / "source.db"
+    _create_database(db_path)
+
+    processor = DatabaseProcessor()
+    data_source = SimpleNamespace(id=1, connection_string=f"sqlite:///{db_path}")
+    engine, error = asyncio.run(processor._connect_to_database(data_source))
+    assert error is None
+    assert not database_processor._is_async_engine(engine)
+    df, error = asyncio.run(processor._execute_query(engine, "SELECT COUNT(*) AS n FROM orders"))
+    assert df["n"].tolist() == [100]
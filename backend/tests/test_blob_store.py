@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import io
+import os
+
+import pytest
+
+from storage.blob_store import BlobStore
+
+
+class AsyncBytes:
+    """按块异步读取的字节流"""
+
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+        self.reads = 0
+
+    async def read(self, size: int = -1) -> bytes:
+        self.reads += 1
+        return self._buffer.read(size)
+
+
+def test_streamed_upload_is_hashed_and_deduplicated(tmp_path):
+    """测试分块保存并计算SHA-256，相同内容和扩展名只保存一份"""
+    store = BlobStore(tmp_path / "blobs", chunk_bytes=1000)
+    data = os.urandom(10500)
+    source = AsyncBytes(data)
+
+    first = asyncio.run(store.save_stream(source, ".CSV"))
+    assert source.reads == 12
+    assert first.sha256 == hashlib.sha256(data).hexdigest()
+    assert first.size == len(data)
+    assert first.path == tmp_path / "blobs" / first.sha256[:2] / f"{first.sha256}.csv"
+    assert first.path.read_bytes() == data
+    assert not first.deduplicated
+
+    second = asyncio.run(store.save_stream(AsyncBytes(data), ".csv"))
+    assert second.deduplicated
+    assert second.path == first.path
+    assert asyncio.run(store.save_stream(AsyncBytes(data), ".txt")).path != first.path
+    assert not os.listdir(tmp_path / "blobs" / "tmp")
+
+
+def test_checksum_mismatch_and_read_error_leave_no_files(tmp_path):
+    """测试校验失败或读取出错时不保存文件，也不留下临时文件"""
+    store = BlobStore(tmp_path / "blobs", chunk_bytes=4)
+    with pytest.raises(ValueError):
+        asyncio.run(store.save_stream(AsyncBytes(b"hello world"), expected_sha256="0" * 64))
+
+    class Broken(AsyncBytes):
+        async def read(self, size: int = -1) -> bytes:
+            if self.reads >= 2:
+                raise ConnectionError("断开")
+            return await super().read(size)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(store.save_stream(Broken(b"hello world")))
+    assert os.listdir(tmp_path / "blobs") == ["tmp"]
+    assert not os.listdir(tmp_path / "blobs" / "tmp")
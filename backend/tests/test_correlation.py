@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from core.processing.correlation import blockwise_correlation_pairs
+
+
+def test_blockwise_correlation_matches_pandas(tmp_path):
+    """测试分块计算结果与pandas一致"""
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(300, 40))
+    values[:, 7] = values[:, 2] * 3 + rng.normal(scale=0.05, size=300)
+    values[:, 39] = -values[:, 0]
+    df = pd.DataFrame(values, columns=[f"c{i}" for i in range(40)])
+
+    matrix_path = tmp_path / "matrix.npy"
+    result = blockwise_correlation_pairs(df, threshold=0.7, block_size=16, matrix_path=matrix_path)
+
+    pairs = {(item["column1"], item["column2"]) for item in result["high_correlations"]}
+    assert pairs == {("c0", "c39"), ("c2", "c7")}
+
+    matrix = np.load(matrix_path)
+    assert matrix.shape == (40, 40)
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(matrix, df.corr().to_numpy(), atol=1e-5)
+
+
+def test_blockwise_correlation_top_k():
+    """测试只保留绝对值最大的K个列对"""
+    rng = np.random.default_rng(1)
+    base = rng.normal(size=200)
+    df = pd.DataFrame({
+        "a": base,
+        "b": base + rng.normal(scale=0.01, size=200),
+        "c": base + rng.normal(scale=0.5, size=200),
+        "d": rng.normal(size=200)
+    })
+
+    result = blockwise_correlation_pairs(df, threshold=0.0, top_k=1)
+    assert len(result["high_correlations"]) == 1
+    assert (result["high_correlations"][0]["column1"], result["high_correlations"][0]["column2"]) == ("a", "b")
+
+
+def test_blockwise_correlation_with_nulls(tmp_path):
+    """测试有缺失值时按成对完整的行计算，与pandas一致"""
+    rng = np.random.default_rng(2)
+    base = rng.normal(size=400)
+    df = pd.DataFrame({
+        "a": base,
+        "b": base + rng.normal(scale=0.01, size=400),
+        "c": rng.normal(size=400) + 1e6,
+        "d": 5.0
+    })
+    df.loc[rng.random(400) < 0.5, "a"] = np.nan
+    df.loc[rng.random(400) < 0.5, "b"] = np.nan
+    df.loc[rng.random(400) < 0.3, "c"] = np.nan
+
+    matrix_path = tmp_path / "matrix.npy"
+    result = blockwise_correlation_pairs(df, threshold=0.7, block_size=3, matrix_path=matrix_path)
+    assert [(item["column1"], item["column2"]) for item in result["high_correlations"]] == [("a", "b")]
+    assert result["high_correlations"][0]["correlation"] > 0.99
+    np.testing.assert_allclose(np.load(matrix_path), df.corr().to_numpy(), atol=1e-5)
@@ -0,0 +1,187 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from core.processing.csv_pipeline import StreamingCsvPipeline, QuantileSketch
+
+
+def make_csv(path, rows=5000):
+    """生成带重复行和空值的CSV"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": rng.integers(0, rows // 2, rows),
+        "city": rng.choice(["北京", "上海", "广州"], rows),
+        "amount": np.where(rng.random(rows) < 0.1, np.nan, rng.integers(1, 100, rows))
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def run_pipeline(tmp_path, operations, chunk_size=700):
+    source = tmp_path / "source.csv"
+    output = tmp_path / "output.csv"
+    df = make_csv(source)
+    pipeline = StreamingCsvPipeline(
+        str(source), str(output), operations, chunk_size=chunk_size, spill_dir=tmp_path / "spill"
+    )
+    return df, pipeline.run(), pd.read_csv(output)
+
+
+def test_row_operations_match_pandas(tmp_path):
+    """测试逐块执行的行级操作与整表执行结果一致"""
+    operations = [
+        {"type": "filter_rows", "column": "city", "condition": "ne", "value": "广州"},
+        {"type": "fill_nulls", "column": "amount", "method": "value", "value": 0},
+        {"type": "create_column", "new_column": "double", "expression": "df['amount'] * 2"},
+        {"type": "rename_columns", "rename_map": {"city": "城市"}},
+        {"type": "select_columns", "columns": ["id", "城市", "double"]},
+        {"type": "filter_rows", "column": "missing", "condition": "eq", "value": 1}
+    ]
+    df, result, output = run_pipeline(tmp_path, operations)
+
+    expected = df[df["city"] != "广州"].copy()
+    expected["amount"] = expected["amount"].fillna(0)
+    expected["double"] = expected["amount"] * 2
+    expected = expected.rename(columns={"city": "城市"})[["id", "城市", "double"]]
+
+    pd.testing.assert_frame_equal(output, expected.reset_index(drop=True), check_dtype=False)
+    assert result["original_rows"] == len(df)
+    assert result["processed_rows"] == len(expected)
+    assert result["operation_results"][-1]["applied"] is False
+
+
+def test_global_operations_spill(tmp_path):
+    """测试去重和按统计量填充通过溢写实现，并保持原有顺序"""
+    operations = [
+        {"type": "drop_duplicates", "subset": ["id", "city"]},
+        {"type": "fill_nulls", "column": "amount", "method": "mean"}
+    ]
+    df, result, output = run_pipeline(tmp_path, operations)
+
+    expected = df.drop_duplicates(subset=["id", "city"]).copy()
+    expected["amount"] = expected["amount"].fillna(expected["amount"].mean())
+
+    pd.testing.assert_frame_equal(output, expected.reset_index(drop=True), check_dtype=False)
+    assert result["operation_results"][0]["message"] == f"已删除 {len(df) - len(expected)} 条重复记录"
+    assert not list((tmp_path / "spill").iterdir())
+
+
+def test_quantile_sketch():
+    """测试近似分位数"""
+    sketch = QuantileSketch(capacity=1000)
+    for start in range(0, 100000, 10000):
+        sketch.add(np.arange(start, start + 10000))
+    assert sketch.count == 100000
+    assert not sketch.exact
+    assert abs(sketch.quantile(0.5) - 50000) < 5000
+
+
+def test_streaming_sort(tmp_path):
+    """测试流式模式下按多列外部排序"""
+    operations = [{"type": "sort", "columns": ["city", "id"], "ascending": [False, True]}]
+    df, result, output = run_pipeline(tmp_path, operations)
+
+    expected = df.sort_values(["city", "id"], ascending=[False, True], kind="mergesort")
+    pd.testing.assert_frame_equal(output, expected.reset_index(drop=True), check_dtype=False)
+    assert result["operation_results"][0]["applied"]
+
+
+def test_streaming_group_by(tmp_path):
+    """测试流式模式下按城市分组聚合并输出为新文件"""
+    operations = [{
+        "type": "group_by",
+        "by": "city",
+        "aggregations": [
+            {"column": "amount", "function": "sum"},
+            {"column": "id", "function": "count_distinct", "alias": "ids"}
+        ]
+    }]
+    df, result, output = run_pipeline(tmp_path, operations)
+
+    expected = df.groupby("city").agg(amount_sum=("amount", "sum"), ids=("id", "nunique")).reset_index()
+    pd.testing.assert_frame_equal(output, expected, check_dtype=False)
+    assert result["operation_results"][0]["rows_out"] == 3
+
+
+def test_streaming_join(tmp_path):
+    """测试流式模式下与另一个文件数据源左连接，未知数据源的连接被跳过"""
+    regions = pd.DataFrame({"city": ["北京", "上海"], "region": ["华北", "华东"]})
+    regions.to_csv(tmp_path / "regions.csv", index=False)
+    source = tmp_path / "source.csv"
+    df = make_csv(source)
+
+    operations = [
+        {"type": "join", "source_id": 7, "on": "city", "how": "left"},
+        {"type": "join", "source_id": 8, "on": "city"}
+    ]
+    pipeline = StreamingCsvPipeline(
+        str(source), str(tmp_path / "output.csv"), operations, chunk_size=700, spill_dir=tmp_path / "spill",
+        join_sources={"7": {"file_path": str(tmp_path / "regions.csv")}}
+    )
+    result = pipeline.run()
+    output = pd.read_csv(tmp_path / "output.csv")
+
+    expected = df.merge(regions, on="city", how="left")
+    pd.testing.assert_frame_equal(output, expected, check_dtype=False)
+    stats = result["operation_results"][0]["join_stats"]
+    assert stats["output_rows"] == len(df)
+    assert stats["unmatched_left_rows"] == int((df["city"] == "广州").sum())
+    assert result["operation_results"][1]["applied"] is False
+
+
+def test_streaming_reads_parquet_shadow(tmp_path):
+    """测试有Parquet影子副本时按批读取副本，结果与读取CSV一致"""
+    from core.processing.parquet_shadow import ParquetShadowStore
+
+    source = tmp_path / "source.csv"
+    df = make_csv(source)
+    shadow_path = ParquetShadowStore(tmp_path / "shadow", row_group_rows=1000).build(str(source))
+    operations = [{"type": "filter_rows", "column": "city", "condition": "eq", "value": "上海"}]
+
+    pipeline = StreamingCsvPipeline(
+        str(source), str(tmp_path / "output.csv"), operations, chunk_size=700,
+        spill_dir=tmp_path / "spill", shadow_path=shadow_path
+    )
+    result = pipeline.run()
+
+    expected = df[df["city"] == "上海"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "output.csv"), expected, check_dtype=False)
+    assert result["original_rows"] == len(df)
+
+
+def test_in_place_dedup_across_chunk_dtypes(tmp_path):
+    """测试同一行在不同数据块中推断为整数或浮点数时也能去重，输出路径与源文件相同时不丢失数据"""
+    source = tmp_path / "source.csv"
+    source.write_text("a,b\n1,q\n2,q\n,q\n1,q\n2,q\n,q\n", encoding="utf-8")
+    expected = pd.read_csv(source).drop_duplicates().reset_index(drop=True)
+
+    result = StreamingCsvPipeline(
+        str(source), str(source), [{"type": "drop_duplicates"}], chunk_size=2, spill_dir=tmp_path / "spill"
+    ).run()
+
+    pd.testing.assert_frame_equal(pd.read_csv(source), expected)
+    assert result["processed_rows"] == 3
+    assert result["operation_results"][0]["message"] == "已删除 3 条重复记录"
+    assert sorted(os.listdir(tmp_path)) == ["source.csv", "spill"]
+
+
+def test_streaming_dtypes_match_in_memory(tmp_path):
+    """测试后面的数据块才出现空值或非数值时，各块按整个文件的列类型读取，输出与整体读取后写出的结果一致"""
+    rows = 3000
+    df = pd.DataFrame({
+        "count": np.arange(rows, dtype=float),
+        "code": [str(i) for i in range(rows)],
+        "name": ["a"] * rows
+    })
+    df.loc[rows - 5, "count"] = np.nan
+    df.loc[rows - 1, "code"] = "unknown"
+    source = tmp_path / "source.csv"
+    df.to_csv(source, index=False)
+
+    pipeline = StreamingCsvPipeline(str(source), str(tmp_path / "output.csv"), [], chunk_size=1000, spill_dir=tmp_path / "spill")
+    pipeline.run()
+    assert pipeline.dtypes == {"count": "float64", "code": "object", "name": "object"}
+
+    pd.read_csv(source).to_csv(tmp_path / "expected.csv", index=False)
+    assert (tmp_path / "output.csv").read_text(encoding="utf-8") == (tmp_path / "expected.csv").read_text(encoding="utf-8")
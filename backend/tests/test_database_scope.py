@@ -0,0 +1,48 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+from core.config import settings
+from core.processing.database_processor import DatabaseProcessor
+from core.processing.memory_planner import memory_planner
+
+
+def _create_database(path, table_count):
+    """创建包含多张表的测试用SQLite数据库"""
+    conn = sqlite3.connect(path)
+    for index in range(table_count):
+        conn.execute(f"CREATE TABLE t{index:02d} (id INTEGER PRIMARY KEY, amount REAL)")
+        conn.executemany(f"INSERT INTO t{index:02d} (amount) VALUES (?)", [(i * (index + 1),) for i in range(20)])
+    conn.commit()
+    conn.close()
+
+
+def test_analyze_all_tables_batches_partial_results(tmp_path, monkeypatch):
+    """测试整库分析按批写入阶段性结果，最终结果包含所有表，每张表按并发数分配内存预算"""
+    monkeypatch.setattr(settings, "DATABASE_PARTIAL_RESULT_TABLES", 10)
+    monkeypatch.setattr(settings, "DATABASE_PROFILE_CONCURRENCY", 4)
+    monkeypatch.setattr(memory_planner, "budget_bytes", 8 * 1024 * 1024)
+    monkeypatch.setattr(settings, "DATABASE_PARTIAL_RESULT_SECONDS", 3600.0)
+    db_path = tmp_path / "source.db"
+    _create_database(db_path, 25)
+
+    processor = DatabaseProcessor()
+    partial_results = []
+    processor.update_partial_result = lambda task_id, result, db: partial_results.append(result)
+    processor.update_progress = lambda task_id, progress, db: None
+
+    task = SimpleNamespace(id=29, parameters={"scope": "database", "analysis_type": "descriptive", "exclude_tables": ["t24"]})
+    data_source = SimpleNamespace(id=9029, connection_string=f"sqlite:///{db_path}")
+    result = asyncio.run(processor._analyze_database(task, data_source, None))
+
+    assert result["success"] is True
+    assert result["table_count"] == 24
+    assert result["completed_count"] == 24
+    assert result["failed_tables"] == []
+    assert sorted(result["tables"]) == [f"t{index:02d}" for index in range(24)]
+    assert result["tables"]["t03"]["success"] is True
+    assert result["tables"]["t03"]["execution_plan"]["budget_bytes"] == 2 * 1024 * 1024
+
+    # 24张表每10张写入一次
+    assert [item["completed_count"] for item in partial_results] == [10, 20]
+    assert len(partial_results[-1]["tables"]) == 20
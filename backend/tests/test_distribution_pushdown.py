@@ -0,0 +1,67 @@
+import asyncio
+import sqlite3
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from core.processing.database_processor import DatabaseProcessor
+
+
+def _create_database(path, cities, amounts):
+    """创建测试用SQLite数据库"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, city TEXT, amount REAL)")
+    conn.executemany("INSERT INTO orders (city, amount) VALUES (?, ?)", zip(cities, amounts))
+    conn.commit()
+    conn.close()
+
+
+def test_distribution_pushdown_sqlite(tmp_path):
+    """测试分类列的分布分析下推为GROUP BY，数值列在不支持的数据库上回退到pandas"""
+    rng = np.random.default_rng(0)
+    cities = rng.choice(["北京", "上海", "广州", None], 500).tolist()
+    amounts = [None if i % 10 == 0 else float(v) for i, v in enumerate(rng.normal(100, 15, 500))]
+    db_path = tmp_path / "source.db"
+    _create_database(db_path, cities, amounts)
+
+    processor = DatabaseProcessor()
+    engine = create_engine(f"sqlite:///{db_path}")
+    data_source = SimpleNamespace(id=9031, connection_string=f"sqlite:///{db_path}")
+
+    def analyze(column, **parameters):
+        return asyncio.run(processor._analyze_distribution(engine, data_source, "orders", {"column": column, **parameters}))
+
+    result = analyze("city")
+    assert result["success"] and result["execution"] == "sql_pushdown"
+    assert result["execution_plan"]["mode"] == "sql_pushdown"
+    assert result["row_count"] == 500
+    expected = pd.Series(cities).value_counts()
+    assert result["result"]["value_counts"] == {city: int(count) for city, count in expected.items()}
+
+    result = analyze("amount")
+    assert result["success"] and result["execution"] == "pandas"
+    assert result["execution_plan"]["mode"] == "in_memory" and result["execution_plan"]["pushdown_fallback"]
+    assert result["result"]["statistics"]["count"] == 450
+
+    # 指定内存执行时不下推
+    result = analyze("city", execution_mode="in_memory")
+    assert result["success"] and result["execution"] == "pandas"
+    assert result["result"]["value_counts"] == {city: int(count) for city, count in expected.items()}
+
+    assert analyze("missing")["success"] is False
+
+
+def test_moments_about_mean_keep_precision():
+    """测试相对均值计算的矩在数值很大时仍与pandas的偏度和峰度一致"""
+    rng = np.random.default_rng(1)
+    values = 1e8 + rng.exponential(size=100000)
+    shifted = values - values.mean()
+
+    skewness, kurtosis = DatabaseProcessor()._moments_to_shape(
+        len(values), shifted.mean(), (shifted ** 2).mean(), (shifted ** 3).mean(), (shifted ** 4).mean()
+    )
+    series = pd.Series(values)
+    assert abs(skewness - series.skew()) < 1e-6
+    assert abs(kurtosis - series.kurt()) < 1e-6
@@ -0,0 +1,93 @@
+import asyncio
+import random
+
+import numpy as np
+
+from core.config import settings
+from core.processing.document_embedding import DocumentEmbeddingPipeline, read_text_blocks
+from core.processing.embedders import HashingEmbedder, create_embedder
+from core.processing.text_chunker import TextChunker
+from core.processing.vector_store import VectorStore
+
+
+def make_text(seed=0, sentences=600):
+    rng = random.Random(seed)
+    words = ["alpha", "beta", "gamma", "delta", "数据", "向量", "epsilon", "zeta", "eta", "theta"]
+    lines = []
+    for i in range(sentences):
+        sentence = " ".join(rng.choice(words) for _ in range(rng.randint(4, 18)))
+        lines.append(f"{sentence} {i}." + ("\n" if i % 5 == 4 else " "))
+    return "".join(lines)
+
+
+def embed(tmp_path, text, store, name="doc.txt"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    pipeline = DocumentEmbeddingPipeline(
+        document_id="doc", blocks=read_text_blocks(str(path), block_chars=1000),
+        embedder=HashingEmbedder(64), store=store, chunker=TextChunker(64, 8), batch_size=7, group_chunks=5
+    )
+    return asyncio.run(pipeline.run())
+
+
+def test_chunks_overlap_and_offsets():
+    """测试文本块是原文的切片、长度不超过上限，且相邻块重叠"""
+    text = make_text()
+    chunker = TextChunker(64, 8)
+    # 按换行符分块，单词不会跨块
+    blocks = [line + "\n" for line in text.split("\n")]
+    blocks[-1] = blocks[-1][:-1]
+    chunks = list(chunker.chunks(blocks))
+
+    assert len(chunks) > 10
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk["text"] == text[chunk["start"]:chunk["end"]]
+        assert chunk["tokens"] <= chunker.max_tokens
+        assert chunk["start"] < previous["end"]
+    assert chunks[-1]["end"] == len(text.rstrip())
+
+    # 比重叠词元数还短的文本也输出一个文本块
+    assert [chunk["text"] for chunk in chunker.chunks(["季度报告\n收入增长"])] == ["季度报告\n收入增长"]
+
+
+def test_reembedding_edited_document_only_embeds_changed_chunks(tmp_path):
+    """测试文档中间被编辑后重新嵌入，只计算变化附近的文本块"""
+    store = VectorStore(tmp_path / "store", "hashing-64")
+    text = make_text()
+    first = embed(tmp_path, text, store)
+    assert first["embedded_chunks"] == first["chunk_count"] == len(store)
+    assert embed(tmp_path, text, store)["embedded_chunks"] == 0
+
+    middle = len(text) // 2
+    edited = text[:middle] + " inserted words here. " + text[middle:]
+    second = embed(tmp_path, edited, store)
+    assert 0 < second["embedded_chunks"] <= 4
+    assert second["unchanged_chunks"] >= second["chunk_count"] - 4
+    assert 0 < second["removed_chunks"] <= 4
+
+
+def test_hashing_embedder_and_store_persistence(tmp_path):
+    """测试哈希嵌入确定且归一化，向量存储重新打开后可读取，未提交的部分被截掉"""
+    embedder = HashingEmbedder(32)
+    vectors = embedder.embed_sync(["hello world", "hello world", ""])
+    # 未指定模型时使用默认模型
+    assert create_embedder(None).model == create_embedder("").model == create_embedder(settings.EMBED_DEFAULT_MODEL).model
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors[0], vectors[1])
+    assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+    assert not vectors[2].any()
+
+    store = VectorStore(tmp_path / "store", "hashing-32")
+    store.add(["aa" * 20, "bb" * 20], vectors[:2], ["hello", "世界"])
+    store.add(["aa" * 20], vectors[:1], ["hello"])
+    assert len(store) == 2
+    # 模拟写入向量后、提交前中断
+    with open(tmp_path / "store" / "vectors.f32", "ab") as f:
+        f.write(b"\0" * 128)
+
+    reopened = VectorStore(tmp_path / "store", "hashing-32")
+    assert len(reopened) == 2
+    assert reopened.row("bb" * 20) == 1
+    assert reopened.texts([1, 0]) == ["世界", "hello"]
+    assert np.allclose(reopened.vectors()[1], vectors[1])
+    assert reopened.missing(["aa" * 20, "cc" * 20, "cc" * 20]) == ["cc" * 20]
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from core.processing.dtype_optimizer import optimize_dtypes
+
+
+def test_optimize_dtypes_converts_columns():
+    """测试数值降位、低基数字符串转category和日期解析"""
+    n = 10000
+    df = pd.DataFrame({
+        "id": np.arange(n, dtype=np.int64),
+        "score": np.full(n, 0.5),
+        "price": np.linspace(0, 1, n) / 3,
+        "city": np.where(np.arange(n) % 2 == 0, "北京", "上海").astype(object),
+        "name": [f"user_{i}" for i in range(n)],
+        "day": pd.date_range("2024-01-01", periods=n, freq="h").strftime("%Y-%m-%d %H:%M:%S"),
+        "mixed": [1, "a"] * (n // 2)
+    })
+
+    optimized, report = optimize_dtypes(df)
+
+    assert optimized["id"].dtype == np.int16
+    assert optimized["score"].dtype == np.float32
+    # 降为float32会损失精度时保持float64
+    assert optimized["price"].dtype == np.float64
+    assert str(optimized["city"].dtype) == "category"
+    assert str(optimized["name"].dtype) == "string"
+    assert pd.api.types.is_datetime64_any_dtype(optimized["day"])
+    assert optimized["mixed"].dtype == object
+
+    assert report["memory_after"] < report["memory_before"]
+    assert report["memory_saved"] == report["memory_before"] - report["memory_after"]
+    assert "mixed" not in report["converted_columns"]
+
+    # 值保持不变
+    assert optimized["id"].tolist() == df["id"].tolist()
+    assert optimized["city"].astype(object).tolist() == df["city"].tolist()
+
+
+def test_optimize_dtypes_keeps_unparseable_dates():
+    """测试部分值无法解析为日期时保持原类型"""
+    df = pd.DataFrame({"day": ["2024-01-01"] * 30 + ["not a date"]})
+    optimized, _ = optimize_dtypes(df, category_ratio=0.0)
+    assert not pd.api.types.is_datetime64_any_dtype(optimized["day"])
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from core.processing.external_sort import external_sort
+
+
+def test_external_sort_matches_pandas(tmp_path):
+    """测试多列、升降序混合的外部排序与pandas稳定排序结果一致"""
+    rng = np.random.default_rng(0)
+    rows = 20000
+    df = pd.DataFrame({
+        "group": rng.choice(["a", "b", "c"], rows),
+        "value": np.where(rng.random(rows) < 0.05, np.nan, rng.integers(0, 50, rows)),
+        "row": np.arange(rows)
+    })
+    chunks = (df.iloc[start:start + 1000] for start in range(0, rows, 1000))
+
+    # 每个有序段约3个数据块，强制多路归并
+    result = pd.concat(
+        external_sort(
+            chunks, ["group", "value"], [True, False],
+            run_dir=tmp_path / "runs", run_bytes=3 * 1000 * 80, merge_batch_rows=500
+        ),
+        ignore_index=True
+    )
+
+    expected = df.sort_values(
+        ["group", "value"], ascending=[True, False], kind="mergesort", na_position="last"
+    ).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert not (tmp_path / "runs").exists()
+
+
+def test_external_sort_in_memory(tmp_path):
+    """测试数据能放入内存时直接排序"""
+    df = pd.DataFrame({"value": [3, 1, 2]})
+    result = list(external_sort(iter([df]), ["value"], [True], run_dir=tmp_path / "runs"))
+    assert len(result) == 1
+    assert result[0]["value"].tolist() == [1, 2, 3]
+
+
+def test_external_sort_many_runs_default_batch(tmp_path, caplog):
+    """测试有序段较多时按内存预算计算每段的读取行数，降序字符串和空值的顺序与pandas一致"""
+    rng = np.random.default_rng(1)
+    rows = 12000
+    df = pd.DataFrame({
+        "name": np.where(rng.random(rows) < 0.1, None, rng.choice(list("abcdefgh"), rows)),
+        "value": rng.integers(0, 1000, rows),
+        "row": np.arange(rows)
+    })
+    chunks = (df.iloc[start:start + 300] for start in range(0, rows, 300))
+
+    with caplog.at_level("INFO"):
+        result = pd.concat(
+            external_sort(chunks, ["name", "value"], [False, True], run_dir=tmp_path / "runs", run_bytes=20000),
+            ignore_index=True
+        )
+
+    expected = df.sort_values(
+        ["name", "value"], ascending=[False, True], kind="mergesort", na_position="last"
+    ).reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert "生成 40 个有序段" in caplog.text
+    assert "每段每次读取 64 行" in caplog.text
@@ -0,0 +1,94 @@
+import gzip
+import json
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from core.processing.file_converter import FileConverter, normalize_format
+
+
+def make_frame(rows=3000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "id": np.arange(rows),
+        "city": np.where(rng.random(rows) < 0.1, None, rng.choice(["北京", "上海"], rows)),
+        "amount": rng.integers(1, 100, rows).astype(float)
+    })
+
+
+def convert(tmp_path, source, source_format, target_format, **kwargs):
+    target = tmp_path / f"output.{target_format}"
+    converter = FileConverter(str(source), source_format, str(target), target_format, batch_rows=500, **kwargs)
+    return converter.run(), target
+
+
+@pytest.mark.parametrize("chain", [
+    ["csv", "parquet", "jsonl", "json", "xlsx", "csv"],
+    ["csv", "json", "parquet", "xlsx", "jsonl", "csv"]
+])
+def test_round_trip(tmp_path, chain):
+    """测试经过各种格式转换后数据不变"""
+    df = make_frame()
+    source = tmp_path / "source.csv"
+    df.to_csv(source, index=False)
+
+    for step, (source_format, target_format) in enumerate(zip(chain, chain[1:])):
+        result, target = convert(tmp_path / str(step), source, source_format, target_format)
+        assert result["rows"] == len(df)
+        source = target
+
+    pd.testing.assert_frame_equal(pd.read_csv(source), df, check_dtype=False)
+
+
+def test_parquet_options_and_type_promotion(tmp_path):
+    """测试Parquet压缩算法和行组大小，以及CSV后段出现小数时整数列改为浮点数"""
+    df = pd.DataFrame({"value": list(range(200000)) + [0.5]})
+    source = tmp_path / "source.csv"
+    df.to_csv(source, index=False)
+
+    result, target = convert(tmp_path, source, "csv", "parquet", compression="gzip", row_group_rows=50000, block_bytes=65536)
+    metadata = pq.ParquetFile(target).metadata
+    assert result["rows"] == len(df)
+    assert metadata.num_row_groups == 5
+    assert metadata.row_group(0).column(0).compression == "GZIP"
+    assert pq.read_table(target).column("value").to_pylist()[-1] == 0.5
+
+
+def test_json_records_with_mixed_types(tmp_path):
+    """测试JSON数组中缺失的键、混合类型和嵌套对象，以及gzip压缩的JSONL输出"""
+    records = [{"a": 1, "b": {"x": 1}}, {"a": 2.5, "c": "text"}, {"a": "n/a", "b": {"x": 2}}]
+    source = tmp_path / "source.json"
+    source.write_text(json.dumps(records), encoding="utf-8")
+
+    result, target = convert(tmp_path, source, "json", "jsonl", compression="gzip")
+    with gzip.open(target, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert result["columns"] == ["a", "b", "c"]
+    assert [line["a"] for line in lines] == ["1", "2.5", "n/a"]
+    assert lines[0]["b"] == {"x": 1} and lines[1]["c"] == "text"
+
+
+def test_invalid_options(tmp_path):
+    """测试不支持的格式和压缩算法"""
+    source = tmp_path / "source.csv"
+    make_frame(10).to_csv(source, index=False)
+    with pytest.raises(ValueError):
+        normalize_format("docx")
+    with pytest.raises(ValueError):
+        FileConverter(str(source), "csv", str(tmp_path / "out.xlsx"), "xlsx", compression="gzip")
+
+
+def test_csv_late_string_value(tmp_path):
+    """测试CSV后段出现非数值时该列改为字符串，其他列的类型不变"""
+    df = pd.DataFrame({"code": [str(i) for i in range(5000)] + ["unknown"], "amount": range(5001)})
+    source = tmp_path / "source.csv"
+    df.to_csv(source, index=False)
+
+    result, target = convert(tmp_path, source, "csv", "parquet", block_bytes=4096)
+    table = pq.read_table(target)
+    assert result["rows"] == len(df)
+    assert table.schema.field("code").type == "string"
+    assert table.schema.field("amount").type == "double"
+    assert table.column("code").to_pylist() == df["code"].tolist()
@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.processing.file_join import FileJoin, parse_join
+
+
+def make_sources(tmp_path, rows=3000):
+    """生成左右两侧的数据，右侧的键有重复、缺失和空值"""
+    rng = np.random.default_rng(0)
+    left = pd.DataFrame({
+        "id": np.where(rng.random(rows) < 0.05, np.nan, rng.integers(0, 500, rows)),
+        "city": rng.choice(["北京", "上海"], rows),
+        "amount": rng.integers(1, 100, rows)
+    })
+    right = pd.DataFrame({
+        "user_id": np.where(rng.random(800) < 0.05, np.nan, rng.integers(0, 400, 800)),
+        "city": rng.choice(["北京", "上海"], 800),
+        "score": rng.random(800)
+    })
+    right_path = tmp_path / "right.csv"
+    right.to_csv(right_path, index=False)
+    return left, right, right_path
+
+
+def expected_join(left, right, how):
+    right = right.dropna(subset=["user_id"])
+    if how == "anti":
+        return left[~left["id"].isin(right["user_id"])]
+    return left.merge(right, how=how, left_on="id", right_on="user_id", suffixes=("", "_right"))
+
+
+def run_join(tmp_path, left, right_path, how, strategy):
+    spec = parse_join({"source_id": 2, "left_on": "id", "right_on": "user_id", "how": how, "strategy": strategy})
+    joiner = FileJoin(spec, str(right_path), tmp_path / "join", chunk_size=200, sort_run_bytes=20000)
+    chunks = (left.iloc[start:start + 250] for start in range(0, len(left), 250))
+    return joiner, pd.concat(joiner.join(chunks), ignore_index=True)
+
+
+@pytest.mark.parametrize("how", ["inner", "left", "anti"])
+@pytest.mark.parametrize("strategy", ["hash", "sort_merge"])
+def test_join_matches_pandas(tmp_path, how, strategy):
+    """测试哈希连接和排序归并连接的结果与pandas一致"""
+    left, right, right_path = make_sources(tmp_path)
+    joiner, result = run_join(tmp_path, left, right_path, how, strategy)
+    expected = expected_join(left, right, how)
+
+    sort_by = ["id", "amount", "city"] + (["score"] if how != "anti" else [])
+    normalize = lambda df: df.sort_values(sort_by, na_position="last").reset_index(drop=True)
+    pd.testing.assert_frame_equal(normalize(result), normalize(expected), check_dtype=False)
+
+    stats = joiner.summary()
+    assert stats["strategy"] == strategy
+    assert stats["left_rows"] == len(left)
+    assert stats["right_rows"] == len(right)
+    assert stats["output_rows"] == len(expected)
+    assert stats["matched_left_rows"] == int(left["id"].isin(right["user_id"].dropna()).sum())
+    assert not (tmp_path / "join").exists()
+
+
+@pytest.mark.parametrize("strategy", ["hash", "sort_merge"])
+def test_join_skew_stats(tmp_path, strategy):
+    """测试两种策略统计出相同的键分布倾斜"""
+    left, right, right_path = make_sources(tmp_path)
+    joiner, _ = run_join(tmp_path, left, right_path, "inner", strategy)
+    counts = right["user_id"].dropna().value_counts()
+
+    skew = joiner.summary()["key_skew"]
+    assert skew["distinct_keys"] == len(counts)
+    assert skew["max_rows_per_key"] == counts.max()
+    assert skew["top_keys"][0]["rows"] == counts.max()
+
+
+def test_join_validation(tmp_path):
+    """测试无效参数和不存在的键列"""
+    _, _, right_path = make_sources(tmp_path)
+    with pytest.raises(ValueError):
+        parse_join({"source_id": 2, "on": "id", "how": "outer"})
+    with pytest.raises(ValueError):
+        parse_join({"on": "id"})
+
+    joiner = FileJoin(parse_join({"source_id": 2, "on": "id"}), str(right_path), tmp_path / "join")
+    with pytest.raises(ValueError):
+        joiner.validate(["id", "city"])
+
+
+def test_inner_join_builds_on_left(tmp_path):
+    """测试右侧超出内存预算而左侧在内存中时，内连接以左侧为构建侧"""
+    left, right, right_path = make_sources(tmp_path)
+    spec = parse_join({"source_id": 2, "left_on": "id", "right_on": "user_id"})
+    joiner = FileJoin(spec, str(right_path), tmp_path / "join", right_bytes=10 ** 9, chunk_size=200, build_bytes=10 ** 6)
+    result = pd.concat(joiner.join(iter([left]), left_bytes=10 ** 5), ignore_index=True)
+
+    stats = joiner.summary()
+    assert (stats["strategy"], stats["build_side"]) == ("hash", "left")
+    assert len(result) == len(expected_join(left, right, "inner"))
+    assert stats["matched_left_rows"] == int(left["id"].isin(right["user_id"].dropna()).sum())
+
+
+@pytest.mark.parametrize("how", ["inner", "left"])
+def test_hash_join_probe_matches_pandas_merge(tmp_path, how):
+    """测试按构建侧键索引探测的结果（行顺序、同名键列和重名列后缀）与pandas merge完全一致"""
+    rng = np.random.default_rng(2)
+    left = pd.DataFrame({
+        "id": rng.integers(0, 50, 600),
+        "city": rng.choice(["北京", "上海", "广州"], 600),
+        "score": rng.integers(0, 10, 600)
+    })
+    right = pd.DataFrame({
+        "id": rng.integers(0, 60, 300),
+        "city": rng.choice(["北京", "上海"], 300),
+        "score": rng.integers(0, 10, 300),
+        "level": rng.integers(0, 3, 300)
+    })
+    right_path = tmp_path / "right.csv"
+    right.to_csv(right_path, index=False)
+
+    spec = parse_join({"source_id": 2, "on": ["id", "city"], "how": how, "strategy": "hash"})
+    joiner = FileJoin(spec, str(right_path), tmp_path / "join", chunk_size=100)
+    chunks = (left.iloc[start:start + 150] for start in range(0, len(left), 150))
+    result = pd.concat(joiner.join(chunks), ignore_index=True)
+
+    expected = left.merge(right, how=how, on=["id", "city"], suffixes=("", "_right"))
+    pd.testing.assert_frame_equal(result, expected)
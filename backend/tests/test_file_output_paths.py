@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+
+import pandas as pd
+
+from core.config import settings
+from core.processing.file_processor import FileProcessor
+from storage.blob_store import BlobStore
+
+
+def test_outputs_are_per_source_and_blob_dir_is_read_only(tmp_path, monkeypatch):
+    """测试内容相同的两个数据源的默认输出互不覆盖，输出路径不能位于共享的文件存储目录中"""
+    monkeypatch.setattr(settings, "UPLOAD_DIR", tmp_path / "uploads")
+    monkeypatch.setattr(settings, "BLOB_DIR", tmp_path / "blobs")
+    store = BlobStore(tmp_path / "blobs")
+    source = tmp_path / "data.csv"
+    pd.DataFrame({"a": [3, 1, 2]}).to_csv(source, index=False)
+    temp_path = store.temp_path()
+    temp_path.write_bytes(source.read_bytes())
+    blob = store.commit_file(temp_path, "ab" * 32, ".csv")
+
+    processor = FileProcessor()
+    processor.update_progress = lambda *args: None
+
+    def run(source_id, parameters):
+        data_source = SimpleNamespace(id=source_id, file_path=str(blob.path), file_type="csv", file_size=blob.size,
+                                      dataset=None)
+        task = SimpleNamespace(id=source_id, parameters=parameters)
+        return asyncio.run(processor._process_csv(task, data_source, None))
+
+    first = run(1, {"operations": [{"type": "sort", "column": "a"}]})
+    second = run(2, {"operations": [{"type": "sort", "column": "a", "ascending": False}]})
+    assert first["output_path"] != second["output_path"]
+    assert pd.read_csv(first["output_path"])["a"].tolist() == [1, 2, 3]
+    assert pd.read_csv(second["output_path"])["a"].tolist() == [3, 2, 1]
+    assert sorted(p.name for p in blob.path.parent.iterdir()) == [blob.path.name]
+
+    result = run(3, {"operations": [{"type": "sort", "column": "a"}], "output_path": str(blob.path)})
+    assert result["success"] is False
+    assert "共享的文件存储目录" in result["error"]
+    assert pd.read_csv(blob.path)["a"].tolist() == [3, 1, 2]
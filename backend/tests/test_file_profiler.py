@@ -0,0 +1,53 @@
+import hashlib
+import re
+from collections import Counter
+
+from core.processing.file_profiler import FileProfiler
+
+
+TEXT = "第一行 hello world\n\n  indented line, with punctuation!  \n\t\nnumbers 123 and 4.5\nlast line without newline 世界"
+
+
+def reference_profile(path):
+    """原来逐行、逐字符计算的结果"""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    non_empty = [line.strip() for line in lines if line.strip()]
+    content = "".join(lines)
+    words = re.findall(r"\b\w+\b", content.lower())
+    return {
+        "line_count": len(lines),
+        "empty_line_count": len(lines) - len(non_empty),
+        "avg_line_length": sum(len(line) for line in non_empty) / len(non_empty),
+        "char_count": len(content),
+        "letter_count": sum(c.isalpha() for c in content),
+        "digit_count": sum(c.isdigit() for c in content),
+        "whitespace_count": sum(c.isspace() for c in content),
+        "punctuation_count": sum(c in ".,;:!?-\"'()[]{}" for c in content),
+        "word_count": len(words),
+        "top_words": Counter(words).most_common(3)
+    }
+
+
+def test_profile_matches_reference(tmp_path):
+    """测试小块读取时（行和多字节字符跨块）的结果与逐字符计算一致"""
+    path = tmp_path / "sample.txt"
+    path.write_text(TEXT * 50, encoding="utf-8")
+    expected = reference_profile(path)
+
+    profile = FileProfiler(block_bytes=7, words=True, top_words=3).profile(str(path))
+    for key in ("line_count", "empty_line_count", "char_count", "letter_count", "digit_count",
+                "whitespace_count", "punctuation_count", "word_count"):
+        assert profile[key] == expected[key], key
+    assert abs(profile["avg_line_length"] - expected["avg_line_length"]) < 1e-9
+    assert [(item["word"], item["count"]) for item in profile["top_words"]] == expected["top_words"]
+    assert profile["md5_hash"] == hashlib.md5(path.read_bytes()).hexdigest()
+    assert profile["detected_encoding"]["encoding"]
+
+
+def test_binary_profile_only_hashes(tmp_path):
+    """测试非文本文件只计算哈希"""
+    path = tmp_path / "data.bin"
+    path.write_bytes(bytes(range(256)) * 10)
+    profile = FileProfiler(text=False).profile(str(path))
+    assert profile == {"size": 2560, "md5_hash": hashlib.md5(path.read_bytes()).hexdigest()}
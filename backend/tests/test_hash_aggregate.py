@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+from core.processing.hash_aggregate import HashAggregator, parse_aggregations
+
+
+def make_frame(rows=20000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "shop": rng.integers(0, 500, rows),
+        "city": rng.choice(["北京", "上海", None], rows),
+        "amount": np.where(rng.random(rows) < 0.1, np.nan, rng.integers(1, 100, rows)),
+        "user": rng.integers(0, 50, rows)
+    })
+
+
+def aggregate(df, operation, tmp_path, **kwargs):
+    keys, aggregations = parse_aggregations(operation)
+    aggregator = HashAggregator(keys, aggregations, spill_dir=tmp_path / "aggregate", **kwargs)
+    for start in range(0, len(df), 1000):
+        aggregator.add(df.iloc[start:start + 1000])
+    return aggregator, pd.concat(list(aggregator.results()), ignore_index=True)
+
+
+def test_group_by_matches_pandas_with_spill(tmp_path):
+    """测试分组数超过内存上限时溢写到磁盘分区，结果与pandas一致"""
+    df = make_frame()
+    operation = {
+        "type": "group_by",
+        "by": ["shop", "city"],
+        "aggregations": [
+            {"function": "count"},
+            {"column": "amount", "function": "sum"},
+            {"column": "amount", "function": "mean"},
+            {"column": "amount", "function": "min"},
+            {"column": "amount", "function": "max"},
+            {"column": "user", "function": "count_distinct"},
+            {"column": "amount", "function": "quantile", "q": 0.5, "alias": "median"}
+        ]
+    }
+    aggregator, result = aggregate(df, operation, tmp_path, max_state_rows=2000, partitions=8)
+    assert aggregator.spilled
+    assert not (tmp_path / "aggregate").exists()
+
+    expected = df.groupby(["shop", "city"], dropna=False).agg(
+        count=("shop", "size"),
+        amount_sum=("amount", "sum"),
+        amount_mean=("amount", "mean"),
+        amount_min=("amount", "min"),
+        amount_max=("amount", "max"),
+        user_count_distinct=("user", "nunique"),
+        median=("amount", "median")
+    ).reset_index()
+
+    result = result.sort_values(["shop", "city"], na_position="last").reset_index(drop=True)
+    expected = expected.sort_values(["shop", "city"], na_position="last").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_aggregate_without_keys(tmp_path):
+    """测试不分组的整体聚合，样本数小于数据量时分位数为近似值"""
+    df = make_frame()
+    operation = {
+        "type": "aggregate",
+        "aggregations": [
+            {"column": "amount", "function": "count"},
+            {"column": "amount", "function": "quantile", "q": 0.9}
+        ]
+    }
+    _, result = aggregate(df, operation, tmp_path, sample_size=2000)
+    assert result.columns.tolist() == ["amount_count", "amount_p90"]
+    assert result.loc[0, "amount_count"] == df["amount"].count()
+    assert abs(result.loc[0, "amount_p90"] - df["amount"].quantile(0.9)) <= 3
@@ -0,0 +1,55 @@
+import random
+from collections import Counter
+
+import pytest
+
+from core.processing.heavy_hitters import HeavyHitters, iter_text_blocks
+
+
+def test_exact_when_vocabulary_fits():
+    """测试词汇量不超过容量时结果与Counter一致"""
+    words = "the cat and the dog and the bird".split()
+    hitters = HeavyHitters(capacity=10)
+    hitters.add(words[:3])
+    hitters.add(words[3:])
+
+    assert [(entry["item"], entry["count"]) for entry in hitters.top(3)] == Counter(words).most_common(3)
+    assert hitters.max_error == 0
+    assert hitters.total == len(words)
+
+
+def test_bounded_memory_and_error_bounds():
+    """测试高基数数据流中内存有上限、真实次数落在误差范围内、高频项不会丢失"""
+    rng = random.Random(0)
+    frequent = [f"hot{i}" for i in range(5)]
+    truth = Counter()
+    hitters = HeavyHitters(capacity=50)
+    for _ in range(40):
+        batch = [rng.choice(frequent) if rng.random() < 0.3 else f"id{rng.randrange(100000)}" for _ in range(500)]
+        truth.update(batch)
+        hitters.add(batch)
+        assert len(hitters) <= 50
+
+    top = hitters.top(5)
+    assert {entry["item"] for entry in top} == set(frequent)
+    for entry in hitters.top(50):
+        assert entry["count"] - entry["error"] <= truth[entry["item"]] <= entry["count"]
+    tracked = {entry["item"] for entry in hitters.top(50)}
+    assert all(count <= hitters.max_error for item, count in truth.items() if item not in tracked)
+
+
+def test_add_text_and_blocks():
+    """测试按空白切块后逐块统计的结果与整段统计一致"""
+    text = "Alpha beta gamma\nalpha BETA alpha " * 100
+    blocks = list(iter_text_blocks(text, block_chars=37))
+    assert "".join(blocks) == text
+
+    hitters = HeavyHitters()
+    words = sum(hitters.add_text(block)["words"] for block in blocks)
+    assert words == 600
+    assert hitters.top_words(1) == [{"word": "alpha", "count": 300, "error": 0}]
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        HeavyHitters(capacity=0)
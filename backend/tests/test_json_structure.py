@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from core.processing.json_structure import JsonStructureAnalyzer
+
+
+DOCUMENT = {
+    "meta": {"version": 1, "name": "export"},
+    "items": [
+        {"id": i, "tags": ["a", "b"][:i % 3], "score": None if i % 5 == 0 else i * 0.5, "extra": {"x": 1}}
+        if i % 2 else {"id": i, "tags": []}
+        for i in range(50)
+    ],
+    "weird.key": True
+}
+
+
+def by_path(summary):
+    return {entry["path"]: entry for entry in summary["schema"]}
+
+
+def test_infers_schema(tmp_path):
+    """测试键路径、类型、可空性、可缺省和数组长度"""
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(DOCUMENT, indent=1), encoding="utf-8")
+
+    summary = JsonStructureAnalyzer().analyze(str(path))
+    schema = by_path(summary)
+    assert summary["format"] == "json"
+    assert summary["root_type"] == "object"
+    assert schema["$"]["keys"] == ["meta", "items", "weird.key"]
+    assert schema["$.items"]["array_length"] == {"min": 50, "max": 50, "avg": 50.0}
+    assert schema["$.items[]"]["keys"] == ["id", "tags", "score", "extra"]
+    assert schema["$.items[].id"]["optional"] is False
+    assert schema["$.items[].score"]["types"] == {"null": 5, "number": 20}
+    assert schema["$.items[].score"]["nullable"] is True
+    assert schema["$.items[].score"]["optional"] is True
+    assert schema["$.items[].tags"]["array_length"]["max"] == 2
+    assert schema['$["weird.key"]']["examples"] == ["true"]
+
+
+def test_large_values_are_parsed_incrementally(tmp_path):
+    """测试超过整体解码上限的对象和数组逐个成员解析，结果与整体解码一致"""
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(DOCUMENT), encoding="utf-8")
+
+    whole = JsonStructureAnalyzer().analyze(str(path))
+    incremental = JsonStructureAnalyzer(max_value_chars=40).analyze(str(path))
+    assert incremental == whole
+
+
+def test_json_lines_and_sampling(tmp_path):
+    """测试JSON Lines按记录分析，抽样时仍统计全部记录数"""
+    path = tmp_path / "data.jsonl"
+    path.write_text("\n".join(json.dumps({"id": i, "name": f"n{i}"}) for i in range(2000)), encoding="utf-8")
+
+    summary = JsonStructureAnalyzer(sample_fraction=0.1, array_head=100, seed=1).analyze(str(path))
+    schema = by_path(summary)
+    assert summary["format"] == "jsonl"
+    assert summary["record_count"] == 2000
+    assert summary["sampled"] is True
+    assert schema["$"]["keys"] == ["id", "name"]
+    assert 100 < schema["$.id"]["count"] < 2000
+
+
+def test_path_limit_and_invalid_json(tmp_path):
+    """测试路径数上限和格式错误"""
+    path = tmp_path / "wide.json"
+    path.write_text(json.dumps({f"k{i}": i for i in range(100)}), encoding="utf-8")
+    summary = JsonStructureAnalyzer(max_paths=10).analyze(str(path))
+    assert summary["path_count"] == 10
+    assert summary["dropped_path_observations"] == 91
+
+    path = tmp_path / "broken.json"
+    path.write_text('{"a": [1, 2, tru]}', encoding="utf-8")
+    with pytest.raises(ValueError):
+        JsonStructureAnalyzer(max_value_chars=4).analyze(str(path))
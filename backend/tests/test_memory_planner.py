@@ -0,0 +1,67 @@
+import pandas as pd
+
+from core.processing.file_processor import FileProcessor
+from core.processing.memory_planner import MemoryPlanner, IN_MEMORY, SAMPLED, SQL_PUSHDOWN
+
+
+def test_estimate_table():
+    """测试根据行数估计和列类型估计表大小"""
+    planner = MemoryPlanner(budget_bytes=1024)
+    table = {
+        "row_estimate": 100,
+        "size_bytes": None,
+        "columns": [{"name": "id", "numeric": True}, {"name": "name", "numeric": False}]
+    }
+    assert planner.estimate_table(table) == 100 * (8 + 64)
+
+    # 目录统计的平均行宽更大时使用目录统计
+    table["size_bytes"] = 100 * 200
+    assert planner.estimate_table(table) == 100 * 200
+
+    # 没有行数估计时无法估计
+    assert planner.estimate_table({"row_estimate": None, "columns": []}) is None
+
+
+def test_plan_modes():
+    """测试执行模式选择"""
+    planner = MemoryPlanner(budget_bytes=1000)
+
+    assert planner.plan(500, [IN_MEMORY, SAMPLED])["mode"] == IN_MEMORY
+    assert planner.plan(None, [IN_MEMORY, SAMPLED])["mode"] == IN_MEMORY
+
+    plan = planner.plan(4000, [IN_MEMORY, SAMPLED])
+    assert plan["mode"] == SAMPLED
+    assert plan["sample_fraction"] == 0.2
+
+    # 支持下推时总是优先下推
+    assert planner.plan(4000, [IN_MEMORY, SAMPLED, SQL_PUSHDOWN])["mode"] == SQL_PUSHDOWN
+    assert planner.plan(500, [SQL_PUSHDOWN, IN_MEMORY])["mode"] == SQL_PUSHDOWN
+
+    # 没有可用模式时拒绝执行
+    assert planner.plan(4000, [IN_MEMORY])["mode"] is None
+
+    # 任务参数可以调低预算，但不能超过配置的预算
+    plan = planner.plan(800, [IN_MEMORY, SAMPLED], {"memory_budget_mb": 500 / (1024 * 1024)})
+    assert plan["mode"] == SAMPLED and plan["budget_bytes"] == 500
+    plan = planner.plan(4000, [IN_MEMORY], {"memory_budget_mb": 1})
+    assert plan["mode"] is None and plan["budget_bytes"] == 1000
+
+    # 任务参数可以指定模式，指定内存执行时仍受预算限制
+    assert planner.plan(500, [IN_MEMORY, SAMPLED], {"execution_mode": SAMPLED})["mode"] == SAMPLED
+    assert planner.plan(500, [IN_MEMORY], {"execution_mode": SAMPLED})["mode"] is None
+    assert planner.plan(500, [IN_MEMORY, SAMPLED], {"execution_mode": IN_MEMORY})["mode"] == IN_MEMORY
+    assert planner.plan(4000, [IN_MEMORY, SAMPLED], {"execution_mode": IN_MEMORY})["mode"] is None
+    assert planner.plan(None, [IN_MEMORY], {"execution_mode": IN_MEMORY})["mode"] == IN_MEMORY
+
+
+def test_read_csv_sample(tmp_path):
+    """测试按比例抽样读取CSV"""
+    path = tmp_path / "data.csv"
+    pd.DataFrame({"value": range(10000)}).to_csv(path, index=False)
+
+    processor = FileProcessor()
+    assert len(processor._read_csv_sample(str(path), 1.0)) == 10000
+
+    sample = processor._read_csv_sample(str(path), 0.1)
+    assert list(sample.columns) == ["value"]
+    assert 500 < len(sample) < 1500
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from core.processing.parquet_shadow import ParquetShadowStore, pushdown_filters, required_columns
+
+
+def make_csv(path, rows=5000):
+    """生成带空值、日期和后段才出现小数的CSV"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "id": np.arange(rows),
+        "city": np.where(rng.random(rows) < 0.1, None, rng.choice(["北京", "上海", "广州"], rows)),
+        "day": pd.date_range("2024-01-01", periods=rows, freq="h").strftime("%Y-%m-%d"),
+        "amount": np.concatenate([rng.integers(1, 100, rows - 10), rng.random(10)])
+    })
+    df.to_csv(path, index=False)
+    return df
+
+
+def test_shadow_matches_csv(tmp_path):
+    """测试副本的数据与pandas读取CSV的结果一致，且写入了行组和列统计"""
+    source = tmp_path / "data.csv"
+    make_csv(source)
+    store = ParquetShadowStore(tmp_path / "shadow", row_group_rows=1000, block_bytes=4096)
+
+    assert store.get(str(source)) is None
+    path = store.build(str(source))
+    assert store.get(str(source)) == path
+    assert pq.ParquetFile(path).metadata.num_row_groups == 5
+
+    pd.testing.assert_frame_equal(store.read(str(source)), pd.read_csv(source), check_dtype=False)
+    statistics = store.statistics(str(source))
+    assert statistics["row_count"] == 5000
+    assert statistics["columns"]["id"]["max"] == 4999
+    assert statistics["columns"]["city"]["null_count"] == int(pd.read_csv(source)["city"].isnull().sum())
+
+
+def test_shadow_invalidated_when_source_changes(tmp_path):
+    """测试源文件变化后副本失效"""
+    source = tmp_path / "data.csv"
+    make_csv(source, rows=100)
+    store = ParquetShadowStore(tmp_path / "shadow")
+    store.build(str(source))
+
+    make_csv(source, rows=50)
+    os.utime(source, ns=(0, 0))
+    assert store.get(str(source)) is None
+    assert store.read(str(source)) is None
+
+
+def test_pushdown_and_column_pruning(tmp_path):
+    """测试开头的过滤条件下推、ne保留空值，以及按select_columns裁剪列"""
+    source = tmp_path / "data.csv"
+    make_csv(source)
+    store = ParquetShadowStore(tmp_path / "shadow", row_group_rows=1000)
+    store.build(str(source))
+    schema = store.schema(str(source))
+
+    operations = [
+        {"type": "filter_rows", "column": "id", "condition": "gt", "value": 2500},
+        {"type": "filter_rows", "column": "city", "condition": "ne", "value": "北京"},
+        {"type": "filter_rows", "column": "id", "condition": "eq", "value": "3000"},
+        {"type": "select_columns", "columns": ["id", "amount"]}
+    ]
+    filters, pushed = pushdown_filters(operations, schema)
+    assert pushed == 2
+
+    columns = required_columns(operations, schema.names)
+    assert columns == ["id", "city", "amount"]
+
+    df = store.read(str(source), columns=columns, filters=filters)
+    expected = pd.read_csv(source)
+    expected = expected[(expected["id"] > 2500) & (expected["city"] != "北京")][columns]
+    pd.testing.assert_frame_equal(df, expected.reset_index(drop=True), check_dtype=False)
+
+    assert required_columns([{"type": "create_column", "new_column": "x", "expression": "1"}], schema.names) is None
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import shutil
+
+from core.processing.profile_store import FileProfileStore
+
+
+def test_lookup_by_size_and_mtime(tmp_path):
+    """测试文件没有变化时按大小和修改时间命中，变化后失效"""
+    store = FileProfileStore(tmp_path / "store")
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+
+    assert store.lookup(str(path)) is None
+    store.update(str(path), {"encoding": "utf-8"})
+    store.update(str(path), {"row_count": 1})
+    profile = store.lookup(str(path))
+    assert profile["encoding"] == "utf-8"
+    assert profile["row_count"] == 1
+    assert profile["content_hash"] == hashlib.md5(path.read_bytes()).hexdigest()
+
+    path.write_text("a,b\n1,2\n3,4\n", encoding="utf-8")
+    assert store.lookup(str(path)) is None
+    assert store.find(str(path)) == {}
+
+
+def test_find_by_content(tmp_path):
+    """测试内容相同的文件（例如重新上传）按内容哈希复用剖析结果"""
+    store = FileProfileStore(tmp_path / "store")
+    path = tmp_path / "data.csv"
+    path.write_text("a,b\n1,2\n", encoding="utf-8")
+    store.update(str(path), {"encoding": "gbk"})
+
+    copy = tmp_path / "copy.csv"
+    shutil.copyfile(path, copy)
+    assert store.lookup(str(copy)) is None
+    assert store.find(str(copy))["encoding"] == "gbk"
+    # 计算过哈希后只按大小和修改时间即可命中
+    assert store.lookup(str(copy))["encoding"] == "gbk"
+
+    store.invalidate(str(copy))
+    assert store.lookup(str(copy)) is None
+
+
+def test_known_hash_and_pruning(tmp_path):
+    """测试使用已知哈希保存，以及超出上限时删除旧的剖析结果"""
+    store = FileProfileStore(tmp_path / "store", max_profiles=5)
+    for i in range(8):
+        path = tmp_path / f"f{i}.txt"
+        path.write_text(f"content {i}", encoding="utf-8")
+        digest = hashlib.md5(path.read_bytes()).hexdigest()
+        store.update(str(path), {"index": i}, content_hash=digest)
+        assert store.lookup(str(path))["index"] == i
+    assert len(os.listdir(tmp_path / "store" / "profiles")) <= 5
@@ -0,0 +1,72 @@
+import pandas as pd
+
+from core.processing.query_cache import QueryCache, normalize_query
+
+
+def test_normalize_query():
+    """测试SQL规范化保留字符串字面量"""
+    query = "SELECT *\n  FROM   users -- 注释\nWHERE name = 'a  b';"
+    assert normalize_query(query) == "SELECT * FROM users WHERE name = 'a  b'"
+    assert normalize_query("select 1") == normalize_query("  select\t1 ; ")
+
+
+def test_query_cache_hit_miss_and_invalidate(tmp_path):
+    """测试缓存命中、未命中和失效"""
+    cache = QueryCache(cache_dir=tmp_path, default_ttl=60)
+    df = pd.DataFrame({"id": [1, 2, 3], "name": ["a", "b", "c"]})
+
+    assert cache.get(1, "SELECT * FROM users") is None
+    assert cache.set(1, "SELECT * FROM users", df)
+
+    # 空白、注释和结尾分号不同的查询命中同一缓存
+    cached = cache.get(1, "  SELECT *\n  FROM users -- 注释\n;")
+    pd.testing.assert_frame_equal(cached, df)
+
+    # 不同数据源互不影响
+    assert cache.get(2, "SELECT * FROM users") is None
+
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+    assert cache.invalidate(1) == 1
+    assert cache.get(1, "SELECT * FROM users") is None
+
+
+def test_query_cache_ttl_and_lru(tmp_path):
+    """测试有效期和LRU淘汰"""
+    cache = QueryCache(cache_dir=tmp_path, default_ttl=60)
+    df = pd.DataFrame({"value": range(1000)})
+
+    cache.set(1, "SELECT 1", df, ttl_seconds=0)
+    assert cache.get(1, "SELECT 1") is None
+
+    # 内存只能容纳一个结果时，旧结果仍可从磁盘读取
+    cache.set(1, "SELECT 2", df)
+    cache.memory_budget = cache.get_stats()["memory_bytes"]
+    cache.set(1, "SELECT 3", df)
+    assert cache.get_stats()["memory_entries"] == 1
+    assert cache.get(1, "SELECT 2") is not None
+    assert cache.get_stats()["disk_hits"] == 1
+
+    # 磁盘预算不足时淘汰最久未使用的结果
+    cache.disk_budget = cache.get_stats()["disk_bytes"] // 2
+    cache.memory_budget = 0
+    cache.set(1, "SELECT 4", df)
+    assert cache.get_stats()["evictions"] >= 1
+
+
+def test_is_cacheable(tmp_path):
+    """测试只缓存只读查询"""
+    cache = QueryCache(cache_dir=tmp_path)
+    assert cache.is_cacheable("SELECT 1")
+    assert cache.is_cacheable("-- comment\nWITH t AS (SELECT 1) SELECT * FROM t")
+    assert not cache.is_cacheable("DELETE FROM users")
+    assert not cache.is_cacheable("WITH d AS (DELETE FROM users RETURNING *) SELECT * FROM d")
+    assert not cache.is_cacheable("with t as (select 1) update users set name = 'a'")
+    assert not cache.is_cacheable("WITH t AS (SELECT 1) INSERT INTO logs SELECT * FROM t")
+    assert not cache.is_cacheable("SELECT * FROM users FOR UPDATE")
+    assert not cache.is_cacheable("SELECT 1; DROP TABLE users")
+    # 字符串字面量和带引号的标识符中的关键字不影响判断
+    assert cache.is_cacheable("SELECT * FROM logs WHERE action = 'delete; drop'")
+    assert cache.is_cacheable('SELECT "update" FROM users')
@@ -0,0 +1,45 @@
+import asyncio
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine
+
+import core.processing.database_processor as database_processor
+from core.processing.database_processor import DatabaseProcessor, _current_task_id
+
+SLOW_QUERY = (
+    "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 100000000) "
+    "SELECT SUM(x) FROM c"
+)
+
+
+def run_query(processor, parameters, cancel_after=None):
+    """以任务身份执行慢查询"""
+    task = SimpleNamespace(id=1, parameters=parameters)
+    engine = create_engine("sqlite://")
+
+    async def main():
+        _current_task_id.set(task.id)
+        processor.running_tasks[task.id] = {"task": task, "progress": 0, "cancel_requested": False}
+        if cancel_after is not None:
+            async def cancel():
+                await asyncio.sleep(cancel_after)
+                processor.running_tasks[task.id]["cancel_requested"] = True
+            asyncio.ensure_future(cancel())
+        return await processor._execute_query(engine, SLOW_QUERY)
+
+    return asyncio.run(main())
+
+
+def test_query_timeout(monkeypatch):
+    """测试查询超时后返回错误"""
+    monkeypatch.setattr(database_processor, "STATEMENT_TIMEOUT_GRACE_SECONDS", 0)
+    df, error = run_query(DatabaseProcessor(), {"statement_timeout": 1})
+    assert df.empty
+    assert "1 秒" in error
+
+
+def test_query_cancel():
+    """测试任务取消时终止查询"""
+    df, error = run_query(DatabaseProcessor(), {"statement_timeout": 0}, cancel_after=0.2)
+    assert df.empty
+    assert "任务已取消" in error
@@ -0,0 +1,72 @@
+import json
+
+from core.processing.query_guard import parse_explain, decide, ALLOW, LIMIT, SAMPLE, REJECT
+
+LIMITS = {"max_rows": 1000, "max_cost": 1e6, "limit_rows": 100}
+
+
+def postgres_plan(rows, cost, join_filter=False):
+    """构造PostgreSQL嵌套循环执行计划"""
+    plan = {
+        "Node Type": "Nested Loop",
+        "Plan Rows": rows,
+        "Total Cost": cost,
+        "Plans": [
+            {"Node Type": "Seq Scan", "Plan Rows": 1000},
+            {"Node Type": "Seq Scan", "Plan Rows": 1000}
+        ]
+    }
+    if join_filter:
+        plan["Join Filter"] = "(a.id = b.id)"
+    return [(json.dumps([{"Plan": plan}]),)]
+
+
+def test_parse_postgres_explain():
+    """测试解析PostgreSQL执行计划和识别笛卡尔积"""
+    estimate = parse_explain("postgresql", postgres_plan(1000000, 5000.0))
+    assert estimate == {"estimated_rows": 1000000, "estimated_cost": 5000.0, "cross_join": True}
+
+    estimate = parse_explain("postgresql", postgres_plan(1000, 5000.0, join_filter=True))
+    assert not estimate["cross_join"]
+
+
+def test_parse_mysql_explain():
+    """测试解析MySQL执行计划"""
+    data = {
+        "query_block": {
+            "cost_info": {"query_cost": "120.50"},
+            "nested_loop": [
+                {"table": {"table_name": "a", "access_type": "ALL", "rows_produced_per_join": 200}},
+                {"table": {"table_name": "b", "access_type": "ALL", "rows_produced_per_join": 40000}}
+            ]
+        }
+    }
+    estimate = parse_explain("mysql", [(json.dumps(data),)])
+    assert estimate == {"estimated_rows": 40000, "estimated_cost": 120.5, "cross_join": True}
+
+
+def test_decide():
+    """测试根据估计值决定执行方式"""
+    small = {"estimated_rows": 10, "estimated_cost": 1.0, "cross_join": False}
+    assert decide("SELECT * FROM t", "postgresql", small, LIMITS)["action"] == ALLOW
+
+    large = {"estimated_rows": 5000, "estimated_cost": 1.0, "cross_join": False}
+    decision = decide("SELECT * FROM t;", "postgresql", large, LIMITS)
+    assert decision["action"] == LIMIT
+    assert decision["query"] == "SELECT * FROM (SELECT * FROM t) AS guarded_query LIMIT 100"
+
+    decision = decide("SELECT * FROM t", "mysql", large, LIMITS, on_large_result="sample")
+    assert decision["action"] == SAMPLE
+    assert "RAND() < 0.02" in decision["query"]
+
+    assert decide("SELECT * FROM t", "postgresql", large, LIMITS, on_large_result="reject")["action"] == REJECT
+    # 非只读语句不改写
+    assert decide("DELETE FROM t", "postgresql", large, LIMITS)["action"] == REJECT
+
+    expensive = {"estimated_rows": 10, "estimated_cost": 1e9, "cross_join": False}
+    assert decide("SELECT * FROM t", "postgresql", expensive, LIMITS)["action"] == REJECT
+
+    cross = {"estimated_rows": 5000, "estimated_cost": 1.0, "cross_join": True}
+    decision = decide("SELECT * FROM a, b", "postgresql", cross, LIMITS)
+    assert decision["action"] == REJECT
+    assert "JOIN" in decision["reason"]
@@ -0,0 +1,59 @@
+import sqlite3
+
+from core.processing.schema_cache import SchemaCache
+
+
+def _create_database(path):
+    """创建测试用SQLite数据库"""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT NOT NULL)")
+    conn.execute("CREATE UNIQUE INDEX ix_users_email ON users (email)")
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER, amount REAL)")
+    conn.commit()
+    conn.close()
+
+
+def test_schema_cache_reflects_tables(tmp_path):
+    """测试元数据缓存反射表、列和索引"""
+    db_path = tmp_path / "source.db"
+    _create_database(db_path)
+
+    cache = SchemaCache(ttl_seconds=60)
+    schema = cache.get_or_load(1, f"sqlite:///{db_path}")
+
+    assert schema["table_count"] == 2
+    users = schema["tables"]["users"]
+    assert [column["name"] for column in users["columns"]] == ["id", "email"]
+    assert users["primary_key"] == ["id"]
+    assert users["indexes"] == [{"name": "ix_users_email", "columns": ["email"], "unique": True}]
+    assert [column["numeric"] for column in schema["tables"]["orders"]["columns"]] == [True, True, True]
+
+
+def test_schema_cache_ttl_and_refresh(tmp_path):
+    """测试缓存命中、过期和显式刷新"""
+    db_path = tmp_path / "source.db"
+    _create_database(db_path)
+    connection_string = f"sqlite:///{db_path}"
+
+    cache = SchemaCache(ttl_seconds=60)
+    first = cache.get_or_load(1, connection_string)
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE events (id INTEGER PRIMARY KEY)")
+    conn.commit()
+    conn.close()
+
+    # 缓存有效期内返回旧结果
+    assert cache.get_or_load(1, connection_string) is first
+    assert "events" not in cache.get_table_names(1, connection_string)
+
+    # 显式刷新后可以看到新表
+    cache.get_or_load(1, connection_string, force=True)
+    assert "events" in cache.get_table_names(1, connection_string)
+
+    # 过期后get返回None
+    cache.ttl_seconds = 0
+    assert cache.get(1) is None
+
+    cache.invalidate(1)
+    assert 1 not in cache._entries
@@ -0,0 +1,95 @@
+import os
+import re
+
+import pytest
+
+from core.processing.text_pipeline import StreamingTextPipeline, TextPipelineCancelled
+
+
+TEXT = "Hello world. foo bar\nsecond line: foo\n\nERROR something failed\nlast line foo"
+
+
+def run(tmp_path, operations, text=TEXT, block_chars=7):
+    source = tmp_path / "source.txt"
+    source.write_text(text, encoding="utf-8")
+    output = tmp_path / "output.txt"
+    result = StreamingTextPipeline(str(source), str(output), operations, block_chars=block_chars).run()
+    return result, output.read_text(encoding="utf-8")
+
+
+def test_line_local_operations_match_whole_text(tmp_path):
+    """测试逐块执行的替换、正则替换和大小写转换与对整个文本执行一致"""
+    operations = [
+        {"type": "replace_text", "old_text": "foo", "new_text": "baz"},
+        {"type": "regex_replace", "pattern": r"l(i)ne", "replacement": r"L\1NE"},
+        {"type": "convert_case", "case_type": "upper"}
+    ]
+    result, output = run(tmp_path, operations)
+
+    expected = re.sub(r"l(i)ne", r"L\1NE", TEXT.replace("foo", "baz")).upper()
+    assert output == expected
+    assert result["original_line_count"] == len(TEXT.splitlines())
+    assert result["original_char_count"] == len(TEXT)
+    assert result["processed_char_count"] == len(expected)
+    assert [r["message"] for r in result["operation_results"]] == [
+        "已替换 3 处文本", "已替换 2 处匹配项", "已转换为 upper 大小写"
+    ]
+
+
+def test_line_operations(tmp_path):
+    """测试过滤、删除和插入行，行号按前面操作处理后的文本计算"""
+    operations = [
+        {"type": "filter_lines", "pattern": "^$", "keep_matching": False},
+        {"type": "remove_lines", "start_line": 2, "end_line": 2},
+        {"type": "insert_text", "position": "line", "line_number": 3, "text": "inserted"},
+        {"type": "insert_text", "position": "start", "text": ">> "},
+        {"type": "insert_text", "position": "end", "text": " <<"}
+    ]
+    result, output = run(tmp_path, operations)
+
+    assert output == ">> Hello world. foo bar\nERROR something failed\ninserted\nlast line foo <<"
+    assert result["processed_line_count"] == 4
+    assert all(r["applied"] for r in result["operation_results"])
+    assert result["operation_results"][0]["message"] == "已移除 1 行"
+
+
+def test_whole_text_operations_and_invalid_parameters(tmp_path):
+    """测试跨行替换、按句子转换大小写，以及参数无效的操作被跳过"""
+    operations = [
+        {"type": "replace_text", "old_text": "bar\nsecond", "new_text": "bar second"},
+        {"type": "convert_case", "case_type": "sentence"},
+        {"type": "regex_replace", "pattern": "("},
+        {"type": "remove_lines", "start_line": 100},
+        {"type": "unknown"}
+    ]
+    result, output = run(tmp_path, operations)
+
+    content = TEXT.replace("bar\nsecond", "bar second")
+    assert output == " ".join(s.capitalize() for s in re.split(r'(?<=[.!?])\s+', content))
+    applied = [r["applied"] for r in result["operation_results"]]
+    assert applied == [True, True, False, False, False]
+    assert result["operation_results"][2]["message"].startswith("正则表达式错误")
+
+
+def test_empty_file_insert(tmp_path):
+    """测试空文件中插入第1行"""
+    result, output = run(tmp_path, [{"type": "insert_text", "position": "line", "line_number": 1, "text": "x"}], text="")
+    assert output == "x"
+    assert result["operation_results"][0]["applied"] is True
+
+
+def test_in_place_and_cancelled(tmp_path):
+    """测试输出路径与源文件相同时先读完源文件，取消时不改动输出文件，也不留下临时文件"""
+    source = tmp_path / "source.txt"
+    source.write_text(TEXT, encoding="utf-8")
+    result = StreamingTextPipeline(str(source), str(source), [{"type": "convert_case", "case_type": "upper"}],
+                                   block_chars=7).run()
+    assert source.read_text(encoding="utf-8") == TEXT.upper()
+    assert result["original_line_count"] == len(TEXT.splitlines())
+
+    pipeline = StreamingTextPipeline(str(source), str(source), [{"type": "convert_case", "case_type": "lower"}],
+                                     block_chars=7, should_cancel=lambda: True)
+    with pytest.raises(TextPipelineCancelled):
+        pipeline.run()
+    assert source.read_text(encoding="utf-8") == TEXT.upper()
+    assert os.listdir(tmp_path) == ["source.txt"]
@@ -0,0 +1,120 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from storage.blob_store import BlobStore
+from storage.upload_sessions import UploadSessionManager, UploadSessionError, merge_range, missing_ranges
+
+
+async def pieces(data, size=1000, fail_after=None):
+    for i, start in enumerate(range(0, len(data), size)):
+        if fail_after is not None and i >= fail_after:
+            raise ConnectionError("断开")
+        yield data[start:start + size]
+
+
+def manager(tmp_path, **kwargs):
+    store = BlobStore(tmp_path / "blobs")
+    return UploadSessionManager(tmp_path / "sessions", store, **kwargs)
+
+
+def content_range(start, end, total):
+    return f"bytes {start}-{end - 1}/{total}"
+
+
+def test_ranges():
+    """测试范围合并和缺少的范围"""
+    ranges = merge_range([], 10, 20)
+    ranges = merge_range(ranges, 0, 5)
+    ranges = merge_range(ranges, 20, 30)
+    assert ranges == [[0, 5], [10, 30]]
+    assert missing_ranges(ranges, 40) == [[5, 10], [30, 40]]
+    assert merge_range(ranges, 5, 10) == [[0, 30]]
+
+
+def test_parallel_out_of_order_upload_and_resume(tmp_path):
+    """测试乱序并行上传、中断后只补传缺少的部分，完成后文件内容和哈希正确"""
+    uploads = manager(tmp_path)
+    data = os.urandom(25000)
+    session = uploads.create(len(data), "data.CSV", hashlib.sha256(data).hexdigest(), dataset_id=1)
+    upload_id = session["upload_id"]
+
+    async def upload():
+        chunks = [(10000, 20000), (20000, 25000)]
+        await asyncio.gather(*(
+            uploads.write_chunk(upload_id, content_range(s, e, len(data)), pieces(data[s:e])) for s, e in chunks
+        ))
+        # 第一个分块中途断开，只记录收到的部分
+        with pytest.raises(ConnectionError):
+            await uploads.write_chunk(upload_id, content_range(0, 10000, len(data)),
+                                      pieces(data[:10000], fail_after=4))
+        status = uploads.status(uploads.get(upload_id))
+        assert status["missing_ranges"] == [[4000, 10000]]
+        # 从开头连续收到的部分已经计入哈希
+        assert uploads._state(upload_id).hashed == 4000
+        return await uploads.write_chunk(upload_id, content_range(4000, 10000, len(data)), pieces(data[4000:10000]))
+
+    status = asyncio.run(upload())
+    assert status["complete"] and status["received_bytes"] == len(data)
+    assert uploads._state(upload_id).hashed == len(data)
+
+    session, blob = uploads.complete(upload_id)
+    assert session["dataset_id"] == 1
+    assert blob.path.read_bytes() == data
+    assert blob.path.suffix == ".csv"
+    assert blob.sha256 == hashlib.sha256(data).hexdigest()
+    with pytest.raises(UploadSessionError):
+        uploads.get(upload_id)
+
+
+def test_invalid_chunks_and_verification(tmp_path):
+    """测试无效的Content-Range、未收完时完成，以及哈希不一致"""
+    uploads = manager(tmp_path, max_chunk_bytes=100)
+    data = b"x" * 150
+    upload_id = uploads.create(len(data), "a.txt", "0" * 64)["upload_id"]
+
+    async def write(header, body):
+        return await uploads.write_chunk(upload_id, header, pieces(body, 50))
+
+    for header, body, code in [
+        (None, data[:10], 400),
+        (content_range(0, 10, 99), data[:10], 400),
+        (content_range(100, 160, 150), data[:60], 416),
+        (content_range(0, 150, 150), data, 413),
+        (content_range(0, 10, 150), data[:20], 400)
+    ]:
+        with pytest.raises(UploadSessionError) as error:
+            asyncio.run(write(header, body))
+        assert error.value.status_code == code
+
+    with pytest.raises(UploadSessionError) as error:
+        uploads.complete(upload_id)
+    assert error.value.status_code == 409
+
+    asyncio.run(write(content_range(0, 100, 150), data[:100]))
+    asyncio.run(write(content_range(100, 150, 150), data[100:]))
+    with pytest.raises(UploadSessionError) as error:
+        uploads.complete(upload_id)
+    assert error.value.status_code == 422
+
+    uploads.abort(upload_id)
+    assert not (tmp_path / "sessions" / upload_id).exists()
+
+
+def test_retried_chunk_over_hashed_prefix(tmp_path):
+    """测试重传已计入哈希的分块时按新内容重新计算哈希"""
+    uploads = manager(tmp_path)
+    upload_id = uploads.create(8, "a.txt")["upload_id"]
+
+    async def upload():
+        await uploads.write_chunk(upload_id, content_range(0, 4, 8), pieces(b"XXXX"))
+        assert uploads._state(upload_id).hashed == 4
+        await uploads.write_chunk(upload_id, content_range(0, 4, 8), pieces(b"good"))
+        await uploads.write_chunk(upload_id, content_range(4, 8, 8), pieces(b"data"))
+
+    asyncio.run(upload())
+    session, blob = uploads.complete(upload_id)
+    assert blob.path.read_bytes() == b"gooddata"
+    assert blob.sha256 == hashlib.sha256(b"gooddata").hexdigest()
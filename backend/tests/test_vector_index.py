@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+
+from core.processing.document_embedding import DocumentEmbeddingPipeline
+from core.processing.embedders import HashingEmbedder
+from core.processing.text_chunker import TextChunker
+from core.processing.vector_index import IndexPartition, VectorIndex
+from core.processing.vector_store import VectorStore
+
+
+def clustered_vectors(n, dimensions=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dimensions))
+    vectors = centers[rng.integers(0, 20, n)] + 0.3 * rng.normal(size=(n, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_ivf_search_updates_and_persistence(tmp_path):
+    """测试倒排列表搜索的召回率、增量更新、过滤和重新打开后的结果"""
+    vectors = clustered_vectors(3000)
+    partition = IndexPartition(tmp_path / "p", train_min=500, merge_min=100)
+    partition.update_source(0, 1, 7, list(range(2000)), vectors[:2000])
+    partition.update_source(0, 2, 8, list(range(2000, 3000)), vectors[2000:])
+    assert partition.base.centroids is not None
+    assert len(partition) == 3000
+
+    hits = 0
+    for q in vectors[:50]:
+        exact = set(np.argsort(-(vectors @ q))[:10].tolist())
+        hits += len(exact & {meta["row"] for _, meta in partition.search(q, 10, 8, {})})
+    assert hits / 500 >= 0.9
+
+    # 数据源1更新：删除前1000个，新增3000个以外的行号
+    result = partition.update_source(0, 1, 7, list(range(1000, 2000)) + [5000], vectors[[*range(1000, 2000), 0]])
+    assert result == {"inserted": 1, "deleted": 1000}
+    results = partition.search(vectors[0], 5, 8, {"source_id": 1})
+    assert results[0][1]["row"] == 5000
+    assert all(meta["row"] >= 1000 for _, meta in results)
+    assert all(meta["user_id"] == 8 for _, meta in partition.search(vectors[2500], 5, 8, {"user_id": 8}))
+
+    reopened = IndexPartition(tmp_path / "p", train_min=500, merge_min=100)
+    assert len(reopened) == 2001
+    assert reopened.search(vectors[0], 1, 8, {"source_id": 1})[0][1]["row"] == 5000
+    assert reopened.delete_source(0, 2) == 1000
+    assert not reopened.search(vectors[2500], 5, 8, {"source_id": 2})
+
+
+def test_index_document_and_search_text(tmp_path):
+    """测试按向量存储的文本块清单建立索引，搜索结果带有文本内容"""
+    store = VectorStore(tmp_path / "store", "hashing-64")
+    embedder = HashingEmbedder(64)
+    index = VectorIndex(tmp_path / "index", store)
+    documents = {
+        1: "Apples and pears grow in the orchard.\nThe harvest is in autumn.\n",
+        2: "Database indexes speed up queries.\nVector search finds similar text.\n"
+    }
+    for source_id, text in documents.items():
+        pipeline = DocumentEmbeddingPipeline(str(source_id), [text], embedder, store, TextChunker(8, 2))
+        asyncio.run(pipeline.run())
+        index.index_document("dataset-1", str(source_id), "file", source_id, 3)
+
+    query = embedder.embed_sync(["vector search similar text"])[0]
+    results = index.search(query, top_k=2)
+    assert results[0]["source_id"] == 2
+    assert "similar text" in results[0]["text"]
+    assert results[0]["partition"] == "dataset-1"
+    assert index.search(query, top_k=5, user_id=4) == []
+    assert all(r["source_id"] == 1 for r in index.search(query, top_k=5, source_id=1))
@@ -0,0 +1,48 @@
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models.domain.llm  # noqa: F401  注册所有表
+import models.domain.user  # noqa: F401
+from core.processing.vector_index import vector_indexes
+from core.processing.vector_store import vector_stores
+from models.domain.base import BaseModel
+from models.domain.dataset import Dataset
+from models.domain.note import Note
+from services import vector_search_service
+
+
+def test_search_only_opens_own_partitions(tmp_path, monkeypatch):
+    """测试未指定数据集时只搜索当前用户的数据集分区和笔记分区，不打开其他用户的分区"""
+    monkeypatch.setattr(vector_stores, "root_dir", tmp_path / "stores")
+    monkeypatch.setattr(vector_stores, "_stores", {})
+    monkeypatch.setattr(vector_indexes, "root_dir", tmp_path / "index")
+    monkeypatch.setattr(vector_indexes, "_indexes", {})
+
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    own = Dataset(name="own", user_id=1)
+    other = Dataset(name="other", user_id=2)
+    db.add_all([own, other])
+    db.flush()
+    db.add_all([
+        Note(title="季度报告", content="收入同比增长", user_id=1, datasets=[own]),
+        Note(title="草稿", content="收入预测", user_id=1),
+        Note(title="别人的", content="收入同比增长", user_id=2, datasets=[other]),
+        Note(title="别人的草稿", content="收入预测", user_id=2)
+    ])
+    db.commit()
+    for note in db.query(Note).all():
+        asyncio.run(vector_search_service.index_note(db, note.id))
+
+    vector_indexes._indexes.clear()
+    results = asyncio.run(vector_search_service.search(db, "收入", user_id=1, top_k=10))
+    assert {result["user_id"] for result in results} == {1}
+    assert {result["dataset_id"] for result in results} == {own.id, None}
+    index = next(iter(vector_indexes._indexes.values()))
+    assert sorted(index._partitions) == [f"dataset-{own.id}", "notes-1"]
+
+    # 没有任何向量的用户搜索结果为空
+    assert asyncio.run(vector_search_service.search(db, "收入", user_id=3, top_k=10)) == []